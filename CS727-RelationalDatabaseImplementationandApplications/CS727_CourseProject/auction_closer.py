@@ -0,0 +1,211 @@
+"""
+Auction closer for the `ebay_db` database (no Tkinter required).
+
+Runs one or more workers that repeatedly call close_expired_listings(), which
+claims expired active listings with FOR UPDATE SKIP LOCKED, so any number of
+workers (in this process or on other machines) can run side by side without
+finalizing a listing twice. Each batch commits on its own.
+
+Every --report seconds a line with closing throughput and lag behind end_date
+is printed; a JSON summary is printed on exit.
+
+At startup and every hour the closer also runs ensure_time_partitions(), so
+the monthly partitions of bid and transaction exist well before they are
+needed (see partitions.py).
+
+Usage:
+  python auction_closer.py                      # run until Ctrl+C
+  python auction_closer.py --workers 4 --batch-size 1000
+  python auction_closer.py --drain              # close the current backlog, then exit
+
+Connection settings come from the same PG* env vars as the app (see db.py).
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+
+import psycopg2
+
+from db import get_conn
+from latency import percentile
+from partitions import ensure_partitions
+
+PARTITION_CHECK_EVERY = 3600  # seconds between ensure_time_partitions() calls
+
+
+class CloserStats:
+    """Counters shared by the workers; lags are kept per report interval."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self.closed = 0
+        self.sold = 0
+        self.batches = 0
+        self.errors = 0
+        self.lag_max = 0.0
+        self._interval_closed = 0
+        self._interval_lags = []
+
+    def record(self, rows):
+        lags = [lag.total_seconds() for _, _, lag in rows]
+        with self._lock:
+            self.batches += 1
+            self.closed += len(rows)
+            self.sold += sum(1 for _, txn_id, _ in rows if txn_id is not None)
+            self.lag_max = max([self.lag_max] + lags)
+            self._interval_closed += len(rows)
+            self._interval_lags.extend(lags)
+
+    def error(self):
+        with self._lock:
+            self.errors += 1
+
+    def take_interval(self):
+        with self._lock:
+            closed, lags = self._interval_closed, sorted(self._interval_lags)
+            self._interval_closed, self._interval_lags = 0, []
+        return closed, lags
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started
+        return {
+            "seconds": round(elapsed, 3),
+            "batches": self.batches,
+            "closed": self.closed,
+            "sold": self.sold,
+            "ended": self.closed - self.sold,
+            "errors": self.errors,
+            "closed_per_sec": round(self.closed / elapsed, 1) if elapsed else None,
+            "max_lag_s": round(self.lag_max, 3),
+        }
+
+
+def backlog(conn):
+    """Expired active listings still waiting to be closed, and the oldest one's lag in seconds."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT COUNT(*), EXTRACT(EPOCH FROM NOW() - MIN(end_date))
+            FROM listing
+            WHERE status = 'active' AND end_date <= NOW()
+            """
+        )
+        count, oldest = cur.fetchone()
+    conn.rollback()
+    return count, float(oldest or 0)
+
+
+def close_worker(stats, stop, batch_size, idle_sleep, drain):
+    """
+    Close batches until `stop` is set. An empty batch means nothing is due
+    (or everything due is locked by other workers): sleep, or exit if draining.
+    """
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            while not stop.is_set():
+                try:
+                    cur.execute("SELECT * FROM close_expired_listings(%s)", (batch_size,))
+                    rows = cur.fetchall()
+                    conn.commit()
+                except psycopg2.Error as exc:
+                    conn.rollback()
+                    stats.error()
+                    sys.stderr.write(f"close batch failed: {exc}\n")
+                    stop.wait(idle_sleep)
+                    continue
+                if rows:
+                    stats.record(rows)
+                elif drain:
+                    return
+                else:
+                    stop.wait(idle_sleep)
+    finally:
+        conn.close()
+
+
+def check_partitions(conn):
+    """ensure_partitions() that reports a failure instead of raising; returns the partitions created."""
+    try:
+        return ensure_partitions(conn)
+    except psycopg2.Error as exc:
+        sys.stderr.write(f"partition check failed: {exc}\n")
+        return 0
+
+
+def run(workers, batch_size, idle_sleep, report_every, drain, seconds=None):
+    monitor = get_conn()
+    partitions_created = check_partitions(monitor)
+    last_partition_check = time.monotonic()
+
+    stats = CloserStats()
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=close_worker, args=(stats, stop, batch_size, idle_sleep, drain), daemon=True)
+        for _ in range(workers)
+    ]
+    for t in threads:
+        t.start()
+
+    deadline = None if seconds is None else time.monotonic() + seconds
+    last = time.monotonic()
+    try:
+        while any(t.is_alive() for t in threads):
+            time.sleep(0.1)
+            now = time.monotonic()
+            if now - last >= report_every:
+                closed, lags = stats.take_interval()
+                pending, oldest = backlog(monitor)
+                print(
+                    f"closed/s={closed / (now - last):8.1f}  "
+                    f"lag p50={percentile(lags, 50) or 0:7.2f}s max={lags[-1] if lags else 0:7.2f}s  "
+                    f"backlog={pending} (oldest {oldest:.1f}s)",
+                    flush=True,
+                )
+                last = now
+            if now - last_partition_check >= PARTITION_CHECK_EVERY:
+                partitions_created += check_partitions(monitor)
+                last_partition_check = now
+            if deadline is not None and now >= deadline:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+        pending, oldest = backlog(monitor)
+        monitor.close()
+
+    result = stats.summary()
+    result.update({
+        "workers": workers,
+        "batch_size": batch_size,
+        "backlog": pending,
+        "backlog_oldest_s": round(oldest, 3),
+        "partitions_created": partitions_created,
+    })
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=500, help="listings claimed per close_expired_listings call")
+    parser.add_argument("--idle-sleep", type=float, default=1.0, help="seconds to wait when nothing is due")
+    parser.add_argument("--report", type=float, default=5.0, help="seconds between progress lines")
+    parser.add_argument("--seconds", type=float, help="stop after this many seconds")
+    parser.add_argument("--drain", action="store_true", help="exit once no expired listings are left")
+    args = parser.parse_args(argv)
+
+    result = run(args.workers, args.batch_size, args.idle_sleep, args.report, args.drain, args.seconds)
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,494 @@
+"""
+Headless benchmarks for the `ebay_db` database (no Tkinter required).
+
+Subcommands:
+  run           Drive the app's operations (ebay_service.py) from N concurrent
+                connections and report per-operation throughput and p50/p95/p99 latency.
+                Suites (--suite, comma separated, default all):
+                  crud      the statements behind refresh, paging, on_select,
+                            create, update and delete (purge_users)
+                  queries   every prebuilt analytics query, read through a
+                            server-side cursor as run_query does
+                  bids      CALL place_bid on a pool of fresh listings
+                  finalize  finalize_listing on fresh listings with bids
+  compare       Compare two `run` results and flag regressions.
+  hot-listing   N workers bid concurrently on one listing through place_bid;
+                reports sustained accepted bids/sec and latency percentiles.
+
+Usage:
+  python bench.py run --workers 4 --seconds 10 --output base.json
+  python bench.py run --suite crud,queries --datagen-scale 1 --output new.json
+  python bench.py compare base.json new.json --threshold 15
+  python bench.py hot-listing --workers 8 --seconds 10
+
+Listings and users created by a run are removed at the end of it. Connection
+settings come from the same PG* env vars as the app (see db.py).
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import psycopg2
+
+from db import get_conn
+import ebay_service
+from ebay_service import BidRejected, User
+from latency import latency_summary
+from queries import PREBUILT_QUERIES
+
+SUITES = ("crud", "queries", "bids", "finalize")
+COMPARE_METRICS = ("p50", "p95", "p99")
+COMPARE_MIN_COUNT = 20
+
+
+class Exhausted(Exception):
+    """Raised by an operation when it has no more work (the worker stops)."""
+
+
+def drive(workers, seconds, ops, seed):
+    """
+    Run weighted operations on `workers` threads, each with its own
+    connection, for `seconds`. `ops` is [(name, weight, fn)]; fn(conn, rng)
+    runs one operation and may return a different name (str) to record it under.
+    Returns {name: {count, errors, ops_per_sec, latency_ms}}.
+    """
+    names = [name for name, _, _ in ops]
+    weights = [weight for _, weight, _ in ops]
+    fns = {name: fn for name, _, fn in ops}
+    lock = threading.Lock()
+    latencies, errors = {}, {}
+    start_barrier = threading.Barrier(workers + 1)
+    deadline = [0.0]
+
+    def worker(i):
+        rng = random.Random(seed * 1000 + i)
+        conn = get_conn()
+        mine, failed = {}, {}
+        try:
+            start_barrier.wait()
+            while time.monotonic() < deadline[0]:
+                name = rng.choices(names, weights=weights)[0]
+                t0 = time.monotonic()
+                try:
+                    recorded = fns[name](conn, rng)
+                except Exhausted:
+                    break
+                except psycopg2.Error:
+                    conn.rollback()
+                    failed[name] = failed.get(name, 0) + 1
+                    continue
+                if not isinstance(recorded, str):
+                    recorded = name
+                mine.setdefault(recorded, []).append(time.monotonic() - t0)
+        finally:
+            conn.close()
+            with lock:
+                for name, values in mine.items():
+                    latencies.setdefault(name, []).extend(values)
+                for name, n in failed.items():
+                    errors[name] = errors.get(name, 0) + n
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(workers)]
+    for t in threads:
+        t.start()
+    deadline[0] = time.monotonic() + seconds
+    started = time.monotonic()
+    start_barrier.wait()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+
+    result = {}
+    for name in sorted(set(latencies) | set(errors)):
+        values = latencies.get(name, [])
+        result[name] = {
+            "count": len(values),
+            "errors": errors.get(name, 0),
+            "ops_per_sec": round(len(values) / elapsed, 1),
+            "latency_ms": latency_summary(values),
+        }
+    return result
+
+
+def _create_bench_listings(cur, count, hours=24):
+    """Insert `count` active listings for the first seller; returns (listing_ids, seller_id)."""
+    cur.execute(
+        "SELECT user_id FROM user_account WHERE user_type IN ('seller','both') ORDER BY user_id LIMIT 1"
+    )
+    seller_id = cur.fetchone()[0]
+    cur.execute("SELECT category_id FROM category ORDER BY category_id LIMIT 1")
+    category_id = cur.fetchone()[0]
+    cur.execute(
+        """
+        INSERT INTO listing (seller_id, category_id, title, description, auction_type,
+                             start_price, start_date, end_date, status)
+        SELECT %s, %s, 'bench: listing ' || g, 'created by bench.py', 'auction',
+               1, NOW(), NOW() + make_interval(hours => %s), 'active'
+        FROM generate_series(1, %s) g
+        RETURNING listing_id
+        """,
+        (seller_id, category_id, hours, count),
+    )
+    return [r[0] for r in cur.fetchall()], seller_id
+
+
+def _create_bench_listing(cur):
+    ids, seller_id = _create_bench_listings(cur, 1)
+    return ids[0], seller_id
+
+
+def _drop_bench_listings(cur, listing_ids):
+    cur.execute(
+        "DELETE FROM feedback WHERE transaction_id IN (SELECT transaction_id FROM transaction WHERE listing_id = ANY(%s))",
+        (listing_ids,),
+    )
+    cur.execute("DELETE FROM transaction WHERE listing_id = ANY(%s)", (listing_ids,))
+    cur.execute("DELETE FROM bid WHERE listing_id = ANY(%s)", (listing_ids,))
+    cur.execute("DELETE FROM user_listing_watch WHERE listing_id = ANY(%s)", (listing_ids,))
+    cur.execute("DELETE FROM listing WHERE listing_id = ANY(%s)", (listing_ids,))
+
+
+def _bidders(cur, exclude, limit=1000):
+    cur.execute(
+        """
+        SELECT user_id FROM user_account WHERE user_id <> %s ORDER BY user_id LIMIT %s
+        """,
+        (exclude, limit),
+    )
+    return [r[0] for r in cur.fetchall()]
+
+
+def suite_crud(workers, seconds, seed):
+    """The statements behind CrudApp.refresh/_request_page/on_select/create/update/delete."""
+    admin = get_conn()
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute("SELECT MIN(user_id), MAX(user_id) FROM user_account")
+        low, high = cur.fetchone()
+    created, created_lock = [], threading.Lock()
+    serial = itertools.count()
+    prefix = f"bench{os.getpid()}_"
+
+    def refresh(conn, rng):
+        ebay_service.list_users(conn, 0)
+
+    def scroll(conn, rng):
+        ebay_service.list_users(conn, rng.randint(low, high))
+
+    def on_select(conn, rng):
+        ebay_service.get_user(conn, rng.randint(low, high))
+
+    def create(conn, rng):
+        name = f"{prefix}{next(serial)}"
+        user_id = ebay_service.create_user(conn, User(None, name, f"{name}@example.invalid"))
+        with created_lock:
+            created.append((user_id, name))
+        return "create"
+
+    def update(conn, rng):
+        with created_lock:
+            target = rng.choice(created) if created else None
+        if target is None:
+            return create(conn, rng)
+        user_id, name = target
+        ebay_service.update_user(conn, User(user_id, name, f"{name}@example.invalid", "both", "active", rng.randint(0, 5)))
+
+    def delete(conn, rng):
+        with created_lock:
+            target = created.pop(rng.randrange(len(created))) if created else None
+        if target is None:
+            return create(conn, rng)
+        ebay_service.purge_users(conn, [target[0]])
+
+    ops = [("refresh", 10, refresh), ("page", 20, scroll), ("on_select", 40, on_select),
+           ("create", 10, create), ("update", 10, update), ("delete", 10, delete)]
+    try:
+        return drive(workers, seconds, ops, seed)
+    finally:
+        with admin.cursor() as cur:
+            cur.execute("SELECT user_id FROM user_account WHERE username LIKE %s", (prefix + "%",))
+            leftover = [r[0] for r in cur.fetchall()]
+        if leftover:
+            ebay_service.purge_users(admin, leftover)
+        admin.close()
+
+
+def suite_queries(workers, seconds, seed):
+    """
+    Each prebuilt query read through a named cursor up to the row cap, like
+    Run Query; queries with an approximate form also run that as "key (approx)".
+    """
+
+    def reader(key, approx=False):
+        return lambda conn, rng: ebay_service.run_query(conn, key, approx=approx)
+
+    ops = [(key, 1, reader(key)) for key in PREBUILT_QUERIES]
+    ops += [(f"{key} (approx)", 1, reader(key, True)) for key, q in PREBUILT_QUERIES.items() if "approx_sql" in q]
+    return drive(workers, seconds, ops, seed)
+
+
+def suite_bids(workers, seconds, seed, listings=200):
+    """CALL place_bid at high bid + 1 on a random listing out of `listings` fresh ones."""
+    admin = get_conn()
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        listing_ids, seller_id = _create_bench_listings(cur, listings)
+        bidders = _bidders(cur, seller_id)
+
+    def place_bid(conn, rng):
+        listing_id = rng.choice(listing_ids)
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT COALESCE(high_bid + 1, start_price) FROM listing WHERE listing_id = %s",
+                    (listing_id,),
+                )
+                amount = cur.fetchone()[0]
+        try:
+            ebay_service.place_bid(conn, rng.choice(bidders), listing_id, amount)
+        except BidRejected:
+            return "place_bid (rejected)"
+
+    try:
+        return drive(workers, seconds, [("place_bid", 1, place_bid)], seed)
+    finally:
+        with admin.cursor() as cur:
+            _drop_bench_listings(cur, listing_ids)
+        admin.close()
+
+
+def suite_finalize(workers, seconds, seed, listings=500, bids_per_listing=5):
+    """finalize_listing on fresh listings that each carry `bids_per_listing` bids."""
+    admin = get_conn()
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        listing_ids, seller_id = _create_bench_listings(cur, listings)
+        bidders = _bidders(cur, seller_id)
+        rng = random.Random(seed)
+        bids = [(rng.choice(bidders), lid, 1 + step, False) for lid in listing_ids for step in range(bids_per_listing)]
+        ebay_service.place_bids(admin, bids)
+    pending, pending_lock = list(listing_ids), threading.Lock()
+
+    def finalize(conn, rng):
+        with pending_lock:
+            if not pending:
+                raise Exhausted
+            listing_id = pending.pop()
+        ebay_service.finalize_listing(conn, listing_id)
+
+    try:
+        result = drive(workers, seconds, [("finalize_listing", 1, finalize)], seed)
+        result.setdefault("finalize_listing", {})["unfinished"] = len(pending)
+        return result
+    finally:
+        with admin.cursor() as cur:
+            _drop_bench_listings(cur, listing_ids)
+        admin.close()
+
+
+def run_suites(suites, workers, seconds, seed, datagen_scale=None):
+    conn = get_conn()
+    meta = {
+        "started": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "suites": list(suites),
+        "workers": workers,
+        "seconds": seconds,
+        "seed": seed,
+        "server_version": conn.server_version,
+    }
+    if datagen_scale is not None:
+        import datagen
+
+        as_of = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        datagen.generate(conn, datagen_scale, seed, as_of, replace=True, log=lambda line: print(line, file=sys.stderr))
+        meta["datagen_scale"] = datagen_scale
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT relname, n_live_tup FROM pg_stat_user_tables WHERE relname = ANY(%s) ORDER BY relname",
+            (["user_account", "listing", "bid", "transaction", "feedback", "user_listing_watch"],),
+        )
+        meta["rows"] = dict(cur.fetchall())
+    conn.close()
+
+    runners = {"crud": suite_crud, "queries": suite_queries, "bids": suite_bids, "finalize": suite_finalize}
+    results = {}
+    ebay_service.STATEMENTS.reset_stats()
+    for name in suites:
+        print(f"running {name} ...", file=sys.stderr)
+        results[name] = runners[name](workers, seconds, seed)
+    return {"meta": meta, "suites": results, "statements": ebay_service.STATEMENTS.stats()}
+
+
+def compare(base, new, threshold):
+    """
+    Compare two `run` results op by op. A regression is a latency percentile
+    up by more than `threshold` percent or throughput down by more than that.
+    Returns (report lines, number of regressions).
+    """
+    lines = [f"{'suite/op':42} {'metric':12} {'base':>10} {'new':>10} {'change':>8}"]
+    regressions = 0
+    for suite, ops in new["suites"].items():
+        for op, stats in ops.items():
+            before = base.get("suites", {}).get(suite, {}).get(op)
+            if not before or "latency_ms" not in stats or "latency_ms" not in before:
+                continue
+            if min(before.get("count", 0), stats.get("count", 0)) < COMPARE_MIN_COUNT:
+                continue
+            pairs = [(m, before["latency_ms"][m], stats["latency_ms"][m], True) for m in COMPARE_METRICS]
+            pairs.append(("ops_per_sec", before["ops_per_sec"], stats["ops_per_sec"], False))
+            for metric, old, cur, higher_is_worse in pairs:
+                if not old or cur is None:
+                    continue
+                change = (cur - old) / old * 100
+                worse = change > threshold if higher_is_worse else change < -threshold
+                regressions += worse
+                lines.append(
+                    f"{suite + '/' + op:42} {metric:12} {old:>10} {cur:>10} {change:>+7.1f}%"
+                    + ("  REGRESSION" if worse else "")
+                )
+    return lines, regressions
+
+
+def bench_hot_listing(workers, seconds, listing_id=None):
+    """
+    Every worker owns a connection and loops: read the listing's high bid,
+    then CALL place_bid with high + 1. All bids serialize on the listing row
+    lock taken by fn_enforce_bid_rules, so throughput here is the per-listing
+    ceiling; bids that lose the race are reported as rejected.
+    """
+    admin = get_conn()
+    admin.autocommit = True
+    created = listing_id is None
+    with admin.cursor() as cur:
+        if created:
+            listing_id, seller_id = _create_bench_listing(cur)
+        else:
+            cur.execute("SELECT seller_id FROM listing WHERE listing_id = %s", (listing_id,))
+            seller_id = cur.fetchone()[0]
+        bidders = _bidders(cur, seller_id, workers)
+    if not bidders:
+        raise SystemExit("need at least one user besides the seller to bid")
+
+    lock = threading.Lock()
+    latencies = []
+    counts = {"accepted": 0, "rejected": 0}
+    start_barrier = threading.Barrier(workers + 1)
+    deadline = [0.0]
+
+    def worker(i):
+        conn = get_conn()
+        conn.autocommit = True
+        user_id = bidders[i % len(bidders)]
+        mine = []
+        accepted = rejected = 0
+        with conn.cursor() as cur:
+            start_barrier.wait()
+            while time.monotonic() < deadline[0]:
+                t0 = time.monotonic()
+                cur.execute(
+                    "SELECT COALESCE(high_bid + 1, start_price) FROM listing WHERE listing_id = %s",
+                    (listing_id,),
+                )
+                amount = cur.fetchone()[0]
+                try:
+                    ebay_service.place_bid(conn, user_id, listing_id, amount)
+                except BidRejected:
+                    rejected += 1
+                    continue
+                mine.append(time.monotonic() - t0)
+                accepted += 1
+        conn.close()
+        with lock:
+            latencies.extend(mine)
+            counts["accepted"] += accepted
+            counts["rejected"] += rejected
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(workers)]
+    for t in threads:
+        t.start()
+    deadline[0] = time.monotonic() + seconds
+    started = time.monotonic()
+    start_barrier.wait()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+
+    if created:
+        with admin.cursor() as cur:
+            _drop_bench_listings(cur, [listing_id])
+    admin.close()
+
+    return {
+        "scenario": "hot-listing",
+        "listing_id": listing_id,
+        "workers": workers,
+        "seconds": round(elapsed, 3),
+        "accepted": counts["accepted"],
+        "rejected": counts["rejected"],
+        "bids_per_sec": round(counts["accepted"] / elapsed, 1),
+        "latency_ms": latency_summary(latencies),
+    }
+
+
+def _write(result, output):
+    text = json.dumps(result, indent=2)
+    print(text)
+    if output:
+        with open(output, "w") as fh:
+            fh.write(text + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="benchmark the app's SQL")
+    run.add_argument("--suite", default=",".join(SUITES), help=f"comma separated subset of {', '.join(SUITES)}")
+    run.add_argument("--workers", type=int, default=4)
+    run.add_argument("--seconds", type=float, default=10, help="duration of each suite")
+    run.add_argument("--seed", type=int, default=42)
+    run.add_argument("--datagen-scale", type=float,
+                     help="first replace all data with datagen.py output at this scale (destructive)")
+    run.add_argument("--output", help="also write the JSON result to this file")
+
+    cmp_ = sub.add_parser("compare", help="compare two run results")
+    cmp_.add_argument("base")
+    cmp_.add_argument("new")
+    cmp_.add_argument("--threshold", type=float, default=10, help="percent change that counts as a regression")
+
+    hot = sub.add_parser("hot-listing", help="concurrent bidding on a single listing")
+    hot.add_argument("--workers", type=int, default=8)
+    hot.add_argument("--seconds", type=float, default=10)
+    hot.add_argument("--listing-id", type=int, help="bid on an existing listing instead of a temporary one")
+    hot.add_argument("--output", help="also write the JSON result to this file")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        suites = [s.strip() for s in args.suite.split(",") if s.strip()]
+        unknown = sorted(set(suites) - set(SUITES))
+        if unknown:
+            parser.error(f"unknown suite(s): {', '.join(unknown)}")
+        _write(run_suites(suites, args.workers, args.seconds, args.seed, args.datagen_scale), args.output)
+    elif args.command == "compare":
+        with open(args.base) as fh:
+            base = json.load(fh)
+        with open(args.new) as fh:
+            new = json.load(fh)
+        lines, regressions = compare(base, new, args.threshold)
+        print("\n".join(lines))
+        print(f"\n{regressions} regression(s) above {args.threshold:g}%")
+        return 1 if regressions else 0
+    elif args.command == "hot-listing":
+        _write(bench_hot_listing(args.workers, args.seconds, args.listing_id), args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
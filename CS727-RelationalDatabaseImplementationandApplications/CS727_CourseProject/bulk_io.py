@@ -0,0 +1,370 @@
+"""
+Bulk import/export of users and listings for the `ebay_db` database
+(no Tkinter required).
+
+Import streams a CSV (header row) or NDJSON file (one JSON object per line)
+through COPY into a temporary all-TEXT staging table, so malformed values
+never abort the load. Validation then runs set-wise in SQL with the same
+rules and messages as the app's forms, and the valid rows are applied with
+a few set-based statements in one transaction:
+
+- users: same checks as CrudApp.create (required username/email, user_type,
+  account_status, rating 0-5). Rows are upserted: a row whose username, or
+  failing that email, matches an existing user updates it (unchanged rows
+  are skipped); other rows are inserted. Only the first row matching a
+  given user updates it, later ones are rejected.
+- listings: title, seller_id / category_id that exist, auction_type,
+  status, prices that fit NUMERIC(12,2), quantity >= 1, valid dates with
+  end_date after start_date. Rows are inserted.
+
+Rejected rows are reported with their 1-based data row number and reason.
+Export streams COPY ... TO STDOUT straight into the output file (CSV with a
+header, or NDJSON).
+
+Usage:
+  python bulk_io.py import users users.csv
+  python bulk_io.py import listings listings.ndjson --rejects rejects.csv
+  python bulk_io.py export users users.ndjson
+  python bulk_io.py export listings -            # CSV to stdout
+
+Type checks use pg_input_is_valid(), so PostgreSQL 16+ is required.
+Connection settings come from the same PG* env vars as the app (see db.py).
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+from db import CopyReader, get_conn
+
+FORMATS = ("csv", "ndjson")
+
+USER_FIELDS = ("username", "email", "user_type", "account_status", "rating")
+LISTING_FIELDS = (
+    "seller_id", "category_id", "title", "description", "auction_type", "start_price", "reserve_price",
+    "buy_now_price", "start_date", "end_date", "status", "condition", "quantity",
+)
+
+EXPORT_SQL = {
+    "users": """
+        SELECT user_id, username, email, user_type, account_status, rating, created_date
+        FROM user_account ORDER BY user_id
+    """,
+    "listings": f"""
+        SELECT listing_id, {', '.join(LISTING_FIELDS)}, high_bid, high_bidder_id
+        FROM listing ORDER BY listing_id
+    """,
+}
+
+# Fill in defaults and name the first rule each row breaks; values arrive
+# trimmed, with blanks as NULL. Messages match ebay_service.validate_user.
+USER_CHECKS = [
+    """
+    UPDATE bulk_users b SET
+        user_type = d.user_type,
+        account_status = d.account_status,
+        rating = d.rating,
+        reason = CASE
+            WHEN d.username IS NULL OR d.email IS NULL THEN 'Username and email are required.'
+            WHEN d.user_type NOT IN ('buyer', 'seller', 'both') THEN 'User type must be buyer, seller, or both.'
+            WHEN d.account_status NOT IN ('active', 'suspended', 'closed') THEN 'Status must be active, suspended, or closed.'
+            WHEN NOT pg_input_is_valid(d.rating, 'numeric') THEN 'Rating must be numeric.'
+            WHEN NOT d.rating::numeric BETWEEN 0 AND 5 THEN 'Rating must be between 0 and 5.'
+        END
+    FROM (SELECT row_no, username, email,
+                 COALESCE(user_type, 'buyer') AS user_type,
+                 COALESCE(account_status, 'active') AS account_status,
+                 COALESCE(rating, '0') AS rating
+          FROM bulk_users) d
+    WHERE b.row_no = d.row_no
+    """,
+    # the last row of the file wins for a repeated username or email
+    """
+    UPDATE bulk_users b SET reason = 'Username appears again on row ' || d.next_row
+    FROM (SELECT row_no, lead(row_no) OVER (PARTITION BY username ORDER BY row_no) AS next_row
+          FROM bulk_users WHERE reason IS NULL) d
+    WHERE b.row_no = d.row_no AND d.next_row IS NOT NULL
+    """,
+    """
+    UPDATE bulk_users b SET reason = 'Email appears again on row ' || d.next_row
+    FROM (SELECT row_no, lead(row_no) OVER (PARTITION BY email ORDER BY row_no) AS next_row
+          FROM bulk_users WHERE reason IS NULL) d
+    WHERE b.row_no = d.row_no AND d.next_row IS NOT NULL
+    """,
+    # upsert key: the user with this username, else the user with this email
+    """
+    UPDATE bulk_users b SET target_id = COALESCE(un.user_id, em.user_id)
+    FROM bulk_users s
+    LEFT JOIN user_account un ON un.username = s.username
+    LEFT JOIN user_account em ON em.email = s.email
+    WHERE b.row_no = s.row_no AND b.reason IS NULL AND s.reason IS NULL
+      AND (un.user_id IS NOT NULL OR em.user_id IS NOT NULL)
+    """,
+    # one file row per existing user: a username matching one row's target
+    # and an email matching another's must not update the same user twice
+    """
+    UPDATE bulk_users b SET reason = 'Matches the same user_id ' || d.target_id || ' as row ' || d.first_row
+    FROM (SELECT row_no, target_id,
+                 ROW_NUMBER() OVER w AS n,
+                 first_value(row_no) OVER w AS first_row
+          FROM bulk_users WHERE reason IS NULL AND target_id IS NOT NULL
+          WINDOW w AS (PARTITION BY target_id ORDER BY row_no)) d
+    WHERE b.row_no = d.row_no AND d.n > 1
+    """,
+    """
+    UPDATE bulk_users b SET reason = 'Email already belongs to user_id ' || u.user_id
+    FROM user_account u
+    WHERE b.reason IS NULL AND u.email = b.email AND u.user_id IS DISTINCT FROM b.target_id
+    """,
+]
+
+USER_UPDATE_SQL = """
+    WITH changed AS (
+        UPDATE user_account u
+           SET username = b.username,
+               email = b.email,
+               user_type = b.user_type,
+               account_status = b.account_status,
+               rating = b.rating::numeric
+          FROM bulk_users b
+         WHERE b.reason IS NULL AND u.user_id = b.target_id
+           AND (u.username, u.email, u.user_type, u.account_status, u.rating)
+               IS DISTINCT FROM (b.username, b.email, b.user_type, b.account_status, b.rating::numeric(4,2))
+        RETURNING 1
+    )
+    SELECT COUNT(*) FROM changed
+"""
+
+USER_INSERT_SQL = """
+    INSERT INTO user_account (username, email, user_type, account_status, rating)
+    SELECT username, email, user_type, account_status, rating::numeric
+    FROM bulk_users
+    WHERE reason IS NULL AND target_id IS NULL
+    ORDER BY row_no
+"""
+
+LISTING_CHECKS = [
+    """
+    UPDATE bulk_listings b SET
+        auction_type = d.auction_type,
+        start_date = d.start_date,
+        status = d.status,
+        quantity = d.quantity,
+        reason = CASE
+            WHEN d.title IS NULL THEN 'Title is required.'
+            WHEN d.seller_id IS NULL OR NOT pg_input_is_valid(d.seller_id, 'int4') THEN 'seller_id must be an integer.'
+            WHEN NOT EXISTS (SELECT 1 FROM user_account u WHERE u.user_id = d.seller_id::int)
+                THEN 'Seller ' || d.seller_id || ' does not exist.'
+            WHEN d.category_id IS NULL OR NOT pg_input_is_valid(d.category_id, 'int4') THEN 'category_id must be an integer.'
+            WHEN NOT EXISTS (SELECT 1 FROM category c WHERE c.category_id = d.category_id::int)
+                THEN 'Category ' || d.category_id || ' does not exist.'
+            WHEN d.auction_type NOT IN ('auction', 'fixed', 'mixed') THEN 'Auction type must be auction, fixed, or mixed.'
+            WHEN d.status NOT IN ('active', 'ended', 'cancelled', 'sold') THEN 'Status must be active, ended, cancelled, or sold.'
+            WHEN d.start_price IS NULL OR NOT pg_input_is_valid(d.start_price, 'numeric(12,2)')
+                 OR d.start_price::numeric < 0 THEN 'Start price must be a non-negative amount.'
+            WHEN NOT pg_input_is_valid(d.reserve_price, 'numeric(12,2)') OR d.reserve_price::numeric < 0
+                THEN 'Reserve price must be a non-negative amount.'
+            WHEN NOT pg_input_is_valid(d.buy_now_price, 'numeric(12,2)') OR d.buy_now_price::numeric < 0
+                THEN 'Buy-now price must be a non-negative amount.'
+            WHEN NOT pg_input_is_valid(d.start_date, 'timestamptz') THEN 'Start date is not a valid timestamp.'
+            WHEN d.end_date IS NULL OR NOT pg_input_is_valid(d.end_date, 'timestamptz')
+                THEN 'End date is not a valid timestamp.'
+            WHEN d.end_date::timestamptz <= d.start_date::timestamptz THEN 'End date must be after the start date.'
+            WHEN NOT pg_input_is_valid(d.quantity, 'int4') OR d.quantity::int < 1 THEN 'Quantity must be a positive integer.'
+        END
+    FROM (SELECT row_no, title, seller_id, category_id, start_price, reserve_price, buy_now_price, end_date,
+                 COALESCE(auction_type, 'auction') AS auction_type,
+                 COALESCE(start_date, NOW()::text) AS start_date,
+                 COALESCE(status, 'active') AS status,
+                 COALESCE(quantity, '1') AS quantity
+          FROM bulk_listings) d
+    WHERE b.row_no = d.row_no
+    """,
+]
+
+LISTING_INSERT_SQL = f"""
+    INSERT INTO listing ({', '.join(LISTING_FIELDS)})
+    SELECT seller_id::int, category_id::int, title, description, auction_type, start_price::numeric,
+           reserve_price::numeric, buy_now_price::numeric, start_date::timestamptz, end_date::timestamptz,
+           status, condition, quantity::int
+    FROM bulk_listings
+    WHERE reason IS NULL
+    ORDER BY row_no
+"""
+
+ENTITIES = {
+    "users": {"table": "bulk_users", "fields": USER_FIELDS, "checks": USER_CHECKS, "extra": ", target_id INT"},
+    "listings": {"table": "bulk_listings", "fields": LISTING_FIELDS, "checks": LISTING_CHECKS, "extra": ""},
+}
+
+
+def detect_format(path):
+    return "ndjson" if os.path.splitext(path)[1].lower() in (".ndjson", ".jsonl", ".json") else "csv"
+
+
+def read_rows(path, fields, fmt=None):
+    """
+    Yield (row_number, values) for each data row of a CSV or NDJSON file,
+    values being strings (or None) in `fields` order, or (row_number, error)
+    with an error string if the row cannot be parsed. Unknown columns are
+    ignored and missing ones are None.
+    """
+    fmt = fmt or detect_format(path)
+    with open(path, newline="" if fmt == "csv" else None, encoding="utf-8") as fh:
+        if fmt == "csv":
+            for n, r in enumerate(csv.DictReader(fh), start=1):
+                if None in r:
+                    yield n, f"Row has {len(r) - 1 + len(r[None])} values, the header has {len(r) - 1}."
+                    continue
+                yield n, tuple(r.get(f) for f in fields)
+        else:
+            n = 0
+            for line in fh:
+                if not line.strip():
+                    continue
+                n += 1
+                try:
+                    obj = json.loads(line)
+                except ValueError as exc:
+                    yield n, f"Invalid JSON: {exc}"
+                    continue
+                if not isinstance(obj, dict):
+                    yield n, "Each line must be a JSON object."
+                    continue
+                yield n, tuple(None if obj.get(f) is None else str(obj[f]) for f in fields)
+
+
+def _copy_text(value):
+    """Trim a value (blank -> NULL) and escape it for COPY ... FROM STDIN (text format)."""
+    value = value.strip() if value is not None else None
+    if not value:
+        return None
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def import_rows(conn, entity, rows):
+    """
+    Stage `rows` (from read_rows) for `entity` ('users' or 'listings'),
+    validate them set-wise and apply the valid ones, all in one transaction.
+    Returns {rows, inserted, updated, unchanged, rejected, rejects, seconds}
+    with rejects a list of (row_number, reason).
+    """
+    spec = ENTITIES[entity]
+    table, fields = spec["table"], spec["fields"]
+    started = time.monotonic()
+    parse_errors = []
+
+    def staged():
+        for n, values in rows:
+            if isinstance(values, str):
+                parse_errors.append((n, values))
+                continue
+            yield (n,) + tuple(_copy_text(v) for v in values)
+
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"CREATE TEMP TABLE {table} (row_no BIGINT PRIMARY KEY, "
+                f"{', '.join(f + ' TEXT' for f in fields)}{spec['extra']}, reason TEXT) ON COMMIT DROP"
+            )
+            reader = CopyReader(staged())
+            cur.copy_expert(f"COPY {table} (row_no, {', '.join(fields)}) FROM STDIN", reader)
+            cur.execute(f"ANALYZE {table}")
+            for sql in spec["checks"]:
+                cur.execute(sql)
+            updated = unchanged = 0
+            if entity == "users":
+                cur.execute(USER_UPDATE_SQL)
+                updated = cur.fetchone()[0]
+                cur.execute("SELECT COUNT(*) FROM bulk_users WHERE reason IS NULL AND target_id IS NOT NULL")
+                unchanged = cur.fetchone()[0] - updated
+                cur.execute(USER_INSERT_SQL)
+            else:
+                cur.execute(LISTING_INSERT_SQL)
+            inserted = cur.rowcount
+            cur.execute(f"SELECT row_no, reason FROM {table} WHERE reason IS NOT NULL")
+            rejects = sorted(cur.fetchall() + parse_errors)
+    return {
+        "rows": reader.count + len(parse_errors),
+        "inserted": inserted,
+        "updated": updated,
+        "unchanged": unchanged,
+        "rejected": len(rejects),
+        "rejects": rejects,
+        "seconds": round(time.monotonic() - started, 3),
+    }
+
+
+def import_file(conn, entity, path, fmt=None):
+    return import_rows(conn, entity, read_rows(path, ENTITIES[entity]["fields"], fmt))
+
+
+def export_rows(conn, entity, fh, fmt="csv"):
+    """Stream every row of `entity` into the text file `fh` through COPY TO STDOUT; returns the row count."""
+    query = EXPORT_SQL[entity].strip()
+    if fmt == "csv":
+        sql = f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true)"
+    else:
+        # row_to_json never emits raw control characters, so with a delimiter
+        # and quote that cannot occur in the text each line is the JSON verbatim
+        sql = (
+            f"COPY (SELECT row_to_json(t) FROM ({query}) t) TO STDOUT "
+            "WITH (FORMAT csv, DELIMITER E'\\x02', QUOTE E'\\x01')"
+        )
+    with conn:
+        with conn.cursor() as cur:
+            cur.copy_expert(sql, fh)
+            return cur.rowcount
+
+
+def export_file(conn, entity, path, fmt=None):
+    fmt = fmt or detect_format(path)
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        return export_rows(conn, entity, fh, fmt)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("import", "export"):
+        p = sub.add_parser(name, help=f"{name} users or listings")
+        p.add_argument("entity", choices=sorted(ENTITIES))
+        p.add_argument("path", help="file to read/write ('-' = stdin/stdout)")
+        p.add_argument("--format", choices=FORMATS, help="default: from the file extension (.ndjson/.jsonl/.json, else csv)")
+    sub.choices["import"].add_argument("--rejects", help="write rejected rows (row, reason) to this CSV file")
+
+    args = parser.parse_args(argv)
+    conn = get_conn()
+    try:
+        if args.command == "import":
+            if args.path == "-":
+                path = "/dev/stdin"
+                fmt = args.format or "csv"
+            else:
+                path, fmt = args.path, args.format
+            report = import_file(conn, args.entity, path, fmt)
+            if args.rejects:
+                with open(args.rejects, "w", newline="") as fh:
+                    writer = csv.writer(fh)
+                    writer.writerow(["row", "reason"])
+                    writer.writerows(report["rejects"])
+            report["rejects"] = report["rejects"][:200]
+            print(json.dumps(report, indent=2))
+        else:
+            fmt = args.format or ("csv" if args.path == "-" else detect_format(args.path))
+            started = time.monotonic()
+            if args.path == "-":
+                count = export_rows(conn, args.entity, sys.stdout, fmt)
+            else:
+                count = export_file(conn, args.entity, args.path, fmt)
+            sys.stderr.write(f"exported {count} {args.entity} in {time.monotonic() - started:.2f}s\n")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
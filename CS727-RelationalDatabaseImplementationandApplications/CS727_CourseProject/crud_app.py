@@ -4,6 +4,35 @@ Simple desktop CRUD app for the `ebay_db` PostgreSQL database.
 Features:
 - Create, Read, Update, Delete for the `user_account` table.
 - Prebuilt advanced queries (set ops, CTEs, OLAP, percentiles) with one-click execution.
+- All database work runs on background worker threads using a shared
+  connection pool (see db.py), with a progress indicator, pool stats and a
+  Cancel button for reads (writes always run to completion).
+- Query results are streamed from a server-side cursor in chunks, up to a
+  configurable row cap, with "Fetch more" to continue reading.
+- Queries > Run all opens a dashboard that runs every prebuilt query in
+  parallel on separate pooled connections, one tab per result, optionally
+  all reading one exported REPEATABLE READ snapshot.
+- Queries > Search listings finds listings by title and description as you
+  type (ranked full-text search, see search_listings() in ebay_db.sql), with
+  category subtree, status and price filters and keyset "More results".
+- Queries > Category browser shows the category tree with listing counts
+  and revenue per subtree, loading each level when it is first expanded.
+- "Approximate (bid sketches)" answers the percentile query from per-listing
+  and per-category bid sketches (±1%) instead of sorting every bid.
+- Prebuilt query results are cached per query (TTL + LRU, see query_cache.py)
+  and invalidated by local edits or LISTEN/NOTIFY from the database triggers.
+- The user list is patched row by row from user_account change
+  notifications, so edits (from this or any other client) show up live
+  without reloading the list.
+- File > Import bids loads a CSV of bids in batches through place_bids().
+- File > Import/Export users and listings stream CSV or NDJSON through COPY
+  (see bulk_io.py); imports are validated set-wise and report rejects.
+- Deleting users (Delete, or File > Delete users by ID for many at once) runs
+  the server-side purge_users() in one round trip and reports its timing.
+- File > Index advisor runs EXPLAIN (ANALYZE, BUFFERS) over the prebuilt
+  queries and CRUD statements and suggests indexes (see index_advisor.py).
+- The window is a thin client of ebay_service.py, the headless data-access
+  layer that bench.py and scripts use as well.
 - Uses Tkinter (stdlib) for UI and psycopg2 for DB access.
 
 Setup:
@@ -11,50 +40,350 @@ Setup:
   sudo apt-get install python3-tk  # for Tkinter GUI
 """
 
+import bisect
 import os
+import queue
 import sys
+import threading
+import time
 import tkinter as tk
-from tkinter import messagebox
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from tkinter import filedialog, messagebox, simpledialog, ttk
 from functools import partial
 
 try:
     import psycopg2
-    from psycopg2.extras import RealDictCursor
 except ImportError:
     sys.stderr.write(
         "psycopg2-binary is required. Install with: pip install psycopg2-binary\n"
     )
     sys.exit(1)
 
+import bulk_io
+import ebay_service
+import index_advisor
+from db import POOL_MAX, ChangeListener, ConnectionPool
+from query_cache import QueryCache
+from ebay_service import ValidationError, load_bids, read_bid_csv, validate_user
+from queries import (
+    PREBUILT_QUERIES,
+    QUERY_CHUNK_ROWS,
+    QUERY_ROW_CAP,
+    USER_INSERT_SQL,
+    USER_PAGE_AFTER_SQL,
+    USER_PAGE_BEFORE_SQL,
+    USER_PAGE_SIZE,
+    USER_SELECT_SQL,
+    USER_UPDATE_SQL,
+)
 
-def get_conn():
+
+# The user list is read in keyset pages so that first paint stays constant no
+# matter how large user_account grows; at most USER_WINDOW_PAGES pages are kept
+# in the listbox at once, older ones are dropped as the user scrolls away.
+USER_WINDOW_PAGES = 5
+
+# Background database work: number of worker threads (each job checks a
+# connection out of the pool) and how often the Tk loop drains finished jobs.
+DB_WORKERS = int(os.getenv("APP_DB_WORKERS", str(POOL_MAX)))
+POLL_MS = 50
+# What a cancelled job's on_error receives: QueryCanceledError if it was
+# running, CancelledError if it was dropped from the queue before it started
+JOB_CANCELLED = (psycopg2.extensions.QueryCanceledError, CancelledError)
+
+# A partly read query result holds its cursor (and a pooled connection, idle
+# in transaction) for "Fetch more"; it is closed after this long unused.
+STREAM_IDLE_MS = int(os.getenv("APP_STREAM_IDLE_MS", "120000"))
+
+# Tables written by the CRUD buttons (delete cascades through all of them) and
+# the NOTIFY channel other clients' writes arrive on (see fn_notify_table_change).
+USER_TABLES = ("user_account",)
+USER_CASCADE_TABLES = ("feedback", "transaction", "bid", "user_listing_watch", "listing", "user_account")
+CHANGE_CHANNEL = "ebay_table_change"
+# Row-level user_account changes, payload '<I|U|D>:<ids>' or '<op>:*' (see fn_notify_user_change)
+USER_CHANNEL = "user_account_change"
+LISTEN_POLL_MS = 500
+
+# The coming months' partitions of bid and transaction are created at startup
+# and checked again this often (see ensure_time_partitions)
+PARTITION_CHECK_MS = 3600 * 1000
+
+# The listing search runs once typing pauses for this long
+SEARCH_DEBOUNCE_MS = 300
+
+# Tables written by a bulk bid import
+BID_TABLES = ("bid", "listing")
+# ... and by the bulk user / listing imports (listing inserts feed listing_price_summary)
+BULK_IMPORT_TABLES = {"users": USER_TABLES, "listings": ("listing", "listing_price_summary")}
+BULK_FILETYPES = [("CSV files", "*.csv"), ("NDJSON files", "*.ndjson *.jsonl"), ("All files", "*")]
+
+
+class BackgroundRunner:
     """
-    Build a connection using env vars. If no PGHOST is provided, connect via
-    UNIX socket (peer auth) instead of TCP localhost to avoid password prompts
-    on default local installs.
+    Runs database jobs on a thread pool so the Tk event loop never blocks on a
+    query. Each job checks its own connection out of `pool`, so several jobs
+    can execute at once. Finished jobs are queued and handed back to the Tk
+    thread by polling with root.after; callbacks always run on the Tk thread.
     """
-    host = os.getenv("PGHOST", "")
-    return psycopg2.connect(
-        host=host if host else None,  # None -> use UNIX socket default
-        port=int(os.getenv("PGPORT", "5432")),
-        user=os.getenv("PGUSER", os.getenv("USER")),
-        password=os.getenv("PGPASSWORD"),
-        dbname=os.getenv("PGDATABASE", "ebay_db"),
-    )
+
+    def __init__(self, root, pool, workers=DB_WORKERS, on_change=None):
+        self.root = root
+        self.pool = pool
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db")
+        self.done = queue.Queue()
+        self.lock = threading.Lock()
+        self.jobs = {}     # job_id -> (label, future, started_at, read_only, on_error)
+        self.running = {}  # job_id -> connection executing the job
+        self.next_id = 0
+        self.on_change = on_change
+        self.root.after(POLL_MS, self._poll)
+
+    def submit(self, label, fn, on_done, on_error=None, needs_conn=True, read_only=False):
+        """
+        Schedule fn(conn) on a worker. on_done(result) or on_error(exc) is
+        called on the Tk thread once it finishes. Returns the job id.
+        With needs_conn=False, fn() is called without checking out a
+        connection (for jobs that manage their own, such as ResultStream).
+        Only jobs submitted with read_only=True can be cancelled; a cancelled
+        job's on_error gets one of JOB_CANCELLED.
+        """
+        with self.lock:
+            self.next_id += 1
+            job_id = self.next_id
+            future = self.executor.submit(self._run, job_id, fn, on_done, on_error, needs_conn, read_only)
+            self.jobs[job_id] = (label, future, time.monotonic(), read_only, on_error)
+        self._notify()
+        return job_id
+
+    def post(self, callback, value):
+        """Worker side: run callback(value) on the Tk thread (e.g. partial results)."""
+        self.done.put((None, callback, value))
+
+    def _run(self, job_id, fn, on_done, on_error, needs_conn, read_only):
+        def tracked(conn):
+            with self.lock:
+                self.running[job_id] = conn
+            try:
+                return fn(conn)
+            finally:
+                with self.lock:
+                    self.running.pop(job_id, None)
+
+        try:
+            if not needs_conn:
+                result = fn()
+                self.done.put((job_id, on_done, result))
+                return
+            # reads are retried once if their connection turns out to be dead
+            result = self.pool.run(tracked, retry=read_only)
+        except Exception as exc:
+            self.done.put((job_id, on_error, exc))
+        else:
+            self.done.put((job_id, on_done, result))
+
+    def cancel(self, job_id=None):
+        """
+        Cancel the read-only jobs (all of them, or just `job_id`): queued ones
+        are dropped (their on_error gets CancelledError on the next poll) and
+        running ones get a cancel request on their own connection, so they
+        finish with QueryCanceledError. Jobs that write are always left to
+        finish.
+        """
+        with self.lock:
+            for jid, (_, future, _, read_only, _) in self.jobs.items():
+                if not read_only or job_id not in (None, jid):
+                    continue
+                future.cancel()
+                # sent under the lock: the job cannot hand its connection back
+                # to the pool (and to another job) until this returns
+                conn = self.running.get(jid)
+                if conn is not None:
+                    conn.cancel()
+        self._notify()
+
+    def status(self):
+        """Return (label, elapsed_seconds) for every job not yet delivered."""
+        now = time.monotonic()
+        with self.lock:
+            return [(label, now - started) for label, _, started, _, _ in self.jobs.values()]
+
+    def _poll(self):
+        with self.lock:
+            dropped = [j for j, (_, f, _, _, _) in self.jobs.items() if f.cancelled()]
+            dropped = [self.jobs.pop(j) for j in dropped]
+        for label, _, _, _, on_error in dropped:
+            if on_error:
+                on_error(CancelledError(f"{label}: cancelled before it started"))
+        while True:
+            try:
+                job_id, callback, value = self.done.get_nowait()
+            except queue.Empty:
+                break
+            if job_id is not None:
+                with self.lock:
+                    self.jobs.pop(job_id, None)
+            if callback:
+                callback(value)
+        self._notify()
+        self.root.after(POLL_MS, self._poll)
+
+    def _notify(self):
+        if self.on_change:
+            self.on_change(self.status())
+
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ResultStream:
+    """
+    One query result read through a named server-side cursor in chunks of
+    `chunk_rows`, so memory depends on the chunk size rather than the result
+    size. The cursor and its pooled connection stay open between read() calls
+    so a later read continues where the previous one stopped; the cursor is
+    closed and its transaction rolled back once the result is exhausted, on
+    error, or after close() or cancel().
+    """
+
+    def __init__(self, pool, sql, chunk_rows=QUERY_CHUNK_ROWS):
+        self.pool = pool
+        self.sql = sql
+        self.chunk_rows = chunk_rows
+        self.lock = threading.Lock()
+        self.conn = None
+        self.cur = None
+        self.columns = None
+        self.rows_read = 0
+        self.exhausted = False
+        self.closed = False
+        self.busy = False     # a read is claimed (queued or running)
+        self.reading = False  # ... and has started on its worker
+
+    def begin_read(self):
+        """Tk side: claim the stream for one read(); False if it cannot be read."""
+        with self.lock:
+            if self.busy or self.closed or self.exhausted:
+                return False
+            self.busy = True
+            return True
+
+    def read(self, limit, emit):
+        """
+        Worker side: read up to `limit` more rows, calling
+        emit(columns, rows, first) once per chunk. Returns rows read so far.
+        """
+        try:
+            with self.lock:
+                if self.closed:
+                    raise psycopg2.extensions.QueryCanceledError("the stream was closed before this read started")
+                self.reading = True
+            if self.cur is None:
+                conn = self.pool.getconn()
+                with self.lock:
+                    self.conn = conn
+                    if self.closed:
+                        raise psycopg2.extensions.QueryCanceledError("the stream was closed before this read started")
+                self.cur = conn.cursor(name="run_query")
+                self.cur.execute(self.sql)
+            remaining = limit
+            while remaining > 0 and not self.closed:
+                wanted = min(self.chunk_rows, remaining)
+                rows = self.cur.fetchmany(wanted)
+                first = self.columns is None
+                if first:
+                    self.columns = [d[0] for d in self.cur.description]
+                if rows or first:
+                    emit(self.columns, rows, first)
+                self.rows_read += len(rows)
+                remaining -= len(rows)
+                if len(rows) < wanted:
+                    self.exhausted = True
+                    break
+        except Exception:
+            with self.lock:
+                self.busy = self.reading = False
+                self.closed = True
+            self.release()
+            raise
+        with self.lock:
+            self.busy = self.reading = False
+            done = self.closed or self.exhausted
+        if done:
+            self.release()
+        return self.rows_read
+
+    def cancel(self):
+        """
+        Tk side: stop the stream, interrupting a running read's statement. A
+        read that has not started yet (e.g. dropped from the runner's queue)
+        gives up its claim. Returns True like close().
+        """
+        with self.lock:
+            self.closed = True
+            if not self.reading:
+                self.busy = False
+                return self.conn is not None
+            conn = self.conn
+        if conn is not None:
+            conn.cancel()
+        return False
+
+    def close(self):
+        """
+        Tk side: stop the stream. An in-flight read releases the cursor itself
+        when it returns; otherwise returns True and the caller must run
+        release() off the Tk thread.
+        """
+        with self.lock:
+            self.closed = True
+            return not self.busy and self.conn is not None
+
+    def release(self):
+        """Close the cursor, roll its transaction back and return the connection."""
+        with self.lock:
+            conn, cur = self.conn, self.cur
+            self.conn = self.cur = None
+        if conn is None:
+            return
+        broken = False
+        try:
+            if cur is not None:
+                cur.close()
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
+        self.pool.putconn(conn, discard=broken)
 
 
 class CrudApp:
     def __init__(self, root):
         self.root = root
         self.root.title("eBay Mimic - User CRUD")
-        self.conn = get_conn()
+        self.pool = ConnectionPool()
+        self.runner = BackgroundRunner(root, self.pool, on_change=self._show_progress)
         self.selected_id = None
         self.query_defs = self._build_queries()
+        self.stream = None
+        self.stream_idle = None  # root.after id of the idle-stream timeout
+        self.snapshots = set()  # exported by running dashboards, see run_all_queries
+        self.cache = QueryCache()
+        self.listener = ChangeListener([CHANGE_CHANNEL, USER_CHANNEL])
+
+        # Keyset paging state for the user list
+        self.row_ids = []
+        self.has_more_before = False
+        self.has_more_after = False
+        self.page_pending = False
+        self.list_generation = 0
 
         # UI layout
         self.listbox = tk.Listbox(root, width=70, height=12)
-        self.listbox.grid(row=0, column=0, columnspan=4, padx=8, pady=8, sticky="nsew")
+        self.listbox.grid(row=0, column=0, columnspan=4, padx=(8, 0), pady=8, sticky="nsew")
         self.listbox.bind("<<ListboxSelect>>", self.on_select)
+        self.list_scroll = tk.Scrollbar(root, orient="vertical", command=self.listbox.yview)
+        self.list_scroll.grid(row=0, column=4, padx=(0, 8), pady=8, sticky="ns")
+        self.listbox.config(yscrollcommand=self._on_list_scroll)
 
         # Form fields
         self._add_label_entry("Username", 1, "username")
@@ -79,23 +408,66 @@ class CrudApp:
         for i, (key, meta) in enumerate(self.query_defs.items()):
             tk.Button(btn_frame, text=meta["label"], command=partial(self.run_query, key), width=32, anchor="w")\
                 .grid(row=i, column=0, padx=2, pady=2, sticky="ew")
+        tk.Button(btn_frame, text="Run all (dashboard)", command=self.run_all_queries, width=32)\
+            .grid(row=len(self.query_defs), column=0, padx=2, pady=(8, 2), sticky="ew")
+        self.snapshot_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(btn_frame, text="Consistent snapshot", variable=self.snapshot_var, anchor="w")\
+            .grid(row=len(self.query_defs) + 1, column=0, padx=2, sticky="w")
+        self.approx_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(btn_frame, text="Approximate (bid sketches)", variable=self.approx_var, anchor="w")\
+            .grid(row=len(self.query_defs) + 2, column=0, padx=2, sticky="w")
 
         self.output = tk.Text(queries_frame, width=100, height=15, wrap="none")
         self.output.grid(row=0, column=1, padx=4, pady=4, sticky="nsew")
+
+        stream_frame = tk.Frame(queries_frame)
+        stream_frame.grid(row=1, column=1, padx=4, pady=(0, 4), sticky="ew")
+        tk.Label(stream_frame, text="Row cap").grid(row=0, column=0, padx=2)
+        self.row_cap_var = tk.StringVar(value=str(QUERY_ROW_CAP))
+        tk.Spinbox(stream_frame, from_=100, to=1000000, increment=500, width=9, textvariable=self.row_cap_var)\
+            .grid(row=0, column=1, padx=2)
+        self.fetch_more_button = tk.Button(stream_frame, text="Fetch more", command=self.fetch_more, state="disabled")
+        self.fetch_more_button.grid(row=0, column=2, padx=6)
+        self.stream_var = tk.StringVar(value="")
+        tk.Label(stream_frame, textvariable=self.stream_var, anchor="w").grid(row=0, column=3, padx=2, sticky="w")
         queries_frame.grid_columnconfigure(1, weight=1)
         queries_frame.grid_rowconfigure(0, weight=1)
 
+        # Background job status / cancellation
+        status_frame = tk.Frame(root)
+        status_frame.grid(row=8, column=0, columnspan=4, padx=8, pady=(0, 8), sticky="ew")
+        self.status_var = tk.StringVar(value="Idle")
+        tk.Label(status_frame, textvariable=self.status_var, anchor="w")\
+            .grid(row=0, column=0, padx=4, sticky="ew")
+        self.progress = ttk.Progressbar(status_frame, mode="indeterminate", length=160)
+        self.progress.grid(row=0, column=1, padx=4)
+        self.cancel_button = tk.Button(status_frame, text="Cancel", command=self.cancel_jobs, state="disabled")
+        self.cancel_button.grid(row=0, column=2, padx=4)
+        status_frame.grid_columnconfigure(0, weight=1)
+
         # Menu with quick access to queries
         menubar = tk.Menu(root)
         file_menu = tk.Menu(menubar, tearoff=0)
         file_menu.add_command(label="Refresh", command=self.refresh)
+        file_menu.add_command(label="Import bids (CSV)...", command=self.import_bids)
+        file_menu.add_command(label="Import users (CSV/NDJSON)...", command=partial(self.bulk_import, "users"))
+        file_menu.add_command(label="Import listings (CSV/NDJSON)...", command=partial(self.bulk_import, "listings"))
+        file_menu.add_command(label="Export users...", command=partial(self.bulk_export, "users"))
+        file_menu.add_command(label="Export listings...", command=partial(self.bulk_export, "listings"))
+        file_menu.add_command(label="Delete users by ID...", command=self.purge_users_by_id)
+        file_menu.add_command(label="Connection pool / statement stats", command=self.show_pool_stats)
+        file_menu.add_command(label="Index advisor", command=self.run_index_advisor)
         file_menu.add_separator()
-        file_menu.add_command(label="Exit", command=root.quit)
+        file_menu.add_command(label="Exit", command=self.close)
         menubar.add_cascade(label="File", menu=file_menu)
 
         q_menu = tk.Menu(menubar, tearoff=0)
         for key, meta in self.query_defs.items():
             q_menu.add_command(label=meta["label"], command=partial(self.run_query, key))
+        q_menu.add_separator()
+        q_menu.add_command(label="Run all (dashboard)", command=self.run_all_queries)
+        q_menu.add_command(label="Search listings", command=self.search_listings)
+        q_menu.add_command(label="Category browser", command=self.browse_categories)
         menubar.add_cascade(label="Queries", menu=q_menu)
         root.config(menu=menubar)
 
@@ -104,8 +476,233 @@ class CrudApp:
             root.grid_columnconfigure(col, weight=1)
         root.grid_rowconfigure(0, weight=1)
         root.grid_rowconfigure(7, weight=1)
+        root.protocol("WM_DELETE_WINDOW", self.close)
 
+        self._ensure_partitions()
         self.refresh()
+        self.root.after(LISTEN_POLL_MS, self._poll_changes)
+
+    def _ensure_partitions(self):
+        self.runner.submit(
+            "create partitions", ebay_service.ensure_partitions, None, self._show_error("Partition check failed")
+        )
+        self.root.after(PARTITION_CHECK_MS, self._ensure_partitions)
+
+    def _poll_changes(self):
+        if self.listener.reconnect_due():
+            # connecting can block for seconds while the server is down
+            self.runner.submit("reconnect listener", self.listener.reconnect, None, None, needs_conn=False)
+        user_ids, reload_users = set(), False
+        for channel, payload in self.listener.poll():
+            if payload is None:
+                self.cache.clear()  # listener reconnected; changes may have been missed
+                reload_users = reload_users or channel == USER_CHANNEL
+            elif channel == USER_CHANNEL:
+                self.cache.invalidate_tables(USER_TABLES)
+                ids = payload.partition(":")[2]
+                if ids == "*":
+                    reload_users = True
+                else:
+                    user_ids.update(int(uid) for uid in ids.split(","))
+            else:
+                self.cache.invalidate_tables([payload])
+        # more changed rows than the listbox holds: cheaper to reload the list
+        if reload_users or len(user_ids) > USER_PAGE_SIZE * USER_WINDOW_PAGES:
+            self._reload_users()
+        elif user_ids:
+            self._sync_users(user_ids)
+        self.root.after(LISTEN_POLL_MS, self._poll_changes)
+
+    def close(self):
+        stream, self.stream = self.stream, None
+        if stream and stream.close():
+            stream.release()
+        self.runner.shutdown()
+        for snapshot in self.snapshots:
+            snapshot.close()
+        self.listener.close()
+        self.pool.closeall()
+        self.root.quit()
+
+    def _show_progress(self, jobs):
+        if not jobs:
+            st = self.pool.stats()
+            self.status_var.set(
+                f"Idle | pool {st['in_use']}/{st['max']} in use, {st['idle']} idle, "
+                f"avg wait {st['avg_wait_ms']:.1f} ms, avg checkout {st['avg_checkout_ms']:.1f} ms"
+            )
+            self.progress.stop()
+            self.cancel_button.config(state="disabled")
+            return
+        label, elapsed = max(jobs, key=lambda job: job[1])
+        more = f" (+{len(jobs) - 1} more)" if len(jobs) > 1 else ""
+        self.status_var.set(f"Running: {label} {elapsed:.1f}s{more}")
+        self.progress.start(15)
+        self.cancel_button.config(state="normal")
+
+    def cancel_jobs(self):
+        self.runner.cancel()
+        if self.page_pending:
+            # a page load dropped from the queue never calls back; forget it
+            # (and any late result) so scrolling can request the page again
+            self.list_generation += 1
+            self.page_pending = False
+        stream = self.stream
+        if stream:
+            if stream.cancel():
+                self.runner.submit("close cursor", stream.release, None, None, needs_conn=False)
+            self._stop_stream_idle()
+            self.fetch_more_button.config(state="disabled")
+            self.stream_var.set(f"{stream.rows_read} rows (cancelled)")
+        # dashboard queries cancelled before they attached never release their snapshot
+        for snapshot in self.snapshots:
+            self.runner.submit("release snapshot", snapshot.close, None, None, needs_conn=False)
+        self.snapshots.clear()
+
+    def import_bids(self):
+        path = filedialog.askopenfilename(
+            title="Import bids", filetypes=[("CSV files", "*.csv"), ("All files", "*")]
+        )
+        if not path:
+            return
+        started = time.monotonic()
+
+        def on_done(result):
+            accepted, rejects = result
+            self.cache.invalidate_tables(BID_TABLES)
+            elapsed = time.monotonic() - started
+            self.output.delete("1.0", tk.END)
+            self.output.insert(
+                tk.END,
+                f"Bid import: {path}\naccepted={len(accepted)} rejected={len(rejects)} "
+                f"in {elapsed:.2f}s\n\n",
+            )
+            for row_number, reason in rejects[:200]:
+                self.output.insert(tk.END, f"row {row_number}: {reason}\n")
+            if len(rejects) > 200:
+                self.output.insert(tk.END, f"... {len(rejects) - 200} more rejects\n")
+
+        self.runner.submit(
+            "import bids",
+            lambda conn: load_bids(conn, read_bid_csv(path)),
+            on_done,
+            self._show_error("Bid import failed"),
+        )
+
+    def bulk_import(self, entity):
+        """Stream a CSV/NDJSON file through COPY into `entity` (see bulk_io.py) and list the rejects."""
+        path = filedialog.askopenfilename(title=f"Import {entity}", filetypes=BULK_FILETYPES)
+        if not path:
+            return
+
+        def on_done(report):
+            self.cache.invalidate_tables(BULK_IMPORT_TABLES[entity])  # the user list follows its notifications
+            rejects = report["rejects"]
+            self.output.delete("1.0", tk.END)
+            self.output.insert(
+                tk.END,
+                f"{entity.capitalize()} import: {path}\nrows={report['rows']} inserted={report['inserted']} "
+                f"updated={report['updated']} unchanged={report['unchanged']} rejected={report['rejected']} "
+                f"in {report['seconds']:.2f}s\n\n",
+            )
+            for row_number, reason in rejects[:200]:
+                self.output.insert(tk.END, f"row {row_number}: {reason}\n")
+            if len(rejects) > 200:
+                self.output.insert(tk.END, f"... {len(rejects) - 200} more rejects\n")
+
+        self.runner.submit(
+            f"import {entity}",
+            lambda conn: bulk_io.import_file(conn, entity, path),
+            on_done,
+            self._show_error(f"{entity.capitalize()} import failed"),
+        )
+
+    def bulk_export(self, entity):
+        """Stream every row of `entity` to a CSV or NDJSON file (by extension) through COPY TO STDOUT."""
+        path = filedialog.asksaveasfilename(
+            title=f"Export {entity}", defaultextension=".csv", initialfile=f"{entity}.csv", filetypes=BULK_FILETYPES
+        )
+        if not path:
+            return
+        started = time.monotonic()
+
+        def on_done(count):
+            self.output.delete("1.0", tk.END)
+            self.output.insert(tk.END, f"Exported {count} {entity} to {path} in {time.monotonic() - started:.2f}s\n")
+
+        self.runner.submit(
+            f"export {entity}",
+            lambda conn: bulk_io.export_file(conn, entity, path),
+            on_done,
+            self._show_error(f"{entity.capitalize()} export failed"),
+            read_only=True,
+        )
+
+    def _advisor_statements(self, conn, sample_uid):
+        """Every prebuilt query plus the CRUD statements, with sample parameters."""
+        statements = [(meta["label"], meta["sql"], None) for meta in self.query_defs.values()]
+        statements += [
+            ("CRUD: user page (forward)", USER_PAGE_AFTER_SQL, (sample_uid, USER_PAGE_SIZE)),
+            ("CRUD: user page (backward)", USER_PAGE_BEFORE_SQL, (sample_uid, USER_PAGE_SIZE)),
+            ("CRUD: select user", USER_SELECT_SQL, (sample_uid,)),
+            ("CRUD: insert user", USER_INSERT_SQL,
+             ("index_advisor_probe", "index_advisor_probe@example.invalid", "buyer", "active", 0)),
+            ("CRUD: update user", USER_UPDATE_SQL,
+             ("index_advisor_probe", "index_advisor_probe@example.invalid", "buyer", "active", 0, sample_uid)),
+        ]
+        # Delete runs purge_users(); analyze the statements inside it
+        statements += index_advisor.purge_statements(conn, [sample_uid])
+        return statements
+
+    def run_index_advisor(self):
+        """
+        EXPLAIN (ANALYZE, BUFFERS) every query the app runs and show missing
+        indexes, large scans and sorts. Writes are only planned, not run.
+        """
+        selected = self.selected_id
+
+        def analyze(conn):
+            uid = selected
+            if uid is None:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT MIN(user_id) FROM user_account")
+                    uid = cur.fetchone()[0] or 0
+            reports = index_advisor.advise(conn, self._advisor_statements(conn, uid))
+            return index_advisor.format_report(reports, index_advisor.redundant_indexes(conn))
+
+        def on_done(text):
+            self._close_stream()
+            self.output.delete("1.0", tk.END)
+            self.output.insert(tk.END, "Index advisor (EXPLAIN ANALYZE, BUFFERS)\n\n" + text)
+
+        # read-only: writes are only planned
+        self.runner.submit("index advisor", analyze, on_done, self._show_error("Index advisor failed"), read_only=True)
+
+    def show_pool_stats(self):
+        self.output.delete("1.0", tk.END)
+        self.output.insert(tk.END, "Connection pool stats\n\n")
+        for name, value in self.pool.stats().items():
+            shown = f"{value:.2f}" if isinstance(value, float) else value
+            self.output.insert(tk.END, f"{name:16} {shown}\n")
+        self.output.insert(tk.END, "\nPrepared statements\n\n")
+        self.output.insert(
+            tk.END, f"{'statement':18} {'calls':>7} {'prepares':>8} {'errors':>6} {'total ms':>10} {'avg ms':>8} {'max ms':>8}\n"
+        )
+        for st in ebay_service.STATEMENTS.stats():
+            avg = f"{st['avg_ms']:.3f}" if st["avg_ms"] is not None else "-"
+            self.output.insert(
+                tk.END,
+                f"{st['name']:18} {st['calls']:>7} {st['prepares']:>8} {st['errors']:>6} "
+                f"{st['total_ms']:>10.1f} {avg:>8} {st['max_ms']:>8.3f}\n",
+            )
+
+    def _show_error(self, title):
+        def handler(exc):
+            if isinstance(exc, JOB_CANCELLED):
+                messagebox.showwarning(title, "Cancelled.")
+            else:
+                messagebox.showerror(title, f"{exc}")
+        return handler
 
     def _add_label_entry(self, text, row, attr):
         tk.Label(self.root, text=text).grid(row=row, column=0, padx=6, pady=4, sticky="w")
@@ -114,19 +711,148 @@ class CrudApp:
         setattr(self, f"{attr}_entry", entry)
 
     def refresh(self):
-        self.listbox.delete(0, tk.END)
-        with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(
-                "SELECT user_id, username, email, user_type, account_status, rating "
-                "FROM user_account ORDER BY user_id"
-            )
-            rows = cur.fetchall()
-            for r in rows:
-                display = f"[{r['user_id']}] {r['username']:12} | {r['email']:25} | {r['user_type']:6} | {r['account_status']:9} | rating={r['rating']}"
-                self.listbox.insert(tk.END, display)
+        self._reload_users()
         self.selected_id = None
         self._clear_form()
 
+    def _reload_users(self):
+        """Reload the user list from its first page, leaving the form alone."""
+        self.listbox.delete(0, tk.END)
+        self.row_ids = []
+        self.has_more_before = False
+        self.has_more_after = True
+        self.list_generation += 1
+        self.page_pending = True
+        self._request_page(forward=True)
+
+    def _sync_users(self, user_ids):
+        """Re-read just `user_ids` and patch their rows in the listbox."""
+        user_ids = sorted(user_ids)
+        generation = self.list_generation
+
+        def on_done(users):
+            if generation == self.list_generation:  # else the list was reloaded meanwhile
+                self._patch_users(user_ids, users)
+
+        self.runner.submit(
+            "sync users", lambda conn: ebay_service.get_users(conn, user_ids), on_done,
+            self._show_error("Load users failed"), read_only=True,
+        )
+
+    def _patch_users(self, user_ids, users):
+        """
+        Apply the current state of `user_ids` (`users` holds the ones that
+        still exist): replace rows that changed, drop deleted ones, and insert
+        new ones in user_id order if they fall inside the loaded window.
+        """
+        found = {u.user_id: u for u in users}
+        # selected by user_id: rows deleted or inserted above shift the indexes
+        selected = {self.row_ids[i] for i in self.listbox.curselection()}
+        for uid in user_ids:
+            user = found.get(uid)
+            if user is None and uid == self.selected_id:
+                self.selected_id = None
+                self._clear_form()
+            i = bisect.bisect_left(self.row_ids, uid)
+            if i < len(self.row_ids) and self.row_ids[i] == uid:
+                self.listbox.delete(i)
+                if user is None:
+                    del self.row_ids[i]
+                    continue
+                self.listbox.insert(i, self._format_user(user))
+            elif user is not None and (
+                0 < i < len(self.row_ids)
+                or (i == 0 and not self.has_more_before)
+                or (i == len(self.row_ids) and not self.has_more_after)
+            ):
+                self.listbox.insert(i, self._format_user(user))
+                self.row_ids.insert(i, uid)
+        for uid in selected:
+            i = bisect.bisect_left(self.row_ids, uid)
+            if i < len(self.row_ids) and self.row_ids[i] == uid:
+                self.listbox.selection_set(i)
+
+    def _format_user(self, u):
+        return f"[{u.user_id}] {u.username:12} | {u.email:25} | {u.user_type:6} | {u.account_status:9} | rating={u.rating}"
+
+    def _request_page(self, forward):
+        if forward:
+            anchor = self.row_ids[-1] if self.row_ids else 0
+        else:
+            anchor = self.row_ids[0]
+        generation = self.list_generation
+
+        def on_done(rows):
+            if generation != self.list_generation:
+                return  # list was refreshed (or the load cancelled) while this page was in flight
+            self.page_pending = False
+            if forward:
+                self._append_page(rows)
+            else:
+                self._prepend_page(rows)
+
+        def on_error(exc):
+            if generation != self.list_generation:
+                return  # cancel_jobs has already forgotten this page
+            self.page_pending = False
+            self._show_error("Load users failed")(exc)
+
+        self.runner.submit(
+            "load users",
+            lambda conn: ebay_service.list_users(conn, anchor, forward),
+            on_done,
+            on_error,
+            read_only=True,
+        )
+
+    def _append_page(self, rows):
+        self.has_more_after = len(rows) == USER_PAGE_SIZE
+        for r in rows:
+            self.listbox.insert(tk.END, self._format_user(r))
+            self.row_ids.append(r.user_id)
+
+        # Drop pages scrolled off the top, keeping the visible rows in place
+        overflow = len(self.row_ids) - USER_PAGE_SIZE * USER_WINDOW_PAGES
+        if overflow > 0:
+            top = self.listbox.nearest(0)
+            self.listbox.delete(0, overflow - 1)
+            del self.row_ids[:overflow]
+            self.has_more_before = True
+            self.listbox.yview(max(top - overflow, 0))
+
+    def _prepend_page(self, rows):
+        self.has_more_before = len(rows) == USER_PAGE_SIZE
+        if not rows:
+            return
+        top = self.listbox.nearest(0)
+        for i, r in enumerate(rows):
+            self.listbox.insert(i, self._format_user(r))
+        self.row_ids[:0] = [r.user_id for r in rows]
+
+        # Drop pages scrolled off the bottom
+        overflow = len(self.row_ids) - USER_PAGE_SIZE * USER_WINDOW_PAGES
+        if overflow > 0:
+            self.listbox.delete(len(self.row_ids) - overflow, tk.END)
+            del self.row_ids[-overflow:]
+            self.has_more_after = True
+        self.listbox.yview(top + len(rows))
+
+    def _on_list_scroll(self, first, last):
+        """
+        yscrollcommand hook: keeps the scrollbar in sync and requests the next
+        (or previous) keyset page once the viewport nears either edge of the
+        rows currently held in the listbox.
+        """
+        self.list_scroll.set(first, last)
+        if self.page_pending or not self.row_ids:
+            return
+        if float(last) >= 0.9 and self.has_more_after:
+            self.page_pending = True
+            self._request_page(forward=True)
+        elif float(first) <= 0.1 and self.has_more_before:
+            self.page_pending = True
+            self._request_page(forward=False)
+
     def on_select(self, event):
         if not self.listbox.curselection():
             return
@@ -138,24 +864,23 @@ class CrudApp:
         except Exception:
             self.selected_id = None
             return
-        with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(
-                "SELECT user_id, username, email, user_type, account_status, rating "
-                "FROM user_account WHERE user_id = %s",
-                (self.selected_id,),
-            )
-            row = cur.fetchone()
-            if row:
+        uid = self.selected_id
+
+        def on_done(user):
+            if user and uid == self.selected_id:
                 self.username_entry.delete(0, tk.END)
-                self.username_entry.insert(0, row["username"])
+                self.username_entry.insert(0, user.username)
                 self.email_entry.delete(0, tk.END)
-                self.email_entry.insert(0, row["email"])
+                self.email_entry.insert(0, user.email)
                 self.user_type_entry.delete(0, tk.END)
-                self.user_type_entry.insert(0, row["user_type"])
+                self.user_type_entry.insert(0, user.user_type)
                 self.account_status_entry.delete(0, tk.END)
-                self.account_status_entry.insert(0, row["account_status"])
+                self.account_status_entry.insert(0, user.account_status)
                 self.rating_entry.delete(0, tk.END)
-                self.rating_entry.insert(0, str(row["rating"]))
+                self.rating_entry.insert(0, str(user.rating))
+
+        self.runner.submit(f"load user {uid}", lambda conn: ebay_service.get_user(conn, uid), on_done,
+                           self._show_error("Load user failed"), read_only=True)
 
     def _clear_form(self):
         for entry in [
@@ -168,223 +893,518 @@ class CrudApp:
             entry.delete(0, tk.END)
 
     def _build_queries(self):
-        """
-        Returns a dict of advanced/demo queries demonstrating:
-        - set operations (UNION/EXCEPT)
-        - set membership (IN)
-        - set comparison (ALL)
-        - CTE (WITH)
-        - advanced aggregates (percentile_cont)
-        - OLAP (ROLLUP/CUBE)
-        """
-        return {
-            "union_buyers_sellers": {
-                "label": "Set: buyers UNION sellers",
-                "sql": """
-                    SELECT username, 'buyer'  AS role FROM user_account WHERE user_type IN ('buyer','both')
-                    UNION
-                    SELECT username, 'seller' AS role FROM user_account WHERE user_type IN ('seller','both')
-                    ORDER BY username, role;
-                """,
-                "desc": "UNION of buyers and sellers (set operation)",
-            },
-            "except_never_bidded": {
-                "label": "Set: users NEVER bid (EXCEPT)",
-                "sql": """
-                    SELECT username FROM user_account
-                    EXCEPT
-                    SELECT DISTINCT u.username
-                    FROM user_account u JOIN bid b ON b.user_id = u.user_id
-                    ORDER BY username;
-                """,
-                "desc": "Users who have never placed a bid (EXCEPT)",
-            },
-            "membership_watch_phones": {
-                "label": "Membership: watchers of Phones/Laptops",
-                "sql": """
-                    SELECT DISTINCT u.username, l.title, c.name AS category
-                    FROM user_listing_watch w
-                    JOIN listing l ON l.listing_id = w.listing_id
-                    JOIN category c ON c.category_id = l.category_id
-                    JOIN user_account u ON u.user_id = w.user_id
-                    WHERE c.name IN ('Phones','Laptops')
-                    ORDER BY username, title;
-                """,
-                "desc": "IN membership on categories Phones/Laptops",
-            },
-            "set_comparison_all": {
-                "label": "Set comparison: start_price > ALL bids",
-                "sql": """
-                    SELECT l.listing_id, l.title, l.start_price
-                    FROM listing l
-                    WHERE l.start_price > ALL (
-                        SELECT b.bid_amount FROM bid b WHERE b.listing_id = l.listing_id
-                    )
-                    ORDER BY l.listing_id;
-                """,
-                "desc": "Listings whose start price exceeds all existing bids (ALL)",
-            },
-            "cte_top_watchers": {
-                "label": "CTE: top watchers per listing",
-                "sql": """
-                    WITH watch_counts AS (
-                        SELECT l.listing_id, l.title, COUNT(w.user_id) AS watchers
-                        FROM listing l
-                        LEFT JOIN user_listing_watch w ON w.listing_id = l.listing_id
-                        GROUP BY l.listing_id, l.title
-                    )
-                    SELECT * FROM watch_counts
-                    ORDER BY watchers DESC, listing_id
-                    LIMIT 10;
-                """,
-                "desc": "CTE to compute watcher counts",
-            },
-            "agg_percentiles": {
-                "label": "Aggregate: bid amount percentiles",
-                "sql": """
-                    SELECT percentile_cont(ARRAY[0.25,0.5,0.75]) WITHIN GROUP (ORDER BY bid_amount) AS bid_amount_percentiles
-                    FROM bid;
-                """,
-                "desc": "Advanced aggregate: percentile_cont",
-            },
-            "olap_rollup_revenue_category": {
-                "label": "OLAP: revenue by category (ROLLUP)",
-                "sql": """
-                    SELECT COALESCE(c.name, '**TOTAL**') AS category, 
-                           COALESCE(SUM(t.final_price),0) AS revenue
-                    FROM category c
-                    LEFT JOIN listing l ON l.category_id = c.category_id
-                    LEFT JOIN transaction t ON t.listing_id = l.listing_id AND t.payment_status = 'paid'
-                    GROUP BY ROLLUP(c.name)
-                    ORDER BY CASE WHEN c.name IS NULL THEN 1 ELSE 0 END, revenue DESC;
-                """,
-                "desc": "ROLLUP creates summary rows (NULL = grand total)",
-            },
-            "olap_cube_payment_shipping": {
-                "label": "OLAP: revenue cube pay/ship",
-                "sql": """
-                    SELECT COALESCE(payment_status::text, '**ALL**') AS payment_status,
-                           COALESCE(shipping_status::text, '**ALL**') AS shipping_status,
-                           SUM(final_price) AS revenue
-                    FROM transaction
-                    GROUP BY CUBE(payment_status, shipping_status)
-                    ORDER BY CASE WHEN payment_status IS NULL THEN 1 ELSE 0 END,
-                             CASE WHEN shipping_status IS NULL THEN 1 ELSE 0 END,
-                             payment_status, shipping_status;
-                """,
-                "desc": "CUBE creates all combinations (NULL = subtotal/total)",
-            },
-        }
-
-    def _format_rows(self, rows):
-        if not rows:
-            return "(no rows)\n"
-        # rows is list of dicts
-        cols = list(rows[0].keys())
+        """Per-window copy of PREBUILT_QUERIES (see queries.py)."""
+        return {key: dict(meta) for key, meta in PREBUILT_QUERIES.items()}
+
+    @staticmethod
+    def _format_rows(cols, rows, header=True):
         lines = []
-        header = " | ".join(cols)
-        lines.append(header)
-        lines.append("-" * len(header))
+        if header:
+            head = " | ".join(cols)
+            lines.append(head)
+            lines.append("-" * len(head))
         for r in rows:
-            line = " | ".join(str(r[c]) if r[c] is not None else "NULL" for c in cols)
+            line = " | ".join(str(v) if v is not None else "NULL" for v in r)
             lines.append(line)
         return "\n".join(lines) + "\n"
 
+    def _row_cap(self):
+        try:
+            return max(1, int(self.row_cap_var.get()))
+        except ValueError:
+            return QUERY_ROW_CAP
+
+    def _query_form(self, key, approx):
+        """(approx?, sql, desc, cache params) of the exact or approximate form of a prebuilt query."""
+        meta = self.query_defs[key]
+        if approx and "approx_sql" in meta:
+            return True, meta["approx_sql"], meta["approx_desc"], ("approx",)
+        return False, meta["sql"], meta["desc"], ()
+
     def run_query(self, key):
         meta = self.query_defs.get(key)
         if not meta:
             return
+        approx, sql, desc, params = self._query_form(key, self.approx_var.get())
+        self._close_stream()
         self.output.delete("1.0", tk.END)
-        self.output.insert(tk.END, f"{meta['label']}\n{meta['desc']}\n\nSQL:\n{meta['sql'].strip()}\n\n")
-        try:
-            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute(meta["sql"])
-                rows = cur.fetchall()
-            self.output.insert(tk.END, "Result:\n")
-            self.output.insert(tk.END, self._format_rows(rows))
-        except Exception as exc:
-            self.output.insert(tk.END, f"Error: {exc}\n")
+        self.output.insert(tk.END, f"{meta['label']}\n{desc}\n\nSQL:\n{sql.strip()}\n\n")
 
-    def create(self):
-        username = self.username_entry.get().strip()
-        email = self.email_entry.get().strip()
-        user_type = self.user_type_entry.get().strip() or "buyer"
-        account_status = self.account_status_entry.get().strip() or "active"
-        rating = self.rating_entry.get().strip() or 0
-        if not username or not email:
-            messagebox.showerror("Error", "Username and email are required.")
+        cached = self.cache.get(key, params)
+        if cached:
+            (cols, rows), age = cached
+            self.output.insert(tk.END, f"Result (cached, {age:.1f}s old):\n")
+            self.output.insert(tk.END, self._format_rows(cols, rows) if rows else "(no rows)\n")
+            self.stream_var.set(f"{len(rows)} rows")
+            self._show_cache_stats("hit")
             return
-        if user_type not in ("buyer", "seller", "both"):
-            messagebox.showerror("Error", "User type must be buyer, seller, or both.")
+
+        self.output.insert(tk.END, "Result:\n")
+        self.stream = ResultStream(self.pool, sql)
+        self._read_stream(key, self.stream, cache_as=key, cache_params=params)
+
+    def run_all_queries(self):
+        """
+        Dashboard: run every prebuilt query at once, each on its own pooled
+        connection, and show each result in its own tab as soon as it
+        arrives. With "Consistent snapshot" ticked all queries read one
+        exported REPEATABLE READ snapshot and the result cache is bypassed;
+        with "Approximate" ticked queries that have a sketch-backed form run
+        that instead.
+        """
+        keys = list(self.query_defs)
+        consistent = self.snapshot_var.get()
+        approx = self.approx_var.get()
+        limit = self._row_cap()
+        started = time.monotonic()
+
+        win = tk.Toplevel(self.root)
+        modes = [m for m, on in (("consistent snapshot", consistent), ("approximate", approx)) if on]
+        win.title("Dashboard" + (f" ({', '.join(modes)})" if modes else ""))
+        notebook = ttk.Notebook(win)
+        notebook.pack(fill="both", expand=True, padx=6, pady=6)
+        summary = tk.Text(notebook, width=110, height=24, wrap="none")
+        notebook.add(summary, text="Summary")
+        tabs = {}
+        for key in keys:
+            tabs[key] = tk.Text(notebook, width=110, height=24, wrap="none")
+            notebook.add(tabs[key], text=f"{self.query_defs[key]['label']} ...")
+        results = {}
+        state = {"snapshot": None, "snapshot_id": None}
+
+        def render_summary():
+            if not win.winfo_exists():
+                return
+            lines = [f"{'Query':40} {'Rows':>8} {'ms':>9}  Source", "-" * 70]
+            for key in keys:
+                label = self.query_defs[key]["label"]
+                if key not in results:
+                    lines.append(f"{label:40} {'':>8} {'':>9}  running")
+                    continue
+                rows, ms, source = results[key]
+                lines.append(f"{label:40} {rows if rows is not None else '-':>8} {ms:>9.1f}  {source}")
+            done = len(results)
+            lines.append("")
+            lines.append(f"{done}/{len(keys)} finished, {(time.monotonic() - started) * 1000:.0f} ms wall time")
+            if state["snapshot_id"]:
+                lines.append(f"Snapshot {state['snapshot_id']} (REPEATABLE READ, READ ONLY)")
+            summary.delete("1.0", tk.END)
+            summary.insert(tk.END, "\n".join(lines) + "\n")
+
+        def show(key, text, rows, ms, source):
+            results[key] = (rows, ms, source)
+            if not win.winfo_exists():
+                return
+            meta = self.query_defs[key]
+            count = source if rows is None else f"{rows} rows"
+            notebook.tab(tabs[key], text=f"{meta['label']} ({count}, {ms:.0f} ms)")
+            tabs[key].delete("1.0", tk.END)
+            tabs[key].insert(tk.END, f"{meta['label']}\n{self._query_form(key, approx)[2]}\n\n{text}")
+            render_summary()
+
+        def run_one(key, snapshot):
+            meta = self.query_defs[key]
+            params = self._query_form(key, approx)[3]
+            token = self.cache.token(meta["tables"])
+            job_started = time.monotonic()
+
+            def fetch(conn):
+                result = ebay_service.run_query(conn, key, limit, snapshot, approx)
+                return result, (time.monotonic() - job_started) * 1000
+
+            def on_done(outcome):
+                (cols, rows, truncated), ms = outcome
+                if snapshot is None and not truncated:
+                    self.cache.put(key, params, (cols, rows), meta["ttl"], meta["tables"], token)
+                text = self._format_rows(cols, rows) if rows else "(no rows)\n"
+                if truncated:
+                    text += f"\n(stopped at the row cap of {limit} rows)\n"
+                show(key, text, len(rows), ms, "snapshot" if snapshot else "database")
+                finished()
+
+            def on_error(exc):
+                ms = (time.monotonic() - job_started) * 1000
+                cancelled = isinstance(exc, JOB_CANCELLED)
+                if cancelled:
+                    show(key, "Cancelled.\n", None, ms, "cancelled")
+                else:
+                    show(key, f"Error: {exc}\n", None, ms, "failed")
+                finished()
+
+            self.runner.submit(f"dashboard: {meta['label']}", fetch, on_done, on_error, read_only=True)
+
+        def finished():
+            if len(results) == len(keys) and state["snapshot"] is not None:
+                snapshot, state["snapshot"] = state["snapshot"], None
+                self.snapshots.discard(snapshot)
+                self.runner.submit("release snapshot", snapshot.close, None, None, needs_conn=False)
+
+        def fan_out(snapshot):
+            state["snapshot"] = snapshot
+            if snapshot is not None:
+                state["snapshot_id"] = snapshot.snapshot_id
+                self.snapshots.add(snapshot)
+            for key in keys:
+                cached = None if snapshot else self.cache.get(key, self._query_form(key, approx)[3])
+                if cached:
+                    (cols, rows), age = cached
+                    text = self._format_rows(cols, rows) if rows else "(no rows)\n"
+                    show(key, text, len(rows), 0.0, f"cache, {age:.1f}s old")
+                else:
+                    run_one(key, snapshot)
+            render_summary()
+
+        if consistent:
+            self.runner.submit(
+                "export snapshot",
+                lambda: ebay_service.Snapshot(self.pool, len(keys)),
+                fan_out,
+                self._show_error("Snapshot export failed"),
+                needs_conn=False,
+                read_only=True,
+            )
+        else:
+            fan_out(None)
+
+    def search_listings(self):
+        """
+        Listing search panel: ranked results with their current price, updated
+        as the user types. A search starts once typing pauses for
+        SEARCH_DEBOUNCE_MS, results of a search that has been overtaken by a
+        newer one are dropped, and "More results" fetches the next keyset page
+        of the search on screen (the filters are kept with its cursor).
+        """
+        win = tk.Toplevel(self.root)
+        win.title("Search listings")
+        bar = tk.Frame(win)
+        bar.grid(row=0, column=0, columnspan=2, padx=6, pady=6, sticky="ew")
+        fields = {}
+        for col, (name, label, width) in enumerate((
+            ("text", "Search", 32), ("category", "Category ID", 8), ("min_price", "Min price", 8),
+            ("max_price", "Max price", 8),
+        )):
+            tk.Label(bar, text=label).grid(row=0, column=col * 2, padx=(6, 2), sticky="w")
+            fields[name] = tk.Entry(bar, width=width)
+            fields[name].grid(row=0, column=col * 2 + 1, padx=(0, 6), sticky="ew")
+        tk.Label(bar, text="Status").grid(row=0, column=8, padx=(6, 2), sticky="w")
+        status = ttk.Combobox(bar, values=("",) + ebay_service.LISTING_STATUSES, width=10, state="readonly")
+        status.grid(row=0, column=9, padx=(0, 6))
+        bar.grid_columnconfigure(1, weight=1)
+
+        columns = ("title", "category", "current_price", "status", "end_date")
+        tree = ttk.Treeview(win, columns=columns, show="headings", height=20)
+        for col, width in zip(columns, (300, 140, 100, 80, 160)):
+            tree.heading(col, text=col.replace("_", " ").capitalize())
+            tree.column(col, width=width, anchor="e" if col == "current_price" else "w")
+        scroll = ttk.Scrollbar(win, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scroll.set)
+        tree.grid(row=1, column=0, padx=(6, 0), sticky="nsew")
+        scroll.grid(row=1, column=1, padx=(0, 6), sticky="ns")
+        footer = tk.Frame(win)
+        footer.grid(row=2, column=0, columnspan=2, padx=6, pady=6, sticky="ew")
+        info = tk.Label(footer, text="Type to search titles and descriptions.", anchor="w")
+        info.pack(side="left", fill="x", expand=True)
+        more = tk.Button(footer, text="More results", state="disabled")
+        more.pack(side="right")
+        win.grid_rowconfigure(1, weight=1)
+        win.grid_columnconfigure(0, weight=1)
+        # query: the search_listings() arguments of the results on screen, paged with cursor
+        state = {"generation": 0, "after_id": None, "query": None, "cursor": None, "shown": 0, "last": None}
+
+        def clear(message):
+            tree.delete(*tree.get_children())
+            state["query"], state["cursor"], state["shown"] = None, None, 0
+            info.config(text=message)
+            more.config(state="disabled")
+
+        def search():
+            state["after_id"] = None
+            if not win.winfo_exists():
+                return
+            text = fields["text"].get().strip()
+            filters = (text, fields["category"].get().strip(), status.get(),
+                       fields["min_price"].get().strip(), fields["max_price"].get().strip())
+            if filters == state["last"]:
+                return  # a key that changed nothing (arrows, shift...)
+            state["last"] = filters
+            state["generation"] += 1
+            if not text:
+                clear("Type to search titles and descriptions.")
+                return
+            try:
+                category_id = int(filters[1]) if filters[1] else None
+            except ValueError:
+                clear("Category ID must be a whole number.")
+                return
+            fetch((text, category_id) + filters[2:], None)
+
+        def more_results():
+            if state["after_id"] is not None:
+                win.after_cancel(state["after_id"])
+                state["after_id"] = None
+            if state["query"] is not None and state["cursor"] is not None:
+                fetch(state["query"], state["cursor"])
+
+        def fetch(query, cursor):
+            generation = state["generation"]
+            started = time.monotonic()
+
+            def on_done(result):
+                if generation != state["generation"] or not win.winfo_exists():
+                    return
+                hits, next_cursor = result
+                if cursor is None:
+                    tree.delete(*tree.get_children())
+                    state["query"], state["shown"] = query, 0
+                for h in hits:
+                    tree.insert("", tk.END, values=(h.title, h.category, f"{h.current_price:.2f}", h.status,
+                                                    h.end_date.strftime("%Y-%m-%d %H:%M")))
+                state["cursor"] = next_cursor
+                state["shown"] += len(hits)
+                ms = (time.monotonic() - started) * 1000
+                shown = f"{state['shown']} listings" + (", more available" if next_cursor else "")
+                info.config(text=f"{shown} ({ms:.0f} ms)" if state["shown"] else f"No matches ({ms:.0f} ms)")
+                more.config(state="normal" if next_cursor else "disabled")
+
+            def on_error(exc):
+                if generation != state["generation"] or not win.winfo_exists():
+                    return
+                if isinstance(exc, ValidationError):
+                    clear(str(exc))
+                else:
+                    more.config(state="normal" if state["cursor"] else "disabled")
+                    self._show_error("Search failed")(exc)
+
+            more.config(state="disabled")
+            self.runner.submit("search listings", lambda conn: ebay_service.search_listings(conn, *query, cursor),
+                               on_done, on_error, read_only=True)
+
+        def schedule(event=None):
+            if state["after_id"] is not None:
+                win.after_cancel(state["after_id"])
+            state["after_id"] = win.after(SEARCH_DEBOUNCE_MS, search)
+
+        for entry in fields.values():
+            entry.bind("<KeyRelease>", schedule)
+        status.bind("<<ComboboxSelected>>", schedule)
+        more.config(command=more_results)
+        fields["text"].focus_set()
+
+    def browse_categories(self):
+        """
+        Category browser: the category tree with the listing counts and paid
+        revenue of each node's whole subtree. Only the top level is loaded up
+        front; a node's subcategories are fetched the first time it is
+        expanded, one category_children() call per level.
+        """
+        win = tk.Toplevel(self.root)
+        win.title("Categories")
+        columns = ("subcategories", "listings", "active_listings", "revenue")
+        tree = ttk.Treeview(win, columns=columns, height=24)
+        tree.heading("#0", text="Category")
+        tree.column("#0", width=280)
+        for col in columns:
+            tree.heading(col, text=col.replace("_", " ").capitalize())
+            tree.column(col, width=110, anchor="e")
+        scroll = ttk.Scrollbar(win, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scroll.set)
+        tree.grid(row=0, column=0, padx=(6, 0), pady=6, sticky="nsew")
+        scroll.grid(row=0, column=1, padx=(0, 6), pady=6, sticky="ns")
+        win.grid_rowconfigure(0, weight=1)
+        win.grid_columnconfigure(0, weight=1)
+        requested = set()  # nodes whose children were fetched or are being fetched
+        state = {"generation": 0}
+
+        def load(node):
+            generation = state["generation"]
+            parent_id = int(node) if node else None
+            requested.add(node)
+
+            def on_done(categories):
+                if generation != state["generation"] or not win.winfo_exists():
+                    return
+                tree.delete(*tree.get_children(node))
+                for c in categories:
+                    iid = str(c.category_id)
+                    tree.insert(node, tk.END, iid=iid, text=c.name,
+                                values=(c.subcategories, c.listings, c.active_listings, f"{c.revenue:.2f}"))
+                    if c.child_count:
+                        tree.insert(iid, tk.END, text="loading...")  # makes the node expandable
+
+            def on_error(exc):
+                requested.discard(node)
+                self._show_error("Category browser failed")(exc)
+
+            self.runner.submit(
+                "categories", lambda conn: ebay_service.category_children(conn, parent_id), on_done, on_error,
+                read_only=True,
+            )
+
+        def on_open(event):
+            node = tree.focus()
+            if node not in requested:
+                load(node)
+
+        def refresh():
+            state["generation"] += 1
+            requested.clear()
+            tree.delete(*tree.get_children())
+            load("")
+
+        tree.bind("<<TreeviewOpen>>", on_open)
+        tk.Button(win, text="Refresh", command=refresh).grid(row=1, column=0, columnspan=2, pady=(0, 6))
+        refresh()
+
+    def _show_cache_stats(self, outcome):
+        st = self.cache.stats()
+        self.output.insert(
+            tk.END,
+            f"\nCache: {outcome} | hits={st['hits']} misses={st['misses']} "
+            f"entries={st['entries']} evictions={st['evictions']} invalidations={st['invalidations']}\n",
+        )
+
+    def fetch_more(self):
+        if self.stream:
+            self._read_stream("fetch more", self.stream)
+
+    def _read_stream(self, label, stream, cache_as=None, cache_params=()):
+        """
+        Read the next row_cap rows of `stream` on a worker. Each chunk is
+        formatted on the worker and appended to the output as it arrives.
+        With cache_as set, a result that is complete within the row cap is
+        stored in the result cache under that query key and cache_params,
+        unless it has more than QUERY_ROW_CAP rows.
+        """
+        if not stream.begin_read():
             return
-        if account_status not in ("active", "suspended", "closed"):
-            messagebox.showerror("Error", "Status must be active, suspended, or closed.")
+        self._stop_stream_idle()
+        self.fetch_more_button.config(state="disabled")
+        self.stream_var.set(f"Reading... ({stream.rows_read} rows so far)")
+        collected = None
+        if cache_as:
+            meta = self.query_defs[cache_as]
+            token = self.cache.token(meta["tables"])
+            collected = []
+
+        def emit(cols, rows, first):
+            nonlocal collected
+            if collected is not None:
+                collected.extend(rows)
+                if len(collected) > QUERY_ROW_CAP:
+                    collected = None  # too large to keep in the cache
+            if first and not rows:
+                text = "(no rows)\n"
+            else:
+                text = self._format_rows(cols, rows, header=first)
+            self.runner.post(append, text)
+
+        def append(text):
+            if stream is self.stream:
+                self.output.insert(tk.END, text)
+
+        def on_done(total):
+            stored = False
+            if collected is not None and stream.exhausted:
+                stored = self.cache.put(
+                    cache_as, cache_params, (stream.columns, collected), meta["ttl"], meta["tables"], token
+                )
+            if stream is not self.stream:
+                return
+            if cache_as:
+                self._show_cache_stats(
+                    "miss, stored" if stored else "miss" if collected is not None else "miss, too large to cache"
+                )
+            if stream.exhausted:
+                self.stream_var.set(f"{total} rows")
+            elif stream.closed:
+                self.stream_var.set(f"{total} rows (cancelled)")
+            else:
+                self.stream_var.set(f"Showing {total} rows; more available")
+                self.fetch_more_button.config(state="normal")
+                self.stream_idle = self.root.after(STREAM_IDLE_MS, self._expire_stream, stream)
+
+        def on_error(exc):
+            if stream is not self.stream:
+                return
+            self.stream_var.set(f"{stream.rows_read} rows")
+            if isinstance(exc, JOB_CANCELLED):
+                self.output.insert(tk.END, "Cancelled.\n")
+            else:
+                self.output.insert(tk.END, f"Error: {exc}\n")
+
+        limit = self._row_cap()
+        self.runner.submit(label, lambda: stream.read(limit, emit), on_done, on_error, needs_conn=False, read_only=True)
+
+    def _stop_stream_idle(self):
+        if self.stream_idle is not None:
+            self.root.after_cancel(self.stream_idle)
+            self.stream_idle = None
+
+    def _expire_stream(self, stream):
+        """Give back the cursor of a result nobody fetched more of within STREAM_IDLE_MS."""
+        self.stream_idle = None
+        if stream is not self.stream:
             return
+        self._close_stream()
+        self.stream_var.set(f"{stream.rows_read} rows; cursor closed after {STREAM_IDLE_MS // 1000}s idle")
+
+    def _close_stream(self):
+        stream, self.stream = self.stream, None
+        self._stop_stream_idle()
+        self.fetch_more_button.config(state="disabled")
+        self.stream_var.set("")
+        if stream and stream.close():
+            self.runner.submit("close cursor", stream.release, None, None, needs_conn=False)
+
+    def _form_user(self, user_id=None):
+        """The form's fields as a validated User, or None after showing what is wrong."""
         try:
-            rating_val = float(rating)
-        except ValueError:
-            messagebox.showerror("Error", "Rating must be numeric.")
-            return
-        if not 0 <= rating_val <= 5:
-            messagebox.showerror("Error", "Rating must be between 0 and 5.")
+            return validate_user(
+                self.username_entry.get(),
+                self.email_entry.get(),
+                self.user_type_entry.get(),
+                self.account_status_entry.get(),
+                self.rating_entry.get(),
+                user_id,
+            )
+        except ValidationError as exc:
+            messagebox.showerror("Error", str(exc))
+            return None
+
+    def create(self):
+        user = self._form_user()
+        if user is None:
             return
-        with self.conn:
-            with self.conn.cursor() as cur:
-                cur.execute(
-                    """
-                    INSERT INTO user_account (username, email, user_type, account_status, rating)
-                    VALUES (%s, %s, %s, %s, %s)
-                    RETURNING user_id
-                    """,
-                    (username, email, user_type, account_status, rating_val),
-                )
-                new_id = cur.fetchone()[0]
-        self.refresh()
-        messagebox.showinfo("Success", f"Created user_id={new_id}")
+
+        def on_done(new_id):
+            self.cache.invalidate_tables(USER_TABLES)
+            self._sync_users([new_id])
+            self.selected_id = None
+            self._clear_form()
+            messagebox.showinfo("Success", f"Created user_id={new_id}")
+
+        self.runner.submit(
+            "create user", lambda conn: ebay_service.create_user(conn, user), on_done, self._show_error("Create failed")
+        )
 
     def update(self):
         if not self.selected_id:
             messagebox.showerror("Error", "Select a user to update.")
             return
         uid = self.selected_id
-        username = self.username_entry.get().strip()
-        email = self.email_entry.get().strip()
-        user_type = self.user_type_entry.get().strip() or "buyer"
-        account_status = self.account_status_entry.get().strip() or "active"
-        rating = self.rating_entry.get().strip() or 0
-        if not username or not email:
-            messagebox.showerror("Error", "Username and email are required.")
+        user = self._form_user(uid)
+        if user is None:
             return
-        if user_type not in ("buyer", "seller", "both"):
-            messagebox.showerror("Error", "User type must be buyer, seller, or both.")
-            return
-        if account_status not in ("active", "suspended", "closed"):
-            messagebox.showerror("Error", "Status must be active, suspended, or closed.")
-            return
-        try:
-            rating_val = float(rating)
-        except ValueError:
-            messagebox.showerror("Error", "Rating must be numeric.")
-            return
-        if not 0 <= rating_val <= 5:
-            messagebox.showerror("Error", "Rating must be between 0 and 5.")
-            return
-        with self.conn:
-            with self.conn.cursor() as cur:
-                cur.execute(
-                    """
-                    UPDATE user_account
-                       SET username = %s,
-                           email = %s,
-                           user_type = %s,
-                           account_status = %s,
-                           rating = %s
-                     WHERE user_id = %s
-                    """,
-                    (username, email, user_type, account_status, rating_val, uid),
-                )
-        self.refresh()
-        messagebox.showinfo("Success", f"Updated user_id={uid}")
+
+        def on_done(_):
+            self.cache.invalidate_tables(USER_TABLES)
+            self._sync_users([uid])
+            messagebox.showinfo("Success", f"Updated user_id={uid}")
+
+        self.runner.submit(
+            f"update user {uid}", lambda conn: ebay_service.update_user(conn, user), on_done,
+            self._show_error("Update failed"),
+        )
 
     def delete(self):
         if not self.selected_id:
@@ -392,79 +1412,45 @@ class CrudApp:
             return
         if not messagebox.askyesno("Confirm", f"Delete user_id={self.selected_id}?"):
             return
-        uid = self.selected_id
+        self._purge_users([self.selected_id])
+
+    def purge_users_by_id(self):
+        text = simpledialog.askstring(
+            "Delete users", "User IDs to delete with all their listings, bids and transactions\n"
+            "(comma or space separated):", parent=self.root,
+        )
+        if not text:
+            return
         try:
-            with self.conn:
-                with self.conn.cursor() as cur:
-                    # Find listings owned by this user
-                    cur.execute(
-                        "SELECT listing_id FROM listing WHERE seller_id = %s",
-                        (uid,),
-                    )
-                    listing_ids = [row[0] for row in cur.fetchall()]
-                    listing_array = listing_ids if listing_ids else [None]
-
-                    # Delete feedback authored/targeted or tied to transactions involving the user/listings
-                    cur.execute(
-                        """
-                        DELETE FROM feedback
-                        WHERE author_user_id = %s
-                           OR target_user_id = %s
-                           OR transaction_id IN (
-                                SELECT transaction_id FROM transaction
-                                WHERE buyer_id = %s OR seller_id = %s
-                                   OR listing_id = ANY(%s)
-                           )
-                        """,
-                        (uid, uid, uid, uid, listing_array),
-                    )
-
-                    # Delete transactions involving the user or their listings
-                    cur.execute(
-                        """
-                        DELETE FROM transaction
-                        WHERE buyer_id = %s
-                           OR seller_id = %s
-                           OR listing_id = ANY(%s)
-                        """,
-                        (uid, uid, listing_array),
-                    )
-
-                    # Delete bids placed by the user or on their listings
-                    cur.execute(
-                        """
-                        DELETE FROM bid
-                        WHERE user_id = %s
-                           OR listing_id = ANY(%s)
-                        """,
-                        (uid, listing_array),
-                    )
-
-                    # Delete watches by the user or on their listings
-                    cur.execute(
-                        """
-                        DELETE FROM user_listing_watch
-                        WHERE user_id = %s
-                           OR listing_id = ANY(%s)
-                        """,
-                        (uid, listing_array),
-                    )
-
-                    # Delete listings owned by the user
-                    cur.execute(
-                        "DELETE FROM listing WHERE seller_id = %s",
-                        (uid,),
-                    )
-
-                    # Finally delete the user
-                    cur.execute(
-                        "DELETE FROM user_account WHERE user_id = %s",
-                        (uid,),
-                    )
-            self.refresh()
-            messagebox.showinfo("Deleted", f"Deleted user_id={uid}")
-        except Exception as exc:
-            messagebox.showerror("Delete failed", f"{exc}")
+            user_ids = sorted({int(tok) for tok in text.replace(",", " ").split()})
+        except ValueError:
+            messagebox.showerror("Error", "User IDs must be integers.")
+            return
+        if not user_ids:
+            return
+        if not messagebox.askyesno("Confirm", f"Delete {len(user_ids)} user(s): {', '.join(map(str, user_ids[:20]))}"
+                                   f"{' ...' if len(user_ids) > 20 else ''}?"):
+            return
+        self._purge_users(user_ids)
+
+    def _purge_users(self, user_ids):
+        """Run purge_users() in one round trip and report per-table counts and timing."""
+        started = time.monotonic()
+
+        def on_done(counts):
+            elapsed = time.monotonic() - started
+            self.cache.invalidate_tables(USER_CASCADE_TABLES)
+            self._sync_users(user_ids)
+            lines = [f"{table}: {n}" for table, n in counts]
+            messagebox.showinfo(
+                "Deleted",
+                f"Deleted user_id={', '.join(map(str, user_ids))} in {elapsed * 1000:.0f} ms\n\n" + "\n".join(lines),
+            )
+
+        label = f"delete user {user_ids[0]}" if len(user_ids) == 1 else f"delete {len(user_ids)} users"
+        self.runner.submit(
+            label, lambda conn: ebay_service.purge_users(conn, user_ids), on_done, self._show_error("Delete failed")
+        )
 
 
 def main():
@@ -0,0 +1,512 @@
+"""
+Synthetic data generator for the `ebay_db` database (no Tkinter required).
+
+Replaces the contents of every table with generated data loaded through COPY,
+at a chosen scale factor (months archived by partitions.py are dropped). Scale
+1 is roughly:
+
+  user_account   10,000      category             250 (up to 6 levels deep)
+  listing        50,000      user_listing_watch   ~200,000
+  bid            ~140,000    transaction          ~12,000     feedback ~15,000
+
+so scale 10 puts bid in the millions. The data is skewed the way a real
+marketplace is: a few power sellers own most listings, a few hot listings
+draw most bids and watchers, and a few heavy bidders place most bids.
+
+Every bid ladder respects fn_enforce_bid_rules: the first bid is at least the
+start price, each later bid beats the previous one by at least 1, bidders
+never bid on their own listing, and bid times fall between start_date and
+end_date. Sold listings get a transaction for their highest bid. Finished
+listings, transactions and feedback are never dated after --as-of.
+
+Output is deterministic for a given --seed, --scale and --as-of (the
+reference "now" that listing dates are laid out around).
+
+bid and transaction are partitioned by month; the months the generated
+history covers are created before loading (create_time_partitions), along
+with the next few months for live bidding (ensure_time_partitions).
+
+User triggers on the loaded tables are switched off during the load and the
+derived columns (listing.high_bid, listing_price_summary, revenue_fact, the bid
+sketches, user ratings, category_closure, transaction_tracking_number) are
+rebuilt afterwards with the
+refresh_* functions; everything runs in one transaction, so a failed load
+leaves the old data in place.
+
+Usage:
+  python datagen.py --scale 1 --seed 42 --replace
+  python datagen.py --scale 10 --seed 7 --as-of 2026-01-01 --replace --verify
+
+Connection settings come from the same PG* env vars as the app (see db.py).
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from db import CopyReader, get_conn
+
+TABLES = ("feedback", "transaction_tracking_number", "transaction", "bid", "user_listing_watch",
+          "listing_price_summary", "revenue_fact", "bid_sketch_listing", "bid_sketch_category", "bid_sketch_total",
+          "listing", "category_closure", "category", "user_account")
+
+PER_SCALE = {"users": 10_000, "categories": 250, "listings": 50_000}
+MAX_CATEGORY_DEPTH = 6
+MAX_BIDS_PER_LISTING = 2_000
+MAX_SALE_DELAY_HOURS = 48   # a sold listing's transaction is dated this long after end_date at most
+
+ROOT_CATEGORIES = ("Electronics", "Fashion", "Home & Garden", "Collectibles", "Motors",
+                   "Books", "Toys", "Sports", "Music", "Health & Beauty")
+CATEGORY_WORDS = ("Vintage", "Accessories", "Parts", "Kits", "Classic", "Outdoor", "Pro", "Mini",
+                  "Rare", "Modern", "Sets", "Tools", "Supplies", "Refurbished", "Limited")
+TITLE_WORDS = ("Genuine", "Used", "New", "Sealed", "Boxed", "Rare", "Lot of 3", "Mint", "Working",
+               "Signed", "Original", "Deluxe", "Compact", "Wireless", "Handmade")
+PAYMENT_METHODS = ('["visa"]', '["paypal"]', '["mastercard"]', '["visa","amex"]', '["paypal","visa"]')
+CONDITIONS = ("new", "used", "refurbished", "for parts")
+
+
+def zipf_cum_weights(n, s):
+    """Cumulative weights 1/rank**s for ranks 1..n (for random.choices)."""
+    total = 0.0
+    cum = []
+    for rank in range(1, n + 1):
+        total += 1.0 / rank ** s
+        cum.append(total)
+    return cum
+
+
+def ts(value):
+    return value.isoformat(sep=" ")
+
+
+class Generator:
+    """
+    Lays the data out in memory-light passes: each table is generated while
+    it is copied, keeping only what later tables reference (ids, sellers,
+    dates, winning bids). Ids are assigned in generation order, which matches
+    the identity values because the tables are truncated with RESTART IDENTITY.
+    """
+
+    def __init__(self, scale, seed, as_of):
+        self.rng = random.Random(seed)
+        self.as_of = as_of
+        self.n_users = max(50, int(PER_SCALE["users"] * scale))
+        self.n_categories = max(len(ROOT_CATEGORIES), int(PER_SCALE["categories"] * scale))
+        self.n_listings = max(20, int(PER_SCALE["listings"] * scale))
+        self.buyers = []      # user_ids allowed to bid (buyer/both)
+        self.sellers = []     # user_ids allowed to list (seller/both)
+        self.leaf_categories = []
+        self.listings = []    # [seller_id, start, end, status, start_price, auction_type, category_id]
+        self.sold = []        # (listing_id, seller_id, end, bid_id, buyer_id, amount)
+
+    def users(self):
+        rng = self.rng
+        for user_id in range(1, self.n_users + 1):
+            user_type = rng.choices(("buyer", "seller", "both"), weights=(60, 10, 30))[0]
+            if user_type != "seller":
+                self.buyers.append(user_id)
+            if user_type != "buyer":
+                self.sellers.append(user_id)
+            status = rng.choices(("active", "suspended", "closed"), weights=(96, 2, 2))[0]
+            created = self.as_of - timedelta(days=rng.uniform(30, 3650))
+            yield (f"user{user_id:07d}", f"user{user_id:07d}@example.com", user_type, status, 0,
+                   ts(created), rng.choice(PAYMENT_METHODS), f"{rng.randint(1, 9999)} Main St",
+                   f"{rng.randint(200, 999)}-{rng.randint(200, 999)}-{rng.randint(1000, 9999)}")
+        # shuffle once so the power sellers/bidders are not simply the lowest ids
+        rng.shuffle(self.buyers)
+        rng.shuffle(self.sellers)
+
+    def categories(self):
+        rng = self.rng
+        nodes = []  # (category_id, depth, path)
+        has_children = set()
+        for category_id in range(1, self.n_categories + 1):
+            if category_id <= len(ROOT_CATEGORIES):
+                name, parent, depth = ROOT_CATEGORIES[category_id - 1], None, 1
+                path = name
+            else:
+                # prefer recent nodes as parents so the tree grows deep, not just wide
+                parent, depth, parent_path = nodes[int(len(nodes) * (1 - rng.random() ** 2))]
+                while depth >= MAX_CATEGORY_DEPTH:
+                    parent, depth, parent_path = nodes[rng.randrange(len(ROOT_CATEGORIES))]
+                name = f"{rng.choice(CATEGORY_WORDS)} {category_id}"
+                depth += 1
+                path = f"{parent_path}/{name}"
+                has_children.add(parent)
+            nodes.append((category_id, depth, path))
+            yield name, parent, path, '{"condition":"text"}'
+        self.leaf_categories = [c for c, _, _ in nodes if c not in has_children]
+
+    def listing_rows(self):
+        rng = self.rng
+        seller_weights = zipf_cum_weights(len(self.sellers), 1.1)
+        category_weights = zipf_cum_weights(len(self.leaf_categories), 0.8)
+        for _ in range(self.n_listings):
+            seller_id = rng.choices(self.sellers, cum_weights=seller_weights)[0]
+            category_id = rng.choices(self.leaf_categories, cum_weights=category_weights)[0]
+            auction_type = rng.choices(("auction", "fixed", "mixed"), weights=(75, 15, 10))[0]
+            start_price = round(rng.lognormvariate(3.5, 1.2) + 1, 2)
+            phase = rng.random()
+            if phase < 0.3:     # running now
+                start = self.as_of - timedelta(days=rng.uniform(0, 7))
+                end = self.as_of + timedelta(days=rng.uniform(0.05, 10))
+                status = "active"
+            else:               # finished
+                start = self.as_of - timedelta(days=rng.uniform(8, 365))
+                end = min(start + timedelta(days=rng.choice((1, 3, 5, 7, 10))), self.as_of)
+                status = "cancelled" if phase > 0.97 else "ended"   # 'ended' may become 'sold' below
+            self.listings.append([seller_id, start, end, status, start_price, auction_type, category_id])
+        # bids are decided before the listing rows are written so 'sold' is known up front
+        self._plan_bids()
+        for seller_id, start, end, status, start_price, auction_type, category_id in self.listings:
+            reserve = round(start_price * rng.uniform(1.1, 1.5), 2) if rng.random() < 0.2 else None
+            buy_now = round(start_price * rng.uniform(1.5, 3), 2) if auction_type != "auction" else None
+            yield (seller_id, category_id, f"{rng.choice(TITLE_WORDS)} item {rng.randint(1, 10**6)}",
+                   "Generated by datagen.py", auction_type, start_price, reserve, buy_now,
+                   ts(start), ts(end), status, rng.choice(CONDITIONS), 1, int(rng.paretovariate(1.1) * 5))
+
+    def time_span(self):
+        """Earliest and latest bid_time / transaction_date the data can have; needs listing_rows() first."""
+        return (min(row[1] for row in self.listings),
+                max(row[2] for row in self.listings) + timedelta(hours=MAX_SALE_DELAY_HOURS))
+
+    def _plan_bids(self):
+        """Draw a heavy-tailed bid count per listing; listings that end with bids become sold."""
+        rng = self.rng
+        self.bid_counts = []
+        for row in self.listings:
+            status, auction_type = row[3], row[5]
+            n = 0
+            if auction_type != "fixed" and status != "cancelled":
+                n = min(int(rng.paretovariate(1.2)) - 1, MAX_BIDS_PER_LISTING)
+            self.bid_counts.append(n)
+            if n and status == "ended":
+                row[3] = "sold"
+
+    def bids(self):
+        rng = self.rng
+        bidder_weights = zipf_cum_weights(len(self.buyers), 0.9)
+        bid_id = 0
+        for listing_id, (row, n) in enumerate(zip(self.listings, self.bid_counts), start=1):
+            if not n:
+                continue
+            seller_id, start, end, status, start_price = row[:5]
+            last_time = min(end, self.as_of)
+            span = (last_time - start).total_seconds()
+            offsets = sorted(rng.random() * span for _ in range(n))
+            amount = start_price + round(rng.uniform(0, start_price * 0.1), 2)
+            previous = None
+            for i, offset in enumerate(offsets):
+                bidder = rng.choices(self.buyers, cum_weights=bidder_weights)[0]
+                while bidder == seller_id or bidder == previous:
+                    bidder = rng.choice(self.buyers)
+                if i:
+                    amount = round(amount + max(1.0, start_price * rng.uniform(0.02, 0.1)), 2)
+                bid_id += 1
+                last = i == n - 1
+                yield (listing_id, bidder, f"{amount:.2f}", ts(start + timedelta(seconds=offset)),
+                       "winning" if last else "outbid", rng.random() < 0.15)
+                previous = bidder
+            if status == "sold":
+                self.sold.append((listing_id, seller_id, end, bid_id, previous, f"{amount:.2f}"))
+
+    def watches(self):
+        rng = self.rng
+        watcher_weights = zipf_cum_weights(len(self.buyers), 0.7)
+        for listing_id, (row, n) in enumerate(zip(self.listings, self.bid_counts), start=1):
+            want = min(len(self.buyers) - 1, int(n * rng.uniform(0.5, 2.0)) + int(rng.expovariate(1.0)))
+            seen = {row[0]}
+            while len(seen) - 1 < want:
+                user_id = rng.choices(self.buyers, cum_weights=watcher_weights)[0]
+                if user_id in seen:
+                    user_id = rng.choice(self.buyers)
+                if user_id not in seen:
+                    seen.add(user_id)
+                    yield user_id, listing_id
+
+    def transactions(self):
+        rng = self.rng
+        for listing_id, seller_id, end, bid_id, buyer_id, amount in self.sold:
+            paid = rng.random() < 0.9
+            payment = "paid" if paid else rng.choice(("pending", "refunded"))
+            shipping = rng.choices(("pending", "shipped", "delivered", "returned"), weights=(10, 20, 65, 5))[0] \
+                if paid else "pending"
+            sold_at = min(end + timedelta(hours=rng.uniform(0.1, MAX_SALE_DELAY_HOURS)), self.as_of)
+            yield (bid_id, listing_id, buyer_id, seller_id, amount, payment, shipping, f"GEN{bid_id:09d}", ts(sold_at))
+
+    def feedback(self):
+        rng = self.rng
+        for transaction_id, (_, seller_id, end, _, buyer_id, _) in enumerate(self.sold, start=1):
+            from_buyer = rng.random() < 0.7
+            from_seller = rng.random() < 0.5
+            for author, target, wanted in ((buyer_id, seller_id, from_buyer), (seller_id, buyer_id, from_seller)):
+                if not wanted:
+                    continue
+                rating = rng.choices((5, 4, 3, 2, 1), weights=(70, 18, 6, 3, 3))[0]
+                kind = "positive" if rating >= 4 else "neutral" if rating == 3 else "negative"
+                yield (transaction_id, author, target, rating, kind, None, from_buyer and from_seller,
+                       ts(min(end + timedelta(days=rng.uniform(1, 14)), self.as_of)))
+
+
+GIN_CLEANUP_SQL = """
+    SELECT gin_clean_pending_list(i.indexrelid)
+    FROM pg_index i
+    JOIN pg_class c ON c.oid = i.indexrelid
+    JOIN pg_am a ON a.oid = c.relam
+    WHERE a.amname = 'gin' AND i.indrelid::REGCLASS::TEXT = ANY(%s)
+"""
+
+LOADS = (
+    ("user_account", "username, email, user_type, account_status, rating, created_date, payment_methods, address, phone", "users"),
+    ("category", "name, parent_id, path, item_specifics", "categories"),
+    ("listing", "seller_id, category_id, title, description, auction_type, start_price, reserve_price, "
+                "buy_now_price, start_date, end_date, status, condition, quantity, view_count", "listing_rows"),
+    ("bid", "listing_id, user_id, bid_amount, bid_time, bid_status, is_proxy", "bids"),
+    ("user_listing_watch", "user_id, listing_id", "watches"),
+    ("transaction", "bid_id, listing_id, buyer_id, seller_id, final_price, payment_status, shipping_status, "
+                    "tracking_number, transaction_date", "transactions"),
+    ("feedback", "transaction_id, author_user_id, target_user_id, rating, feedback_type, comment, "
+                 "is_reciprocated, feedback_date", "feedback"),
+)
+
+
+# months archived by partitions.py; dropped on --replace so their months can be loaded and archived again
+ARCHIVED_PARTITIONS_SQL = """
+    SELECT i.inhrelid::REGCLASS::TEXT
+    FROM pg_inherits i
+    WHERE i.inhparent IN ('archive.bid'::REGCLASS, 'archive.transaction'::REGCLASS)
+"""
+
+
+def _enabled_user_triggers(cur, tables):
+    cur.execute(
+        """
+        SELECT c.relname, t.tgname
+        FROM pg_trigger t JOIN pg_class c ON c.oid = t.tgrelid
+        WHERE NOT t.tgisinternal AND t.tgenabled <> 'D' AND c.relname = ANY(%s)
+        ORDER BY 1, 2
+        """,
+        (list(tables),),
+    )
+    return cur.fetchall()
+
+
+def generate(conn, scale, seed, as_of, replace=False, log=print):
+    """Load a generated data set; returns {table: rows} plus timings."""
+    gen = Generator(scale, seed, as_of)
+    result = {"scale": scale, "seed": seed, "as_of": as_of.isoformat(), "rows": {}, "seconds": {}}
+    started = time.monotonic()
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT EXISTS (SELECT 1 FROM user_account)")
+            if cur.fetchone()[0] and not replace:
+                raise SystemExit("ebay_db already has data; pass --replace to overwrite it")
+            cur.execute(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY")
+            cur.execute(ARCHIVED_PARTITIONS_SQL)
+            for (partition,) in cur.fetchall():
+                cur.execute(f"DROP TABLE {partition}")
+            triggers = _enabled_user_triggers(cur, [t for t, _, _ in LOADS])
+            for table, trigger in triggers:
+                cur.execute(f'ALTER TABLE {table} DISABLE TRIGGER "{trigger}"')
+
+            for table, columns, method in LOADS:
+                if table == "bid":
+                    # listing dates are known by now: create the months the bids and sales fall in
+                    first, last = gen.time_span()
+                    cur.execute(
+                        "SELECT create_time_partitions('bid', %(first)s, %(last)s)"
+                        " + create_time_partitions('transaction', %(first)s, %(last)s) + ensure_time_partitions()",
+                        {"first": first, "last": last},
+                    )
+                    result["partitions_created"] = cur.fetchone()[0]
+                t0 = time.monotonic()
+                reader = CopyReader(getattr(gen, method)())
+                cur.copy_expert(f"COPY {table} ({columns}) FROM STDIN", reader, size=1 << 16)
+                result["rows"][table] = reader.count
+                result["seconds"][table] = round(time.monotonic() - t0, 3)
+                log(f"{table:20} {reader.count:>10} rows  {result['seconds'][table]:8.2f}s")
+
+            t0 = time.monotonic()
+            cur.execute("SELECT refresh_listing_high_bids()")
+            cur.execute("SELECT refresh_listing_price_summary()")
+            cur.execute("SELECT refresh_user_feedback_aggregates()")
+            cur.execute("SELECT refresh_revenue_fact()")
+            cur.execute("SELECT refresh_transaction_tracking_numbers()")
+            cur.execute("SELECT refresh_bid_sketches()")
+            cur.execute("SELECT refresh_category_closure()")
+            result["seconds"]["refresh"] = round(time.monotonic() - t0, 3)
+            for table, trigger in triggers:
+                cur.execute(f'ALTER TABLE {table} ENABLE TRIGGER "{trigger}"')
+    conn.autocommit = True
+    t0 = time.monotonic()
+    with conn.cursor() as cur:
+        # COPY leaves the new rows in the pending lists of the GIN (search) indexes, which
+        # every search would scan; ANALYZE does not merge them, so do it here
+        cur.execute(GIN_CLEANUP_SQL, ([t for t, _, _ in LOADS],))
+        cur.execute("ANALYZE")
+    conn.autocommit = False
+    result["seconds"]["analyze"] = round(time.monotonic() - t0, 3)
+    result["seconds"]["total"] = round(time.monotonic() - started, 3)
+    return result
+
+
+VERIFY_CHECKS = {
+    "bid below start price": """
+        SELECT COUNT(*) FROM v_bid_history b JOIN listing l USING (listing_id) WHERE b.bid_amount < l.start_price
+    """,
+    "bid not 1 above previous": """
+        SELECT COUNT(*) FROM (
+            SELECT bid_amount - LAG(bid_amount) OVER (PARTITION BY listing_id ORDER BY bid_time, bid_id) AS step
+            FROM v_bid_history) s
+        WHERE s.step < 1
+    """,
+    "bid on own listing": """
+        SELECT COUNT(*) FROM v_bid_history b JOIN listing l USING (listing_id) WHERE b.user_id = l.seller_id
+    """,
+    "bid outside listing dates": """
+        SELECT COUNT(*) FROM v_bid_history b JOIN listing l USING (listing_id)
+        WHERE b.bid_time < l.start_date OR b.bid_time > l.end_date
+    """,
+    "transaction not for high bid": """
+        SELECT COUNT(*) FROM v_transaction_history t JOIN listing l USING (listing_id)
+        WHERE t.bid_id IS DISTINCT FROM (SELECT b.bid_id FROM v_bid_history b WHERE b.listing_id = l.listing_id
+                                         ORDER BY b.bid_amount DESC, b.bid_time LIMIT 1)
+    """,
+    "finished listing ending in the future": """
+        SELECT COUNT(*) FROM listing WHERE status IN ('ended', 'sold') AND end_date > NOW()
+    """,
+    "sale or feedback dated in the future": """
+        SELECT (SELECT COUNT(*) FROM v_transaction_history WHERE transaction_date > NOW())
+             + (SELECT COUNT(*) FROM feedback WHERE feedback_date > NOW())
+    """,
+    "transaction without bid": """
+        SELECT COUNT(*) FROM v_transaction_history t
+        WHERE NOT EXISTS (SELECT 1 FROM v_bid_history b WHERE b.bid_id = t.bid_id)
+    """,
+    "feedback without transaction": """
+        SELECT COUNT(*) FROM feedback f
+        WHERE NOT EXISTS (SELECT 1 FROM v_transaction_history t WHERE t.transaction_id = f.transaction_id)
+    """,
+    "duplicate tracking number": """
+        SELECT COUNT(*) - COUNT(DISTINCT tracking_number) FROM v_transaction_history
+        WHERE tracking_number IS NOT NULL
+    """,
+    "transaction_tracking_number out of date": """
+        SELECT COUNT(*) FROM (
+            (SELECT tracking_number, transaction_id FROM v_transaction_history WHERE tracking_number IS NOT NULL
+             EXCEPT ALL
+             SELECT tracking_number, transaction_id FROM transaction_tracking_number)
+            UNION ALL
+            (SELECT tracking_number, transaction_id FROM transaction_tracking_number
+             EXCEPT ALL
+             SELECT tracking_number, transaction_id FROM v_transaction_history WHERE tracking_number IS NOT NULL)
+        ) d
+    """,
+    "revenue_fact out of date": """
+        SELECT COUNT(*) FROM (
+            (SELECT l.category_id, t.payment_status, t.shipping_status, (t.transaction_date AT TIME ZONE 'UTC')::DATE,
+                    COUNT(*), SUM(t.final_price)
+             FROM v_transaction_history t JOIN listing l USING (listing_id) GROUP BY 1, 2, 3, 4
+             EXCEPT ALL
+             SELECT category_id, payment_status, shipping_status, sale_date, txn_count, revenue FROM revenue_fact)
+            UNION ALL
+            (SELECT category_id, payment_status, shipping_status, sale_date, txn_count, revenue FROM revenue_fact
+             EXCEPT ALL
+             SELECT l.category_id, t.payment_status, t.shipping_status, (t.transaction_date AT TIME ZONE 'UTC')::DATE,
+                    COUNT(*), SUM(t.final_price)
+             FROM v_transaction_history t JOIN listing l USING (listing_id) GROUP BY 1, 2, 3, 4)
+        ) d
+    """,
+    "bid sketch out of date": """
+        WITH listing_exact AS (
+            SELECT listing_id, bid_sketch_bucket(bid_amount) AS bucket, COUNT(*) AS n FROM v_bid_history GROUP BY 1, 2
+        ), category_exact AS (
+            SELECT l.category_id, e.bucket, SUM(e.n) AS n
+            FROM listing_exact e JOIN listing l USING (listing_id) GROUP BY 1, 2
+        ), total_exact AS (
+            SELECT listing_id % 16 AS stripe, bucket, SUM(n) AS n FROM listing_exact GROUP BY 1, 2
+        )
+        SELECT COUNT(*) FROM (
+            (TABLE listing_exact EXCEPT ALL SELECT listing_id, bucket, n FROM bid_sketch_listing)
+            UNION ALL
+            (SELECT listing_id, bucket, n FROM bid_sketch_listing EXCEPT ALL TABLE listing_exact)
+            UNION ALL
+            (TABLE category_exact EXCEPT ALL SELECT category_id, bucket, n FROM bid_sketch_category)
+            UNION ALL
+            (SELECT category_id, bucket, n FROM bid_sketch_category EXCEPT ALL TABLE category_exact)
+            UNION ALL
+            (TABLE total_exact EXCEPT ALL SELECT stripe, bucket, n FROM bid_sketch_total)
+            UNION ALL
+            (SELECT stripe, bucket, n FROM bid_sketch_total EXCEPT ALL TABLE total_exact)
+        ) d
+    """,
+    "category_closure out of date": """
+        WITH RECURSIVE down AS (
+            SELECT category_id AS ancestor_id, category_id AS descendant_id, 0 AS depth FROM category
+            UNION ALL
+            SELECT down.ancestor_id, c.category_id, down.depth + 1
+            FROM down JOIN category c ON c.parent_id = down.descendant_id
+        )
+        SELECT COUNT(*) FROM (
+            (TABLE down EXCEPT ALL SELECT ancestor_id, descendant_id, depth FROM category_closure)
+            UNION ALL
+            (SELECT ancestor_id, descendant_id, depth FROM category_closure EXCEPT ALL TABLE down)
+        ) d
+    """,
+    "high_bid out of date": """
+        SELECT COUNT(*) FROM listing l
+        WHERE l.high_bid IS DISTINCT FROM (SELECT MAX(bid_amount) FROM v_bid_history b WHERE b.listing_id = l.listing_id)
+    """,
+}
+
+
+def verify(conn):
+    """Count violations of the bid rules and derived columns; all zeros means the data is valid."""
+    out = {}
+    with conn.cursor() as cur:
+        for name, sql in VERIFY_CHECKS.items():
+            cur.execute(sql)
+            out[name] = cur.fetchone()[0]
+    conn.rollback()
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--as-of", help="reference time (ISO date/time, UTC) listing dates are laid out around; "
+                                        "default: today at 00:00 UTC")
+    parser.add_argument("--replace", action="store_true", help="overwrite existing data")
+    parser.add_argument("--verify", action="store_true", help="check bid ladders and derived columns after loading")
+    parser.add_argument("--output", help="also write the JSON summary to this file")
+    args = parser.parse_args(argv)
+
+    if args.as_of:
+        as_of = datetime.fromisoformat(args.as_of)
+        as_of = as_of if as_of.tzinfo else as_of.replace(tzinfo=timezone.utc)
+    else:
+        as_of = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    conn = get_conn()
+    try:
+        result = generate(conn, args.scale, args.seed, as_of, replace=args.replace,
+                          log=lambda line: print(line, file=sys.stderr))
+        if args.verify:
+            result["violations"] = verify(conn)
+    finally:
+        conn.close()
+
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(text + "\n")
+    return 1 if any(result.get("violations", {}).values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,401 @@
+"""
+Connection handling for the `ebay_db` PostgreSQL database.
+
+- conn_params() / get_conn(): connection settings from the standard PG* env
+  vars, and one psycopg2 connection built from them.
+- ConnectionPool: a thread-safe pool on top of get_conn() with health checks
+  on checkout, automatic reconnect after a server restart, a retry-once
+  run() for jobs that are safe to repeat, and usage stats.
+- ChangeListener: non-blocking LISTEN/NOTIFY consumer for cache invalidation.
+- CopyReader: file-like rows for cursor.copy_expert("COPY ... FROM STDIN"),
+  rendered as COPY reads them so nothing is built up in memory.
+
+Pool settings (env vars, alongside PGHOST/PGPORT/...):
+  PGPOOL_MIN          connections opened up front (default 1)
+  PGPOOL_MAX          hard cap on open connections (default 8)
+  PGPOOL_TIMEOUT      seconds to wait for a free connection (default 30)
+  PGPOOL_CHECK_IDLE   ping connections idle longer than this many seconds
+                      before handing them out (default 5, 0 = always)
+"""
+
+import io
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import psycopg2
+    import psycopg2.extensions
+except ImportError:
+    sys.stderr.write(
+        "psycopg2-binary is required. Install with: pip install psycopg2-binary\n"
+    )
+    sys.exit(1)
+
+
+def conn_params():
+    """
+    Connection keyword arguments from env vars. If no PGHOST is provided,
+    connect via UNIX socket (peer auth) instead of TCP localhost to avoid
+    password prompts on default local installs.
+    """
+    host = os.getenv("PGHOST", "")
+    return dict(
+        host=host if host else None,  # None -> use UNIX socket default
+        port=int(os.getenv("PGPORT", "5432")),
+        user=os.getenv("PGUSER", os.getenv("USER")),
+        password=os.getenv("PGPASSWORD"),
+        dbname=os.getenv("PGDATABASE", "ebay_db"),
+    )
+
+
+def get_conn():
+    """Build a psycopg2 connection from conn_params()."""
+    return psycopg2.connect(**conn_params())
+
+
+class CopyReader(io.TextIOBase):
+    """File-like object that renders rows for COPY ... FROM STDIN on demand."""
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buf = ""
+        self.count = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        parts = [self._buf]
+        have = len(self._buf)
+        while size < 0 or have < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            line = "\t".join(r"\N" if v is None else str(v) for v in row) + "\n"
+            parts.append(line)
+            have += len(line)
+            self.count += 1
+        data = "".join(parts)
+        if size < 0:
+            self._buf = ""
+            return data
+        self._buf = data[size:]
+        return data[:size]
+
+
+POOL_MIN = int(os.getenv("PGPOOL_MIN", "1"))
+POOL_MAX = int(os.getenv("PGPOOL_MAX", "8"))
+POOL_TIMEOUT = float(os.getenv("PGPOOL_TIMEOUT", "30"))
+POOL_CHECK_IDLE = float(os.getenv("PGPOOL_CHECK_IDLE", "5"))
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection frees up within the pool timeout."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections created with `connect`
+    (get_conn by default). Use `with pool.connection() as conn:` or the
+    getconn()/putconn() pair.
+
+    On checkout a connection that is closed, or that has been idle longer than
+    `check_idle` seconds and fails a `SELECT 1`, is replaced with a fresh one,
+    so the pool recovers by itself after the server restarts. A connection
+    that died less than `check_idle` seconds ago passes that check unseen;
+    run(fn, retry=True) covers it by running fn once more on a fresh
+    connection. Connections are returned with any open transaction rolled
+    back; broken ones are dropped.
+    """
+
+    def __init__(self, minconn=POOL_MIN, maxconn=POOL_MAX, timeout=POOL_TIMEOUT,
+                 check_idle=POOL_CHECK_IDLE, connect=get_conn):
+        if maxconn < 1 or not 0 <= minconn <= maxconn:
+            raise ValueError("pool needs 0 <= minconn <= maxconn and maxconn >= 1")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.check_idle = check_idle
+        self.connect = connect
+        self._cond = threading.Condition()
+        self._idle = []       # [(conn, returned_at)], most recently returned last
+        self._in_use = set()
+        self._size = 0        # idle + in use + being opened
+        self._closed = False
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "wait_total": 0.0,
+            "wait_max": 0.0,
+            "checkout_total": 0.0,
+            "checkout_max": 0.0,
+            "connects": 0,
+            "reconnects": 0,
+            "failed_checks": 0,
+            "retries": 0,
+        }
+        for _ in range(minconn):
+            conn = self._open()
+            with self._cond:
+                self._size += 1
+                self._idle.append((conn, time.monotonic()))
+
+    def _open(self):
+        conn = self.connect()
+        with self._cond:
+            self._stats["connects"] += 1
+        return conn
+
+    def _healthy(self, conn, idle_for):
+        if conn.closed:
+            return False
+        if idle_for < self.check_idle:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        """
+        Check a connection out, waiting up to `timeout` seconds for one to be
+        returned when the pool is at maxconn.
+        """
+        started = time.monotonic()
+        deadline = started + self.timeout
+        conn = None
+        waited = False
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("pool is closed")
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    self._size += 1  # reserve a slot, open outside the lock
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(f"no connection available after {self.timeout:.1f}s")
+                waited = True
+                self._cond.wait(remaining)
+        wait = time.monotonic() - started
+
+        try:
+            if conn is None:
+                conn = self._open()
+            elif not self._healthy(conn, started - returned_at):
+                with self._cond:
+                    self._stats["failed_checks"] += 1
+                    self._stats["reconnects"] += 1
+                self._discard(conn)
+                conn = self._open()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        checkout = time.monotonic() - started
+        with self._cond:
+            self._in_use.add(conn)
+            s = self._stats
+            s["checkouts"] += 1
+            s["waits"] += waited
+            s["wait_total"] += wait
+            s["wait_max"] = max(s["wait_max"], wait)
+            s["checkout_total"] += checkout
+            s["checkout_max"] = max(s["checkout_max"], checkout)
+        return conn
+
+    def putconn(self, conn, discard=False):
+        """Return a connection; it is closed instead if broken or discard=True."""
+        if not conn.closed and not discard:
+            try:
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        with self._cond:
+            self._in_use.discard(conn)
+            if conn.closed or discard or self._closed:
+                self._size -= 1
+                drop = True
+            else:
+                self._idle.append((conn, time.monotonic()))
+                drop = False
+            self._cond.notify()
+        if drop:
+            self._discard(conn)
+
+    @staticmethod
+    def _discard(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def run(self, fn, retry=False):
+        """
+        Return fn(conn) run on a checked-out connection. With retry=True, if
+        fn fails with an OperationalError that left the connection closed
+        (the server went away), the idle connections are flagged for a
+        health check and fn runs once more on another connection. Only pass
+        retry=True for work that is safe to repeat, such as reads.
+        """
+        for attempt in (1, 2):
+            conn = self.getconn()
+            try:
+                return fn(conn)
+            except psycopg2.OperationalError:
+                if not retry or attempt == 2 or not conn.closed:
+                    raise
+                with self._cond:
+                    self._stats["retries"] += 1
+                    # idle connections most likely died the same way
+                    self._idle = [(c, float("-inf")) for c, _ in self._idle]
+            finally:
+                self.putconn(conn)
+
+    def stats(self):
+        """Snapshot of pool usage; times are in milliseconds."""
+        with self._cond:
+            s = dict(self._stats)
+            in_use = len(self._in_use)
+            idle = len(self._idle)
+        checkouts = s["checkouts"] or 1
+        return {
+            "in_use": in_use,
+            "idle": idle,
+            "size": in_use + idle,
+            "max": self.maxconn,
+            "checkouts": s["checkouts"],
+            "waits": s["waits"],
+            "timeouts": s["timeouts"],
+            "avg_wait_ms": 1000 * s["wait_total"] / checkouts,
+            "max_wait_ms": 1000 * s["wait_max"],
+            "avg_checkout_ms": 1000 * s["checkout_total"] / checkouts,
+            "max_checkout_ms": 1000 * s["checkout_max"],
+            "connects": s["connects"],
+            "reconnects": s["reconnects"],
+            "failed_checks": s["failed_checks"],
+            "retries": s["retries"],
+        }
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._size -= len(idle)
+            self._idle = []
+            self._cond.notify_all()
+        for conn in idle:
+            self._discard(conn)
+
+
+class ChangeListener:
+    """
+    Dedicated autocommit connection that LISTENs on `channels` (kept outside
+    the pool because it is held for the life of the app). poll() never blocks
+    and is meant to be called periodically, e.g. from root.after.
+
+    poll() returns a list of (channel, payload) tuples. If the connection was
+    lost, reconnect_due() turns true every `retry_after` seconds and
+    reconnect() (which blocks, so run it off the UI thread) re-opens it; the
+    next poll() then returns one (channel, None) tuple per channel because
+    notifications may have been missed meanwhile.
+    """
+
+    def __init__(self, channels, connect=get_conn, retry_after=5.0):
+        self.channels = list(channels)
+        self.connect = connect
+        self.retry_after = retry_after
+        self.conn = None
+        self._lock = threading.Lock()
+        self._next_retry = 0.0
+        self._reconnecting = False
+        self._missed = False
+        self._closed = False
+        self.conn = self._listen()
+
+    def _listen(self):
+        conn = self.connect()
+        conn.set_session(autocommit=True)
+        with conn.cursor() as cur:
+            for channel in self.channels:
+                cur.execute(f'LISTEN "{channel}"')
+        return conn
+
+    def reconnect_due(self):
+        """True when the connection is lost and a reconnect() should start now."""
+        with self._lock:
+            if self.conn is not None or self._reconnecting or time.monotonic() < self._next_retry:
+                return False
+            self._reconnecting = True
+            return True
+
+    def reconnect(self):
+        """Re-open the connection after reconnect_due(); blocks while connecting."""
+        try:
+            conn = self._listen()
+        except psycopg2.Error:
+            with self._lock:
+                self._next_retry = time.monotonic() + self.retry_after
+                self._reconnecting = False
+            return
+        with self._lock:
+            self._reconnecting = False
+            if not self._closed:
+                self.conn, conn = conn, None
+                self._missed = True
+        if conn is not None:  # close() ran meanwhile
+            conn.close()
+
+    def poll(self):
+        with self._lock:
+            conn = self.conn
+            missed, self._missed = self._missed, False
+        notes = [(channel, None) for channel in self.channels] if missed else []
+        if conn is None:
+            return notes
+        try:
+            conn.poll()
+        except psycopg2.Error:
+            self._drop()
+            with self._lock:
+                self._next_retry = time.monotonic() + self.retry_after
+            return notes
+        notes += [(n.channel, n.payload) for n in conn.notifies]
+        conn.notifies.clear()
+        return notes
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+        self._drop()
+
+    def _drop(self):
+        with self._lock:
+            conn, self.conn = self.conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
@@ -0,0 +1,287 @@
+"""
+asyncio backend for the `ebay_db` database (optional, needs psycopg 3).
+
+AsyncService offers the ebay_service.py operations as coroutines on a pool
+of psycopg 3 connections, so independent reads run concurrently instead of
+one after another:
+
+- run_queries(keys) runs several prebuilt analytics queries at once, each on
+  its own pooled connection; the whole batch takes about as long as the
+  slowest query instead of the sum.
+- get_users(ids) / get_listings(ids) send every lookup on one connection in
+  pipeline mode (one network round trip for the batch) when libpq supports
+  it, and fall back to one statement at a time otherwise.
+- User CRUD, place_bid / place_bids and finalize_listing run the same
+  queries.py statements as ebay_service.py and return the same User /
+  Listing dataclasses.
+
+psycopg 3 prepares a statement server-side once it has run it
+prepare_threshold times on a connection, so hot statements skip parsing
+and planning here too.
+
+Setup:
+  pip install "psycopg[binary,pool]"
+
+Usage:
+  python ebay_async.py dashboard                 # all prebuilt queries, concurrent vs sequential
+  python ebay_async.py dashboard --keys agg_percentiles cte_top_watchers
+  python ebay_async.py dashboard --approx        # sketch-backed forms where a query has one
+  python ebay_async.py users 1 2 3 4 5           # pipelined lookups
+
+Connection settings come from the same PG* env vars as the app (see db.py);
+the pool holds up to PGPOOL_MAX connections.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from dataclasses import asdict
+
+try:
+    import psycopg
+    from psycopg_pool import AsyncConnectionPool
+except ImportError:
+    psycopg = None
+
+from db import POOL_MAX, POOL_TIMEOUT, conn_params
+from ebay_service import (
+    BidRejected,
+    Listing,
+    User,
+    json_default,
+)
+from queries import (
+    ENSURE_PARTITIONS_SQL,
+    FINALIZE_LISTING_SQL,
+    LISTING_SELECT_SQL,
+    PARTITION_MONTHS_AHEAD,
+    PLACE_BID_SQL,
+    PLACE_BIDS_SQL,
+    PREBUILT_QUERIES,
+    PURGE_USERS_SQL,
+    QUERY_CHUNK_ROWS,
+    QUERY_ROW_CAP,
+    USER_INSERT_SQL,
+    USER_PAGE_AFTER_SQL,
+    USER_PAGE_BEFORE_SQL,
+    USER_PAGE_SIZE,
+    USER_SELECT_SQL,
+    USER_UPDATE_SQL,
+    query_sql,
+)
+
+
+class AsyncService:
+    """
+    Pool-backed async data access. Use as `async with AsyncService() as svc:`
+    or call open()/close() explicitly.
+    """
+
+    def __init__(self, max_size=POOL_MAX, min_size=1, timeout=POOL_TIMEOUT):
+        if psycopg is None:
+            raise RuntimeError('the async backend needs psycopg 3: pip install "psycopg[binary,pool]"')
+        params = {k: v for k, v in conn_params().items() if v is not None}
+        self.pool = AsyncConnectionPool(
+            psycopg.conninfo.make_conninfo(client_encoding="utf8", **params),
+            min_size=min_size,
+            max_size=max_size,
+            timeout=timeout,
+            open=False,
+        )
+        self.pipeline = psycopg.Pipeline.is_supported()
+
+    async def open(self):
+        await self.pool.open(wait=True)
+        # a month's first bid or sale fails without its partition
+        async with self.pool.connection() as conn:
+            await conn.execute(ENSURE_PARTITIONS_SQL, (PARTITION_MONTHS_AHEAD,))
+
+    async def close(self):
+        await self.pool.close()
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _fetchone(self, sql, params):
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(sql, params)
+            return await cur.fetchone()
+
+    async def _fetch_each(self, sql, param_list):
+        """Run `sql` once per params tuple on one connection; returns the first row of each."""
+        async with self.pool.connection() as conn:
+            if not self.pipeline:
+                return [await (await conn.execute(sql, p)).fetchone() for p in param_list]
+            async with conn.pipeline():
+                cursors = [await conn.execute(sql, p) for p in param_list]
+            return [await cur.fetchone() for cur in cursors]
+
+    # -- users ---------------------------------------------------------------
+
+    async def list_users(self, anchor_id=0, forward=True, limit=USER_PAGE_SIZE):
+        sql = USER_PAGE_AFTER_SQL if forward else USER_PAGE_BEFORE_SQL
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(sql, (anchor_id, limit))
+            rows = [User(*r) for r in await cur.fetchall()]
+        return rows if forward else rows[::-1]
+
+    async def get_user(self, user_id):
+        row = await self._fetchone(USER_SELECT_SQL, (user_id,))
+        return User(*row) if row else None
+
+    async def get_users(self, user_ids):
+        """Look up many users in one pipelined batch; missing ids give None."""
+        rows = await self._fetch_each(USER_SELECT_SQL, [(uid,) for uid in user_ids])
+        return [User(*r) if r else None for r in rows]
+
+    async def create_user(self, user):
+        row = await self._fetchone(
+            USER_INSERT_SQL, (user.username, user.email, user.user_type, user.account_status, user.rating)
+        )
+        return row[0]
+
+    async def update_user(self, user):
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(
+                USER_UPDATE_SQL,
+                (user.username, user.email, user.user_type, user.account_status, user.rating, user.user_id),
+            )
+            return cur.rowcount == 1
+
+    async def purge_users(self, user_ids):
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(PURGE_USERS_SQL, (list(user_ids),))
+            return await cur.fetchall()
+
+    # -- listings and bids ---------------------------------------------------
+
+    async def get_listing(self, listing_id):
+        row = await self._fetchone(LISTING_SELECT_SQL, (listing_id,))
+        return Listing(*row) if row else None
+
+    async def get_listings(self, listing_ids):
+        rows = await self._fetch_each(LISTING_SELECT_SQL, [(lid,) for lid in listing_ids])
+        return [Listing(*r) if r else None for r in rows]
+
+    async def place_bid(self, user_id, listing_id, amount, is_proxy=False):
+        try:
+            async with self.pool.connection() as conn:
+                await conn.execute(PLACE_BID_SQL, (user_id, listing_id, amount, is_proxy))
+        except psycopg.errors.RaiseException as exc:
+            raise BidRejected(exc.diag.message_primary or str(exc).strip()) from exc
+
+    async def place_bids(self, bids):
+        users, listings, amounts, proxies = (list(col) for col in zip(*bids)) if bids else ([], [], [], [])
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(PLACE_BIDS_SQL, (users, listings, amounts, proxies))
+            return await cur.fetchall()
+
+    async def finalize_listing(self, listing_id):
+        row = await self._fetchone(FINALIZE_LISTING_SQL, (listing_id,))
+        return row[0]
+
+    # -- analytics -----------------------------------------------------------
+
+    async def run_query(self, key, row_cap=QUERY_ROW_CAP, approx=False):
+        """Same contract as ebay_service.run_query: (column names, rows, truncated)."""
+        rows = []
+        async with self.pool.connection() as conn:
+            async with conn.transaction():
+                async with conn.cursor(name="run_query") as cur:
+                    await cur.execute(query_sql(key, approx))
+                    while len(rows) < row_cap:
+                        chunk = await cur.fetchmany(min(QUERY_CHUNK_ROWS, row_cap - len(rows)))
+                        rows.extend(chunk)
+                        if not chunk:
+                            break
+                    cols = [d.name for d in cur.description]
+                    truncated = len(rows) >= row_cap and bool(await cur.fetchmany(1))
+        return cols, rows, truncated
+
+    async def run_queries(self, keys=None, row_cap=QUERY_ROW_CAP, approx=False):
+        """
+        Run prebuilt queries concurrently, one pooled connection each.
+        Returns {key: (cols, rows, truncated, seconds)}; a failed query maps
+        to its exception instead.
+        """
+        keys = list(keys or PREBUILT_QUERIES)
+
+        async def timed(key):
+            started = time.monotonic()
+            cols, rows, truncated = await self.run_query(key, row_cap, approx)
+            return cols, rows, truncated, time.monotonic() - started
+
+        results = await asyncio.gather(*(timed(k) for k in keys), return_exceptions=True)
+        return dict(zip(keys, results))
+
+
+async def dashboard(keys=None, row_cap=QUERY_ROW_CAP, max_size=POOL_MAX, approx=False):
+    """Time the prebuilt queries run concurrently against the same queries run one after another."""
+    # open every connection up front so neither run pays for connecting
+    async with AsyncService(max_size=max_size, min_size=max_size) as svc:
+        keys = list(keys or PREBUILT_QUERIES)
+        started = time.monotonic()
+        for key in keys:
+            await svc.run_query(key, row_cap, approx)
+        sequential = time.monotonic() - started
+
+        started = time.monotonic()
+        results = await svc.run_queries(keys, row_cap, approx)
+        concurrent = time.monotonic() - started
+
+    queries = {}
+    for key, result in results.items():
+        if isinstance(result, Exception):
+            queries[key] = {"error": str(result).strip()}
+        else:
+            queries[key] = {"rows": len(result[1]), "truncated": result[2], "seconds": round(result[3], 4)}
+    timings = [q["seconds"] for q in queries.values() if "seconds" in q]
+    return {
+        "pool_size": max_size,
+        "approx": approx,
+        "sequential_s": round(sequential, 4),
+        "concurrent_s": round(concurrent, 4),
+        "slowest_query_s": max(timings) if timings else None,
+        "queries": queries,
+    }
+
+
+async def _lookup_users(user_ids):
+    async with AsyncService() as svc:
+        users = await svc.get_users(user_ids)
+        return {"pipeline": svc.pipeline, "users": [asdict(u) if u else None for u in users]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("dashboard", help="run prebuilt queries concurrently and sequentially")
+    p.add_argument("--keys", nargs="+", choices=sorted(PREBUILT_QUERIES), help="default: all")
+    p.add_argument("--row-cap", type=int, default=QUERY_ROW_CAP)
+    p.add_argument("--pool-size", type=int, default=POOL_MAX)
+    p.add_argument("--approx", action="store_true", help="use approximate forms where available")
+
+    p = sub.add_parser("users", help="look up users in one pipelined batch")
+    p.add_argument("user_ids", type=int, nargs="+")
+
+    args = parser.parse_args(argv)
+    if psycopg is None:
+        sys.stderr.write('psycopg 3 is required. Install with: pip install "psycopg[binary,pool]"\n')
+        return 1
+    if args.command == "dashboard":
+        result = asyncio.run(dashboard(args.keys, args.row_cap, args.pool_size, args.approx))
+    elif args.command == "users":
+        result = asyncio.run(_lookup_users(args.user_ids))
+    print(json.dumps(result, indent=2, default=json_default))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
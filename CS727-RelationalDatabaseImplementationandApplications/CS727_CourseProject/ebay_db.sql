@@ -6,7 +6,8 @@ SET client_min_messages TO warning;
 BEGIN;
 
 -- Clean slate for repeatable runs
-DROP TABLE IF EXISTS feedback, transaction, bid, user_listing_watch, listing, category, user_account CASCADE;
+DROP TABLE IF EXISTS category_closure, bid_sketch_listing, bid_sketch_category, bid_sketch_total, revenue_fact, listing_price_summary, feedback, transaction_tracking_number, transaction, bid, user_listing_watch, listing, category, user_account CASCADE;
+DROP SCHEMA IF EXISTS archive CASCADE;
 
 --  Core tables 
 CREATE TABLE user_account (
@@ -19,7 +20,11 @@ CREATE TABLE user_account (
     created_date    TIMESTAMPTZ NOT NULL DEFAULT NOW(),
     payment_methods JSONB,
     address         TEXT,
-    phone           TEXT
+    phone           TEXT,
+    -- Running feedback aggregates kept by the feedback rating triggers
+    feedback_count    INT NOT NULL DEFAULT 0,
+    feedback_sum      INT NOT NULL DEFAULT 0,
+    feedback_positive INT NOT NULL DEFAULT 0
 );
 
 CREATE TABLE category (
@@ -45,7 +50,15 @@ CREATE TABLE listing (
     status        TEXT NOT NULL CHECK (status IN ('active','ended','cancelled','sold')),
     condition     TEXT,
     quantity      INT NOT NULL DEFAULT 1,
-    view_count    INT NOT NULL DEFAULT 0
+    view_count    INT NOT NULL DEFAULT 0,
+    -- Current high bid, kept by fn_enforce_bid_rules under the listing row lock
+    high_bid       NUMERIC(12,2),
+    high_bidder_id INT REFERENCES user_account(user_id),
+    -- Words of title (weight A) and description (weight B) for search_listings
+    search_vector  TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', title), 'A') ||
+        setweight(to_tsvector('english', COALESCE(description, '')), 'B')
+    ) STORED
 );
 
 CREATE TABLE user_listing_watch (
@@ -54,32 +67,83 @@ CREATE TABLE user_listing_watch (
     PRIMARY KEY (user_id, listing_id)
 );
 
+-- bid and transaction only ever grow, so both are range-partitioned by month on their
+-- timestamp (see create_time_partitions): date-bounded queries scan only the months they
+-- cover, and old months can be detached and archived whole (partitions.py)
+-- A unique key on a partitioned table must include the partition key, hence the composite
+-- primary keys; bid_id and transaction_id still come from one identity sequence each
+-- Moving a bid to another month by updating bid_time runs as delete + insert, which
+-- tg_enforce_bid_rules re-validates like a new bid
 CREATE TABLE bid (
-    bid_id     INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    bid_id     INT GENERATED ALWAYS AS IDENTITY,
     listing_id INT NOT NULL REFERENCES listing(listing_id),
     user_id    INT NOT NULL REFERENCES user_account(user_id),
     bid_amount NUMERIC(12,2) NOT NULL CHECK (bid_amount > 0),
     bid_time   TIMESTAMPTZ NOT NULL DEFAULT NOW(),
     bid_status TEXT NOT NULL DEFAULT 'active' CHECK (bid_status IN ('active','retracted','winning','outbid')),
-    is_proxy   BOOLEAN NOT NULL DEFAULT FALSE
-);
+    is_proxy   BOOLEAN NOT NULL DEFAULT FALSE,
+    PRIMARY KEY (bid_id, bid_time)
+) PARTITION BY RANGE (bid_time);
 
+-- bid_id references bid and is unique, enforced by the tg_ref_* triggers: neither can be
+-- declared against the partitioned bid table on bid_id alone. tracking_number is unique
+-- through transaction_tracking_number (below)
 CREATE TABLE transaction (
-    transaction_id  INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
-    bid_id          INT NOT NULL UNIQUE REFERENCES bid(bid_id),
+    transaction_id  INT GENERATED ALWAYS AS IDENTITY,
+    bid_id          INT NOT NULL,
     listing_id      INT NOT NULL REFERENCES listing(listing_id),
     buyer_id        INT NOT NULL REFERENCES user_account(user_id),
     seller_id       INT NOT NULL REFERENCES user_account(user_id),
     final_price     NUMERIC(12,2) NOT NULL,
     payment_status  TEXT NOT NULL CHECK (payment_status IN ('pending','paid','refunded')),
     shipping_status TEXT NOT NULL CHECK (shipping_status IN ('pending','shipped','delivered','returned')),
-    tracking_number TEXT UNIQUE,
-    transaction_date TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    tracking_number TEXT,
+    transaction_date TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (transaction_id, transaction_date)
+) PARTITION BY RANGE (transaction_date);
+
+-- One row per tracking number in transaction, archived months included: a UNIQUE constraint on
+-- the partitioned table would have to include transaction_date. Kept by the tg_ref_transaction_*
+-- triggers, so a duplicate fails on transaction_tracking_number_key, the name the UNIQUE
+-- constraint had; refresh_transaction_tracking_numbers() rebuilds it
+CREATE TABLE transaction_tracking_number (
+    tracking_number TEXT NOT NULL,
+    transaction_id  INT NOT NULL,
+    CONSTRAINT transaction_tracking_number_key PRIMARY KEY (tracking_number)
 );
 
+-- Months archived by partitions.py are detached from bid / transaction and attached here, so
+-- the ids that transaction.bid_id and feedback.transaction_id hold still resolve
+-- Same columns, no keys; a column added to bid or transaction must be added here too
+-- Archived rows are only ever deleted, by purge_users(); their DELETE triggers (see "Triggers on
+-- archive.bid / archive.transaction") keep the summaries in step when that happens
+CREATE SCHEMA archive;
+CREATE TABLE archive.bid (LIKE bid) PARTITION BY RANGE (bid_time);
+CREATE TABLE archive.transaction (LIKE transaction) PARTITION BY RANGE (transaction_date);
+-- Same definitions as idx_bid_listing_amount / idx_bid_user / idx_transaction_*, so an archived
+-- month's own indexes are adopted when it is attached; purge_users() and the tg_ref_* checks
+-- look archived rows up through them
+CREATE INDEX idx_archive_bid_listing_amount ON archive.bid (listing_id, bid_amount DESC);
+CREATE INDEX idx_archive_bid_user ON archive.bid (user_id);
+CREATE INDEX idx_archive_transaction_listing ON archive.transaction (listing_id);
+CREATE INDEX idx_archive_transaction_buyer ON archive.transaction (buyer_id);
+CREATE INDEX idx_archive_transaction_seller ON archive.transaction (seller_id);
+CREATE INDEX idx_archive_transaction_bid ON archive.transaction (bid_id);
+
+-- View: v_bid_history / v_transaction_history
+-- Purpose: Every bid / transaction, live and archived: what the trigger-maintained summaries
+-- (high_bid, listing_price_summary, revenue_fact, the bid sketches) count, and what their
+-- refresh_*() functions rebuild from
+CREATE OR REPLACE VIEW v_bid_history AS
+SELECT * FROM bid UNION ALL SELECT * FROM archive.bid;
+
+CREATE OR REPLACE VIEW v_transaction_history AS
+SELECT * FROM transaction UNION ALL SELECT * FROM archive.transaction;
+
+-- transaction_id references transaction, enforced by the tg_ref_* triggers
 CREATE TABLE feedback (
     feedback_id     INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
-    transaction_id  INT NOT NULL REFERENCES transaction(transaction_id),
+    transaction_id  INT NOT NULL,
     author_user_id  INT NOT NULL REFERENCES user_account(user_id),
     target_user_id  INT NOT NULL REFERENCES user_account(user_id),
     rating          INT NOT NULL CHECK (rating BETWEEN 1 AND 5),
@@ -90,6 +154,80 @@ CREATE TABLE feedback (
     UNIQUE (transaction_id, author_user_id)
 );
 
+--  Summary tables (maintained by triggers) 
+
+-- Table: listing_price_summary
+-- Purpose: Per-listing bid and watcher counts behind v_listing_current_price
+-- (the current price itself is listing.high_bid)
+-- Maintained incrementally by the tg_summary_* triggers on listing, bid and user_listing_watch;
+-- refresh_listing_price_summary() rebuilds it from scratch
+CREATE TABLE listing_price_summary (
+    listing_id    INT PRIMARY KEY REFERENCES listing(listing_id) ON DELETE CASCADE,
+    bid_count     INT NOT NULL DEFAULT 0,
+    watcher_count INT NOT NULL DEFAULT 0
+);
+
+-- Table: revenue_fact
+-- Purpose: Transaction count and revenue per category x payment_status x shipping_status x day,
+-- the fact table behind the revenue ROLLUP/CUBE queries (a few rows per category and day
+-- instead of one per transaction)
+-- sale_date is the UTC day of transaction_date, so it does not depend on the session time zone
+-- Maintained incrementally by the tg_revenue_fact_* triggers on transaction and listing;
+-- refresh_revenue_fact() rebuilds it from scratch
+CREATE TABLE revenue_fact (
+    category_id     INT NOT NULL REFERENCES category(category_id) ON DELETE CASCADE,
+    payment_status  TEXT NOT NULL,
+    shipping_status TEXT NOT NULL,
+    sale_date       DATE NOT NULL,
+    txn_count       BIGINT NOT NULL,
+    revenue         NUMERIC(14,2) NOT NULL,
+    PRIMARY KEY (category_id, payment_status, shipping_status, sale_date)
+);
+
+-- Tables: bid_sketch_listing, bid_sketch_category, bid_sketch_total
+-- Purpose: Mergeable quantile sketches of bid_amount (DDSketch-style log buckets) per listing,
+-- per category and overall, behind the approximate mode of the bid percentile queries
+-- Bucket k counts the bids in (gamma^(k-1), gamma^k] with gamma = 1.01 / 0.99, so any bucket's
+-- representative value (bid_sketch_value) is within 1% of every bid it holds; merging sketches
+-- is a SUM(n) per bucket, and a whole sketch is a few hundred rows however many bids there are
+-- Maintained incrementally by the tg_bid_sketch_* triggers on bid and listing;
+-- refresh_bid_sketches() rebuilds them from scratch
+CREATE TABLE bid_sketch_listing (
+    listing_id INT NOT NULL REFERENCES listing(listing_id) ON DELETE CASCADE,
+    bucket     INT NOT NULL,
+    n          BIGINT NOT NULL,
+    PRIMARY KEY (listing_id, bucket)
+);
+
+CREATE TABLE bid_sketch_category (
+    category_id INT NOT NULL REFERENCES category(category_id) ON DELETE CASCADE,
+    bucket      INT NOT NULL,
+    n           BIGINT NOT NULL,
+    PRIMARY KEY (category_id, bucket)
+);
+
+-- The overall sketch is split into 16 stripes by listing_id % 16, so concurrent bids on
+-- different listings rarely wait on the same bucket row; readers sum the stripes
+CREATE TABLE bid_sketch_total (
+    stripe SMALLINT NOT NULL,
+    bucket INT NOT NULL,
+    n      BIGINT NOT NULL,
+    PRIMARY KEY (stripe, bucket)
+);
+
+-- Table: category_closure
+-- Purpose: Every (ancestor, descendant) pair of the category tree with the number of levels
+-- between them, each category also being its own ancestor at depth 0, so "everything under
+-- category X" is one indexed join on ancestor_id = X however deep the tree is
+-- Maintained by the tg_category_closure_* triggers on category;
+-- refresh_category_closure() rebuilds it from scratch
+CREATE TABLE category_closure (
+    ancestor_id   INT NOT NULL REFERENCES category(category_id) ON DELETE CASCADE,
+    descendant_id INT NOT NULL REFERENCES category(category_id) ON DELETE CASCADE,
+    depth         INT NOT NULL CHECK (depth >= 0),
+    PRIMARY KEY (ancestor_id, descendant_id)
+);
+
 --  Indexes 
 -- Indexes are created to optimize query performance for common access patterns
 
@@ -106,13 +244,81 @@ CREATE INDEX idx_listing_category ON listing (category_id);
 -- Query pattern: SELECT * FROM bid WHERE listing_id = ? ORDER BY bid_amount DESC
 CREATE INDEX idx_bid_listing_amount ON bid (listing_id, bid_amount DESC);
 
+-- Optimizes the auction closer's scan for expired auctions (close_expired_listings)
+-- Partial index only holds active listings, so it stays small as listings close
+-- Query pattern: SELECT * FROM listing WHERE status = 'active' AND end_date <= NOW() ORDER BY end_date
+CREATE INDEX idx_listing_active_end ON listing (end_date) WHERE status = 'active';
+
 -- Optimizes user feedback lookups (e.g., "Show all feedback for user X")
 -- Query pattern: SELECT * FROM feedback WHERE target_user_id = ?
 CREATE INDEX idx_feedback_target ON feedback (target_user_id);
 
--- Optimizes user watchlist queries (e.g., "Show all listings user X is watching")
+-- User watchlist queries (e.g., "Show all listings user X is watching") use the
+-- primary key (user_id, listing_id), so no separate index on user_id is needed
 -- Query pattern: SELECT * FROM user_listing_watch WHERE user_id = ?
-CREATE INDEX idx_watch_user ON user_listing_watch (user_id);
+
+-- Foreign-key lookup indexes used by purge_users() and by the FK checks when
+-- users, listings, bids or transactions are deleted. The other lookups purge_users()
+-- makes are served by: bid.listing_id -> idx_bid_listing_amount,
+-- user_listing_watch.listing_id -> idx_watch_listing_user (below),
+-- feedback.transaction_id -> the UNIQUE (transaction_id, author_user_id) constraint
+-- Query pattern: DELETE FROM bid WHERE user_id = ANY(?)
+CREATE INDEX idx_bid_user ON bid (user_id);
+CREATE INDEX idx_transaction_buyer ON transaction (buyer_id);
+CREATE INDEX idx_transaction_seller ON transaction (seller_id);
+CREATE INDEX idx_transaction_listing ON transaction (listing_id);
+CREATE INDEX idx_feedback_author ON feedback (author_user_id);
+CREATE INDEX idx_listing_high_bidder ON listing (high_bidder_id) WHERE high_bidder_id IS NOT NULL;
+
+-- Finds the transaction of a bid (the tg_ref_* checks, purge_users); the UNIQUE constraint
+-- that used to provide it cannot be declared on the partitioned transaction table
+-- Query pattern: SELECT 1 FROM transaction WHERE bid_id = ANY(?)
+CREATE INDEX idx_transaction_bid ON transaction (bid_id);
+
+-- Covering indexes for the app's prebuilt queries (suggested by index_advisor.py)
+-- Watcher counts per listing are answered by an index-only scan; also the listing_id
+-- lookup of purge_users()
+-- Query pattern: SELECT listing_id, COUNT(user_id) FROM user_listing_watch GROUP BY listing_id
+CREATE INDEX idx_watch_listing_user ON user_listing_watch (listing_id) INCLUDE (user_id);
+
+-- Lets the revenue_fact triggers find emptied groups without scanning the fact table
+-- The partial index only holds groups whose last transaction was just removed, so it stays near-empty
+-- Query pattern: DELETE FROM revenue_fact WHERE txn_count = 0
+CREATE INDEX idx_revenue_fact_empty ON revenue_fact (category_id) WHERE txn_count = 0;
+
+-- Same for buckets of the bid sketches emptied by bid deletes
+-- Query pattern: DELETE FROM bid_sketch_listing WHERE n = 0
+CREATE INDEX idx_bid_sketch_listing_empty ON bid_sketch_listing (listing_id) WHERE n = 0;
+CREATE INDEX idx_bid_sketch_category_empty ON bid_sketch_category (category_id) WHERE n = 0;
+CREATE INDEX idx_bid_sketch_total_empty ON bid_sketch_total (stripe) WHERE n = 0;
+
+-- Buyer/seller role lists
+-- Query pattern: SELECT username FROM user_account WHERE user_type IN ('buyer','both')
+CREATE INDEX idx_user_account_type ON user_account (user_type) INCLUDE (username);
+
+-- Category tree: children of a category (the app's category browser) and the ancestors of a
+-- category (the closure triggers); subtrees are read through the closure primary key
+-- Query pattern: SELECT * FROM category WHERE parent_id = ?
+-- Query pattern: SELECT ancestor_id FROM category_closure WHERE descendant_id = ?
+CREATE INDEX idx_category_parent ON category (parent_id);
+CREATE INDEX idx_category_closure_descendant ON category_closure (descendant_id) INCLUDE (ancestor_id, depth);
+
+-- Listing search (search_listings): full-text matches on title and description
+-- Query pattern: SELECT * FROM listing WHERE search_vector @@ to_tsquery('english', 'camera:*')
+CREATE INDEX idx_listing_search ON listing USING GIN (search_vector);
+
+-- Fuzzy title matching (search_listings) needs the pg_trgm extension, which is optional:
+-- without it the trigram index is skipped and search is full-text only
+-- Query pattern: SELECT * FROM listing WHERE title % 'camra'
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX idx_listing_title_trgm ON listing USING GIN (title gin_trgm_ops);
+    ELSE
+        RAISE WARNING 'pg_trgm is not available: listing search will not match misspelled titles';
+    END IF;
+END$$;
 
 --  Functions, triggers, and stored procedures 
 
@@ -122,6 +328,13 @@ CREATE INDEX idx_watch_user ON user_listing_watch (user_id);
 --   1. Bids can only be placed on active listings that haven't ended
 --   2. Bid amount must be at least the starting price
 --   3. Bid amount must be at least $1 more than the current highest bid
+--   4. Rule 3 means every accepted bid beats the current high bid, so every accepted bid becomes
+--      the listing's high_bid / high_bidder_id. Unless the high bidder raises their own bid,
+--      that UPDATE cannot be HOT: high_bidder_id is indexed (idx_listing_high_bidder, needed
+--      by the foreign-key check when users are deleted), so it also writes every listing index
+-- The listing row is locked FOR UPDATE before the high bid is read, so concurrent bids
+-- on the same listing are validated one at a time against an up-to-date high bid, and
+-- validation is a single primary-key row access instead of a MAX() over bid
 -- Usage: Automatically called by trigger tg_enforce_bid_rules on bid INSERT
 -- Example: When user places bid, this validates it meets all requirements
 CREATE OR REPLACE FUNCTION fn_enforce_bid_rules()
@@ -132,10 +345,14 @@ DECLARE
     l_status    TEXT;
     l_end       TIMESTAMPTZ;
 BEGIN
-    SELECT COALESCE(MAX(bid_amount), 0) INTO current_max FROM bid WHERE listing_id = NEW.listing_id;
-    SELECT l.start_price, l.status, l.end_date INTO start_price, l_status, l_end
+    SELECT l.start_price, l.status, l.end_date, COALESCE(l.high_bid, 0)
+    INTO start_price, l_status, l_end, current_max
     FROM listing l WHERE l.listing_id = NEW.listing_id FOR UPDATE;
 
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Listing % does not exist', NEW.listing_id;
+    END IF;
+
     IF l_status <> 'active' OR NOW() > l_end THEN
         RAISE EXCEPTION 'Listing not active or already ended';
     END IF;
@@ -143,6 +360,9 @@ BEGIN
     IF NEW.bid_amount < GREATEST(start_price, current_max + 1) THEN
         RAISE EXCEPTION 'Bid too low. Minimum acceptable: %', GREATEST(start_price, current_max + 1);
     END IF;
+
+    UPDATE listing SET high_bid = NEW.bid_amount, high_bidder_id = NEW.user_id
+    WHERE listing_id = NEW.listing_id;
     RETURN NEW;
 END$$;
 
@@ -154,33 +374,210 @@ CREATE TRIGGER tg_enforce_bid_rules
 BEFORE INSERT ON bid
 FOR EACH ROW EXECUTE FUNCTION fn_enforce_bid_rules();
 
--- Function: fn_update_rating_on_feedback()
--- Automatically recalculates and updates user rating when feedback is added
+-- Function: fn_reset_high_bid()
+-- Purpose: Keeps listing.high_bid correct when bids are deleted or changed
 -- Business Rules:
---   1. User rating is the average of all feedback ratings received
---   2. Rating is updated in real-time whenever new feedback is added
+--   1. Only acts when the affected bid was the listing's high bid
+--   2. The replacement is the top entry of idx_bid_listing_amount (earliest bid wins ties)
+-- Usage: Automatically called by trigger tg_reset_high_bid on bid DELETE/UPDATE
+CREATE OR REPLACE FUNCTION fn_reset_high_bid()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE listing l
+       SET high_bid = top.bid_amount, high_bidder_id = top.user_id
+      FROM (SELECT OLD.listing_id AS listing_id) k
+      LEFT JOIN LATERAL (
+            SELECT b.bid_amount, b.user_id FROM v_bid_history b
+            WHERE b.listing_id = k.listing_id
+            ORDER BY b.bid_amount DESC, b.bid_time ASC
+            LIMIT 1) top ON TRUE
+     WHERE l.listing_id = k.listing_id
+       AND OLD.bid_amount >= l.high_bid;
+    IF TG_OP = 'UPDATE' THEN
+        UPDATE listing
+           SET high_bid = NEW.bid_amount, high_bidder_id = NEW.user_id
+         WHERE listing_id = NEW.listing_id
+           AND (high_bid IS NULL OR NEW.bid_amount > high_bid);
+    END IF;
+    RETURN NULL;
+END$$;
+
+CREATE TRIGGER tg_reset_high_bid
+AFTER DELETE OR UPDATE OF listing_id, bid_amount ON bid
+FOR EACH ROW EXECUTE FUNCTION fn_reset_high_bid();
+
+-- Function: refresh_listing_high_bids()
+-- Purpose: Recomputes listing.high_bid / high_bidder_id from bid, archived months included
+-- Returns: Number of listings updated
+-- Usage: SELECT refresh_listing_high_bids();
+-- Example: Run after bulk loads done with triggers disabled
+CREATE OR REPLACE FUNCTION refresh_listing_high_bids()
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+    n INT;
+BEGIN
+    LOCK TABLE bid IN SHARE MODE;
+    UPDATE listing l
+       SET high_bid = top.bid_amount, high_bidder_id = top.user_id
+      FROM listing l2
+      LEFT JOIN LATERAL (
+            SELECT b.bid_amount, b.user_id FROM v_bid_history b
+            WHERE b.listing_id = l2.listing_id
+            ORDER BY b.bid_amount DESC, b.bid_time ASC
+            LIMIT 1) top ON TRUE
+     WHERE l.listing_id = l2.listing_id
+       AND (l.high_bid IS DISTINCT FROM top.bid_amount OR l.high_bidder_id IS DISTINCT FROM top.user_id);
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END$$;
+
+-- Function: fn_apply_feedback_delta()
+-- Purpose: Adjusts a user's running feedback aggregates and derives the rating from them
+-- Business Rules:
+--   1. User rating is the average of all feedback ratings received (feedback_sum / feedback_count)
+--   2. A user with no feedback left keeps their current rating (it can be set from the app)
 --   3. Rating is stored as NUMERIC(4,2) for precision
--- Usage: Automatically called by trigger tg_update_rating_on_feedback on feedback INSERT
+-- Usage: Called by the feedback rating triggers; one primary-key update per call
+CREATE OR REPLACE FUNCTION fn_apply_feedback_delta(p_user_id INT, p_count INT, p_sum INT, p_positive INT)
+RETURNS VOID LANGUAGE sql AS $$
+    UPDATE user_account
+       SET feedback_count = feedback_count + p_count,
+           feedback_sum = feedback_sum + p_sum,
+           feedback_positive = feedback_positive + p_positive,
+           rating = CASE WHEN feedback_count + p_count > 0
+                         THEN ((feedback_sum + p_sum)::NUMERIC / (feedback_count + p_count))::NUMERIC(4,2)
+                         ELSE rating END
+     WHERE user_id = p_user_id;
+$$;
+
+-- Function: fn_update_rating_on_feedback()
+-- Automatically updates the target user's rating when feedback is added, changed or removed
+-- Business Rules:
+--   1. Maintains feedback_count/feedback_sum/feedback_positive on user_account incrementally,
+--      so each change costs one row update instead of re-averaging all of the user's feedback
+--   2. UPDATE is applied as removing the old row and adding the new one
+-- Usage: Automatically called by trigger tg_update_rating_on_feedback on feedback INSERT/UPDATE/DELETE
 -- Example: When buyer leaves 5-star feedback, seller's rating is recalculated
 CREATE OR REPLACE FUNCTION fn_update_rating_on_feedback()
 RETURNS TRIGGER LANGUAGE plpgsql AS $$
-DECLARE
-    new_avg NUMERIC(4,2);
 BEGIN
-    SELECT AVG(rating)::NUMERIC(4,2) INTO new_avg
-    FROM feedback WHERE target_user_id = NEW.target_user_id;
-    UPDATE user_account SET rating = new_avg WHERE user_id = NEW.target_user_id;
-    RETURN NEW;
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        PERFORM fn_apply_feedback_delta(OLD.target_user_id, -1, -OLD.rating,
+                                        -(OLD.feedback_type = 'positive')::INT);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM fn_apply_feedback_delta(NEW.target_user_id, 1, NEW.rating,
+                                        (NEW.feedback_type = 'positive')::INT);
+    END IF;
+    RETURN NULL;
 END$$;
 
 -- Trigger: tg_update_rating_on_feedback
--- Purpose: Automatically updates user ratings when feedback is submitted
--- When: AFTER INSERT on feedback table
+-- Purpose: Automatically updates user ratings when feedback is submitted, edited or deleted
+-- When: AFTER INSERT, UPDATE or DELETE on feedback table, once per row
 -- Business Impact: Ensures user ratings are always current and accurate
 CREATE TRIGGER tg_update_rating_on_feedback
-AFTER INSERT ON feedback
+AFTER INSERT OR UPDATE OF target_user_id, rating, feedback_type OR DELETE ON feedback
 FOR EACH ROW EXECUTE FUNCTION fn_update_rating_on_feedback();
 
+-- Function: fn_update_rating_on_feedback_stmt()
+-- Purpose: Statement-level variant of fn_update_rating_on_feedback() for bulk feedback loads
+-- Business Rules:
+--   1. Reads the statement's transition tables and updates every affected user exactly once
+--   2. Same aggregates and rating formula as the row-level trigger
+-- Usage: Installed disabled; switch with CALL set_feedback_rating_mode('statement')
+-- Example: INSERT INTO feedback SELECT ... of 10,000 rows for 50 sellers performs 50 user updates
+CREATE OR REPLACE FUNCTION fn_update_rating_on_feedback_stmt()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM fn_apply_feedback_delta(target_user_id, COUNT(*)::INT, SUM(rating)::INT,
+                                        (COUNT(*) FILTER (WHERE feedback_type = 'positive'))::INT)
+        FROM new_feedback GROUP BY target_user_id;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM fn_apply_feedback_delta(target_user_id, -COUNT(*)::INT, -SUM(rating)::INT,
+                                        -(COUNT(*) FILTER (WHERE feedback_type = 'positive'))::INT)
+        FROM old_feedback GROUP BY target_user_id;
+    ELSE
+        PERFORM fn_apply_feedback_delta(target_user_id, SUM(cnt)::INT, SUM(total)::INT, SUM(positive)::INT)
+        FROM (SELECT target_user_id, 1 AS cnt, rating AS total, (feedback_type = 'positive')::INT AS positive
+              FROM new_feedback
+              UNION ALL
+              SELECT target_user_id, -1, -rating, -(feedback_type = 'positive')::INT
+              FROM old_feedback) d
+        GROUP BY target_user_id;
+    END IF;
+    RETURN NULL;
+END$$;
+
+-- Triggers: tg_update_rating_on_feedback_stmt_{ins,upd,del}
+-- Purpose: Statement-level rating maintenance (one trigger per event, each with its transition tables)
+-- When: AFTER INSERT / UPDATE / DELETE on feedback, once per statement; created DISABLED
+CREATE TRIGGER tg_update_rating_on_feedback_stmt_ins
+AFTER INSERT ON feedback REFERENCING NEW TABLE AS new_feedback
+FOR EACH STATEMENT EXECUTE FUNCTION fn_update_rating_on_feedback_stmt();
+
+CREATE TRIGGER tg_update_rating_on_feedback_stmt_upd
+AFTER UPDATE ON feedback REFERENCING OLD TABLE AS old_feedback NEW TABLE AS new_feedback
+FOR EACH STATEMENT EXECUTE FUNCTION fn_update_rating_on_feedback_stmt();
+
+CREATE TRIGGER tg_update_rating_on_feedback_stmt_del
+AFTER DELETE ON feedback REFERENCING OLD TABLE AS old_feedback
+FOR EACH STATEMENT EXECUTE FUNCTION fn_update_rating_on_feedback_stmt();
+
+ALTER TABLE feedback DISABLE TRIGGER tg_update_rating_on_feedback_stmt_ins;
+ALTER TABLE feedback DISABLE TRIGGER tg_update_rating_on_feedback_stmt_upd;
+ALTER TABLE feedback DISABLE TRIGGER tg_update_rating_on_feedback_stmt_del;
+
+-- Procedure: set_feedback_rating_mode()
+-- Purpose: Chooses between row-level and statement-level rating maintenance
+-- Parameters:
+--   - p_mode: 'row' (default install) or 'statement' (bulk imports)
+-- Usage: CALL set_feedback_rating_mode('statement');
+CREATE OR REPLACE PROCEDURE set_feedback_rating_mode(p_mode TEXT)
+LANGUAGE plpgsql AS $$
+DECLARE
+    row_action  TEXT;
+    stmt_action TEXT;
+BEGIN
+    IF p_mode = 'row' THEN
+        row_action := 'ENABLE'; stmt_action := 'DISABLE';
+    ELSIF p_mode = 'statement' THEN
+        row_action := 'DISABLE'; stmt_action := 'ENABLE';
+    ELSE
+        RAISE EXCEPTION 'Unknown rating mode %, expected row or statement', p_mode;
+    END IF;
+    EXECUTE format('ALTER TABLE feedback %s TRIGGER tg_update_rating_on_feedback', row_action);
+    EXECUTE format('ALTER TABLE feedback %s TRIGGER tg_update_rating_on_feedback_stmt_ins', stmt_action);
+    EXECUTE format('ALTER TABLE feedback %s TRIGGER tg_update_rating_on_feedback_stmt_upd', stmt_action);
+    EXECUTE format('ALTER TABLE feedback %s TRIGGER tg_update_rating_on_feedback_stmt_del', stmt_action);
+END$$;
+
+-- Function: refresh_user_feedback_aggregates()
+-- Purpose: Recomputes feedback_count/feedback_sum/feedback_positive and rating from feedback
+-- Returns: Number of users whose aggregates were reset
+-- Usage: SELECT refresh_user_feedback_aggregates();
+-- Example: Run after bulk loads done with triggers disabled
+CREATE OR REPLACE FUNCTION refresh_user_feedback_aggregates()
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+    n INT;
+BEGIN
+    LOCK TABLE feedback IN SHARE MODE;
+    UPDATE user_account u
+       SET feedback_count = COALESCE(f.cnt, 0),
+           feedback_sum = COALESCE(f.total, 0),
+           feedback_positive = COALESCE(f.positive, 0),
+           rating = CASE WHEN f.cnt > 0 THEN (f.total::NUMERIC / f.cnt)::NUMERIC(4,2) ELSE u.rating END
+      FROM user_account u2
+      LEFT JOIN (SELECT target_user_id, COUNT(*)::INT AS cnt, SUM(rating)::INT AS total,
+                        COUNT(*) FILTER (WHERE feedback_type = 'positive')::INT AS positive
+                 FROM feedback GROUP BY target_user_id) f ON f.target_user_id = u2.user_id
+     WHERE u.user_id = u2.user_id;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END$$;
+
 -- Procedure: place_bid()
 -- Purpose: Provides a safe interface for placing bids with proper validation
 -- Business Rules:
@@ -200,6 +597,115 @@ BEGIN
     VALUES (p_listing_id, p_user_id, p_amount, p_is_proxy);
 END$$;
 
+-- Function: place_bids()
+-- Purpose: Set-based bulk entry point for bids (auction-sniping replays, bid history imports)
+-- Business Rules:
+--   1. Each bid is checked against the fn_enforce_bid_rules rules, in input order per listing,
+--      with every accepted bid raising the minimum for the bids after it
+--   2. Invalid bids are rejected with a reason instead of aborting the whole batch; a NULL
+--      user, listing or amount is rejected before its listing is looked at
+--   3. Every listing in the batch is locked once, in listing_id order, to avoid deadlocks
+--   4. Accepted bids are written with a single INSERT (tg_enforce_bid_rules still runs per row,
+--      now a cheap re-check under the lock already held)
+-- Parameters (parallel arrays, one element per bid):
+--   - p_user_ids, p_listing_ids, p_amounts: Bidder, listing and amount
+--   - p_is_proxy: Proxy flags (NULL = all FALSE)
+-- Returns: One row per input bid (ord = 1-based input position) with the new bid_id,
+--          or a NULL bid_id and the rejection reason
+-- Usage: SELECT * FROM place_bids(ARRAY[2,4], ARRAY[1,1], ARRAY[400,420]);
+-- Example: A 5,000-bid sniping burst is validated and stored in one round trip
+CREATE OR REPLACE FUNCTION place_bids(p_user_ids INT[], p_listing_ids INT[], p_amounts NUMERIC[],
+                                      p_is_proxy BOOLEAN[] DEFAULT NULL)
+RETURNS TABLE (ord INT, listing_id INT, bid_id INT, reason TEXT)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    r           RECORD;
+    cur_listing INT;
+    l_found     BOOLEAN;
+    l_start     NUMERIC(12,2);
+    l_status    TEXT;
+    l_end       TIMESTAMPTZ;
+    high        NUMERIC(12,2);
+    min_ok      NUMERIC(12,2);
+    why         TEXT;
+    new_id      INT;
+    seq         TEXT := pg_get_serial_sequence('bid', 'bid_id');
+    res_ord     INT[] := '{}';
+    res_listing INT[] := '{}';
+    res_bid     INT[] := '{}';
+    res_reason  TEXT[] := '{}';
+    ok_bid      INT[] := '{}';
+    ok_listing  INT[] := '{}';
+    ok_user     INT[] := '{}';
+    ok_amount   NUMERIC[] := '{}';
+    ok_proxy    BOOLEAN[] := '{}';
+BEGIN
+    IF cardinality(p_user_ids) <> cardinality(p_listing_ids)
+       OR cardinality(p_user_ids) <> cardinality(p_amounts)
+       OR cardinality(p_user_ids) <> COALESCE(cardinality(p_is_proxy), cardinality(p_user_ids)) THEN
+        RAISE EXCEPTION 'place_bids: input arrays must have the same length';
+    END IF;
+
+    PERFORM 1 FROM listing l
+    WHERE l.listing_id = ANY(p_listing_ids)
+    ORDER BY l.listing_id
+    FOR UPDATE;
+
+    FOR r IN
+        SELECT i.ord::INT AS ord, i.user_id, i.listing_id, round(i.amount, 2) AS amount,
+               COALESCE(p_is_proxy[i.ord], FALSE) AS is_proxy,
+               EXISTS (SELECT 1 FROM user_account u WHERE u.user_id = i.user_id) AS user_ok
+        FROM unnest(p_user_ids, p_listing_ids, p_amounts) WITH ORDINALITY AS i(user_id, listing_id, amount, ord)
+        ORDER BY i.listing_id, i.ord
+    LOOP
+        IF r.listing_id IS NOT NULL AND r.listing_id IS DISTINCT FROM cur_listing THEN
+            cur_listing := r.listing_id;
+            SELECT l.start_price, l.status, l.end_date, COALESCE(l.high_bid, 0)
+            INTO l_start, l_status, l_end, high
+            FROM listing l WHERE l.listing_id = r.listing_id;
+            l_found := FOUND;
+        END IF;
+        min_ok := GREATEST(l_start, high + 1);
+        why := CASE
+            WHEN r.user_id IS NULL THEN 'Missing user_id'
+            WHEN r.listing_id IS NULL THEN 'Missing listing_id'
+            WHEN r.amount IS NULL THEN 'Missing bid amount'
+            -- NaN compares above every number, so it fails the upper bound
+            WHEN NOT (r.amount > 0 AND r.amount < 1e10) THEN 'Bid amount must be positive and below 10000000000'
+            WHEN NOT l_found THEN format('Listing %s does not exist', r.listing_id)
+            WHEN NOT r.user_ok THEN format('User %s does not exist', r.user_id)
+            WHEN l_status <> 'active' OR NOW() > l_end THEN 'Listing not active or already ended'
+            WHEN r.amount < min_ok THEN format('Bid too low. Minimum acceptable: %s', min_ok)
+        END;
+        new_id := NULL;
+        IF why IS NULL THEN
+            new_id := nextval(seq);
+            high := r.amount;
+            ok_bid := ok_bid || new_id;
+            ok_listing := ok_listing || r.listing_id;
+            ok_user := ok_user || r.user_id;
+            ok_amount := ok_amount || r.amount;
+            ok_proxy := ok_proxy || r.is_proxy;
+        END IF;
+        res_ord := res_ord || r.ord;
+        res_listing := res_listing || r.listing_id;
+        res_bid := res_bid || new_id;
+        res_reason := res_reason || why;
+    END LOOP;
+
+    INSERT INTO bid (bid_id, listing_id, user_id, bid_amount, is_proxy)
+    OVERRIDING SYSTEM VALUE
+    SELECT a.bid_id, a.listing_id, a.user_id, a.amount, a.is_proxy
+    FROM unnest(ok_bid, ok_listing, ok_user, ok_amount, ok_proxy) AS a(bid_id, listing_id, user_id, amount, is_proxy)
+    ORDER BY a.bid_id;
+
+    RETURN QUERY
+    SELECT x.ord, x.listing_id, x.bid_id, x.reason
+    FROM unnest(res_ord, res_listing, res_bid, res_reason) AS x(ord, listing_id, bid_id, reason)
+    ORDER BY x.ord;
+END$$;
+
 -- Function: finalize_listing()
 -- Purpose: Finalizes an auction listing by determining winner and creating transaction
 -- Business Rules:
@@ -243,7 +749,1188 @@ BEGIN
     RETURN txn_id;
 END$$;
 
+-- Function: close_expired_listings()
+-- Purpose: Set-based version of finalize_listing() for every active listing whose end_date has passed
+-- Business Rules:
+--   1. Claims up to p_limit expired active listings, oldest end_date first, with FOR UPDATE SKIP LOCKED
+--      so several closers can run in parallel without finalizing the same listing twice
+--   2. Winners are picked exactly as in finalize_listing (highest bid, earliest bid wins ties),
+--      one index probe per listing on idx_bid_listing_amount
+--   3. All transactions of the batch are created with one INSERT; listings become 'sold' or 'ended'
+--   4. Listings locked by an in-flight bid are skipped and picked up by a later call
+-- Returns: One row per closed listing with its transaction_id (NULL if no bids) and how long
+--          after end_date it was closed
+-- Usage: SELECT * FROM close_expired_listings(500);
+-- Example: Run repeatedly from auction_closer.py until it returns no rows
+CREATE OR REPLACE FUNCTION close_expired_listings(p_limit INT DEFAULT 500)
+RETURNS TABLE (listing_id INT, transaction_id INT, lag INTERVAL)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+BEGIN
+    RETURN QUERY
+    WITH expired AS (
+        SELECT l.listing_id, l.seller_id, l.end_date
+        FROM listing l
+        WHERE l.status = 'active' AND l.end_date <= NOW()
+        ORDER BY l.end_date
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    ),
+    winners AS (
+        SELECT e.listing_id, e.seller_id, e.end_date, w.bid_id, w.user_id, w.bid_amount
+        FROM expired e
+        LEFT JOIN LATERAL (
+            SELECT b.bid_id, b.user_id, b.bid_amount
+            FROM bid b
+            WHERE b.listing_id = e.listing_id
+            ORDER BY b.bid_amount DESC, b.bid_time ASC
+            LIMIT 1
+        ) w ON TRUE
+    ),
+    txns AS (
+        INSERT INTO transaction (bid_id, listing_id, buyer_id, seller_id, final_price, payment_status, shipping_status, tracking_number)
+        SELECT w.bid_id, w.listing_id, w.user_id, w.seller_id, w.bid_amount, 'pending', 'pending', CONCAT('AUTO', w.bid_id)
+        FROM winners w
+        WHERE w.bid_id IS NOT NULL
+        RETURNING transaction.transaction_id, transaction.listing_id
+    ),
+    closed AS (
+        UPDATE listing l
+        SET status = CASE WHEN w.bid_id IS NULL THEN 'ended' ELSE 'sold' END
+        FROM winners w
+        WHERE l.listing_id = w.listing_id
+        RETURNING l.listing_id
+    )
+    SELECT c.listing_id, t.transaction_id, clock_timestamp() - w.end_date
+    FROM closed c
+    JOIN winners w ON w.listing_id = c.listing_id
+    LEFT JOIN txns t ON t.listing_id = c.listing_id;
+END$$;
+
+-- Function: purge_users()
+-- Purpose: Deletes users together with everything that depends on them, in one round trip
+-- Business Rules:
+--   1. Removes the users' listings, and every bid, watch and transaction that involves
+--      the users or those listings, archived months included (an archived bid left behind
+--      could become a listing's high bid again and keep its bidder referenced)
+--   2. Removes feedback written by or about the users, or tied to a removed transaction
+--   3. Every step is a set-based DELETE on an indexed column, in FK order
+--   4. Runs in the caller's transaction, so a failure leaves nothing half-deleted
+--   5. Keeps generic plans: its lookups by id cannot be pruned to one partition of bid or
+--      transaction, and re-planning them against every partition on each call cost more
+--      than running them
+-- Returns: One row per table with the number of rows deleted
+-- Usage: SELECT * FROM purge_users(ARRAY[12, 13, 14]);
+-- Example: Remove test or spam accounts in bulk
+CREATE OR REPLACE FUNCTION purge_users(p_user_ids INT[])
+RETURNS TABLE (table_name TEXT, deleted BIGINT)
+LANGUAGE plpgsql
+SET plan_cache_mode = force_generic_plan AS $$
+DECLARE
+    v_listings INT[];
+    v_txns     INT[];
+    n          BIGINT;
+BEGIN
+    SELECT COALESCE(array_agg(l.listing_id), '{}') INTO v_listings
+    FROM listing l WHERE l.seller_id = ANY(p_user_ids);
+
+    SELECT COALESCE(array_agg(DISTINCT x.transaction_id), '{}') INTO v_txns
+    FROM (
+        SELECT t.transaction_id FROM v_transaction_history t WHERE t.buyer_id = ANY(p_user_ids)
+        UNION ALL
+        SELECT t.transaction_id FROM v_transaction_history t WHERE t.seller_id = ANY(p_user_ids)
+        UNION ALL
+        SELECT t.transaction_id FROM v_transaction_history t WHERE t.listing_id = ANY(v_listings)
+        UNION ALL
+        SELECT t.transaction_id FROM v_bid_history b JOIN v_transaction_history t ON t.bid_id = b.bid_id
+        WHERE b.user_id = ANY(p_user_ids)
+    ) x;
+
+    table_name := 'feedback';
+    DELETE FROM feedback f
+    WHERE f.author_user_id = ANY(p_user_ids)
+       OR f.target_user_id = ANY(p_user_ids)
+       OR f.transaction_id = ANY(v_txns);
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+    RETURN NEXT;
+
+    table_name := 'transaction';
+    DELETE FROM transaction t WHERE t.transaction_id = ANY(v_txns);
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+    DELETE FROM archive.transaction t WHERE t.transaction_id = ANY(v_txns);
+    GET DIAGNOSTICS n = ROW_COUNT;
+    deleted := deleted + n;
+    RETURN NEXT;
+
+    table_name := 'bid';
+    DELETE FROM bid b WHERE b.listing_id = ANY(v_listings);
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+    DELETE FROM archive.bid b WHERE b.listing_id = ANY(v_listings);
+    GET DIAGNOSTICS n = ROW_COUNT;
+    deleted := deleted + n;
+    DELETE FROM bid b WHERE b.user_id = ANY(p_user_ids);
+    GET DIAGNOSTICS n = ROW_COUNT;
+    deleted := deleted + n;
+    DELETE FROM archive.bid b WHERE b.user_id = ANY(p_user_ids);
+    GET DIAGNOSTICS n = ROW_COUNT;
+    deleted := deleted + n;
+    RETURN NEXT;
+
+    table_name := 'user_listing_watch';
+    DELETE FROM user_listing_watch w WHERE w.listing_id = ANY(v_listings);
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+    DELETE FROM user_listing_watch w WHERE w.user_id = ANY(p_user_ids);
+    GET DIAGNOSTICS n = ROW_COUNT;
+    deleted := deleted + n;
+    RETURN NEXT;
+
+    table_name := 'listing';
+    DELETE FROM listing l WHERE l.listing_id = ANY(v_listings);
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+    RETURN NEXT;
+
+    table_name := 'user_account';
+    DELETE FROM user_account u WHERE u.user_id = ANY(p_user_ids);
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+    RETURN NEXT;
+END$$;
+
+-- Function: purge_user()
+-- Purpose: Single-user form of purge_users()
+-- Usage: SELECT * FROM purge_user(12);
+CREATE OR REPLACE FUNCTION purge_user(p_user_id INT)
+RETURNS TABLE (table_name TEXT, deleted BIGINT)
+LANGUAGE sql AS $$
+    SELECT * FROM purge_users(ARRAY[p_user_id]);
+$$;
+
+-- Function: fn_notify_table_change()
+-- Purpose: Publishes a change notification so clients can invalidate cached query results
+-- Business Rules:
+--   1. Sends NOTIFY on channel 'ebay_table_change' with the changed table's name as payload
+--   2. Fires once per statement, so bulk writes produce a single notification
+--   3. Notifications are only delivered when the writing transaction commits
+-- Usage: Automatically called by the tg_notify_*_change triggers below
+-- Example: Client runs LISTEN ebay_table_change; a new bid delivers payload 'bid'
+CREATE OR REPLACE FUNCTION fn_notify_table_change()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_notify('ebay_table_change', TG_TABLE_NAME);
+    RETURN NULL;
+END$$;
+
+-- Triggers: tg_notify_bid_change, tg_notify_transaction_change, tg_notify_feedback_change
+-- Purpose: Announce writes to the tables behind the analytics queries
+-- When: AFTER INSERT, UPDATE or DELETE, once per statement
+-- Business Impact: The desktop app drops stale cached analytics as soon as another client writes
+CREATE TRIGGER tg_notify_bid_change
+AFTER INSERT OR UPDATE OR DELETE ON bid
+FOR EACH STATEMENT EXECUTE FUNCTION fn_notify_table_change();
+
+CREATE TRIGGER tg_notify_transaction_change
+AFTER INSERT OR UPDATE OR DELETE ON transaction
+FOR EACH STATEMENT EXECUTE FUNCTION fn_notify_table_change();
+
+CREATE TRIGGER tg_notify_feedback_change
+AFTER INSERT OR UPDATE OR DELETE ON feedback
+FOR EACH STATEMENT EXECUTE FUNCTION fn_notify_table_change();
+
+-- Function: fn_notify_user_change()
+-- Purpose: Publishes which user_account rows a statement changed so clients can patch their user list
+-- Business Rules:
+--   1. Sends NOTIFY on channel 'user_account_change' with payload '<op>:<ids>', where <op> is
+--      I, U or D and <ids> is a comma-separated list of the affected user_ids
+--   2. Fires once per statement and reads the transition table, so a multi-row write is one notification
+--   3. Statements touching more than 500 rows send '<op>:*' instead; clients reload their list
+--   4. Notifications are only delivered when the writing transaction commits
+-- Usage: Automatically called by the tg_notify_user_* triggers below
+-- Example: UPDATE user_account SET rating = 4.9 WHERE user_id = 3 delivers payload 'U:3'
+CREATE OR REPLACE FUNCTION fn_notify_user_change()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+DECLARE
+    v_count INT;
+    v_ids TEXT;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        SELECT COUNT(*) INTO v_count FROM old_rows;
+    ELSE
+        SELECT COUNT(*) INTO v_count FROM new_rows;
+    END IF;
+
+    IF v_count = 0 THEN
+        RETURN NULL;
+    ELSIF v_count > 500 THEN
+        v_ids := '*';
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT string_agg(user_id::TEXT, ',') INTO v_ids FROM old_rows;
+    ELSE
+        SELECT string_agg(user_id::TEXT, ',') INTO v_ids FROM new_rows;
+    END IF;
+
+    PERFORM pg_notify('user_account_change', left(TG_OP, 1) || ':' || v_ids);
+    RETURN NULL;
+END$$;
+
+-- Triggers: tg_notify_user_insert, tg_notify_user_update, tg_notify_user_delete
+-- Purpose: Announce row-level changes to user_account (one trigger per event, as transition tables require)
+-- When: AFTER INSERT, UPDATE or DELETE, once per statement
+-- Business Impact: Every open desktop app patches just the changed rows of its user list, live
+CREATE TRIGGER tg_notify_user_insert
+AFTER INSERT ON user_account
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION fn_notify_user_change();
+
+CREATE TRIGGER tg_notify_user_update
+AFTER UPDATE ON user_account
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION fn_notify_user_change();
+
+CREATE TRIGGER tg_notify_user_delete
+AFTER DELETE ON user_account
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION fn_notify_user_change();
+
+-- Function: fn_summary_on_listing()
+-- Purpose: Creates the empty listing_price_summary row for a new listing
+-- Usage: Automatically called by trigger tg_summary_on_listing on listing INSERT
+CREATE OR REPLACE FUNCTION fn_summary_on_listing()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO listing_price_summary (listing_id) VALUES (NEW.listing_id)
+    ON CONFLICT (listing_id) DO NOTHING;
+    RETURN NULL;
+END$$;
+
+CREATE TRIGGER tg_summary_on_listing
+AFTER INSERT ON listing
+FOR EACH ROW EXECUTE FUNCTION fn_summary_on_listing();
+
+-- Function: fn_summary_on_bid()
+-- Purpose: Keeps bid_count in listing_price_summary current
+-- Business Rules:
+--   1. INSERT increments and DELETE decrements bid_count (one row update)
+--   2. UPDATE moves the bid between listings
+-- Usage: Automatically called by trigger tg_summary_on_bid
+CREATE OR REPLACE FUNCTION fn_summary_on_bid()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE listing_price_summary
+           SET bid_count = bid_count - 1
+         WHERE listing_id = OLD.listing_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO listing_price_summary AS s (listing_id, bid_count)
+        VALUES (NEW.listing_id, 1)
+        ON CONFLICT (listing_id) DO UPDATE
+           SET bid_count = s.bid_count + 1;
+    END IF;
+    RETURN NULL;
+END$$;
+
+CREATE TRIGGER tg_summary_on_bid
+AFTER INSERT OR DELETE OR UPDATE OF listing_id ON bid
+FOR EACH ROW EXECUTE FUNCTION fn_summary_on_bid();
+
+-- Function: fn_summary_on_watch()
+-- Purpose: Keeps watcher_count in listing_price_summary current
+-- Business Rules:
+--   1. user_listing_watch has one row per (user, listing), so each row is one distinct watcher
+--   2. INSERT increments, DELETE decrements, UPDATE moves the watcher between listings
+-- Usage: Automatically called by trigger tg_summary_on_watch
+CREATE OR REPLACE FUNCTION fn_summary_on_watch()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE listing_price_summary
+           SET watcher_count = watcher_count - 1
+         WHERE listing_id = OLD.listing_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO listing_price_summary AS s (listing_id, watcher_count)
+        VALUES (NEW.listing_id, 1)
+        ON CONFLICT (listing_id) DO UPDATE
+           SET watcher_count = s.watcher_count + 1;
+    END IF;
+    RETURN NULL;
+END$$;
+
+CREATE TRIGGER tg_summary_on_watch
+AFTER INSERT OR DELETE OR UPDATE OF listing_id ON user_listing_watch
+FOR EACH ROW EXECUTE FUNCTION fn_summary_on_watch();
+
+-- Function: refresh_listing_price_summary()
+-- Purpose: Rebuilds listing_price_summary from the base tables (bids of archived months included)
+-- Business Rules:
+--   1. Bids and watchers are aggregated separately, so there is no bids x watchers fan-out
+--   2. Writers to bid/user_listing_watch are blocked for the duration so no delta is lost
+-- Returns: Number of listings summarized
+-- Usage: SELECT refresh_listing_price_summary();
+-- Example: Run after bulk loads done with triggers disabled
+CREATE OR REPLACE FUNCTION refresh_listing_price_summary()
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+    n INT;
+BEGIN
+    LOCK TABLE bid, user_listing_watch IN SHARE MODE;
+    DELETE FROM listing_price_summary;
+    INSERT INTO listing_price_summary (listing_id, bid_count, watcher_count)
+    SELECT l.listing_id, COALESCE(b.bid_count, 0), COALESCE(w.watcher_count, 0)
+    FROM listing l
+    LEFT JOIN (SELECT listing_id, COUNT(*) AS bid_count
+               FROM v_bid_history GROUP BY listing_id) b ON b.listing_id = l.listing_id
+    LEFT JOIN (SELECT listing_id, COUNT(*) AS watcher_count
+               FROM user_listing_watch GROUP BY listing_id) w ON w.listing_id = l.listing_id;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END$$;
+
+-- Function: fn_revenue_fact_stmt()
+-- Purpose: Applies a statement's transaction changes to revenue_fact as per-group deltas
+-- Business Rules:
+--   1. Inserted rows add to their group, deleted rows subtract, updated rows move between groups
+--   2. The changed rows are aggregated first, so a bulk write is one upsert, not one per row
+--   3. Groups left with no transactions are removed
+-- Usage: Automatically called by the tg_revenue_fact_insert/update/delete triggers
+CREATE OR REPLACE FUNCTION fn_revenue_fact_stmt()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    -- transition tables exist only for their own event, hence one statement per TG_OP
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO revenue_fact AS f (category_id, payment_status, shipping_status, sale_date, txn_count, revenue)
+        SELECT l.category_id, n.payment_status, n.shipping_status, (n.transaction_date AT TIME ZONE 'UTC')::DATE,
+               COUNT(*), SUM(n.final_price)
+        FROM new_txns n
+        JOIN listing l ON l.listing_id = n.listing_id
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT (category_id, payment_status, shipping_status, sale_date) DO UPDATE
+           SET txn_count = f.txn_count + EXCLUDED.txn_count,
+               revenue = f.revenue + EXCLUDED.revenue;
+        RETURN NULL;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE revenue_fact f
+           SET txn_count = f.txn_count - d.n,
+               revenue = f.revenue - d.amount
+          FROM (SELECT l.category_id, o.payment_status, o.shipping_status,
+                       (o.transaction_date AT TIME ZONE 'UTC')::DATE AS sale_date,
+                       COUNT(*) AS n, SUM(o.final_price) AS amount
+                FROM old_txns o
+                JOIN listing l ON l.listing_id = o.listing_id
+                GROUP BY 1, 2, 3, 4) d
+         WHERE (f.category_id, f.payment_status, f.shipping_status, f.sale_date)
+             = (d.category_id, d.payment_status, d.shipping_status, d.sale_date);
+    ELSE
+        INSERT INTO revenue_fact AS f (category_id, payment_status, shipping_status, sale_date, txn_count, revenue)
+        SELECT l.category_id, d.payment_status, d.shipping_status, (d.transaction_date AT TIME ZONE 'UTC')::DATE,
+               SUM(d.sign), SUM(d.sign * d.final_price)
+        FROM (SELECT listing_id, payment_status, shipping_status, transaction_date, final_price, 1 AS sign
+              FROM new_txns
+              UNION ALL
+              SELECT listing_id, payment_status, shipping_status, transaction_date, final_price, -1
+              FROM old_txns) d
+        JOIN listing l ON l.listing_id = d.listing_id
+        GROUP BY 1, 2, 3, 4
+        HAVING SUM(d.sign) <> 0 OR SUM(d.sign * d.final_price) <> 0
+        ON CONFLICT (category_id, payment_status, shipping_status, sale_date) DO UPDATE
+           SET txn_count = f.txn_count + EXCLUDED.txn_count,
+               revenue = f.revenue + EXCLUDED.revenue;
+    END IF;
+    DELETE FROM revenue_fact WHERE txn_count = 0;
+    RETURN NULL;
+END$$;
+
+CREATE TRIGGER tg_revenue_fact_insert
+AFTER INSERT ON transaction
+REFERENCING NEW TABLE AS new_txns
+FOR EACH STATEMENT EXECUTE FUNCTION fn_revenue_fact_stmt();
+
+CREATE TRIGGER tg_revenue_fact_update
+AFTER UPDATE ON transaction
+REFERENCING OLD TABLE AS old_txns NEW TABLE AS new_txns
+FOR EACH STATEMENT EXECUTE FUNCTION fn_revenue_fact_stmt();
+
+CREATE TRIGGER tg_revenue_fact_delete
+AFTER DELETE ON transaction
+REFERENCING OLD TABLE AS old_txns
+FOR EACH STATEMENT EXECUTE FUNCTION fn_revenue_fact_stmt();
+
+-- Function: fn_revenue_fact_on_listing()
+-- Purpose: Moves a listing's transactions to its new category in revenue_fact
+-- Usage: Automatically called by trigger tg_revenue_fact_on_listing when listing.category_id changes
+CREATE OR REPLACE FUNCTION fn_revenue_fact_on_listing()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO revenue_fact AS f (category_id, payment_status, shipping_status, sale_date, txn_count, revenue)
+    SELECT v.category_id, t.payment_status, t.shipping_status, (t.transaction_date AT TIME ZONE 'UTC')::DATE,
+           SUM(v.sign), SUM(v.sign * t.final_price)
+    FROM v_transaction_history t
+    CROSS JOIN (VALUES (OLD.category_id, -1), (NEW.category_id, 1)) AS v(category_id, sign)
+    WHERE t.listing_id = NEW.listing_id
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (category_id, payment_status, shipping_status, sale_date) DO UPDATE
+       SET txn_count = f.txn_count + EXCLUDED.txn_count,
+           revenue = f.revenue + EXCLUDED.revenue;
+    DELETE FROM revenue_fact WHERE txn_count = 0;
+    RETURN NULL;
+END$$;
+
+CREATE TRIGGER tg_revenue_fact_on_listing
+AFTER UPDATE OF category_id ON listing
+FOR EACH ROW WHEN (OLD.category_id IS DISTINCT FROM NEW.category_id)
+EXECUTE FUNCTION fn_revenue_fact_on_listing();
+
+-- Function: refresh_revenue_fact()
+-- Purpose: Rebuilds revenue_fact from transaction (archived months included) and listing
+-- Business Rules:
+--   1. Writers to transaction/listing are blocked for the duration so no delta is lost
+-- Returns: Number of fact rows
+-- Usage: SELECT refresh_revenue_fact();
+-- Example: Run after bulk loads done with triggers disabled
+CREATE OR REPLACE FUNCTION refresh_revenue_fact()
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+    n INT;
+BEGIN
+    LOCK TABLE transaction, listing IN SHARE MODE;
+    DELETE FROM revenue_fact;
+    INSERT INTO revenue_fact (category_id, payment_status, shipping_status, sale_date, txn_count, revenue)
+    SELECT l.category_id, t.payment_status, t.shipping_status, (t.transaction_date AT TIME ZONE 'UTC')::DATE,
+           COUNT(*), SUM(t.final_price)
+    FROM v_transaction_history t
+    JOIN listing l ON l.listing_id = t.listing_id
+    GROUP BY 1, 2, 3, 4;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END$$;
+
+-- Function: bid_sketch_accuracy()
+-- Purpose: Relative accuracy of the bid sketches (alpha); gamma = (1 + alpha) / (1 - alpha)
+-- Usage: SELECT bid_sketch_accuracy();  -- 0.01
+CREATE OR REPLACE FUNCTION bid_sketch_accuracy()
+RETURNS NUMERIC LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT 0.01;
+$$;
+
+-- Function: bid_sketch_bucket()
+-- Purpose: Sketch bucket of a bid amount, ceil(log_gamma(amount))
+-- Business Rules:
+--   1. Amounts below 0.01 (a zero start price) share the bucket of 0.01
+-- Usage: SELECT bid_sketch_bucket(129.99);
+CREATE OR REPLACE FUNCTION bid_sketch_bucket(p_amount NUMERIC)
+RETURNS INT LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT CEIL(LN(GREATEST(p_amount, 0.01)::FLOAT8)
+                / LN(((1 + bid_sketch_accuracy()) / (1 - bid_sketch_accuracy()))::FLOAT8))::INT;
+$$;
+
+-- Function: bid_sketch_value()
+-- Purpose: Representative amount of a sketch bucket, 2 * gamma^k / (gamma + 1), in cents
+-- Business Rules:
+--   1. Within bid_sketch_accuracy() of every amount in the bucket (plus half a cent of rounding)
+-- Usage: SELECT bid_sketch_value(bid_sketch_bucket(129.99));  -- about 129.99
+CREATE OR REPLACE FUNCTION bid_sketch_value(p_bucket INT)
+RETURNS NUMERIC LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT ROUND((2 * POWER(g, p_bucket) / (g + 1))::NUMERIC, 2)
+    FROM (SELECT ((1 + bid_sketch_accuracy()) / (1 - bid_sketch_accuracy()))::FLOAT8 AS g) c;
+$$;
+
+-- Function: fn_bid_sketch_stmt()
+-- Purpose: Applies a statement's bid changes to the listing, category and overall bid sketches
+-- Business Rules:
+--   1. Changed bids are counted per (listing, bucket) first, so a bulk write is three upserts
+--   2. Rows are upserted in key order, so concurrent statements lock buckets in the same order
+--   3. Buckets left empty by deletes are removed
+-- Usage: Automatically called by the tg_bid_sketch_insert/update/delete triggers
+CREATE OR REPLACE FUNCTION fn_bid_sketch_stmt()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+DECLARE
+    v_listings INT[];
+    v_buckets INT[];
+    v_counts BIGINT[];
+BEGIN
+    -- transition tables exist only for their own event, so each builds its delta separately
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(listing_id), array_agg(bucket), array_agg(n)
+          INTO v_listings, v_buckets, v_counts
+          FROM (SELECT listing_id, bid_sketch_bucket(bid_amount) AS bucket, COUNT(*) AS n
+                FROM new_bids GROUP BY 1, 2) d;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(listing_id), array_agg(bucket), array_agg(n)
+          INTO v_listings, v_buckets, v_counts
+          FROM (SELECT listing_id, bid_sketch_bucket(bid_amount) AS bucket, -COUNT(*) AS n
+                FROM old_bids GROUP BY 1, 2) d;
+    ELSE
+        SELECT array_agg(listing_id), array_agg(bucket), array_agg(n)
+          INTO v_listings, v_buckets, v_counts
+          FROM (SELECT listing_id, bucket, SUM(sign) AS n
+                FROM (SELECT listing_id, bid_sketch_bucket(bid_amount) AS bucket, 1 AS sign FROM new_bids
+                      UNION ALL
+                      SELECT listing_id, bid_sketch_bucket(bid_amount), -1 FROM old_bids) c
+                GROUP BY 1, 2
+                HAVING SUM(sign) <> 0) d;
+    END IF;
+    IF v_listings IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    WITH d AS (
+        SELECT * FROM unnest(v_listings, v_buckets, v_counts) AS d(listing_id, bucket, n)
+    ), by_listing AS (
+        INSERT INTO bid_sketch_listing AS s (listing_id, bucket, n)
+        SELECT listing_id, bucket, n FROM d ORDER BY 1, 2
+        ON CONFLICT (listing_id, bucket) DO UPDATE SET n = s.n + EXCLUDED.n
+    ), by_stripe AS (
+        INSERT INTO bid_sketch_total AS s (stripe, bucket, n)
+        SELECT listing_id % 16, bucket, SUM(n) FROM d GROUP BY 1, 2 HAVING SUM(n) <> 0 ORDER BY 1, 2
+        ON CONFLICT (stripe, bucket) DO UPDATE SET n = s.n + EXCLUDED.n
+    )
+    INSERT INTO bid_sketch_category AS s (category_id, bucket, n)
+    SELECT l.category_id, d.bucket, SUM(d.n)
+    FROM d JOIN listing l ON l.listing_id = d.listing_id
+    GROUP BY 1, 2
+    HAVING SUM(d.n) <> 0
+    ORDER BY 1, 2
+    ON CONFLICT (category_id, bucket) DO UPDATE SET n = s.n + EXCLUDED.n;
+
+    IF TG_OP <> 'INSERT' THEN
+        DELETE FROM bid_sketch_listing WHERE n = 0;
+        DELETE FROM bid_sketch_category WHERE n = 0;
+        DELETE FROM bid_sketch_total WHERE n = 0;
+    END IF;
+    RETURN NULL;
+END$$;
+
+CREATE TRIGGER tg_bid_sketch_insert
+AFTER INSERT ON bid
+REFERENCING NEW TABLE AS new_bids
+FOR EACH STATEMENT EXECUTE FUNCTION fn_bid_sketch_stmt();
+
+CREATE TRIGGER tg_bid_sketch_update
+AFTER UPDATE ON bid
+REFERENCING OLD TABLE AS old_bids NEW TABLE AS new_bids
+FOR EACH STATEMENT EXECUTE FUNCTION fn_bid_sketch_stmt();
+
+CREATE TRIGGER tg_bid_sketch_delete
+AFTER DELETE ON bid
+REFERENCING OLD TABLE AS old_bids
+FOR EACH STATEMENT EXECUTE FUNCTION fn_bid_sketch_stmt();
+
+-- Function: fn_bid_sketch_on_listing()
+-- Purpose: Moves a listing's bid sketch to its new category in bid_sketch_category
+-- Usage: Automatically called by trigger tg_bid_sketch_on_listing when listing.category_id changes
+CREATE OR REPLACE FUNCTION fn_bid_sketch_on_listing()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO bid_sketch_category AS s (category_id, bucket, n)
+    SELECT v.category_id, b.bucket, v.sign * b.n
+    FROM bid_sketch_listing b
+    CROSS JOIN (VALUES (OLD.category_id, -1), (NEW.category_id, 1)) AS v(category_id, sign)
+    WHERE b.listing_id = NEW.listing_id
+    ORDER BY 1, 2
+    ON CONFLICT (category_id, bucket) DO UPDATE SET n = s.n + EXCLUDED.n;
+    DELETE FROM bid_sketch_category WHERE n = 0;
+    RETURN NULL;
+END$$;
+
+CREATE TRIGGER tg_bid_sketch_on_listing
+AFTER UPDATE OF category_id ON listing
+FOR EACH ROW WHEN (OLD.category_id IS DISTINCT FROM NEW.category_id)
+EXECUTE FUNCTION fn_bid_sketch_on_listing();
+
+-- Function: refresh_bid_sketches()
+-- Purpose: Rebuilds bid_sketch_listing, bid_sketch_category and bid_sketch_total from bid,
+-- archived months included
+-- Business Rules:
+--   1. Writers to bid/listing are blocked for the duration so no delta is lost
+-- Returns: Number of listing sketch rows
+-- Usage: SELECT refresh_bid_sketches();
+-- Example: Run after bulk loads done with triggers disabled
+CREATE OR REPLACE FUNCTION refresh_bid_sketches()
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+    v_rows INT;
+BEGIN
+    LOCK TABLE bid, listing IN SHARE MODE;
+    DELETE FROM bid_sketch_listing;
+    DELETE FROM bid_sketch_category;
+    DELETE FROM bid_sketch_total;
+    INSERT INTO bid_sketch_listing (listing_id, bucket, n)
+    SELECT listing_id, bid_sketch_bucket(bid_amount), COUNT(*)
+    FROM v_bid_history
+    GROUP BY 1, 2;
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    INSERT INTO bid_sketch_category (category_id, bucket, n)
+    SELECT l.category_id, s.bucket, SUM(s.n)
+    FROM bid_sketch_listing s
+    JOIN listing l ON l.listing_id = s.listing_id
+    GROUP BY 1, 2;
+    INSERT INTO bid_sketch_total (stripe, bucket, n)
+    SELECT listing_id % 16, bucket, SUM(n)
+    FROM bid_sketch_listing
+    GROUP BY 1, 2;
+    RETURN v_rows;
+END$$;
+
+-- Function: bid_amount_percentiles_approx()
+-- Purpose: Approximate bid_amount percentiles from the merged bid sketches
+-- Business Rules:
+--   1. Without filters, merges the stripes of bid_sketch_total (all bids); p_category_id reads
+--      one category's sketch, p_listing_id one listing's
+--   2. Interpolates between the bids at ranks floor/ceil(q * (n - 1)) like percentile_cont,
+--      so each result is within bid_sketch_accuracy() (1%) of the exact percentile
+--   3. Reads a few hundred sketch rows instead of sorting every bid
+-- Returns: One amount per requested quantile, NULL entries when there are no bids
+-- Usage: SELECT bid_amount_percentiles_approx(ARRAY[0.25, 0.5, 0.75]);
+-- Example: SELECT bid_amount_percentiles_approx(ARRAY[0.5, 0.99], p_category_id => 4);
+CREATE OR REPLACE FUNCTION bid_amount_percentiles_approx(
+    p_quantiles FLOAT8[], p_category_id INT DEFAULT NULL, p_listing_id INT DEFAULT NULL)
+RETURNS NUMERIC[] LANGUAGE sql STABLE AS $$
+    WITH merged AS (
+        SELECT bucket, SUM(n) AS n
+        FROM bid_sketch_total
+        WHERE p_listing_id IS NULL AND p_category_id IS NULL
+        GROUP BY bucket
+        UNION ALL
+        SELECT bucket, n FROM bid_sketch_category WHERE category_id = p_category_id AND p_listing_id IS NULL
+        UNION ALL
+        SELECT bucket, n FROM bid_sketch_listing WHERE listing_id = p_listing_id
+    ), ranked AS (
+        SELECT bucket, SUM(n) OVER (ORDER BY bucket) AS upto, SUM(n) OVER () AS total
+        FROM merged
+    ), ranks AS (
+        SELECT q.ord, q.q * (r.total - 1) AS pos
+        FROM unnest(p_quantiles) WITH ORDINALITY AS q(q, ord)
+        CROSS JOIN (SELECT total FROM ranked LIMIT 1) r
+    )
+    SELECT array_agg(v.amount ORDER BY q.ord)
+    FROM unnest(p_quantiles) WITH ORDINALITY AS q(q, ord)
+    LEFT JOIN ranks k ON k.ord = q.ord
+    LEFT JOIN LATERAL (
+        SELECT ROUND(lo.v + (k.pos - FLOOR(k.pos))::NUMERIC * (hi.v - lo.v), 2) AS amount
+        FROM (SELECT bid_sketch_value(bucket) AS v FROM ranked
+              WHERE upto > FLOOR(k.pos) ORDER BY bucket LIMIT 1) lo,
+             (SELECT bid_sketch_value(bucket) AS v FROM ranked
+              WHERE upto > CEIL(k.pos) ORDER BY bucket LIMIT 1) hi
+    ) v ON TRUE;
+$$;
+
+--  Time partitioning of bid and transaction 
+
+-- View: v_time_partitions
+-- Purpose: The monthly partitions of bid and transaction with their time range and size
+-- (archived months are partitions of archive.bid / archive.transaction and are not listed)
+-- Query Pattern: SELECT * FROM v_time_partitions ORDER BY parent_table, range_from
+CREATE OR REPLACE VIEW v_time_partitions AS
+SELECT p.relname AS parent_table, c.relname AS partition_name,
+       b[1]::TIMESTAMPTZ AS range_from, b[2]::TIMESTAMPTZ AS range_to,
+       GREATEST(c.reltuples, 0)::BIGINT AS estimated_rows,
+       pg_total_relation_size(c.oid) AS total_bytes
+FROM pg_inherits i
+JOIN pg_class p ON p.oid = i.inhparent
+JOIN pg_class c ON c.oid = i.inhrelid
+CROSS JOIN LATERAL regexp_match(pg_get_expr(c.relpartbound, c.oid), 'FROM \(''(.+)''\) TO \(''(.+)''\)') AS b
+WHERE i.inhparent IN ('bid'::REGCLASS, 'transaction'::REGCLASS);
+
+-- Function: create_time_partitions()
+-- Purpose: Creates the monthly partitions of bid or transaction covering p_from .. p_to
+-- Business Rules:
+--   1. One partition per calendar month in UTC, named <table>_yYYYYmMM (e.g. bid_y2026m10)
+--   2. Months already covered by a partition are skipped, so overlapping calls are safe
+--   3. Row triggers and indexes of the parent are added to each new partition automatically
+-- Returns: Number of partitions created
+-- Usage: SELECT create_time_partitions('bid', '2025-01-01', '2026-12-31');
+-- Example: datagen.py creates the months of its generated history before loading
+CREATE OR REPLACE FUNCTION create_time_partitions(p_table REGCLASS, p_from TIMESTAMPTZ, p_to TIMESTAMPTZ)
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+    v_parent  TEXT;
+    v_month   TIMESTAMPTZ;
+    v_next    TIMESTAMPTZ;
+    v_created INT := 0;
+BEGIN
+    SELECT relname INTO v_parent FROM pg_class WHERE oid = p_table;
+    FOR v_month IN SELECT generate_series(date_trunc('month', p_from, 'UTC'), p_to, INTERVAL '1 month', 'UTC') LOOP
+        v_next := date_add(v_month, INTERVAL '1 month', 'UTC');
+        CONTINUE WHEN EXISTS (SELECT 1 FROM v_time_partitions
+                              WHERE parent_table = v_parent AND range_from < v_next AND range_to > v_month);
+        EXECUTE format('CREATE TABLE %I PARTITION OF %s FOR VALUES FROM (%L) TO (%L)',
+                       v_parent || to_char(v_month AT TIME ZONE 'UTC', '"_y"YYYY"m"MM'), p_table, v_month, v_next);
+        v_created := v_created + 1;
+    END LOOP;
+    RETURN v_created;
+END$$;
+
+-- Function: ensure_time_partitions()
+-- Purpose: Keeps the partitions of bid and transaction ready from this month to p_months_ahead months ahead
+-- Business Rules:
+--   1. There is no default partition: a bid or transaction dated in a month without a partition
+--      is rejected, so this has to run at least once every p_months_ahead months
+-- Returns: Number of partitions created
+-- Usage: SELECT ensure_time_partitions();
+-- Example: The app and auction_closer.py run it at startup and every hour, ebay_service.py and
+--          ebay_async.py before they write bids or transactions
+CREATE OR REPLACE FUNCTION ensure_time_partitions(p_months_ahead INT DEFAULT 3)
+RETURNS INT LANGUAGE sql AS $$
+    SELECT create_time_partitions('bid', NOW(), date_add(NOW(), make_interval(months => p_months_ahead), 'UTC'))
+         + create_time_partitions('transaction', NOW(), date_add(NOW(), make_interval(months => p_months_ahead), 'UTC'));
+$$;
+
+-- Function: fn_ref_transaction_bid()
+-- Purpose: Enforces transaction.bid_id -> bid(bid_id), one transaction per bid and unique
+-- tracking numbers
+-- Business Rules:
+--   1. Every inserted transaction, or one whose bid_id changed, must name an existing bid
+--   2. No bid may have more than one transaction
+--   3. The named bids are locked FOR KEY SHARE, as a declared foreign key would lock them, so a
+--      concurrent delete of the bid waits for this transaction and then fails its own check
+--   4. One transaction-scoped advisory lock per bid, taken in bid_id order, serializes writers
+--      naming the same bid, so the second one's duplicate check sees the first one's row;
+--      a statement takes one lock per distinct bid (close_expired_listings: one per listing
+--      closed), which has to fit the server's lock table (max_locks_per_transaction)
+--   5. The bid_id lookups cannot be pruned to one partition, so this function (like
+--      fn_ref_feedback_transaction) keeps generic plans: re-planning them against every
+--      partition on each call cost more than the check itself
+--   6. Tracking numbers the statement set are claimed in transaction_tracking_number and the
+--      ones it replaced are released; its primary key rejects a duplicate, and a concurrent
+--      writer of the same tracking number waits for this transaction, as with a UNIQUE constraint
+-- Usage: Automatically called by the tg_ref_transaction_bid_* triggers
+CREATE OR REPLACE FUNCTION fn_ref_transaction_bid()
+RETURNS TRIGGER LANGUAGE plpgsql
+SET plan_cache_mode = force_generic_plan AS $$
+DECLARE
+    v_bids INT[];
+    v_bid  INT;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO transaction_tracking_number (tracking_number, transaction_id)
+        SELECT tracking_number, transaction_id FROM new_rows WHERE tracking_number IS NOT NULL;
+    ELSE
+        DELETE FROM transaction_tracking_number k
+        USING (SELECT tracking_number, transaction_id FROM old_rows
+               EXCEPT SELECT tracking_number, transaction_id FROM new_rows) o
+        WHERE k.tracking_number = o.tracking_number AND k.transaction_id = o.transaction_id;
+        INSERT INTO transaction_tracking_number (tracking_number, transaction_id)
+        SELECT tracking_number, transaction_id FROM new_rows WHERE tracking_number IS NOT NULL
+        EXCEPT SELECT tracking_number, transaction_id FROM old_rows;
+    END IF;
+
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT bid_id ORDER BY bid_id) INTO v_bids FROM new_rows;
+    ELSE
+        SELECT array_agg(DISTINCT n.bid_id ORDER BY n.bid_id) INTO v_bids
+        FROM new_rows n
+        WHERE NOT EXISTS (SELECT 1 FROM old_rows o WHERE o.transaction_id = n.transaction_id AND o.bid_id = n.bid_id);
+    END IF;
+    IF v_bids IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    FOREACH v_bid IN ARRAY v_bids LOOP
+        PERFORM pg_advisory_xact_lock(hashtext('transaction.bid_id'), v_bid);
+    END LOOP;
+    WITH locked AS MATERIALIZED (
+        SELECT bid_id FROM bid WHERE bid_id = ANY(v_bids) ORDER BY bid_id FOR KEY SHARE
+    )
+    SELECT x INTO v_bid FROM unnest(v_bids) AS x
+    WHERE x NOT IN (SELECT bid_id FROM locked)
+    LIMIT 1;
+    IF FOUND THEN
+        RAISE EXCEPTION 'Bid % does not exist', v_bid USING ERRCODE = 'foreign_key_violation';
+    END IF;
+    SELECT t.bid_id INTO v_bid FROM transaction t
+    WHERE t.bid_id = ANY(v_bids)
+    GROUP BY t.bid_id HAVING COUNT(*) > 1
+    LIMIT 1;
+    IF FOUND THEN
+        RAISE EXCEPTION 'Bid % already has a transaction', v_bid USING ERRCODE = 'unique_violation';
+    END IF;
+    RETURN NULL;
+END$$;
+
+CREATE TRIGGER tg_ref_transaction_bid_insert
+AFTER INSERT ON transaction
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION fn_ref_transaction_bid();
+
+CREATE TRIGGER tg_ref_transaction_bid_update
+AFTER UPDATE ON transaction
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION fn_ref_transaction_bid();
+
+-- Function: fn_ref_bid_delete()
+-- Purpose: The ON DELETE side of transaction.bid_id: bids that have a transaction cannot be deleted
+-- (live or archived bids, live or archived transactions)
+-- Usage: Automatically called by trigger tg_ref_bid_delete (purge_users deletes transactions first)
+CREATE OR REPLACE FUNCTION fn_ref_bid_delete()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+DECLARE
+    v_bid INT;
+BEGIN
+    SELECT t.bid_id INTO v_bid FROM v_transaction_history t
+    WHERE t.bid_id IN (SELECT bid_id FROM old_rows)
+    LIMIT 1;
+    IF FOUND THEN
+        RAISE EXCEPTION 'Bid % is still referenced by a transaction', v_bid USING ERRCODE = 'foreign_key_violation';
+    END IF;
+    RETURN NULL;
+END$$;
+
+CREATE TRIGGER tg_ref_bid_delete
+AFTER DELETE ON bid
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION fn_ref_bid_delete();
+
+-- Function: fn_ref_feedback_transaction()
+-- Purpose: Enforces feedback.transaction_id -> transaction(transaction_id)
+-- Business Rules:
+--   1. Every inserted or updated feedback row must name an existing transaction
+--   2. The named transactions are locked FOR KEY SHARE first, so a concurrent delete waits and then fails
+-- Usage: Automatically called by the tg_ref_feedback_transaction_* triggers
+CREATE OR REPLACE FUNCTION fn_ref_feedback_transaction()
+RETURNS TRIGGER LANGUAGE plpgsql
+SET plan_cache_mode = force_generic_plan AS $$
+DECLARE
+    v_txns INT[];
+    v_txn  INT;
+BEGIN
+    SELECT array_agg(DISTINCT transaction_id) INTO v_txns FROM new_rows;
+    WITH locked AS MATERIALIZED (
+        SELECT transaction_id FROM transaction WHERE transaction_id = ANY(v_txns)
+        ORDER BY transaction_id FOR KEY SHARE
+    )
+    SELECT x INTO v_txn FROM unnest(v_txns) AS x
+    WHERE x NOT IN (SELECT transaction_id FROM locked)
+    LIMIT 1;
+    IF FOUND THEN
+        RAISE EXCEPTION 'Transaction % does not exist', v_txn USING ERRCODE = 'foreign_key_violation';
+    END IF;
+    RETURN NULL;
+END$$;
+
+CREATE TRIGGER tg_ref_feedback_transaction_insert
+AFTER INSERT ON feedback
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION fn_ref_feedback_transaction();
+
+CREATE TRIGGER tg_ref_feedback_transaction_update
+AFTER UPDATE ON feedback
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION fn_ref_feedback_transaction();
+
+-- Function: fn_ref_transaction_delete()
+-- Purpose: The ON DELETE side of feedback.transaction_id: transactions with feedback cannot be deleted;
+-- also releases the tracking numbers of the deleted transactions
+-- Usage: Automatically called by trigger tg_ref_transaction_delete (purge_users deletes feedback first)
+CREATE OR REPLACE FUNCTION fn_ref_transaction_delete()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+DECLARE
+    v_txn INT;
+BEGIN
+    DELETE FROM transaction_tracking_number k
+    USING old_rows o
+    WHERE k.tracking_number = o.tracking_number AND k.transaction_id = o.transaction_id;
+    SELECT f.transaction_id INTO v_txn FROM feedback f
+    WHERE f.transaction_id IN (SELECT transaction_id FROM old_rows)
+    LIMIT 1;
+    IF FOUND THEN
+        RAISE EXCEPTION 'Transaction % is still referenced by feedback', v_txn USING ERRCODE = 'foreign_key_violation';
+    END IF;
+    RETURN NULL;
+END$$;
+
+CREATE TRIGGER tg_ref_transaction_delete
+AFTER DELETE ON transaction
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION fn_ref_transaction_delete();
+
+-- Function: refresh_transaction_tracking_numbers()
+-- Purpose: Rebuilds transaction_tracking_number from transaction (archived months included)
+-- Business Rules:
+--   1. Writers to transaction are blocked for the duration so no tracking number is missed
+--   2. Fails on transaction_tracking_number_key if two transactions share a tracking number
+-- Returns: Number of tracking numbers
+-- Usage: SELECT refresh_transaction_tracking_numbers();
+-- Example: Run after bulk loads done with triggers disabled, or after dropping archived months
+CREATE OR REPLACE FUNCTION refresh_transaction_tracking_numbers()
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+    n INT;
+BEGIN
+    LOCK TABLE transaction IN SHARE MODE;
+    DELETE FROM transaction_tracking_number;
+    INSERT INTO transaction_tracking_number (tracking_number, transaction_id)
+    SELECT tracking_number, transaction_id FROM v_transaction_history WHERE tracking_number IS NOT NULL;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END$$;
+
+-- Triggers on archive.bid / archive.transaction
+-- Purpose: purge_users() deletes archived rows too; these are the DELETE triggers of bid and
+-- transaction, so the high bid, listing_price_summary, the bid sketches, revenue_fact and
+-- transaction_tracking_number lose them as they would lose live rows, and the tg_ref_* checks
+-- still apply. Archived rows are never inserted or updated, so there are no other triggers
+-- Usage: Attached months get the row triggers automatically; the statement triggers fire on the
+-- parent
+CREATE TRIGGER tg_reset_high_bid
+AFTER DELETE ON archive.bid
+FOR EACH ROW EXECUTE FUNCTION fn_reset_high_bid();
+
+CREATE TRIGGER tg_summary_on_bid
+AFTER DELETE ON archive.bid
+FOR EACH ROW EXECUTE FUNCTION fn_summary_on_bid();
+
+CREATE TRIGGER tg_bid_sketch_delete
+AFTER DELETE ON archive.bid
+REFERENCING OLD TABLE AS old_bids
+FOR EACH STATEMENT EXECUTE FUNCTION fn_bid_sketch_stmt();
+
+CREATE TRIGGER tg_ref_bid_delete
+AFTER DELETE ON archive.bid
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION fn_ref_bid_delete();
+
+CREATE TRIGGER tg_revenue_fact_delete
+AFTER DELETE ON archive.transaction
+REFERENCING OLD TABLE AS old_txns
+FOR EACH STATEMENT EXECUTE FUNCTION fn_revenue_fact_stmt();
+
+CREATE TRIGGER tg_ref_transaction_delete
+AFTER DELETE ON archive.transaction
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION fn_ref_transaction_delete();
+
+--  Category tree 
+
+-- Function: fn_category_closure_insert()
+-- Purpose: Adds new categories to category_closure
+-- Business Rules:
+--   1. Each new category is its own ancestor at depth 0 and inherits every ancestor of its parent
+--   2. Reads the statement's transition table, so a multi-row INSERT may name a parent that is
+--      inserted by the same statement, in any row order
+--   3. Category writes take a SHARE ROW EXCLUSIVE lock on category_closure and so run one at a
+--      time; a concurrent move cannot leave a new category with stale ancestors
+-- Usage: Automatically called by trigger tg_category_closure_insert
+CREATE OR REPLACE FUNCTION fn_category_closure_insert()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    LOCK TABLE category_closure IN SHARE ROW EXCLUSIVE MODE;
+    INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+    WITH RECURSIVE up AS (
+        -- each new category, then its ancestors among the other new ones
+        SELECT n.category_id AS descendant_id, n.category_id AS ancestor_id, n.parent_id, 0 AS depth
+        FROM new_rows n
+        UNION ALL
+        SELECT up.descendant_id, n.category_id, n.parent_id, up.depth + 1
+        FROM up JOIN new_rows n ON n.category_id = up.parent_id
+    )
+    SELECT ancestor_id, descendant_id, depth FROM up
+    UNION ALL
+    -- the first existing ancestor brings its own ancestors along
+    SELECT c.ancestor_id, up.descendant_id, up.depth + 1 + c.depth
+    FROM up
+    JOIN category_closure c ON c.descendant_id = up.parent_id
+    WHERE up.parent_id NOT IN (SELECT category_id FROM new_rows);
+    RETURN NULL;
+END$$;
+
+CREATE TRIGGER tg_category_closure_insert
+AFTER INSERT ON category
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION fn_category_closure_insert();
+
+-- Function: fn_category_closure_move()
+-- Purpose: Moves a category's whole subtree in category_closure when its parent_id changes
+-- Business Rules:
+--   1. A category cannot be moved under itself or one of its own subcategories
+--   2. The links from the old ancestors to every category of the subtree are removed and the
+--      links from the new ancestors added; links inside the subtree are kept
+--   3. Serialized with the other category writes like fn_category_closure_insert, so two
+--      concurrent moves cannot build a cycle between them
+--   4. category.path is free text and is not rewritten
+-- Usage: Automatically called by trigger tg_category_closure_move
+-- Example: UPDATE category SET parent_id = 5 WHERE category_id = 12;  -- Sports and Outdoors under Fashion
+CREATE OR REPLACE FUNCTION fn_category_closure_move()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    LOCK TABLE category_closure IN SHARE ROW EXCLUSIVE MODE;
+    IF EXISTS (SELECT 1 FROM category_closure
+               WHERE ancestor_id = NEW.category_id AND descendant_id = NEW.parent_id) THEN
+        RAISE EXCEPTION 'Category % cannot be moved under its own subcategory %', NEW.category_id, NEW.parent_id;
+    END IF;
+
+    DELETE FROM category_closure c
+    USING category_closure a, category_closure d
+    WHERE a.descendant_id = NEW.category_id AND a.ancestor_id <> NEW.category_id
+      AND d.ancestor_id = NEW.category_id
+      AND c.ancestor_id = a.ancestor_id AND c.descendant_id = d.descendant_id;
+
+    INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+    SELECT a.ancestor_id, d.descendant_id, a.depth + d.depth + 1
+    FROM category_closure a
+    JOIN category_closure d ON d.ancestor_id = NEW.category_id
+    WHERE a.descendant_id = NEW.parent_id;
+    RETURN NULL;
+END$$;
+
+CREATE TRIGGER tg_category_closure_move
+AFTER UPDATE OF parent_id ON category
+FOR EACH ROW WHEN (OLD.parent_id IS DISTINCT FROM NEW.parent_id)
+EXECUTE FUNCTION fn_category_closure_move();
+
+-- Function: refresh_category_closure()
+-- Purpose: Rebuilds category_closure from category.parent_id
+-- Business Rules:
+--   1. Writers to category are blocked for the duration so no change is lost
+-- Returns: Number of closure rows
+-- Usage: SELECT refresh_category_closure();
+-- Example: Run after bulk loads done with triggers disabled
+CREATE OR REPLACE FUNCTION refresh_category_closure()
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+    n INT;
+BEGIN
+    LOCK TABLE category IN SHARE MODE;
+    DELETE FROM category_closure;
+    INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+    WITH RECURSIVE down AS (
+        SELECT category_id AS ancestor_id, category_id AS descendant_id, 0 AS depth FROM category
+        UNION ALL
+        SELECT down.ancestor_id, c.category_id, down.depth + 1
+        FROM down JOIN category c ON c.parent_id = down.descendant_id
+    )
+    SELECT ancestor_id, descendant_id, depth FROM down;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END$$;
+
+-- Function: category_children()
+-- Purpose: The direct subcategories of a category (the top-level categories for NULL), each with
+-- the listing counts and paid revenue of its whole subtree
+-- Business Rules:
+--   1. Subtrees are read from category_closure (ancestor_id = child), one indexed join whatever
+--      the depth, with no recursive CTE and no matching on category.path
+--   2. The subtrees of all children are joined to listing and revenue_fact together, so a level
+--      costs one pass however many children it has
+--   3. Revenue is paid transactions only, read from revenue_fact like the revenue ROLLUP
+-- Returns: category_id, name, parent_id, child_count (direct children), subcategories (all
+--          levels below), listings, active_listings, revenue
+-- Usage: SELECT * FROM category_children();    -- top level
+--        SELECT * FROM category_children(1);   -- under Electronics
+-- Example: Electronics -> 3 subcategories, 4 listings (4 active), 1240.00 revenue (seed data);
+--          the app's category browser loads one level each time a node is expanded
+CREATE OR REPLACE FUNCTION category_children(p_parent_id INT DEFAULT NULL)
+RETURNS TABLE (category_id INT, name TEXT, parent_id INT, child_count BIGINT,
+               subcategories BIGINT, listings BIGINT, active_listings BIGINT, revenue NUMERIC)
+LANGUAGE sql STABLE AS $$
+    WITH children AS (
+        SELECT c.category_id, c.name, c.parent_id
+        FROM category c
+        WHERE c.parent_id = p_parent_id OR (p_parent_id IS NULL AND c.parent_id IS NULL)
+    ), subtree AS MATERIALIZED (
+        SELECT s.ancestor_id, s.descendant_id, s.depth
+        FROM children c
+        JOIN category_closure s ON s.ancestor_id = c.category_id
+    ), listing_totals AS (
+        SELECT t.ancestor_id, COUNT(*) AS listings, COUNT(*) FILTER (WHERE l.status = 'active') AS active_listings
+        FROM subtree t
+        JOIN listing l ON l.category_id = t.descendant_id
+        GROUP BY t.ancestor_id
+    ), revenue_totals AS (
+        SELECT t.ancestor_id, SUM(f.revenue) AS revenue
+        FROM subtree t
+        JOIN revenue_fact f ON f.category_id = t.descendant_id AND f.payment_status = 'paid'
+        GROUP BY t.ancestor_id
+    ), tree_totals AS (
+        SELECT t.ancestor_id, COUNT(*) FILTER (WHERE t.depth = 1) AS child_count, COUNT(*) - 1 AS subcategories
+        FROM subtree t
+        GROUP BY t.ancestor_id
+    )
+    SELECT c.category_id, c.name, c.parent_id, n.child_count, n.subcategories,
+           COALESCE(l.listings, 0), COALESCE(l.active_listings, 0), COALESCE(r.revenue, 0)
+    FROM children c
+    JOIN tree_totals n ON n.ancestor_id = c.category_id
+    LEFT JOIN listing_totals l ON l.ancestor_id = c.category_id
+    LEFT JOIN revenue_totals r ON r.ancestor_id = c.category_id
+    ORDER BY c.name, c.category_id;
+$$;
+
+--  Listing search 
+
+-- Function: search_listings()
+-- Purpose: Ranked listing search on title and description, one keyset page at a time
+-- Business Rules:
+--   1. Every word of p_query must match, as a prefix, a word of the title or description
+--      (English stemming), so results appear while the last word is still being typed
+--   2. With the optional trigram index (pg_trgm), titles similar to p_query also match, which
+--      catches misspellings; its similarity is added to the rank
+--   3. Ranked by ts_rank_cd with title words weighted above description words, then listing_id
+--   4. Optional filters: category subtree (through category_closure), status, and a range on the
+--      current price (high bid, or start price without bids)
+--   5. Keyset pagination: pass the rank and listing_id of the last row of a page to get the next
+--      one; rows are never skipped or repeated the way OFFSET would while listings change
+--   6. A query with no searchable words (empty, punctuation, only stop words) returns no rows
+-- Parameters:
+--   - p_query: Search text as typed
+--   - p_category_id, p_status, p_min_price, p_max_price: Filters (NULL = any)
+--   - p_after_rank, p_after_id: Last row of the previous page (NULL = first page)
+--   - p_limit: Page size
+-- Returns: listing_id, title, category, status, current_price, end_date, rank
+-- Usage: SELECT * FROM search_listings('vintage cam', p_category_id => 1, p_status => 'active');
+-- Example: The app's search panel calls it on every pause in typing
+CREATE OR REPLACE FUNCTION search_listings(
+    p_query       TEXT,
+    p_category_id INT DEFAULT NULL,
+    p_status      TEXT DEFAULT NULL,
+    p_min_price   NUMERIC DEFAULT NULL,
+    p_max_price   NUMERIC DEFAULT NULL,
+    p_after_rank  REAL DEFAULT NULL,
+    p_after_id    INT DEFAULT NULL,
+    p_limit       INT DEFAULT 50
+)
+RETURNS TABLE (listing_id INT, title TEXT, category TEXT, status TEXT,
+               current_price NUMERIC, end_date TIMESTAMPTZ, rank REAL)
+LANGUAGE plpgsql STABLE AS $$
+DECLARE
+    v_query TSQUERY;
+    -- the trigram operators only exist with pg_trgm, hence the dynamic SQL below
+    v_fuzzy BOOLEAN := to_regclass('idx_listing_title_trgm') IS NOT NULL;
+BEGIN
+    SELECT to_tsquery('english', string_agg(quote_literal(w) || ':*', ' & ')) INTO v_query
+    FROM regexp_split_to_table(lower(p_query), '\W+') AS w
+    WHERE w <> '';
+    IF v_query IS NULL OR numnode(v_query) = 0 THEN
+        RETURN;
+    END IF;
+
+    RETURN QUERY EXECUTE format($sql$
+        SELECT m.listing_id, m.title, c.name, m.status, m.current_price, m.end_date, m.rank
+        FROM (
+            SELECT l.listing_id, l.title, l.category_id, l.status, l.end_date,
+                   COALESCE(l.high_bid, l.start_price) AS current_price,
+                   (ts_rank_cd(l.search_vector, $1) %s)::REAL AS rank
+            FROM listing l
+            WHERE (l.search_vector @@ $1 %s)
+              AND ($2::INT IS NULL
+                   OR l.category_id IN (SELECT s.descendant_id FROM category_closure s WHERE s.ancestor_id = $2))
+              AND ($3::TEXT IS NULL OR l.status = $3)
+              AND ($4::NUMERIC IS NULL OR COALESCE(l.high_bid, l.start_price) >= $4)
+              AND ($5::NUMERIC IS NULL OR COALESCE(l.high_bid, l.start_price) <= $5)
+        ) m
+        JOIN category c ON c.category_id = m.category_id
+        WHERE $6::REAL IS NULL OR m.rank < $6 OR (m.rank = $6 AND m.listing_id > $7)
+        ORDER BY m.rank DESC, m.listing_id
+        LIMIT $8
+    $sql$,
+        CASE WHEN v_fuzzy THEN '+ similarity(l.title, $9)' ELSE '' END,
+        CASE WHEN v_fuzzy THEN 'OR l.title % $9' ELSE '' END)
+    USING v_query, p_category_id, p_status, p_min_price, p_max_price, p_after_rank, p_after_id, p_limit, p_query;
+END$$;
+
 --  Seed data (15+ rows per table) 
+-- Partitions for the seed rows (dated up to a few days back) and the next three months
+SELECT create_time_partitions('bid', NOW() - INTERVAL '7 day', NOW());
+SELECT create_time_partitions('transaction', NOW() - INTERVAL '7 day', NOW());
+SELECT ensure_time_partitions();
+
 INSERT INTO user_account (username, email, user_type, account_status, rating, payment_methods, address, phone) VALUES
  ('alice','alice@example.com','both','active',4.8,'["visa"]','1 Main St','111-111-1111'),
  ('bob','bob@example.com','buyer','active',4.5,'["paypal"]','2 Main St','222-222-2222'),
@@ -358,16 +2045,17 @@ INSERT INTO feedback (transaction_id, author_user_id, target_user_id, rating, fe
 --   1. Display current bid price on listing pages (shows highest bid or starting price)
 --   2. Show popularity metrics (watcher count) to encourage bidding
 --   3. Quick overview of listing status and market activity
+-- Reads listing.high_bid and the trigger-maintained listing_price_summary, so a lookup
+-- is two primary-key probes instead of aggregating bids x watchers per listing
 -- Query Pattern: SELECT * FROM v_listing_current_price WHERE listing_id = ?
 -- Example: Used by frontend to display "Current bid: $360 (4 watchers)"
 CREATE OR REPLACE VIEW v_listing_current_price AS
 SELECT l.listing_id, l.title, l.status, l.end_date,
-       COALESCE(MAX(b.bid_amount), l.start_price) AS current_price,
-       COUNT(w.user_id) AS watcher_count
+       COALESCE(l.high_bid, l.start_price) AS current_price,
+       COALESCE(s.watcher_count, 0) AS watcher_count,
+       COALESCE(s.bid_count, 0) AS bid_count
 FROM listing l
-LEFT JOIN bid b ON b.listing_id = l.listing_id
-LEFT JOIN user_listing_watch w ON w.listing_id = l.listing_id
-GROUP BY l.listing_id;
+LEFT JOIN listing_price_summary s ON s.listing_id = l.listing_id;
 
 -- View: v_user_feedback_summary
 -- Purpose: Aggregates user feedback statistics for reputation display
@@ -375,15 +2063,16 @@ GROUP BY l.listing_id;
 --   1. Display user reputation scores on profile pages
 --   2. Show feedback summary in seller/buyer ratings
 --   3. Enable sorting/filtering users by reputation
+-- Reads the running aggregates on user_account, so a lookup is a primary-key probe
 -- Query Pattern: SELECT * FROM v_user_feedback_summary WHERE user_id = ?
 -- Example: Shows "User has 10 feedback, 4.5 average rating, 8 positive"
 CREATE OR REPLACE VIEW v_user_feedback_summary AS
-SELECT target_user_id AS user_id,
-       COUNT(*) AS total_feedback,
-       AVG(rating)::NUMERIC(4,2) AS avg_rating,
-       SUM(CASE WHEN feedback_type='positive' THEN 1 ELSE 0 END) AS positives
-FROM feedback
-GROUP BY target_user_id;
+SELECT user_id,
+       feedback_count AS total_feedback,
+       (feedback_sum::NUMERIC / feedback_count)::NUMERIC(4,2) AS avg_rating,
+       feedback_positive AS positives
+FROM user_account
+WHERE feedback_count > 0;
 
 --  Temporary Tables and Data Transformation 
 
@@ -413,20 +2102,28 @@ LIMIT 5;
 
 -- Additional Data Transformation Example: Calculate category revenue
 -- This demonstrates more complex business logic using temp tables
--- Calculates total revenue per category for business analytics
+-- Calculates total revenue per category for business analytics from the
+-- trigger-maintained revenue_fact table instead of re-aggregating transactions;
+-- a running MAX cannot be maintained through deletes, so highest_sale is still
+-- read from the paid transactions of each category that has any
 CREATE TEMP TABLE tmp_category_revenue ON COMMIT DROP AS
 SELECT 
-    c.category_id,
-    c.name AS category_name,
-    COUNT(DISTINCT t.transaction_id) AS transaction_count,
-    SUM(t.final_price) AS total_revenue,
-    AVG(t.final_price)::NUMERIC(12,2) AS avg_transaction_value,
-    MAX(t.final_price) AS highest_sale
-FROM category c
-LEFT JOIN listing l ON l.category_id = c.category_id
-LEFT JOIN transaction t ON t.listing_id = l.listing_id AND t.payment_status = 'paid'
-GROUP BY c.category_id, c.name
-HAVING COUNT(DISTINCT t.transaction_id) > 0
+    r.*,
+    (SELECT MAX(t.final_price)
+     FROM listing l
+     JOIN transaction t ON t.listing_id = l.listing_id AND t.payment_status = 'paid'
+     WHERE l.category_id = r.category_id) AS highest_sale
+FROM (
+    SELECT 
+        c.category_id,
+        c.name AS category_name,
+        SUM(f.txn_count) AS transaction_count,
+        SUM(f.revenue) AS total_revenue,
+        (SUM(f.revenue) / SUM(f.txn_count))::NUMERIC(12,2) AS avg_transaction_value
+    FROM category c
+    JOIN revenue_fact f ON f.category_id = c.category_id AND f.payment_status = 'paid'
+    GROUP BY c.category_id, c.name
+) r
 ORDER BY total_revenue DESC;
 
 --  Example queries to inspect results 
@@ -0,0 +1,702 @@
+"""
+Headless data-access layer for the `ebay_db` database (no Tkinter required).
+
+Every operation takes a psycopg2 connection as its first argument, runs in
+its own transaction and returns plain Python values (User / Listing
+dataclasses, ids, row tuples), so the desktop app, bench.py and scripts all
+share one implementation:
+
+- Users: validate_user, list_users (keyset pages), get_user, create_user,
+  create_users (one round trip per batch), update_user, purge_users.
+- Listings and bids: get_listing, place_bid, place_bids / load_bids (batched
+  through the place_bids() SQL function), finalize_listing, and
+  ensure_partitions, which creates the monthly partitions of bid and
+  transaction they write to; the CLI runs it before every write to those.
+- Analytics: run_query for any PREBUILT_QUERIES key; run_queries runs many
+  of them in parallel on a ConnectionPool, optionally all inside one
+  exported REPEATABLE READ Snapshot so their results agree with each other.
+  Both take approx=True to read the bid sketches where a query has an
+  approximate form; bid_percentiles answers arbitrary quantiles, overall
+  or for one category or listing, exactly or from the sketches.
+- Categories: category_children returns one level of the category tree,
+  each node with the listing counts and revenue of its whole subtree.
+- Search: search_listings runs a ranked full-text (and, with pg_trgm,
+  fuzzy title) search with category subtree, status and price filters, one
+  keyset page at a time.
+
+The hot user and listing statements are registered in STATEMENTS, PREPAREd
+once per connection and run with EXECUTE, so repeated calls skip parsing
+and planning; STATEMENTS.stats() reports calls and time per statement.
+
+Usage (prints JSON):
+  python ebay_service.py users --after 0 --limit 20
+  python ebay_service.py user 12
+  python ebay_service.py create-user alice alice@example.com --type both
+  python ebay_service.py update-user 12 alice alice@example.com --rating 4.5
+  python ebay_service.py delete-users 12 13
+  python ebay_service.py listing 5
+  python ebay_service.py bid 3 5 120.00
+  python ebay_service.py import-bids bids.csv
+  python ebay_service.py finalize 5
+  python ebay_service.py query agg_percentiles --row-cap 100
+  python ebay_service.py query agg_percentiles --approx
+  python ebay_service.py percentiles 0.5 0.9 0.99 --category 3 --approx
+  python ebay_service.py categories --parent 1
+  python ebay_service.py search "vintage camera" --category 1 --status active --max-price 200
+  python ebay_service.py dashboard --consistent
+
+For the same operations at high concurrency see `python bench.py run`.
+Connection settings come from the same PG* env vars as the app (see db.py).
+"""
+
+import argparse
+import csv
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from db import ConnectionPool, get_conn
+from queries import (
+    BID_PERCENTILES_APPROX_SQL,
+    BID_PERCENTILES_SQL,
+    CATEGORY_CHILDREN_SQL,
+    ENSURE_PARTITIONS_SQL,
+    FINALIZE_LISTING_SQL,
+    LISTING_SELECT_SQL,
+    PLACE_BID_SQL,
+    PARTITION_MONTHS_AHEAD,
+    PLACE_BIDS_SQL,
+    PREBUILT_QUERIES,
+    PURGE_USERS_SQL,
+    QUERY_CHUNK_ROWS,
+    QUERY_ROW_CAP,
+    SEARCH_LISTINGS_SQL,
+    SEARCH_PAGE_SIZE,
+    USER_INSERT_MANY_SQL,
+    USER_INSERT_SQL,
+    USER_PAGE_AFTER_SQL,
+    USER_PAGE_BEFORE_SQL,
+    USER_PAGE_SIZE,
+    USER_SELECT_SQL,
+    USER_SELECT_MANY_SQL,
+    USER_UPDATE_SQL,
+    query_sql,
+)
+from statements import StatementRegistry
+
+USER_TYPES = ("buyer", "seller", "both")
+ACCOUNT_STATUSES = ("active", "suspended", "closed")
+LISTING_STATUSES = ("active", "ended", "cancelled", "sold")
+
+# Isolation for every transaction sharing an exported snapshot
+SNAPSHOT_ISOLATION_SQL = "SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY"
+
+# Bulk bid import: rows sent to place_bids() per call/transaction
+BID_BATCH_SIZE = 5000
+
+
+class ValidationError(ValueError):
+    """Input rejected before it reaches the database; the message is user-facing."""
+
+
+class BidRejected(Exception):
+    """place_bid refused the bid (listing missing, not active or ended, bid too low)."""
+
+
+@dataclass
+class User:
+    user_id: Optional[int]
+    username: str
+    email: str
+    user_type: str = "buyer"
+    account_status: str = "active"
+    rating: Decimal = Decimal(0)
+
+
+@dataclass
+class Listing:
+    listing_id: int
+    seller_id: int
+    category_id: int
+    title: str
+    status: str
+    start_price: Decimal
+    high_bid: Optional[Decimal]
+    high_bidder_id: Optional[int]
+    end_date: datetime
+
+
+@dataclass
+class Category:
+    category_id: int
+    name: str
+    parent_id: Optional[int]
+    child_count: int
+    subcategories: int
+    listings: int
+    active_listings: int
+    revenue: Decimal
+
+
+@dataclass
+class SearchHit:
+    listing_id: int
+    title: str
+    category: str
+    status: str
+    current_price: Decimal
+    end_date: datetime
+    rank: float
+
+
+# Hot statements, PREPAREd once per connection (see statements.py)
+STATEMENTS = StatementRegistry()
+STATEMENTS.register("user_page_after", USER_PAGE_AFTER_SQL)
+STATEMENTS.register("user_page_before", USER_PAGE_BEFORE_SQL)
+STATEMENTS.register("user_select", USER_SELECT_SQL)
+STATEMENTS.register("user_select_many", USER_SELECT_MANY_SQL)
+STATEMENTS.register("user_insert", USER_INSERT_SQL)
+STATEMENTS.register("user_update", USER_UPDATE_SQL)
+STATEMENTS.register("listing_select", LISTING_SELECT_SQL)
+STATEMENTS.register("listing_search", SEARCH_LISTINGS_SQL)
+
+
+def validate_user(username, email, user_type="", account_status="", rating="", user_id=None):
+    """Build a User from form input, applying the app's defaults; raises ValidationError."""
+    username = (username or "").strip()
+    email = (email or "").strip()
+    user_type = (user_type or "").strip() or "buyer"
+    account_status = (account_status or "").strip() or "active"
+    rating = str(rating).strip() or 0
+    if not username or not email:
+        raise ValidationError("Username and email are required.")
+    if user_type not in USER_TYPES:
+        raise ValidationError("User type must be buyer, seller, or both.")
+    if account_status not in ACCOUNT_STATUSES:
+        raise ValidationError("Status must be active, suspended, or closed.")
+    try:
+        rating = float(rating)
+    except ValueError:
+        raise ValidationError("Rating must be numeric.") from None
+    if not 0 <= rating <= 5:
+        raise ValidationError("Rating must be between 0 and 5.")
+    return User(user_id, username, email, user_type, account_status, Decimal(str(rating)))
+
+
+def list_users(conn, anchor_id=0, forward=True, limit=USER_PAGE_SIZE):
+    """
+    One keyset page of users strictly after (or before) anchor_id, always in
+    ascending user_id order.
+    """
+    with conn:
+        with conn.cursor() as cur:
+            if forward:
+                STATEMENTS.execute(cur, "user_page_after", (anchor_id, limit))
+            else:
+                STATEMENTS.execute(cur, "user_page_before", (anchor_id, limit))
+            rows = [User(*r) for r in cur.fetchall()]
+    return rows if forward else rows[::-1]
+
+
+def get_user(conn, user_id):
+    with conn:
+        with conn.cursor() as cur:
+            STATEMENTS.execute(cur, "user_select", (user_id,))
+            row = cur.fetchone()
+    return User(*row) if row else None
+
+
+def get_users(conn, user_ids):
+    """The users among `user_ids` that still exist, in user_id order."""
+    with conn:
+        with conn.cursor() as cur:
+            STATEMENTS.execute(cur, "user_select_many", (list(user_ids),))
+            return [User(*r) for r in cur.fetchall()]
+
+
+def create_user(conn, user):
+    """Insert `user` and return its new user_id."""
+    with conn:
+        with conn.cursor() as cur:
+            STATEMENTS.execute(
+                cur, "user_insert",
+                (user.username, user.email, user.user_type, user.account_status, user.rating),
+            )
+            return cur.fetchone()[0]
+
+
+def create_users(conn, users, page_size=1000):
+    """Insert many users, `page_size` rows per statement, in one transaction; returns their ids in order."""
+    rows = [(u.username, u.email, u.user_type, u.account_status, u.rating) for u in users]
+    with conn:
+        with conn.cursor() as cur:
+            result = execute_values(
+                cur,
+                USER_INSERT_MANY_SQL,
+                rows,
+                page_size=page_size,
+                fetch=True,
+            )
+    return [r[0] for r in result]
+
+
+def update_user(conn, user):
+    """Save every field of `user`; returns False if the user no longer exists."""
+    with conn:
+        with conn.cursor() as cur:
+            STATEMENTS.execute(
+                cur, "user_update",
+                (user.username, user.email, user.user_type, user.account_status, user.rating, user.user_id),
+            )
+            return cur.rowcount == 1
+
+
+def purge_users(conn, user_ids):
+    """Delete users with everything that references them; returns [(table, rows deleted)]."""
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(PURGE_USERS_SQL, (list(user_ids),))
+            return cur.fetchall()
+
+
+def get_listing(conn, listing_id):
+    with conn:
+        with conn.cursor() as cur:
+            STATEMENTS.execute(cur, "listing_select", (listing_id,))
+            row = cur.fetchone()
+    return Listing(*row) if row else None
+
+
+def place_bid(conn, user_id, listing_id, amount, is_proxy=False):
+    """CALL place_bid; raises BidRejected with the server's reason if the bid is refused."""
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(PLACE_BID_SQL, (user_id, listing_id, amount, is_proxy))
+    except psycopg2.errors.RaiseException as exc:
+        raise BidRejected(exc.diag.message_primary or str(exc).strip()) from exc
+
+
+def place_bids(conn, bids):
+    """
+    Validate and store many (user_id, listing_id, amount, is_proxy) bids in
+    one place_bids() call and transaction. Returns [(ord, bid_id, reason)],
+    ord being the 1-based input position; rejected bids have bid_id None.
+    """
+    users, listings, amounts, proxies = (list(col) for col in zip(*bids)) if bids else ([], [], [], [])
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(PLACE_BIDS_SQL, (users, listings, amounts, proxies))
+            return cur.fetchall()
+
+
+def read_bid_csv(path):
+    """
+    Yield one item per data line of a CSV with a header of user_id,
+    listing_id, bid_amount and optional is_proxy: a (user_id, listing_id,
+    amount, is_proxy) tuple with a Decimal amount, or an error string if the
+    line cannot be parsed.
+    """
+    with open(path, newline="") as fh:
+        for r in csv.DictReader(fh):
+            try:
+                proxy = (r.get("is_proxy") or "false").strip().lower() in ("1", "t", "true", "yes")
+                try:
+                    amount = Decimal(r["bid_amount"].strip())
+                except ArithmeticError:
+                    amount = None
+                if amount is None or not amount.is_finite():
+                    raise ValueError(f"bid_amount {r['bid_amount']!r} is not a number")
+                yield int(r["user_id"]), int(r["listing_id"]), amount, proxy
+            except (KeyError, AttributeError, TypeError, ValueError) as exc:
+                yield f"Unparseable row: {exc}"
+
+
+def load_bids(conn, rows, batch_size=BID_BATCH_SIZE):
+    """
+    Bulk-load bids through place_bids(), one transaction per batch, so a
+    whole batch costs one round trip. `rows` yields (user_id, listing_id,
+    amount, is_proxy) tuples, or error strings for rows that could not be
+    parsed. Invalid bids do not stop the load.
+    Returns (accepted_bid_ids, rejects) where rejects is a list of
+    (row_number, reason) with 1-based row numbers.
+    """
+    accepted = []
+    rejects = []
+    batch = []
+    batch_rows = []
+
+    def flush():
+        if not batch:
+            return
+        for ord_, bid_id, reason in place_bids(conn, batch):
+            if bid_id is None:
+                rejects.append((batch_rows[ord_ - 1], reason))
+            else:
+                accepted.append(bid_id)
+        batch.clear()
+        batch_rows.clear()
+
+    for n, row in enumerate(rows, start=1):
+        if isinstance(row, str):
+            rejects.append((n, row))
+            continue
+        batch.append(row)
+        batch_rows.append(n)
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    return accepted, sorted(rejects)
+
+
+def finalize_listing(conn, listing_id):
+    """Close a listing through finalize_listing(); returns the new transaction_id, or None if unsold."""
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(FINALIZE_LISTING_SQL, (listing_id,))
+            return cur.fetchone()[0]
+
+
+def ensure_partitions(conn, months_ahead=PARTITION_MONTHS_AHEAD):
+    """Create the missing partitions up to `months_ahead` months ahead; returns how many were created."""
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(ENSURE_PARTITIONS_SQL, (months_ahead,))
+            return cur.fetchone()[0]
+
+
+class Snapshot:
+    """
+    A REPEATABLE READ snapshot exported from a connection checked out of
+    `pool`, for `importers` other connections to share (pg_export_snapshot /
+    SET TRANSACTION SNAPSHOT), so all of them see the database as of the same
+    instant. The exporting transaction only has to live until every importer
+    has attached; it is released after the last attach() or on close().
+    """
+
+    def __init__(self, pool, importers):
+        self.pool = pool
+        self.pending = importers
+        self.lock = threading.Lock()
+        self.conn = pool.getconn()
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute(SNAPSHOT_ISOLATION_SQL)
+                cur.execute("SELECT pg_export_snapshot()")
+                self.snapshot_id = cur.fetchone()[0]
+        except Exception:
+            self.pool.putconn(self.conn)
+            raise
+
+    def attach(self, conn):
+        """Make conn's current (not yet started) transaction use this snapshot."""
+        try:
+            with conn.cursor() as cur:
+                cur.execute(SNAPSHOT_ISOLATION_SQL)
+                cur.execute("SET TRANSACTION SNAPSHOT %s", (self.snapshot_id,))
+        finally:
+            with self.lock:
+                self.pending -= 1
+                last = self.pending <= 0
+            if last:
+                self.close()
+
+    def close(self):
+        with self.lock:
+            conn, self.conn = self.conn, None
+        if conn is not None:
+            conn.rollback()
+            self.pool.putconn(conn)
+
+
+def bid_percentiles(conn, quantiles, category_id=None, listing_id=None, approx=False):
+    """
+    Bid amount percentiles over all bids, one category's or one listing's
+    (listing_id wins over category_id). With `approx` they are merged from
+    the bid sketches instead of sorting the bids. Returns (values, relative
+    error bound); values are None when there are no bids.
+    """
+    quantiles = [float(q) for q in quantiles]
+    if any(not 0 <= q <= 1 for q in quantiles):
+        raise ValidationError("quantiles must be between 0 and 1")
+    if listing_id is not None:
+        category_id = None
+    with conn, conn.cursor() as cur:
+        if approx:
+            cur.execute(BID_PERCENTILES_APPROX_SQL, (quantiles, category_id, listing_id))
+        else:
+            cur.execute(BID_PERCENTILES_SQL, (quantiles, category_id, category_id, listing_id, listing_id))
+        values, error = cur.fetchone()
+    return values or [None] * len(quantiles), error
+
+
+def category_children(conn, parent_id=None):
+    """
+    The direct subcategories of `parent_id` (the top-level categories for
+    None), by name, as Category rows whose counts and revenue cover each
+    one's whole subtree.
+    """
+    with conn, conn.cursor() as cur:
+        cur.execute(CATEGORY_CHILDREN_SQL, (parent_id,))
+        return [Category(*r) for r in cur.fetchall()]
+
+
+def _price(value, name):
+    if value is None or str(value).strip() == "":
+        return None
+    try:
+        price = Decimal(str(value).strip())
+    except ArithmeticError:
+        raise ValidationError(f"{name} must be numeric.") from None
+    if not price.is_finite():
+        raise ValidationError(f"{name} must be numeric.")
+    if price < 0:
+        raise ValidationError(f"{name} cannot be negative.")
+    return price
+
+
+def search_listings(conn, text, category_id=None, status=None, min_price=None, max_price=None,
+                    after=None, limit=SEARCH_PAGE_SIZE):
+    """
+    One page of listings matching `text`, best match first, optionally only
+    under `category_id` (its whole subtree), with `status`, and with a
+    current price between `min_price` and `max_price` (numbers or form
+    strings; blank means no bound). `after` is the cursor returned with the
+    previous page. Returns (SearchHit list, cursor of the next page or None
+    when this is the last one); raises ValidationError on bad filters or a
+    `limit` below 1.
+    """
+    if limit < 1:
+        raise ValidationError("Page size must be at least 1.")
+    status = (status or "").strip() or None
+    if status is not None and status not in LISTING_STATUSES:
+        raise ValidationError("Status must be active, ended, cancelled, or sold.")
+    min_price = _price(min_price, "Minimum price")
+    max_price = _price(max_price, "Maximum price")
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise ValidationError("Minimum price is above the maximum price.")
+    after_rank, after_id = after or (None, None)
+    with conn:
+        with conn.cursor() as cur:
+            # one row more than a page tells whether there is a next page
+            STATEMENTS.execute(cur, "listing_search", (text, category_id, status, min_price, max_price,
+                                                       after_rank, after_id, limit + 1))
+            hits = [SearchHit(*r) for r in cur.fetchall()]
+    if len(hits) <= limit:
+        return hits, None
+    hits = hits[:limit]
+    return hits, (hits[-1].rank, hits[-1].listing_id)
+
+
+def run_query(conn, key, row_cap=QUERY_ROW_CAP, snapshot=None, approx=False):
+    """
+    Run PREBUILT_QUERIES[key] through a server-side cursor, reading at most
+    `row_cap` rows, inside `snapshot` if given; `approx` runs its
+    approximate form if it has one. Returns (column names, rows, truncated).
+    """
+    sql = query_sql(key, approx)
+    rows = []
+    with conn:
+        if snapshot is not None:
+            snapshot.attach(conn)
+        with conn.cursor(name="run_query") as cur:
+            cur.execute(sql)
+            while len(rows) < row_cap:
+                chunk = cur.fetchmany(min(QUERY_CHUNK_ROWS, row_cap - len(rows)))
+                rows.extend(chunk)
+                if not chunk:
+                    break
+            cols = [d[0] for d in cur.description]
+            truncated = len(rows) >= row_cap and bool(cur.fetchmany(1))
+    return cols, rows, truncated
+
+
+def run_queries(pool, keys=None, row_cap=QUERY_ROW_CAP, consistent=False, approx=False):
+    """
+    Run prebuilt queries in parallel, each on its own connection from `pool`;
+    with `consistent`, all of them read one exported snapshot, and with
+    `approx` those with an approximate form run that instead. Returns
+    {key: (cols, rows, truncated, seconds)}, a failed query mapping to its
+    exception instead.
+    """
+    keys = list(keys or PREBUILT_QUERIES)
+    snapshot = Snapshot(pool, len(keys)) if consistent else None
+
+    def timed(key):
+        started = time.monotonic()
+        # a snapshot is imported once per connection, so only plain reads are retried
+        cols, rows, truncated = pool.run(
+            lambda conn: run_query(conn, key, row_cap, snapshot, approx), retry=snapshot is None
+        )
+        return cols, rows, truncated, time.monotonic() - started
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(keys)) as executor:
+            futures = {key: executor.submit(timed, key) for key in keys}
+        return {key: f.exception() or f.result() for key, f in futures.items()}
+    finally:
+        if snapshot is not None:
+            snapshot.close()
+
+
+def json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("users", help="one keyset page of users")
+    p.add_argument("--after", type=int, default=0, help="list users with a larger user_id")
+    p.add_argument("--before", type=int, help="list users with a smaller user_id instead")
+    p.add_argument("--limit", type=int, default=USER_PAGE_SIZE)
+
+    p = sub.add_parser("user", help="show one user")
+    p.add_argument("user_id", type=int)
+
+    for name in ("create-user", "update-user"):
+        p = sub.add_parser(name, help=f"{name.split('-')[0]} a user")
+        if name == "update-user":
+            p.add_argument("user_id", type=int)
+        p.add_argument("username")
+        p.add_argument("email")
+        p.add_argument("--type", default="buyer", choices=USER_TYPES)
+        p.add_argument("--status", default="active", choices=ACCOUNT_STATUSES)
+        p.add_argument("--rating", default="0")
+
+    p = sub.add_parser("delete-users", help="purge users with their listings, bids and transactions")
+    p.add_argument("user_ids", type=int, nargs="+")
+
+    p = sub.add_parser("listing", help="show one listing")
+    p.add_argument("listing_id", type=int)
+
+    p = sub.add_parser("bid", help="place a bid")
+    p.add_argument("user_id", type=int)
+    p.add_argument("listing_id", type=int)
+    p.add_argument("amount", type=Decimal)
+    p.add_argument("--proxy", action="store_true")
+
+    p = sub.add_parser("import-bids", help="load a CSV of bids (user_id,listing_id,bid_amount[,is_proxy])")
+    p.add_argument("path")
+    p.add_argument("--batch-size", type=int, default=BID_BATCH_SIZE)
+
+    p = sub.add_parser("finalize", help="close a listing")
+    p.add_argument("listing_id", type=int)
+
+    p = sub.add_parser("query", help="run a prebuilt analytics query")
+    p.add_argument("key", choices=sorted(PREBUILT_QUERIES))
+    p.add_argument("--row-cap", type=int, default=QUERY_ROW_CAP)
+    p.add_argument("--approx", action="store_true", help="use the approximate form if the query has one")
+
+    p = sub.add_parser("percentiles", help="bid amount percentiles, exact or from the bid sketches")
+    p.add_argument("quantiles", type=float, nargs="+")
+    p.add_argument("--category", type=int, help="only bids on this category's listings")
+    p.add_argument("--listing", type=int, help="only bids on this listing")
+    p.add_argument("--approx", action="store_true", help="merge the bid sketches instead of sorting bids")
+
+    p = sub.add_parser("categories", help="one level of the category tree with subtree totals")
+    p.add_argument("--parent", type=int, help="list this category's subcategories (default: top level)")
+
+    p = sub.add_parser("search", help="ranked listing search, one page at a time")
+    p.add_argument("text")
+    p.add_argument("--category", type=int, help="only listings in this category's subtree")
+    p.add_argument("--status", choices=LISTING_STATUSES)
+    p.add_argument("--min-price")
+    p.add_argument("--max-price")
+    p.add_argument("--after", nargs=2, metavar=("RANK", "LISTING_ID"), help="cursor printed with the previous page")
+    p.add_argument("--limit", type=int, default=SEARCH_PAGE_SIZE)
+
+    p = sub.add_parser("dashboard", help="run every prebuilt query in parallel")
+    p.add_argument("--consistent", action="store_true", help="share one REPEATABLE READ snapshot")
+    p.add_argument("--row-cap", type=int, default=QUERY_ROW_CAP)
+    p.add_argument("--approx", action="store_true", help="use approximate forms where available")
+
+    args = parser.parse_args(argv)
+    if args.command == "dashboard":
+        pool = ConnectionPool(minconn=0)
+        try:
+            started = time.monotonic()
+            results = run_queries(pool, row_cap=args.row_cap, consistent=args.consistent, approx=args.approx)
+            wall = time.monotonic() - started
+        finally:
+            pool.closeall()
+        queries = {
+            key: {"error": str(r).strip()} if isinstance(r, Exception)
+            else {"rows": len(r[1]), "truncated": r[2], "seconds": round(r[3], 4)}
+            for key, r in results.items()
+        }
+        print(json.dumps({"consistent": args.consistent, "approx": args.approx, "wall_s": round(wall, 4),
+                          "queries": queries}, indent=2))
+        return 0
+    conn = get_conn()
+    try:
+        if args.command in ("bid", "import-bids", "finalize"):
+            ensure_partitions(conn)
+        if args.command == "users":
+            if args.before is not None:
+                result = [asdict(u) for u in list_users(conn, args.before, False, args.limit)]
+            else:
+                result = [asdict(u) for u in list_users(conn, args.after, True, args.limit)]
+        elif args.command == "user":
+            user = get_user(conn, args.user_id)
+            result = asdict(user) if user else None
+        elif args.command in ("create-user", "update-user"):
+            user = validate_user(args.username, args.email, args.type, args.status, args.rating,
+                                 getattr(args, "user_id", None))
+            if user.user_id is None:
+                result = {"user_id": create_user(conn, user)}
+            else:
+                result = {"user_id": user.user_id, "updated": update_user(conn, user)}
+        elif args.command == "delete-users":
+            result = dict(purge_users(conn, args.user_ids))
+        elif args.command == "listing":
+            listing = get_listing(conn, args.listing_id)
+            result = asdict(listing) if listing else None
+        elif args.command == "bid":
+            place_bid(conn, args.user_id, args.listing_id, args.amount, args.proxy)
+            result = {"accepted": True}
+        elif args.command == "import-bids":
+            accepted, rejects = load_bids(conn, read_bid_csv(args.path), args.batch_size)
+            result = {"accepted": len(accepted), "rejected": len(rejects), "rejects": rejects[:200]}
+        elif args.command == "finalize":
+            result = {"transaction_id": finalize_listing(conn, args.listing_id)}
+        elif args.command == "query":
+            cols, rows, truncated = run_query(conn, args.key, args.row_cap, approx=args.approx)
+            result = {"columns": cols, "rows": rows, "truncated": truncated}
+        elif args.command == "percentiles":
+            started = time.monotonic()
+            values, error = bid_percentiles(conn, args.quantiles, args.category, args.listing, args.approx)
+            result = {"quantiles": args.quantiles, "values": values, "relative_error": error,
+                      "seconds": round(time.monotonic() - started, 4)}
+        elif args.command == "search":
+            after = (float(args.after[0]), int(args.after[1])) if args.after else None
+            hits, cursor = search_listings(conn, args.text, args.category, args.status, args.min_price,
+                                           args.max_price, after, args.limit)
+            result = {"hits": [asdict(h) for h in hits], "next": cursor}
+        elif args.command == "categories":
+            result = [asdict(c) for c in category_children(conn, args.parent)]
+    except (ValidationError, BidRejected) as exc:
+        print(json.dumps({"error": str(exc)}))
+        return 1
+    finally:
+        conn.close()
+    print(json.dumps(result, indent=2, default=json_default))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,336 @@
+"""
+Index advisor for the `ebay_db` database (no Tkinter required).
+
+advise() runs every (label, sql, params) statement under
+EXPLAIN (ANALYZE, BUFFERS, VERBOSE) inside a transaction that is rolled back.
+Statements that write (INSERT/UPDATE/DELETE/MERGE) are only planned, not
+executed, unless analyze_writes=True: running them would still take row
+locks, fire triggers and advance sequences before the rollback. It then
+walks each plan and reports:
+
+- Seq Scans that filter or join on a column. The statement is planned again
+  with enable_seqscan off: if the table is still read in full (Seq Scan, or
+  an index scan without an index condition), no usable index exists and
+  an index is suggested (partial when the scan filters on a string constant,
+  covering via INCLUDE when it only needs a few more columns).
+- Full Seq Scans of tables with at least `min_rows` rows.
+- Sorts that spill to disk or sort at least `min_rows` rows, with an index
+  on the sort key when the sort sits directly on a scan.
+
+redundant_indexes() lists indexes whose columns are a leading prefix of
+another index on the same table.
+
+EXPLAIN shows a function call as a single node, so purge_statements() spells
+out the statements purge_users() runs for one set of users.
+"""
+
+import json
+import re
+
+import psycopg2
+
+from queries import PURGE_USERS_STEPS, PURGE_USERS_TARGETS_SQL
+
+SCAN_NODES = ("Seq Scan", "Index Scan", "Index Only Scan", "Bitmap Heap Scan")
+JOIN_KEYS = ("Hash Cond", "Merge Cond", "Join Filter")
+MAX_INCLUDE = 3
+
+_COMPARISON = r"\b{alias}\.(\w+)\s*(=|<>|<=|>=|<|>|~~\*?|IS)\s*(\S+)?"
+_WRITES = re.compile(r"^\s*(INSERT|UPDATE|DELETE|MERGE)\b", re.IGNORECASE)
+
+
+def _explain(cur, sql, params, analyze):
+    options = "ANALYZE, BUFFERS, VERBOSE, FORMAT JSON" if analyze else "VERBOSE, FORMAT JSON"
+    cur.execute(f"EXPLAIN ({options}) {sql}", params or None)
+    plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]
+
+
+def _rows(node):
+    """Rows a plan node produced: actual when analyzed, else the planner's estimate."""
+    if "Actual Rows" in node:
+        return node["Actual Rows"] * node.get("Actual Loops", 1)
+    return node.get("Plan Rows", 0)
+
+
+def _relation(node):
+    """Table a scan node reads, schema-qualified outside public (archived months)."""
+    schema = node.get("Schema", "public")
+    return node["Relation Name"] if schema == "public" else f"{schema}.{node['Relation Name']}"
+
+
+def _walk(node, join_conds=()):
+    """Yield (node, join conditions of the nearest enclosing join)."""
+    own = tuple(node[k] for k in JOIN_KEYS if k in node)
+    yield node, join_conds
+    for child in node.get("Plans", ()):
+        yield from _walk(child, own or join_conds)
+
+
+def _columns(text, alias):
+    """Split the columns of `alias` used in `text` into (equality, literal equality, other)."""
+    eq, literal, other = [], [], []
+    for col, op, rhs in re.findall(_COMPARISON.format(alias=re.escape(alias)), text or ""):
+        if op == "=" and rhs and rhs.startswith("'") and "::" in rhs:
+            target = literal
+        elif op == "=":
+            target = eq
+        else:
+            target = other
+        if col not in eq + literal + other:
+            target.append((col, rhs) if target is literal else col)
+    return eq, literal, [c for c in other if c not in eq]
+
+
+def _output_columns(node, alias):
+    cols = []
+    for expr in node.get("Output", ()):
+        m = re.fullmatch(rf"{re.escape(alias)}\.(\w+)", expr)
+        if m and m.group(1) not in cols:
+            cols.append(m.group(1))
+    return cols
+
+
+def _suggest(node, join_conds):
+    """(key columns, CREATE INDEX statement) for a filtering/joining Seq Scan, or None."""
+    table, alias = _relation(node), node.get("Alias", node["Relation Name"])
+    eq, literal, other = _columns(node.get("Filter"), alias)
+    for cond in join_conds:
+        for col in re.findall(rf"\b{re.escape(alias)}\.(\w+)", cond):
+            if col not in eq:
+                eq.append(col)
+        other = [c for c in other if c not in eq]
+    keys = eq + [c for c in other if c not in eq]
+    predicate = ""
+    if literal and keys:
+        predicate = " WHERE " + " AND ".join(f"{col} = {rhs.split('::')[0]}" for col, rhs in literal)
+    else:
+        keys = [col for col, _ in literal] + keys
+    if not keys:
+        return None
+    include = [c for c in _output_columns(node, alias) if c not in keys and c not in dict(literal)]
+    include_sql = f" INCLUDE ({', '.join(include)})" if include and len(include) <= MAX_INCLUDE else ""
+    name = f"idx_{node['Relation Name']}_{'_'.join(keys)}"
+    return keys, f"CREATE INDEX {name} ON {table} ({', '.join(keys)}){include_sql}{predicate};"
+
+
+def _leading_columns(cur, table):
+    """First key column of every non-partial index on `table`."""
+    cur.execute(
+        """
+        SELECT a.attname
+        FROM pg_index x
+        JOIN pg_attribute a ON a.attrelid = x.indrelid AND a.attnum = x.indkey[0]
+        WHERE x.indrelid = %s::regclass AND x.indpred IS NULL
+        """,
+        (table,),
+    )
+    return {r[0] for r in cur.fetchall()}
+
+
+def _table_rows(cur, table):
+    cur.execute("SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE oid = %s::regclass", (table,))
+    row = cur.fetchone()
+    return row[0] if row else 0
+
+
+def advise(conn, statements, min_rows=1000, analyze_writes=False):
+    """
+    Analyze `statements` ([(label, sql, params)]) and return one report per
+    statement: {label, estimated, time_ms, buffers: {hit, read}, findings:
+    [...], error}; estimated reports (writes, unless analyze_writes) have no
+    time or buffers. Each finding is {kind, relation, detail, suggestion}.
+    """
+    if analyze_writes and conn.autocommit:
+        raise ValueError("analyze_writes needs a connection outside autocommit, so the writes can be rolled back")
+    reports = []
+    with conn.cursor() as cur:
+        for label, sql, params in statements:
+            execute = analyze_writes or not _WRITES.match(sql)
+            report = {"label": label, "estimated": not execute, "time_ms": None, "buffers": None,
+                      "findings": [], "error": None}
+            reports.append(report)
+            try:
+                analyzed = _explain(cur, sql, params, analyze=execute)
+                conn.rollback()
+                cur.execute("SET LOCAL enable_seqscan = off")
+                forced = _explain(cur, sql, params, analyze=False)
+                forced_seq = {
+                    _relation(n) for n, _ in _walk(forced["Plan"])
+                    if n["Node Type"] == "Seq Scan"
+                    or (n["Node Type"] in SCAN_NODES and "Index Cond" not in n and "Recheck Cond" not in n)
+                }
+                plan = analyzed["Plan"]
+                if execute:
+                    report["time_ms"] = round(analyzed.get("Execution Time", 0.0), 3)
+                    report["buffers"] = {"hit": plan.get("Shared Hit Blocks", 0),
+                                         "read": plan.get("Shared Read Blocks", 0)}
+                report["findings"] = _findings(cur, plan, forced_seq, min_rows)
+            except psycopg2.Error as exc:
+                report["error"] = str(exc).strip()
+            finally:
+                conn.rollback()
+    return reports
+
+
+def _findings(cur, plan, forced_seq, min_rows):
+    findings = []
+    seen = set()
+    for node, join_conds in _walk(plan):
+        kind = node["Node Type"]
+        if kind == "Seq Scan":
+            table = _relation(node)
+            rows = _rows(node)
+            if "Actual Rows" in node:
+                removed = node.get("Rows Removed by Filter", 0) * node.get("Actual Loops", 1)
+                returned = f"Seq Scan returned {rows} rows, filtered out {removed}"
+            else:
+                returned = f"Seq Scan estimated at {rows} rows"
+            suggestion = _suggest(node, join_conds)
+            if suggestion and suggestion[0][0] in _leading_columns(cur, table):
+                # an index already leads with that column; reading the whole table was the plan's choice
+                suggestion = None
+            if suggestion:
+                suggestion = suggestion[1]
+                if table in forced_seq:
+                    key = ("missing", suggestion)
+                    if key not in seen:
+                        seen.add(key)
+                        findings.append({
+                            "kind": "missing index",
+                            "relation": table,
+                            "detail": f"{returned}; no index can serve it",
+                            "suggestion": suggestion,
+                        })
+                else:
+                    table_rows = _table_rows(cur, table)
+                    if table_rows >= min_rows:
+                        findings.append({
+                            "kind": "seq scan",
+                            "relation": table,
+                            "detail": f"planner chose a Seq Scan over an existing index ({table_rows} rows in table)",
+                            "suggestion": None,
+                        })
+            elif _table_rows(cur, table) >= min_rows:
+                findings.append({
+                    "kind": "full scan",
+                    "relation": table,
+                    "detail": f"reads all {rows} rows" if "Actual Rows" in node else f"reads all ~{rows} rows",
+                    "suggestion": None,
+                })
+        elif kind in ("Sort", "Incremental Sort"):
+            rows = _rows(node)
+            method = node.get("Sort Method", "")
+            spilled = "external" in method or node.get("Sort Space Type") == "Disk"
+            if not spilled and rows < min_rows:
+                continue
+            keys = node.get("Sort Key", [])
+            suggestion = None
+            child = node.get("Plans", [{}])[0]
+            if child.get("Node Type") in SCAN_NODES:
+                alias = child.get("Alias", "")
+                cols = []
+                for k in keys:
+                    m = re.fullmatch(rf"{re.escape(alias)}\.(\w+)( DESC)?", k)
+                    if not m:
+                        cols = []
+                        break
+                    cols.append(m.group(1) + (m.group(2) or ""))
+                table = _relation(child)
+                if cols and cols[0].split()[0] not in _leading_columns(cur, table):
+                    suggestion = f"CREATE INDEX idx_{child['Relation Name']}_{'_'.join(c.split()[0] for c in cols)} ON {table} ({', '.join(cols)});"
+            findings.append({
+                "kind": "expensive sort",
+                "relation": _relation(child) if "Relation Name" in child else None,
+                "detail": f"{method or 'sort'} of {rows} rows on {', '.join(keys)}"
+                          + (f", {node.get('Sort Space Used')} kB on disk" if spilled else ""),
+                "suggestion": suggestion,
+            })
+    return findings
+
+
+def redundant_indexes(conn):
+    """
+    [(table, index, covered_by)] for non-unique, non-partial indexes whose key
+    columns are a leading prefix of another index on the same table.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT t.relname, i.relname, x.indkey::int2[], x.indisunique, x.indpred IS NOT NULL,
+                   x.indnkeyatts
+            FROM pg_index x
+            JOIN pg_class i ON i.oid = x.indexrelid
+            JOIN pg_class t ON t.oid = x.indrelid
+            JOIN pg_namespace n ON n.oid = t.relnamespace
+            WHERE n.nspname = 'public'
+            """
+        )
+        rows = cur.fetchall()
+    conn.rollback()
+    found = []
+    for table, index, keys, unique, partial, nkeys in rows:
+        if unique or partial:
+            continue
+        keys = list(keys[:nkeys])
+        for other_table, other, other_keys, _, other_partial, other_nkeys in rows:
+            if other_table != table or other == index or other_partial:
+                continue
+            other_keys = list(other_keys[:other_nkeys])
+            if len(other_keys) >= len(keys) and other_keys[:len(keys)] == keys and (len(other_keys) > len(keys) or other < index):
+                found.append((table, index, other))
+                break
+    return sorted(found)
+
+
+def purge_statements(conn, user_ids):
+    """
+    [(label, sql, params)] of the statements purge_users(user_ids) runs, for
+    advise(): the listings and transactions it would remove are looked up
+    first, as purge_users() does, so the DELETEs get the same arguments.
+    """
+    with conn.cursor() as cur:
+        cur.execute(PURGE_USERS_TARGETS_SQL, {"users": list(user_ids)})
+        listings, txns = cur.fetchone()
+    conn.rollback()
+    params = {"users": list(user_ids), "listings": listings, "txns": txns}
+    statements = [("purge_users: find listings and transactions", PURGE_USERS_TARGETS_SQL, params)]
+    statements += [(f"purge_users: {label}", sql, params) for label, sql in PURGE_USERS_STEPS]
+    return statements
+
+
+def format_report(reports, redundant=()):
+    lines = []
+    suggestions = []
+    for r in reports:
+        head = f"== {r['label']}"
+        if r["error"]:
+            lines.append(f"{head}: ERROR {r['error']}")
+            continue
+        if r.get("estimated"):
+            lines.append(f"{head}: estimated plan (writes are planned, not run)")
+        else:
+            lines.append(f"{head}: {r['time_ms']} ms, buffers hit={r['buffers']['hit']} read={r['buffers']['read']}")
+        if not r["findings"]:
+            lines.append("   ok")
+        for f in r["findings"]:
+            where = f" {f['relation']}" if f["relation"] else ""
+            lines.append(f"   [{f['kind']}]{where}: {f['detail']}")
+            if f["suggestion"]:
+                lines.append(f"      -> {f['suggestion']}")
+                name = f["suggestion"].split()[2]
+                if all(s.split()[2] != name for s in suggestions):
+                    suggestions.append(f["suggestion"])
+    if redundant:
+        lines.append("")
+        lines.append("Redundant indexes:")
+        for table, index, covered_by in redundant:
+            lines.append(f"   {table}.{index} is a prefix of {covered_by}")
+            suggestions.append(f"DROP INDEX {index};")
+    if suggestions:
+        lines.append("")
+        lines.append("Suggested DDL:")
+        lines.extend(f"   {s}" for s in suggestions)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,23 @@
+"""
+Latency statistics shared by bench.py and auction_closer.py (no database or
+Tkinter required).
+"""
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list (p in 0..100)."""
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def latency_summary(seconds):
+    """p50/p95/p99/max of a list of durations, in milliseconds."""
+    ms = sorted(round(s * 1000, 3) for s in seconds)
+    return {
+        "p50": percentile(ms, 50),
+        "p95": percentile(ms, 95),
+        "p99": percentile(ms, 99),
+        "max": ms[-1] if ms else None,
+    }
@@ -0,0 +1,41 @@
+-- Migration 001: foreign-key and covering indexes for the app's query mix
+-- Purpose: Brings an existing ebay_db up to the indexes defined in ebay_db.sql
+--          (fresh installs created from ebay_db.sql already have them)
+-- Source: File > Index advisor in crud_app.py (index_advisor.py), run over the
+--         prebuilt queries, the CRUD statements and purge_users()
+-- Notes:
+--   1. CREATE/DROP INDEX CONCURRENTLY does not block writes but cannot run inside a
+--      transaction block, so run this file with plain psql (no --single-transaction)
+--   2. Every statement is idempotent; re-running the file is safe
+--   3. A failed CONCURRENTLY build leaves an INVALID index behind; drop it and re-run
+--   4. purge_users() keeps an index for every lookup it makes: the two indexes dropped
+--      here (idx_watch_listing, idx_feedback_transaction) are taken over by
+--      idx_watch_listing_user and by the UNIQUE (transaction_id, author_user_id) constraint
+-- Usage: psql -d ebay_db -f migrations/001_query_mix_indexes.sql
+
+-- Foreign-key lookups (purge_users, FK checks on delete, the EXCEPT never-bidded query)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_bid_user ON bid (user_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_transaction_buyer ON transaction (buyer_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_transaction_seller ON transaction (seller_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_transaction_listing ON transaction (listing_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_feedback_author ON feedback (author_user_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_listing_high_bidder ON listing (high_bidder_id)
+    WHERE high_bidder_id IS NOT NULL;
+
+-- Watcher counts: a covering listing_id index replaces the plain one (purge_users uses either)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_watch_listing_user ON user_listing_watch (listing_id) INCLUDE (user_id);
+DROP INDEX CONCURRENTLY IF EXISTS idx_watch_listing;
+
+-- Revenue rollups over paid transactions
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_transaction_paid_listing ON transaction (listing_id) INCLUDE (final_price)
+    WHERE payment_status = 'paid';
+
+-- Buyer/seller role lists
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_account_type ON user_account (user_type) INCLUDE (username);
+
+-- Redundant: the primary key (user_id, listing_id) already serves user_id lookups
+DROP INDEX CONCURRENTLY IF EXISTS idx_watch_user;
+-- Redundant: UNIQUE (transaction_id, author_user_id) already serves transaction_id lookups
+DROP INDEX CONCURRENTLY IF EXISTS idx_feedback_transaction;
+
+ANALYZE bid, transaction, feedback, listing, user_listing_watch, user_account;
@@ -0,0 +1,65 @@
+-- Migration 002: row-level change notifications for user_account
+-- Purpose: Brings an existing ebay_db up to the user_account NOTIFY triggers defined in ebay_db.sql
+--          (fresh installs created from ebay_db.sql already have them)
+-- Source: crud_app.py patches its user list from these notifications instead of reloading it
+-- Notes:
+--   1. Every statement is idempotent; re-running the file is safe
+-- Usage: psql -d ebay_db -f migrations/002_user_change_notify.sql
+
+-- Function: fn_notify_user_change()
+-- Purpose: Publishes which user_account rows a statement changed so clients can patch their user list
+-- Business Rules:
+--   1. Sends NOTIFY on channel 'user_account_change' with payload '<op>:<ids>', where <op> is
+--      I, U or D and <ids> is a comma-separated list of the affected user_ids
+--   2. Fires once per statement and reads the transition table, so a multi-row write is one notification
+--   3. Statements touching more than 500 rows send '<op>:*' instead; clients reload their list
+--   4. Notifications are only delivered when the writing transaction commits
+-- Usage: Automatically called by the tg_notify_user_* triggers below
+-- Example: UPDATE user_account SET rating = 4.9 WHERE user_id = 3 delivers payload 'U:3'
+CREATE OR REPLACE FUNCTION fn_notify_user_change()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+DECLARE
+    v_count INT;
+    v_ids TEXT;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        SELECT COUNT(*) INTO v_count FROM old_rows;
+    ELSE
+        SELECT COUNT(*) INTO v_count FROM new_rows;
+    END IF;
+
+    IF v_count = 0 THEN
+        RETURN NULL;
+    ELSIF v_count > 500 THEN
+        v_ids := '*';
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT string_agg(user_id::TEXT, ',') INTO v_ids FROM old_rows;
+    ELSE
+        SELECT string_agg(user_id::TEXT, ',') INTO v_ids FROM new_rows;
+    END IF;
+
+    PERFORM pg_notify('user_account_change', left(TG_OP, 1) || ':' || v_ids);
+    RETURN NULL;
+END$$;
+
+-- Triggers: tg_notify_user_insert, tg_notify_user_update, tg_notify_user_delete
+-- Purpose: Announce row-level changes to user_account (one trigger per event, as transition tables require)
+-- When: AFTER INSERT, UPDATE or DELETE, once per statement
+-- Business Impact: Every open desktop app patches just the changed rows of its user list, live
+DROP TRIGGER IF EXISTS tg_notify_user_insert ON user_account;
+CREATE TRIGGER tg_notify_user_insert
+AFTER INSERT ON user_account
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION fn_notify_user_change();
+
+DROP TRIGGER IF EXISTS tg_notify_user_update ON user_account;
+CREATE TRIGGER tg_notify_user_update
+AFTER UPDATE ON user_account
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION fn_notify_user_change();
+
+DROP TRIGGER IF EXISTS tg_notify_user_delete ON user_account;
+CREATE TRIGGER tg_notify_user_delete
+AFTER DELETE ON user_account
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION fn_notify_user_change();
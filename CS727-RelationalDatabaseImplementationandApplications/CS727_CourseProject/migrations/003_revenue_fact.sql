@@ -0,0 +1,164 @@
+-- Migration 003: incrementally maintained revenue fact table
+-- Purpose: Brings an existing ebay_db up to the revenue_fact table, its triggers and
+--          refresh_revenue_fact() defined in ebay_db.sql (fresh installs already have them)
+-- Source: the revenue ROLLUP/CUBE queries in queries.py now read revenue_fact instead of
+--         re-aggregating transaction, which leaves idx_transaction_paid_listing unused
+-- Notes:
+--   1. The table, triggers and initial fill run in one transaction, so no transaction
+--      written meanwhile is missed; refresh_revenue_fact() blocks writers while it runs
+--   2. DROP INDEX CONCURRENTLY cannot run inside a transaction block, so run this file
+--      with plain psql (no --single-transaction)
+--   3. Every statement is idempotent; re-running the file is safe
+-- Usage: psql -d ebay_db -f migrations/003_revenue_fact.sql
+
+BEGIN;
+
+-- Table: revenue_fact
+-- Purpose: Transaction count and revenue per category x payment_status x shipping_status x day,
+-- the fact table behind the revenue ROLLUP/CUBE queries (a few rows per category and day
+-- instead of one per transaction)
+-- sale_date is the UTC day of transaction_date, so it does not depend on the session time zone
+-- Maintained incrementally by the tg_revenue_fact_* triggers on transaction and listing;
+-- refresh_revenue_fact() rebuilds it from scratch
+CREATE TABLE IF NOT EXISTS revenue_fact (
+    category_id     INT NOT NULL REFERENCES category(category_id) ON DELETE CASCADE,
+    payment_status  TEXT NOT NULL,
+    shipping_status TEXT NOT NULL,
+    sale_date       DATE NOT NULL,
+    txn_count       BIGINT NOT NULL,
+    revenue         NUMERIC(14,2) NOT NULL,
+    PRIMARY KEY (category_id, payment_status, shipping_status, sale_date)
+);
+
+-- Lets the revenue_fact triggers find emptied groups without scanning the fact table
+-- The partial index only holds groups whose last transaction was just removed, so it stays near-empty
+-- Query pattern: DELETE FROM revenue_fact WHERE txn_count = 0
+CREATE INDEX IF NOT EXISTS idx_revenue_fact_empty ON revenue_fact (category_id) WHERE txn_count = 0;
+
+-- Function: fn_revenue_fact_stmt()
+-- Purpose: Applies a statement's transaction changes to revenue_fact as per-group deltas
+-- Business Rules:
+--   1. Inserted rows add to their group, deleted rows subtract, updated rows move between groups
+--   2. The changed rows are aggregated first, so a bulk write is one upsert, not one per row
+--   3. Groups left with no transactions are removed
+-- Usage: Automatically called by the tg_revenue_fact_insert/update/delete triggers
+CREATE OR REPLACE FUNCTION fn_revenue_fact_stmt()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    -- transition tables exist only for their own event, hence one statement per TG_OP
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO revenue_fact AS f (category_id, payment_status, shipping_status, sale_date, txn_count, revenue)
+        SELECT l.category_id, n.payment_status, n.shipping_status, (n.transaction_date AT TIME ZONE 'UTC')::DATE,
+               COUNT(*), SUM(n.final_price)
+        FROM new_txns n
+        JOIN listing l ON l.listing_id = n.listing_id
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT (category_id, payment_status, shipping_status, sale_date) DO UPDATE
+           SET txn_count = f.txn_count + EXCLUDED.txn_count,
+               revenue = f.revenue + EXCLUDED.revenue;
+        RETURN NULL;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE revenue_fact f
+           SET txn_count = f.txn_count - d.n,
+               revenue = f.revenue - d.amount
+          FROM (SELECT l.category_id, o.payment_status, o.shipping_status,
+                       (o.transaction_date AT TIME ZONE 'UTC')::DATE AS sale_date,
+                       COUNT(*) AS n, SUM(o.final_price) AS amount
+                FROM old_txns o
+                JOIN listing l ON l.listing_id = o.listing_id
+                GROUP BY 1, 2, 3, 4) d
+         WHERE (f.category_id, f.payment_status, f.shipping_status, f.sale_date)
+             = (d.category_id, d.payment_status, d.shipping_status, d.sale_date);
+    ELSE
+        INSERT INTO revenue_fact AS f (category_id, payment_status, shipping_status, sale_date, txn_count, revenue)
+        SELECT l.category_id, d.payment_status, d.shipping_status, (d.transaction_date AT TIME ZONE 'UTC')::DATE,
+               SUM(d.sign), SUM(d.sign * d.final_price)
+        FROM (SELECT listing_id, payment_status, shipping_status, transaction_date, final_price, 1 AS sign
+              FROM new_txns
+              UNION ALL
+              SELECT listing_id, payment_status, shipping_status, transaction_date, final_price, -1
+              FROM old_txns) d
+        JOIN listing l ON l.listing_id = d.listing_id
+        GROUP BY 1, 2, 3, 4
+        HAVING SUM(d.sign) <> 0 OR SUM(d.sign * d.final_price) <> 0
+        ON CONFLICT (category_id, payment_status, shipping_status, sale_date) DO UPDATE
+           SET txn_count = f.txn_count + EXCLUDED.txn_count,
+               revenue = f.revenue + EXCLUDED.revenue;
+    END IF;
+    DELETE FROM revenue_fact WHERE txn_count = 0;
+    RETURN NULL;
+END$$;
+
+DROP TRIGGER IF EXISTS tg_revenue_fact_insert ON transaction;
+CREATE TRIGGER tg_revenue_fact_insert
+AFTER INSERT ON transaction
+REFERENCING NEW TABLE AS new_txns
+FOR EACH STATEMENT EXECUTE FUNCTION fn_revenue_fact_stmt();
+
+DROP TRIGGER IF EXISTS tg_revenue_fact_update ON transaction;
+CREATE TRIGGER tg_revenue_fact_update
+AFTER UPDATE ON transaction
+REFERENCING OLD TABLE AS old_txns NEW TABLE AS new_txns
+FOR EACH STATEMENT EXECUTE FUNCTION fn_revenue_fact_stmt();
+
+DROP TRIGGER IF EXISTS tg_revenue_fact_delete ON transaction;
+CREATE TRIGGER tg_revenue_fact_delete
+AFTER DELETE ON transaction
+REFERENCING OLD TABLE AS old_txns
+FOR EACH STATEMENT EXECUTE FUNCTION fn_revenue_fact_stmt();
+
+-- Function: fn_revenue_fact_on_listing()
+-- Purpose: Moves a listing's transactions to its new category in revenue_fact
+-- Usage: Automatically called by trigger tg_revenue_fact_on_listing when listing.category_id changes
+CREATE OR REPLACE FUNCTION fn_revenue_fact_on_listing()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO revenue_fact AS f (category_id, payment_status, shipping_status, sale_date, txn_count, revenue)
+    SELECT v.category_id, t.payment_status, t.shipping_status, (t.transaction_date AT TIME ZONE 'UTC')::DATE,
+           SUM(v.sign), SUM(v.sign * t.final_price)
+    FROM transaction t
+    CROSS JOIN (VALUES (OLD.category_id, -1), (NEW.category_id, 1)) AS v(category_id, sign)
+    WHERE t.listing_id = NEW.listing_id
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (category_id, payment_status, shipping_status, sale_date) DO UPDATE
+       SET txn_count = f.txn_count + EXCLUDED.txn_count,
+           revenue = f.revenue + EXCLUDED.revenue;
+    DELETE FROM revenue_fact WHERE txn_count = 0;
+    RETURN NULL;
+END$$;
+
+DROP TRIGGER IF EXISTS tg_revenue_fact_on_listing ON listing;
+CREATE TRIGGER tg_revenue_fact_on_listing
+AFTER UPDATE OF category_id ON listing
+FOR EACH ROW WHEN (OLD.category_id IS DISTINCT FROM NEW.category_id)
+EXECUTE FUNCTION fn_revenue_fact_on_listing();
+
+-- Function: refresh_revenue_fact()
+-- Purpose: Rebuilds revenue_fact from transaction and listing
+-- Business Rules:
+--   1. Writers to transaction/listing are blocked for the duration so no delta is lost
+-- Returns: Number of fact rows
+-- Usage: SELECT refresh_revenue_fact();
+-- Example: Run after bulk loads done with triggers disabled
+CREATE OR REPLACE FUNCTION refresh_revenue_fact()
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+    n INT;
+BEGIN
+    LOCK TABLE transaction, listing IN SHARE MODE;
+    DELETE FROM revenue_fact;
+    INSERT INTO revenue_fact (category_id, payment_status, shipping_status, sale_date, txn_count, revenue)
+    SELECT l.category_id, t.payment_status, t.shipping_status, (t.transaction_date AT TIME ZONE 'UTC')::DATE,
+           COUNT(*), SUM(t.final_price)
+    FROM transaction t
+    JOIN listing l ON l.listing_id = t.listing_id
+    GROUP BY 1, 2, 3, 4;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END$$;
+
+SELECT refresh_revenue_fact();
+
+COMMIT;
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_transaction_paid_listing;
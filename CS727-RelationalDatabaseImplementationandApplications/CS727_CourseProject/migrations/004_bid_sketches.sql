@@ -0,0 +1,267 @@
+-- Migration 004: bid amount sketches for approximate percentiles
+-- Purpose: Brings an existing ebay_db up to the bid_sketch_* tables, their triggers,
+--          refresh_bid_sketches() and bid_amount_percentiles_approx() defined in ebay_db.sql
+--          (fresh installs already have them)
+-- Source: agg_percentiles sorts every bid with percentile_cont; its approximate form in
+--         queries.py merges these sketches instead
+-- Notes:
+--   1. The tables, triggers and initial fill run in one transaction, so no bid placed
+--      meanwhile is missed; refresh_bid_sketches() blocks writers to bid/listing while it runs
+--   2. Every statement is idempotent; re-running the file is safe
+-- Usage: psql -d ebay_db -f migrations/004_bid_sketches.sql
+
+BEGIN;
+
+-- Tables: bid_sketch_listing, bid_sketch_category, bid_sketch_total
+-- Purpose: Mergeable quantile sketches of bid_amount (DDSketch-style log buckets) per listing,
+-- per category and overall, behind the approximate mode of the bid percentile queries
+-- Bucket k counts the bids in (gamma^(k-1), gamma^k] with gamma = 1.01 / 0.99, so any bucket's
+-- representative value (bid_sketch_value) is within 1% of every bid it holds; merging sketches
+-- is a SUM(n) per bucket, and a whole sketch is a few hundred rows however many bids there are
+-- Maintained incrementally by the tg_bid_sketch_* triggers on bid and listing;
+-- refresh_bid_sketches() rebuilds them from scratch
+CREATE TABLE IF NOT EXISTS bid_sketch_listing (
+    listing_id INT NOT NULL REFERENCES listing(listing_id) ON DELETE CASCADE,
+    bucket     INT NOT NULL,
+    n          BIGINT NOT NULL,
+    PRIMARY KEY (listing_id, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS bid_sketch_category (
+    category_id INT NOT NULL REFERENCES category(category_id) ON DELETE CASCADE,
+    bucket      INT NOT NULL,
+    n           BIGINT NOT NULL,
+    PRIMARY KEY (category_id, bucket)
+);
+
+-- The overall sketch is split into 16 stripes by listing_id % 16, so concurrent bids on
+-- different listings rarely wait on the same bucket row; readers sum the stripes
+CREATE TABLE IF NOT EXISTS bid_sketch_total (
+    stripe SMALLINT NOT NULL,
+    bucket INT NOT NULL,
+    n      BIGINT NOT NULL,
+    PRIMARY KEY (stripe, bucket)
+);
+
+-- Let the bid sketch triggers find buckets emptied by bid deletes without scanning the sketches
+-- Query pattern: DELETE FROM bid_sketch_listing WHERE n = 0
+CREATE INDEX IF NOT EXISTS idx_bid_sketch_listing_empty ON bid_sketch_listing (listing_id) WHERE n = 0;
+CREATE INDEX IF NOT EXISTS idx_bid_sketch_category_empty ON bid_sketch_category (category_id) WHERE n = 0;
+CREATE INDEX IF NOT EXISTS idx_bid_sketch_total_empty ON bid_sketch_total (stripe) WHERE n = 0;
+
+-- Function: bid_sketch_accuracy()
+-- Purpose: Relative accuracy of the bid sketches (alpha); gamma = (1 + alpha) / (1 - alpha)
+-- Usage: SELECT bid_sketch_accuracy();  -- 0.01
+CREATE OR REPLACE FUNCTION bid_sketch_accuracy()
+RETURNS NUMERIC LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT 0.01;
+$$;
+
+-- Function: bid_sketch_bucket()
+-- Purpose: Sketch bucket of a bid amount, ceil(log_gamma(amount))
+-- Business Rules:
+--   1. Amounts below 0.01 (a zero start price) share the bucket of 0.01
+-- Usage: SELECT bid_sketch_bucket(129.99);
+CREATE OR REPLACE FUNCTION bid_sketch_bucket(p_amount NUMERIC)
+RETURNS INT LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT CEIL(LN(GREATEST(p_amount, 0.01)::FLOAT8)
+                / LN(((1 + bid_sketch_accuracy()) / (1 - bid_sketch_accuracy()))::FLOAT8))::INT;
+$$;
+
+-- Function: bid_sketch_value()
+-- Purpose: Representative amount of a sketch bucket, 2 * gamma^k / (gamma + 1), in cents
+-- Business Rules:
+--   1. Within bid_sketch_accuracy() of every amount in the bucket (plus half a cent of rounding)
+-- Usage: SELECT bid_sketch_value(bid_sketch_bucket(129.99));  -- about 129.99
+CREATE OR REPLACE FUNCTION bid_sketch_value(p_bucket INT)
+RETURNS NUMERIC LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT ROUND((2 * POWER(g, p_bucket) / (g + 1))::NUMERIC, 2)
+    FROM (SELECT ((1 + bid_sketch_accuracy()) / (1 - bid_sketch_accuracy()))::FLOAT8 AS g) c;
+$$;
+
+-- Function: fn_bid_sketch_stmt()
+-- Purpose: Applies a statement's bid changes to the listing, category and overall bid sketches
+-- Business Rules:
+--   1. Changed bids are counted per (listing, bucket) first, so a bulk write is three upserts
+--   2. Rows are upserted in key order, so concurrent statements lock buckets in the same order
+--   3. Buckets left empty by deletes are removed
+-- Usage: Automatically called by the tg_bid_sketch_insert/update/delete triggers
+CREATE OR REPLACE FUNCTION fn_bid_sketch_stmt()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+DECLARE
+    v_listings INT[];
+    v_buckets INT[];
+    v_counts BIGINT[];
+BEGIN
+    -- transition tables exist only for their own event, so each builds its delta separately
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(listing_id), array_agg(bucket), array_agg(n)
+          INTO v_listings, v_buckets, v_counts
+          FROM (SELECT listing_id, bid_sketch_bucket(bid_amount) AS bucket, COUNT(*) AS n
+                FROM new_bids GROUP BY 1, 2) d;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(listing_id), array_agg(bucket), array_agg(n)
+          INTO v_listings, v_buckets, v_counts
+          FROM (SELECT listing_id, bid_sketch_bucket(bid_amount) AS bucket, -COUNT(*) AS n
+                FROM old_bids GROUP BY 1, 2) d;
+    ELSE
+        SELECT array_agg(listing_id), array_agg(bucket), array_agg(n)
+          INTO v_listings, v_buckets, v_counts
+          FROM (SELECT listing_id, bucket, SUM(sign) AS n
+                FROM (SELECT listing_id, bid_sketch_bucket(bid_amount) AS bucket, 1 AS sign FROM new_bids
+                      UNION ALL
+                      SELECT listing_id, bid_sketch_bucket(bid_amount), -1 FROM old_bids) c
+                GROUP BY 1, 2
+                HAVING SUM(sign) <> 0) d;
+    END IF;
+    IF v_listings IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    WITH d AS (
+        SELECT * FROM unnest(v_listings, v_buckets, v_counts) AS d(listing_id, bucket, n)
+    ), by_listing AS (
+        INSERT INTO bid_sketch_listing AS s (listing_id, bucket, n)
+        SELECT listing_id, bucket, n FROM d ORDER BY 1, 2
+        ON CONFLICT (listing_id, bucket) DO UPDATE SET n = s.n + EXCLUDED.n
+    ), by_stripe AS (
+        INSERT INTO bid_sketch_total AS s (stripe, bucket, n)
+        SELECT listing_id % 16, bucket, SUM(n) FROM d GROUP BY 1, 2 HAVING SUM(n) <> 0 ORDER BY 1, 2
+        ON CONFLICT (stripe, bucket) DO UPDATE SET n = s.n + EXCLUDED.n
+    )
+    INSERT INTO bid_sketch_category AS s (category_id, bucket, n)
+    SELECT l.category_id, d.bucket, SUM(d.n)
+    FROM d JOIN listing l ON l.listing_id = d.listing_id
+    GROUP BY 1, 2
+    HAVING SUM(d.n) <> 0
+    ORDER BY 1, 2
+    ON CONFLICT (category_id, bucket) DO UPDATE SET n = s.n + EXCLUDED.n;
+
+    IF TG_OP <> 'INSERT' THEN
+        DELETE FROM bid_sketch_listing WHERE n = 0;
+        DELETE FROM bid_sketch_category WHERE n = 0;
+        DELETE FROM bid_sketch_total WHERE n = 0;
+    END IF;
+    RETURN NULL;
+END$$;
+
+DROP TRIGGER IF EXISTS tg_bid_sketch_insert ON bid;
+CREATE TRIGGER tg_bid_sketch_insert
+AFTER INSERT ON bid
+REFERENCING NEW TABLE AS new_bids
+FOR EACH STATEMENT EXECUTE FUNCTION fn_bid_sketch_stmt();
+
+DROP TRIGGER IF EXISTS tg_bid_sketch_update ON bid;
+CREATE TRIGGER tg_bid_sketch_update
+AFTER UPDATE ON bid
+REFERENCING OLD TABLE AS old_bids NEW TABLE AS new_bids
+FOR EACH STATEMENT EXECUTE FUNCTION fn_bid_sketch_stmt();
+
+DROP TRIGGER IF EXISTS tg_bid_sketch_delete ON bid;
+CREATE TRIGGER tg_bid_sketch_delete
+AFTER DELETE ON bid
+REFERENCING OLD TABLE AS old_bids
+FOR EACH STATEMENT EXECUTE FUNCTION fn_bid_sketch_stmt();
+
+-- Function: fn_bid_sketch_on_listing()
+-- Purpose: Moves a listing's bid sketch to its new category in bid_sketch_category
+-- Usage: Automatically called by trigger tg_bid_sketch_on_listing when listing.category_id changes
+CREATE OR REPLACE FUNCTION fn_bid_sketch_on_listing()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO bid_sketch_category AS s (category_id, bucket, n)
+    SELECT v.category_id, b.bucket, v.sign * b.n
+    FROM bid_sketch_listing b
+    CROSS JOIN (VALUES (OLD.category_id, -1), (NEW.category_id, 1)) AS v(category_id, sign)
+    WHERE b.listing_id = NEW.listing_id
+    ORDER BY 1, 2
+    ON CONFLICT (category_id, bucket) DO UPDATE SET n = s.n + EXCLUDED.n;
+    DELETE FROM bid_sketch_category WHERE n = 0;
+    RETURN NULL;
+END$$;
+
+DROP TRIGGER IF EXISTS tg_bid_sketch_on_listing ON listing;
+CREATE TRIGGER tg_bid_sketch_on_listing
+AFTER UPDATE OF category_id ON listing
+FOR EACH ROW WHEN (OLD.category_id IS DISTINCT FROM NEW.category_id)
+EXECUTE FUNCTION fn_bid_sketch_on_listing();
+
+-- Function: refresh_bid_sketches()
+-- Purpose: Rebuilds bid_sketch_listing, bid_sketch_category and bid_sketch_total from bid
+-- Business Rules:
+--   1. Writers to bid/listing are blocked for the duration so no delta is lost
+-- Returns: Number of listing sketch rows
+-- Usage: SELECT refresh_bid_sketches();
+-- Example: Run after bulk loads done with triggers disabled
+CREATE OR REPLACE FUNCTION refresh_bid_sketches()
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+    v_rows INT;
+BEGIN
+    LOCK TABLE bid, listing IN SHARE MODE;
+    DELETE FROM bid_sketch_listing;
+    DELETE FROM bid_sketch_category;
+    DELETE FROM bid_sketch_total;
+    INSERT INTO bid_sketch_listing (listing_id, bucket, n)
+    SELECT listing_id, bid_sketch_bucket(bid_amount), COUNT(*)
+    FROM bid
+    GROUP BY 1, 2;
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    INSERT INTO bid_sketch_category (category_id, bucket, n)
+    SELECT l.category_id, s.bucket, SUM(s.n)
+    FROM bid_sketch_listing s
+    JOIN listing l ON l.listing_id = s.listing_id
+    GROUP BY 1, 2;
+    INSERT INTO bid_sketch_total (stripe, bucket, n)
+    SELECT listing_id % 16, bucket, SUM(n)
+    FROM bid_sketch_listing
+    GROUP BY 1, 2;
+    RETURN v_rows;
+END$$;
+
+-- Function: bid_amount_percentiles_approx()
+-- Purpose: Approximate bid_amount percentiles from the merged bid sketches
+-- Business Rules:
+--   1. Without filters, merges the stripes of bid_sketch_total (all bids); p_category_id reads
+--      one category's sketch, p_listing_id one listing's
+--   2. Interpolates between the bids at ranks floor/ceil(q * (n - 1)) like percentile_cont,
+--      so each result is within bid_sketch_accuracy() (1%) of the exact percentile
+--   3. Reads a few hundred sketch rows instead of sorting every bid
+-- Returns: One amount per requested quantile, NULL entries when there are no bids
+-- Usage: SELECT bid_amount_percentiles_approx(ARRAY[0.25, 0.5, 0.75]);
+-- Example: SELECT bid_amount_percentiles_approx(ARRAY[0.5, 0.99], p_category_id => 4);
+CREATE OR REPLACE FUNCTION bid_amount_percentiles_approx(
+    p_quantiles FLOAT8[], p_category_id INT DEFAULT NULL, p_listing_id INT DEFAULT NULL)
+RETURNS NUMERIC[] LANGUAGE sql STABLE AS $$
+    WITH merged AS (
+        SELECT bucket, SUM(n) AS n
+        FROM bid_sketch_total
+        WHERE p_listing_id IS NULL AND p_category_id IS NULL
+        GROUP BY bucket
+        UNION ALL
+        SELECT bucket, n FROM bid_sketch_category WHERE category_id = p_category_id AND p_listing_id IS NULL
+        UNION ALL
+        SELECT bucket, n FROM bid_sketch_listing WHERE listing_id = p_listing_id
+    ), ranked AS (
+        SELECT bucket, SUM(n) OVER (ORDER BY bucket) AS upto, SUM(n) OVER () AS total
+        FROM merged
+    ), ranks AS (
+        SELECT q.ord, q.q * (r.total - 1) AS pos
+        FROM unnest(p_quantiles) WITH ORDINALITY AS q(q, ord)
+        CROSS JOIN (SELECT total FROM ranked LIMIT 1) r
+    )
+    SELECT array_agg(v.amount ORDER BY q.ord)
+    FROM unnest(p_quantiles) WITH ORDINALITY AS q(q, ord)
+    LEFT JOIN ranks k ON k.ord = q.ord
+    LEFT JOIN LATERAL (
+        SELECT ROUND(lo.v + (k.pos - FLOOR(k.pos))::NUMERIC * (hi.v - lo.v), 2) AS amount
+        FROM (SELECT bid_sketch_value(bucket) AS v FROM ranked
+              WHERE upto > FLOOR(k.pos) ORDER BY bucket LIMIT 1) lo,
+             (SELECT bid_sketch_value(bucket) AS v FROM ranked
+              WHERE upto > CEIL(k.pos) ORDER BY bucket LIMIT 1) hi
+    ) v ON TRUE;
+$$;
+
+SELECT refresh_bid_sketches();
+
+COMMIT;
@@ -0,0 +1,365 @@
+-- Migration 005: time partitioning of bid and transaction
+-- Purpose: Converts bid and transaction of an existing ebay_db into the monthly range-partitioned
+--          tables defined in ebay_db.sql, with v_time_partitions, create_time_partitions(),
+--          ensure_time_partitions() and the tg_ref_* reference triggers (fresh installs already
+--          have them)
+-- Source: both tables only grow; partitioned by bid_time / transaction_date, date-bounded queries
+--         scan only the months they cover and old months can be archived with partitions.py
+-- Notes:
+--   1. Everything runs in one transaction that copies every bid and transaction and holds
+--      ACCESS EXCLUSIVE locks on bid, transaction and feedback meanwhile: stop the app and
+--      auction_closer.py first
+--   2. transaction.bid_id -> bid and feedback.transaction_id -> transaction become trigger-enforced
+--      (tg_ref_*), as do one transaction per bid; tracking_number is no longer UNIQUE
+--   3. Rows are copied with their ids and timestamps and no triggers, so listing_price_summary,
+--      revenue_fact and the bid sketches stay as they are
+--   4. Re-running the file is safe: the conversion is skipped once bid is partitioned
+-- Usage: psql -d ebay_db -f migrations/005_time_partitioning.sql
+
+BEGIN;
+
+-- View: v_time_partitions
+-- Purpose: The monthly partitions of bid and transaction with their time range and size
+-- Query Pattern: SELECT * FROM v_time_partitions ORDER BY parent_table, range_from
+CREATE OR REPLACE VIEW v_time_partitions AS
+SELECT p.relname AS parent_table, c.relname AS partition_name,
+       b[1]::TIMESTAMPTZ AS range_from, b[2]::TIMESTAMPTZ AS range_to,
+       GREATEST(c.reltuples, 0)::BIGINT AS estimated_rows,
+       pg_total_relation_size(c.oid) AS total_bytes
+FROM pg_inherits i
+JOIN pg_class p ON p.oid = i.inhparent
+JOIN pg_class c ON c.oid = i.inhrelid
+CROSS JOIN LATERAL regexp_match(pg_get_expr(c.relpartbound, c.oid), 'FROM \(''(.+)''\) TO \(''(.+)''\)') AS b
+WHERE p.relname IN ('bid', 'transaction') AND p.relkind = 'p';
+
+-- Function: create_time_partitions()
+-- Purpose: Creates the monthly partitions of bid or transaction covering p_from .. p_to
+-- Business Rules:
+--   1. One partition per calendar month in UTC, named <table>_yYYYYmMM (e.g. bid_y2026m10)
+--   2. Months already covered by a partition are skipped, so overlapping calls are safe
+--   3. Row triggers and indexes of the parent are added to each new partition automatically
+-- Returns: Number of partitions created
+-- Usage: SELECT create_time_partitions('bid', '2025-01-01', '2026-12-31');
+-- Example: datagen.py creates the months of its generated history before loading
+CREATE OR REPLACE FUNCTION create_time_partitions(p_table REGCLASS, p_from TIMESTAMPTZ, p_to TIMESTAMPTZ)
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+    v_parent  TEXT;
+    v_month   TIMESTAMPTZ;
+    v_next    TIMESTAMPTZ;
+    v_created INT := 0;
+BEGIN
+    SELECT relname INTO v_parent FROM pg_class WHERE oid = p_table;
+    FOR v_month IN SELECT generate_series(date_trunc('month', p_from, 'UTC'), p_to, INTERVAL '1 month', 'UTC') LOOP
+        v_next := date_add(v_month, INTERVAL '1 month', 'UTC');
+        CONTINUE WHEN EXISTS (SELECT 1 FROM v_time_partitions
+                              WHERE parent_table = v_parent AND range_from < v_next AND range_to > v_month);
+        EXECUTE format('CREATE TABLE %I PARTITION OF %s FOR VALUES FROM (%L) TO (%L)',
+                       v_parent || to_char(v_month AT TIME ZONE 'UTC', '"_y"YYYY"m"MM'), p_table, v_month, v_next);
+        v_created := v_created + 1;
+    END LOOP;
+    RETURN v_created;
+END$$;
+
+-- Function: ensure_time_partitions()
+-- Purpose: Keeps the partitions of bid and transaction ready from this month to p_months_ahead months ahead
+-- Business Rules:
+--   1. There is no default partition: a bid or transaction dated in a month without a partition
+--      is rejected, so this has to run at least once every p_months_ahead months
+-- Returns: Number of partitions created
+-- Usage: SELECT ensure_time_partitions();
+-- Example: auction_closer.py runs it at startup and every hour
+CREATE OR REPLACE FUNCTION ensure_time_partitions(p_months_ahead INT DEFAULT 3)
+RETURNS INT LANGUAGE sql AS $$
+    SELECT create_time_partitions('bid', NOW(), date_add(NOW(), make_interval(months => p_months_ahead), 'UTC'))
+         + create_time_partitions('transaction', NOW(), date_add(NOW(), make_interval(months => p_months_ahead), 'UTC'));
+$$;
+
+-- Function: fn_ref_transaction_bid()
+-- Purpose: Enforces transaction.bid_id -> bid(bid_id) and one transaction per bid
+-- Business Rules:
+--   1. Every inserted transaction, or one whose bid_id changed, must name an existing bid
+--   2. No bid may have more than one transaction
+--   3. The named bids are locked FOR NO KEY UPDATE first, so a concurrent delete of the bid or a
+--      second transaction for it waits for this one and then fails its own check
+--   4. The bid_id lookups cannot be pruned to one partition, so this function (like
+--      fn_ref_feedback_transaction) keeps generic plans: re-planning them against every
+--      partition on each call cost more than the check itself
+-- Usage: Automatically called by the tg_ref_transaction_bid_* triggers
+CREATE OR REPLACE FUNCTION fn_ref_transaction_bid()
+RETURNS TRIGGER LANGUAGE plpgsql
+SET plan_cache_mode = force_generic_plan AS $$
+DECLARE
+    v_bids INT[];
+    v_bid  INT;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT bid_id) INTO v_bids FROM new_rows;
+    ELSE
+        SELECT array_agg(DISTINCT n.bid_id) INTO v_bids
+        FROM new_rows n
+        WHERE NOT EXISTS (SELECT 1 FROM old_rows o WHERE o.transaction_id = n.transaction_id AND o.bid_id = n.bid_id);
+    END IF;
+    IF v_bids IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    WITH locked AS MATERIALIZED (
+        SELECT bid_id FROM bid WHERE bid_id = ANY(v_bids) ORDER BY bid_id FOR NO KEY UPDATE
+    )
+    SELECT x INTO v_bid FROM unnest(v_bids) AS x
+    WHERE x NOT IN (SELECT bid_id FROM locked)
+    LIMIT 1;
+    IF FOUND THEN
+        RAISE EXCEPTION 'Bid % does not exist', v_bid USING ERRCODE = 'foreign_key_violation';
+    END IF;
+    SELECT t.bid_id INTO v_bid FROM transaction t
+    WHERE t.bid_id = ANY(v_bids)
+    GROUP BY t.bid_id HAVING COUNT(*) > 1
+    LIMIT 1;
+    IF FOUND THEN
+        RAISE EXCEPTION 'Bid % already has a transaction', v_bid USING ERRCODE = 'unique_violation';
+    END IF;
+    RETURN NULL;
+END$$;
+
+-- Function: fn_ref_bid_delete()
+-- Purpose: The ON DELETE side of transaction.bid_id: bids that have a transaction cannot be deleted
+-- Usage: Automatically called by trigger tg_ref_bid_delete (purge_users deletes transactions first)
+CREATE OR REPLACE FUNCTION fn_ref_bid_delete()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+DECLARE
+    v_bid INT;
+BEGIN
+    SELECT t.bid_id INTO v_bid FROM transaction t
+    WHERE t.bid_id IN (SELECT bid_id FROM old_rows)
+    LIMIT 1;
+    IF FOUND THEN
+        RAISE EXCEPTION 'Bid % is still referenced by a transaction', v_bid USING ERRCODE = 'foreign_key_violation';
+    END IF;
+    RETURN NULL;
+END$$;
+
+-- Function: fn_ref_feedback_transaction()
+-- Purpose: Enforces feedback.transaction_id -> transaction(transaction_id)
+-- Business Rules:
+--   1. Every inserted or updated feedback row must name an existing transaction
+--   2. The named transactions are locked FOR KEY SHARE first, so a concurrent delete waits and then fails
+-- Usage: Automatically called by the tg_ref_feedback_transaction_* triggers
+CREATE OR REPLACE FUNCTION fn_ref_feedback_transaction()
+RETURNS TRIGGER LANGUAGE plpgsql
+SET plan_cache_mode = force_generic_plan AS $$
+DECLARE
+    v_txns INT[];
+    v_txn  INT;
+BEGIN
+    SELECT array_agg(DISTINCT transaction_id) INTO v_txns FROM new_rows;
+    WITH locked AS MATERIALIZED (
+        SELECT transaction_id FROM transaction WHERE transaction_id = ANY(v_txns)
+        ORDER BY transaction_id FOR KEY SHARE
+    )
+    SELECT x INTO v_txn FROM unnest(v_txns) AS x
+    WHERE x NOT IN (SELECT transaction_id FROM locked)
+    LIMIT 1;
+    IF FOUND THEN
+        RAISE EXCEPTION 'Transaction % does not exist', v_txn USING ERRCODE = 'foreign_key_violation';
+    END IF;
+    RETURN NULL;
+END$$;
+
+-- Function: fn_ref_transaction_delete()
+-- Purpose: The ON DELETE side of feedback.transaction_id: transactions with feedback cannot be deleted
+-- Usage: Automatically called by trigger tg_ref_transaction_delete (purge_users deletes feedback first)
+CREATE OR REPLACE FUNCTION fn_ref_transaction_delete()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+DECLARE
+    v_txn INT;
+BEGIN
+    SELECT f.transaction_id INTO v_txn FROM feedback f
+    WHERE f.transaction_id IN (SELECT transaction_id FROM old_rows)
+    LIMIT 1;
+    IF FOUND THEN
+        RAISE EXCEPTION 'Transaction % is still referenced by feedback', v_txn USING ERRCODE = 'foreign_key_violation';
+    END IF;
+    RETURN NULL;
+END$$;
+
+
+DO $$
+DECLARE
+    v_first TIMESTAMPTZ;
+    v_last  TIMESTAMPTZ;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'bid'::REGCLASS) = 'p' THEN
+        RAISE NOTICE 'bid is already partitioned, nothing to convert';
+        RETURN;
+    END IF;
+
+    -- Free the constraint and index names the partitioned tables are created with
+    ALTER TABLE feedback DROP CONSTRAINT feedback_transaction_id_fkey;
+    ALTER TABLE transaction DROP CONSTRAINT transaction_bid_id_fkey;
+    ALTER TABLE bid RENAME TO bid_unpartitioned;
+    ALTER TABLE transaction RENAME TO transaction_unpartitioned;
+    ALTER TABLE bid_unpartitioned
+        DROP CONSTRAINT bid_pkey,
+        DROP CONSTRAINT bid_listing_id_fkey,
+        DROP CONSTRAINT bid_user_id_fkey,
+        DROP CONSTRAINT bid_bid_amount_check,
+        DROP CONSTRAINT bid_bid_status_check;
+    ALTER TABLE transaction_unpartitioned
+        DROP CONSTRAINT transaction_pkey,
+        DROP CONSTRAINT transaction_bid_id_key,
+        DROP CONSTRAINT transaction_tracking_number_key,
+        DROP CONSTRAINT transaction_listing_id_fkey,
+        DROP CONSTRAINT transaction_buyer_id_fkey,
+        DROP CONSTRAINT transaction_seller_id_fkey,
+        DROP CONSTRAINT transaction_payment_status_check,
+        DROP CONSTRAINT transaction_shipping_status_check;
+    DROP INDEX idx_bid_listing_amount, idx_bid_user, idx_transaction_buyer, idx_transaction_seller,
+               idx_transaction_listing;
+
+    CREATE TABLE bid (
+        bid_id     INT GENERATED ALWAYS AS IDENTITY,
+        listing_id INT NOT NULL REFERENCES listing(listing_id),
+        user_id    INT NOT NULL REFERENCES user_account(user_id),
+        bid_amount NUMERIC(12,2) NOT NULL CHECK (bid_amount > 0),
+        bid_time   TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        bid_status TEXT NOT NULL DEFAULT 'active' CHECK (bid_status IN ('active','retracted','winning','outbid')),
+        is_proxy   BOOLEAN NOT NULL DEFAULT FALSE,
+        PRIMARY KEY (bid_id, bid_time)
+    ) PARTITION BY RANGE (bid_time);
+
+    CREATE TABLE transaction (
+        transaction_id  INT GENERATED ALWAYS AS IDENTITY,
+        bid_id          INT NOT NULL,
+        listing_id      INT NOT NULL REFERENCES listing(listing_id),
+        buyer_id        INT NOT NULL REFERENCES user_account(user_id),
+        seller_id       INT NOT NULL REFERENCES user_account(user_id),
+        final_price     NUMERIC(12,2) NOT NULL,
+        payment_status  TEXT NOT NULL CHECK (payment_status IN ('pending','paid','refunded')),
+        shipping_status TEXT NOT NULL CHECK (shipping_status IN ('pending','shipped','delivered','returned')),
+        tracking_number TEXT,
+        transaction_date TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (transaction_id, transaction_date)
+    ) PARTITION BY RANGE (transaction_date);
+
+    SELECT MIN(bid_time), MAX(bid_time) INTO v_first, v_last FROM bid_unpartitioned;
+    IF v_first IS NOT NULL THEN
+        PERFORM create_time_partitions('bid', v_first, v_last);
+    END IF;
+    SELECT MIN(transaction_date), MAX(transaction_date) INTO v_first, v_last FROM transaction_unpartitioned;
+    IF v_first IS NOT NULL THEN
+        PERFORM create_time_partitions('transaction', v_first, v_last);
+    END IF;
+    PERFORM ensure_time_partitions();
+
+    -- Copied before any index or trigger exists on the new tables
+    INSERT INTO bid (bid_id, listing_id, user_id, bid_amount, bid_time, bid_status, is_proxy)
+    OVERRIDING SYSTEM VALUE
+    SELECT bid_id, listing_id, user_id, bid_amount, bid_time, bid_status, is_proxy FROM bid_unpartitioned;
+    INSERT INTO transaction (transaction_id, bid_id, listing_id, buyer_id, seller_id, final_price, payment_status,
+                             shipping_status, tracking_number, transaction_date)
+    OVERRIDING SYSTEM VALUE
+    SELECT transaction_id, bid_id, listing_id, buyer_id, seller_id, final_price, payment_status,
+           shipping_status, tracking_number, transaction_date
+    FROM transaction_unpartitioned;
+    PERFORM setval(pg_get_serial_sequence('bid', 'bid_id'), COALESCE(MAX(bid_id), 0) + 1, FALSE) FROM bid;
+    PERFORM setval(pg_get_serial_sequence('transaction', 'transaction_id'), COALESCE(MAX(transaction_id), 0) + 1, FALSE)
+    FROM transaction;
+    DROP TABLE transaction_unpartitioned, bid_unpartitioned;
+
+    CREATE INDEX idx_bid_listing_amount ON bid (listing_id, bid_amount DESC);
+    CREATE INDEX idx_bid_user ON bid (user_id);
+    CREATE INDEX idx_transaction_buyer ON transaction (buyer_id);
+    CREATE INDEX idx_transaction_seller ON transaction (seller_id);
+    CREATE INDEX idx_transaction_listing ON transaction (listing_id);
+    CREATE INDEX idx_transaction_bid ON transaction (bid_id);
+
+    CREATE TRIGGER tg_enforce_bid_rules
+    BEFORE INSERT ON bid
+    FOR EACH ROW EXECUTE FUNCTION fn_enforce_bid_rules();
+
+    CREATE TRIGGER tg_reset_high_bid
+    AFTER DELETE OR UPDATE OF listing_id, bid_amount ON bid
+    FOR EACH ROW EXECUTE FUNCTION fn_reset_high_bid();
+
+    CREATE TRIGGER tg_notify_bid_change
+    AFTER INSERT OR UPDATE OR DELETE ON bid
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_notify_table_change();
+
+    CREATE TRIGGER tg_notify_transaction_change
+    AFTER INSERT OR UPDATE OR DELETE ON transaction
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_notify_table_change();
+
+    CREATE TRIGGER tg_summary_on_bid
+    AFTER INSERT OR DELETE OR UPDATE OF listing_id ON bid
+    FOR EACH ROW EXECUTE FUNCTION fn_summary_on_bid();
+
+    CREATE TRIGGER tg_revenue_fact_insert
+    AFTER INSERT ON transaction
+    REFERENCING NEW TABLE AS new_txns
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_revenue_fact_stmt();
+
+    CREATE TRIGGER tg_revenue_fact_update
+    AFTER UPDATE ON transaction
+    REFERENCING OLD TABLE AS old_txns NEW TABLE AS new_txns
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_revenue_fact_stmt();
+
+    CREATE TRIGGER tg_revenue_fact_delete
+    AFTER DELETE ON transaction
+    REFERENCING OLD TABLE AS old_txns
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_revenue_fact_stmt();
+
+    CREATE TRIGGER tg_bid_sketch_insert
+    AFTER INSERT ON bid
+    REFERENCING NEW TABLE AS new_bids
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_bid_sketch_stmt();
+
+    CREATE TRIGGER tg_bid_sketch_update
+    AFTER UPDATE ON bid
+    REFERENCING OLD TABLE AS old_bids NEW TABLE AS new_bids
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_bid_sketch_stmt();
+
+    CREATE TRIGGER tg_bid_sketch_delete
+    AFTER DELETE ON bid
+    REFERENCING OLD TABLE AS old_bids
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_bid_sketch_stmt();
+
+    CREATE TRIGGER tg_ref_transaction_bid_insert
+    AFTER INSERT ON transaction
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_ref_transaction_bid();
+
+    CREATE TRIGGER tg_ref_transaction_bid_update
+    AFTER UPDATE ON transaction
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_ref_transaction_bid();
+
+    CREATE TRIGGER tg_ref_bid_delete
+    AFTER DELETE ON bid
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_ref_bid_delete();
+
+    CREATE TRIGGER tg_ref_feedback_transaction_insert
+    AFTER INSERT ON feedback
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_ref_feedback_transaction();
+
+    CREATE TRIGGER tg_ref_feedback_transaction_update
+    AFTER UPDATE ON feedback
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_ref_feedback_transaction();
+
+    CREATE TRIGGER tg_ref_transaction_delete
+    AFTER DELETE ON transaction
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION fn_ref_transaction_delete();
+END$$;
+
+-- purge_users() looks bids and transactions up by id, which no partition bound can narrow down
+ALTER FUNCTION purge_users(INT[]) SET plan_cache_mode = force_generic_plan;
+
+ANALYZE bid;
+ANALYZE transaction;
+
+COMMIT;
@@ -0,0 +1,193 @@
+-- Migration 006: category closure table
+-- Purpose: Brings an existing ebay_db up to the category_closure table, its triggers,
+--          refresh_category_closure() and category_children() defined in ebay_db.sql
+--          (fresh installs already have them)
+-- Source: "everything under a category" needed a recursive CTE over category.parent_id or
+--         matching on the free-text category.path; the closure table makes any subtree one
+--         indexed join (the tree_subtree_totals query, the app's category browser)
+-- Notes:
+--   1. The table, triggers and initial fill run in one transaction, so no category change
+--      made meanwhile is missed; refresh_category_closure() blocks writers to category while it runs
+--   2. Every statement is idempotent; re-running the file is safe
+-- Usage: psql -d ebay_db -f migrations/006_category_closure.sql
+
+BEGIN;
+
+-- Table: category_closure
+-- Purpose: Every (ancestor, descendant) pair of the category tree with the number of levels
+-- between them, each category also being its own ancestor at depth 0, so "everything under
+-- category X" is one indexed join on ancestor_id = X however deep the tree is
+-- Maintained by the tg_category_closure_* triggers on category;
+-- refresh_category_closure() rebuilds it from scratch
+CREATE TABLE IF NOT EXISTS category_closure (
+    ancestor_id   INT NOT NULL REFERENCES category(category_id) ON DELETE CASCADE,
+    descendant_id INT NOT NULL REFERENCES category(category_id) ON DELETE CASCADE,
+    depth         INT NOT NULL CHECK (depth >= 0),
+    PRIMARY KEY (ancestor_id, descendant_id)
+);
+
+-- Category tree: children of a category (the app's category browser) and the ancestors of a
+-- category (the closure triggers); subtrees are read through the closure primary key
+-- Query pattern: SELECT * FROM category WHERE parent_id = ?
+-- Query pattern: SELECT ancestor_id FROM category_closure WHERE descendant_id = ?
+CREATE INDEX IF NOT EXISTS idx_category_parent ON category (parent_id);
+CREATE INDEX IF NOT EXISTS idx_category_closure_descendant ON category_closure (descendant_id) INCLUDE (ancestor_id, depth);
+
+-- Function: fn_category_closure_insert()
+-- Purpose: Adds new categories to category_closure
+-- Business Rules:
+--   1. Each new category is its own ancestor at depth 0 and inherits every ancestor of its parent
+--   2. Reads the statement's transition table, so a multi-row INSERT may name a parent that is
+--      inserted by the same statement, in any row order
+--   3. Category writes take a SHARE ROW EXCLUSIVE lock on category_closure and so run one at a
+--      time; a concurrent move cannot leave a new category with stale ancestors
+-- Usage: Automatically called by trigger tg_category_closure_insert
+CREATE OR REPLACE FUNCTION fn_category_closure_insert()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    LOCK TABLE category_closure IN SHARE ROW EXCLUSIVE MODE;
+    INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+    WITH RECURSIVE up AS (
+        -- each new category, then its ancestors among the other new ones
+        SELECT n.category_id AS descendant_id, n.category_id AS ancestor_id, n.parent_id, 0 AS depth
+        FROM new_rows n
+        UNION ALL
+        SELECT up.descendant_id, n.category_id, n.parent_id, up.depth + 1
+        FROM up JOIN new_rows n ON n.category_id = up.parent_id
+    )
+    SELECT ancestor_id, descendant_id, depth FROM up
+    UNION ALL
+    -- the first existing ancestor brings its own ancestors along
+    SELECT c.ancestor_id, up.descendant_id, up.depth + 1 + c.depth
+    FROM up
+    JOIN category_closure c ON c.descendant_id = up.parent_id
+    WHERE up.parent_id NOT IN (SELECT category_id FROM new_rows);
+    RETURN NULL;
+END$$;
+
+DROP TRIGGER IF EXISTS tg_category_closure_insert ON category;
+CREATE TRIGGER tg_category_closure_insert
+AFTER INSERT ON category
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION fn_category_closure_insert();
+
+-- Function: fn_category_closure_move()
+-- Purpose: Moves a category's whole subtree in category_closure when its parent_id changes
+-- Business Rules:
+--   1. A category cannot be moved under itself or one of its own subcategories
+--   2. The links from the old ancestors to every category of the subtree are removed and the
+--      links from the new ancestors added; links inside the subtree are kept
+--   3. Serialized with the other category writes like fn_category_closure_insert, so two
+--      concurrent moves cannot build a cycle between them
+--   4. category.path is free text and is not rewritten
+-- Usage: Automatically called by trigger tg_category_closure_move
+-- Example: UPDATE category SET parent_id = 5 WHERE category_id = 12;  -- Sports and Outdoors under Fashion
+CREATE OR REPLACE FUNCTION fn_category_closure_move()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    LOCK TABLE category_closure IN SHARE ROW EXCLUSIVE MODE;
+    IF EXISTS (SELECT 1 FROM category_closure
+               WHERE ancestor_id = NEW.category_id AND descendant_id = NEW.parent_id) THEN
+        RAISE EXCEPTION 'Category % cannot be moved under its own subcategory %', NEW.category_id, NEW.parent_id;
+    END IF;
+
+    DELETE FROM category_closure c
+    USING category_closure a, category_closure d
+    WHERE a.descendant_id = NEW.category_id AND a.ancestor_id <> NEW.category_id
+      AND d.ancestor_id = NEW.category_id
+      AND c.ancestor_id = a.ancestor_id AND c.descendant_id = d.descendant_id;
+
+    INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+    SELECT a.ancestor_id, d.descendant_id, a.depth + d.depth + 1
+    FROM category_closure a
+    JOIN category_closure d ON d.ancestor_id = NEW.category_id
+    WHERE a.descendant_id = NEW.parent_id;
+    RETURN NULL;
+END$$;
+
+DROP TRIGGER IF EXISTS tg_category_closure_move ON category;
+CREATE TRIGGER tg_category_closure_move
+AFTER UPDATE OF parent_id ON category
+FOR EACH ROW WHEN (OLD.parent_id IS DISTINCT FROM NEW.parent_id)
+EXECUTE FUNCTION fn_category_closure_move();
+
+-- Function: refresh_category_closure()
+-- Purpose: Rebuilds category_closure from category.parent_id
+-- Business Rules:
+--   1. Writers to category are blocked for the duration so no change is lost
+-- Returns: Number of closure rows
+-- Usage: SELECT refresh_category_closure();
+-- Example: Run after bulk loads done with triggers disabled
+CREATE OR REPLACE FUNCTION refresh_category_closure()
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+    n INT;
+BEGIN
+    LOCK TABLE category IN SHARE MODE;
+    DELETE FROM category_closure;
+    INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+    WITH RECURSIVE down AS (
+        SELECT category_id AS ancestor_id, category_id AS descendant_id, 0 AS depth FROM category
+        UNION ALL
+        SELECT down.ancestor_id, c.category_id, down.depth + 1
+        FROM down JOIN category c ON c.parent_id = down.descendant_id
+    )
+    SELECT ancestor_id, descendant_id, depth FROM down;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END$$;
+
+-- Function: category_children()
+-- Purpose: The direct subcategories of a category (the top-level categories for NULL), each with
+-- the listing counts and paid revenue of its whole subtree
+-- Business Rules:
+--   1. Subtrees are read from category_closure (ancestor_id = child), one indexed join whatever
+--      the depth, with no recursive CTE and no matching on category.path
+--   2. The subtrees of all children are joined to listing and revenue_fact together, so a level
+--      costs one pass however many children it has
+--   3. Revenue is paid transactions only, read from revenue_fact like the revenue ROLLUP
+-- Returns: category_id, name, parent_id, child_count (direct children), subcategories (all
+--          levels below), listings, active_listings, revenue
+-- Usage: SELECT * FROM category_children();    -- top level
+--        SELECT * FROM category_children(1);   -- under Electronics
+-- Example: Electronics -> 3 subcategories, 4 listings (4 active), 1240.00 revenue (seed data);
+--          the app's category browser loads one level each time a node is expanded
+CREATE OR REPLACE FUNCTION category_children(p_parent_id INT DEFAULT NULL)
+RETURNS TABLE (category_id INT, name TEXT, parent_id INT, child_count BIGINT,
+               subcategories BIGINT, listings BIGINT, active_listings BIGINT, revenue NUMERIC)
+LANGUAGE sql STABLE AS $$
+    WITH children AS (
+        SELECT c.category_id, c.name, c.parent_id
+        FROM category c
+        WHERE c.parent_id = p_parent_id OR (p_parent_id IS NULL AND c.parent_id IS NULL)
+    ), subtree AS MATERIALIZED (
+        SELECT s.ancestor_id, s.descendant_id, s.depth
+        FROM children c
+        JOIN category_closure s ON s.ancestor_id = c.category_id
+    ), listing_totals AS (
+        SELECT t.ancestor_id, COUNT(*) AS listings, COUNT(*) FILTER (WHERE l.status = 'active') AS active_listings
+        FROM subtree t
+        JOIN listing l ON l.category_id = t.descendant_id
+        GROUP BY t.ancestor_id
+    ), revenue_totals AS (
+        SELECT t.ancestor_id, SUM(f.revenue) AS revenue
+        FROM subtree t
+        JOIN revenue_fact f ON f.category_id = t.descendant_id AND f.payment_status = 'paid'
+        GROUP BY t.ancestor_id
+    ), tree_totals AS (
+        SELECT t.ancestor_id, COUNT(*) FILTER (WHERE t.depth = 1) AS child_count, COUNT(*) - 1 AS subcategories
+        FROM subtree t
+        GROUP BY t.ancestor_id
+    )
+    SELECT c.category_id, c.name, c.parent_id, n.child_count, n.subcategories,
+           COALESCE(l.listings, 0), COALESCE(l.active_listings, 0), COALESCE(r.revenue, 0)
+    FROM children c
+    JOIN tree_totals n ON n.ancestor_id = c.category_id
+    LEFT JOIN listing_totals l ON l.ancestor_id = c.category_id
+    LEFT JOIN revenue_totals r ON r.ancestor_id = c.category_id
+    ORDER BY c.name, c.category_id;
+$$;
+
+SELECT refresh_category_closure();
+
+COMMIT;
@@ -0,0 +1,113 @@
+-- Migration 007: listing search
+-- Purpose: Brings an existing ebay_db up to listing.search_vector, its GIN index, the optional
+--          trigram index on listing.title and search_listings() defined in ebay_db.sql
+--          (fresh installs already have them)
+-- Source: listings could only be found with ILIKE, which scans every row; search_listings()
+--         behind the app's search panel reads the GIN index instead
+-- Notes:
+--   1. Adding the generated column rewrites listing under an ACCESS EXCLUSIVE lock, blocking
+--      reads and writes of listing until the migration commits (about 1 s for the scale 1 data)
+--   2. The trigram index is created only where the pg_trgm extension is available; without it
+--      search is full-text only and a warning is printed
+--   3. Every statement is idempotent; re-running the file is safe
+-- Usage: psql -d ebay_db -f migrations/007_listing_search.sql
+
+BEGIN;
+
+-- Words of title (weight A) and description (weight B) for search_listings
+ALTER TABLE listing ADD COLUMN IF NOT EXISTS search_vector TSVECTOR GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', title), 'A') ||
+    setweight(to_tsvector('english', COALESCE(description, '')), 'B')
+) STORED;
+-- Listing search (search_listings): full-text matches on title and description
+-- Query pattern: SELECT * FROM listing WHERE search_vector @@ to_tsquery('english', 'camera:*')
+CREATE INDEX IF NOT EXISTS idx_listing_search ON listing USING GIN (search_vector);
+
+-- Fuzzy title matching (search_listings) needs the pg_trgm extension, which is optional:
+-- without it the trigram index is skipped and search is full-text only
+-- Query pattern: SELECT * FROM listing WHERE title % 'camra'
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS idx_listing_title_trgm ON listing USING GIN (title gin_trgm_ops);
+    ELSE
+        RAISE WARNING 'pg_trgm is not available: listing search will not match misspelled titles';
+    END IF;
+END$$;
+
+
+-- Function: search_listings()
+-- Purpose: Ranked listing search on title and description, one keyset page at a time
+-- Business Rules:
+--   1. Every word of p_query must match, as a prefix, a word of the title or description
+--      (English stemming), so results appear while the last word is still being typed
+--   2. With the optional trigram index (pg_trgm), titles similar to p_query also match, which
+--      catches misspellings; its similarity is added to the rank
+--   3. Ranked by ts_rank_cd with title words weighted above description words, then listing_id
+--   4. Optional filters: category subtree (through category_closure), status, and a range on the
+--      current price (high bid, or start price without bids)
+--   5. Keyset pagination: pass the rank and listing_id of the last row of a page to get the next
+--      one; rows are never skipped or repeated the way OFFSET would while listings change
+--   6. A query with no searchable words (empty, punctuation, only stop words) returns no rows
+-- Parameters:
+--   - p_query: Search text as typed
+--   - p_category_id, p_status, p_min_price, p_max_price: Filters (NULL = any)
+--   - p_after_rank, p_after_id: Last row of the previous page (NULL = first page)
+--   - p_limit: Page size
+-- Returns: listing_id, title, category, status, current_price, end_date, rank
+-- Usage: SELECT * FROM search_listings('vintage cam', p_category_id => 1, p_status => 'active');
+-- Example: The app's search panel calls it on every pause in typing
+CREATE OR REPLACE FUNCTION search_listings(
+    p_query       TEXT,
+    p_category_id INT DEFAULT NULL,
+    p_status      TEXT DEFAULT NULL,
+    p_min_price   NUMERIC DEFAULT NULL,
+    p_max_price   NUMERIC DEFAULT NULL,
+    p_after_rank  REAL DEFAULT NULL,
+    p_after_id    INT DEFAULT NULL,
+    p_limit       INT DEFAULT 50
+)
+RETURNS TABLE (listing_id INT, title TEXT, category TEXT, status TEXT,
+               current_price NUMERIC, end_date TIMESTAMPTZ, rank REAL)
+LANGUAGE plpgsql STABLE AS $$
+DECLARE
+    v_query TSQUERY;
+    -- the trigram operators only exist with pg_trgm, hence the dynamic SQL below
+    v_fuzzy BOOLEAN := to_regclass('idx_listing_title_trgm') IS NOT NULL;
+BEGIN
+    SELECT to_tsquery('english', string_agg(quote_literal(w) || ':*', ' & ')) INTO v_query
+    FROM regexp_split_to_table(lower(p_query), '\W+') AS w
+    WHERE w <> '';
+    IF v_query IS NULL OR numnode(v_query) = 0 THEN
+        RETURN;
+    END IF;
+
+    RETURN QUERY EXECUTE format($sql$
+        SELECT m.listing_id, m.title, c.name, m.status, m.current_price, m.end_date, m.rank
+        FROM (
+            SELECT l.listing_id, l.title, l.category_id, l.status, l.end_date,
+                   COALESCE(l.high_bid, l.start_price) AS current_price,
+                   (ts_rank_cd(l.search_vector, $1) %s)::REAL AS rank
+            FROM listing l
+            WHERE (l.search_vector @@ $1 %s)
+              AND ($2::INT IS NULL
+                   OR l.category_id IN (SELECT s.descendant_id FROM category_closure s WHERE s.ancestor_id = $2))
+              AND ($3::TEXT IS NULL OR l.status = $3)
+              AND ($4::NUMERIC IS NULL OR COALESCE(l.high_bid, l.start_price) >= $4)
+              AND ($5::NUMERIC IS NULL OR COALESCE(l.high_bid, l.start_price) <= $5)
+        ) m
+        JOIN category c ON c.category_id = m.category_id
+        WHERE $6::REAL IS NULL OR m.rank < $6 OR (m.rank = $6 AND m.listing_id > $7)
+        ORDER BY m.rank DESC, m.listing_id
+        LIMIT $8
+    $sql$,
+        CASE WHEN v_fuzzy THEN '+ similarity(l.title, $9)' ELSE '' END,
+        CASE WHEN v_fuzzy THEN 'OR l.title % $9' ELSE '' END)
+    USING v_query, p_category_id, p_status, p_min_price, p_max_price, p_after_rank, p_after_id, p_limit, p_query;
+END$$;
+
+
+COMMIT;
+
+ANALYZE listing;
@@ -0,0 +1,391 @@
+-- Migration 008: function and trigger fixes
+-- Purpose: Brings the functions and triggers of an existing ebay_db up to the fixed versions
+--          in ebay_db.sql (fresh installs already have them)
+-- Source: review of the bid, purge, revenue and partitioning changes
+-- Notes:
+--   1. Everything runs in one transaction; functions are replaced in place, so the app and
+--      auction_closer.py can keep running
+--   2. Every statement is idempotent; re-running the file is safe
+--   3. The fixed fn_ref_transaction_bid (FOR KEY SHARE plus a per-bid advisory lock) is in
+--      migration 009, together with the tracking number check it now also does
+-- Usage: psql -d ebay_db -f migrations/008_function_fixes.sql
+
+BEGIN;
+
+-- Function: fn_enforce_bid_rules()
+-- Enforces eBay-like bidding rules before a bid is inserted
+-- Business Rules:
+--   1. Bids can only be placed on active listings that haven't ended
+--   2. Bid amount must be at least the starting price
+--   3. Bid amount must be at least $1 more than the current highest bid
+--   4. Rule 3 means every accepted bid beats the current high bid, so every accepted bid becomes
+--      the listing's high_bid / high_bidder_id. Unless the high bidder raises their own bid,
+--      that UPDATE cannot be HOT: high_bidder_id is indexed (idx_listing_high_bidder, needed
+--      by the foreign-key check when users are deleted), so it also writes every listing index
+-- The listing row is locked FOR UPDATE before the high bid is read, so concurrent bids
+-- on the same listing are validated one at a time against an up-to-date high bid, and
+-- validation is a single primary-key row access instead of a MAX() over bid
+-- Usage: Automatically called by trigger tg_enforce_bid_rules on bid INSERT
+-- Example: When user places bid, this validates it meets all requirements
+CREATE OR REPLACE FUNCTION fn_enforce_bid_rules()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+DECLARE
+    current_max NUMERIC(12,2);
+    start_price NUMERIC(12,2);
+    l_status    TEXT;
+    l_end       TIMESTAMPTZ;
+BEGIN
+    SELECT l.start_price, l.status, l.end_date, COALESCE(l.high_bid, 0)
+    INTO start_price, l_status, l_end, current_max
+    FROM listing l WHERE l.listing_id = NEW.listing_id FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Listing % does not exist', NEW.listing_id;
+    END IF;
+
+    IF l_status <> 'active' OR NOW() > l_end THEN
+        RAISE EXCEPTION 'Listing not active or already ended';
+    END IF;
+
+    IF NEW.bid_amount < GREATEST(start_price, current_max + 1) THEN
+        RAISE EXCEPTION 'Bid too low. Minimum acceptable: %', GREATEST(start_price, current_max + 1);
+    END IF;
+
+    UPDATE listing SET high_bid = NEW.bid_amount, high_bidder_id = NEW.user_id
+    WHERE listing_id = NEW.listing_id;
+    RETURN NEW;
+END$$;
+
+-- Function: place_bids()
+-- Purpose: Set-based bulk entry point for bids (auction-sniping replays, bid history imports)
+-- Business Rules:
+--   1. Each bid is checked against the fn_enforce_bid_rules rules, in input order per listing,
+--      with every accepted bid raising the minimum for the bids after it
+--   2. Invalid bids are rejected with a reason instead of aborting the whole batch; a NULL
+--      user, listing or amount is rejected before its listing is looked at
+--   3. Every listing in the batch is locked once, in listing_id order, to avoid deadlocks
+--   4. Accepted bids are written with a single INSERT (tg_enforce_bid_rules still runs per row,
+--      now a cheap re-check under the lock already held)
+-- Parameters (parallel arrays, one element per bid):
+--   - p_user_ids, p_listing_ids, p_amounts: Bidder, listing and amount
+--   - p_is_proxy: Proxy flags (NULL = all FALSE)
+-- Returns: One row per input bid (ord = 1-based input position) with the new bid_id,
+--          or a NULL bid_id and the rejection reason
+-- Usage: SELECT * FROM place_bids(ARRAY[2,4], ARRAY[1,1], ARRAY[400,420]);
+-- Example: A 5,000-bid sniping burst is validated and stored in one round trip
+CREATE OR REPLACE FUNCTION place_bids(p_user_ids INT[], p_listing_ids INT[], p_amounts NUMERIC[],
+                                      p_is_proxy BOOLEAN[] DEFAULT NULL)
+RETURNS TABLE (ord INT, listing_id INT, bid_id INT, reason TEXT)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    r           RECORD;
+    cur_listing INT;
+    l_found     BOOLEAN;
+    l_start     NUMERIC(12,2);
+    l_status    TEXT;
+    l_end       TIMESTAMPTZ;
+    high        NUMERIC(12,2);
+    min_ok      NUMERIC(12,2);
+    why         TEXT;
+    new_id      INT;
+    seq         TEXT := pg_get_serial_sequence('bid', 'bid_id');
+    res_ord     INT[] := '{}';
+    res_listing INT[] := '{}';
+    res_bid     INT[] := '{}';
+    res_reason  TEXT[] := '{}';
+    ok_bid      INT[] := '{}';
+    ok_listing  INT[] := '{}';
+    ok_user     INT[] := '{}';
+    ok_amount   NUMERIC[] := '{}';
+    ok_proxy    BOOLEAN[] := '{}';
+BEGIN
+    IF cardinality(p_user_ids) <> cardinality(p_listing_ids)
+       OR cardinality(p_user_ids) <> cardinality(p_amounts)
+       OR cardinality(p_user_ids) <> COALESCE(cardinality(p_is_proxy), cardinality(p_user_ids)) THEN
+        RAISE EXCEPTION 'place_bids: input arrays must have the same length';
+    END IF;
+
+    PERFORM 1 FROM listing l
+    WHERE l.listing_id = ANY(p_listing_ids)
+    ORDER BY l.listing_id
+    FOR UPDATE;
+
+    FOR r IN
+        SELECT i.ord::INT AS ord, i.user_id, i.listing_id, round(i.amount, 2) AS amount,
+               COALESCE(p_is_proxy[i.ord], FALSE) AS is_proxy,
+               EXISTS (SELECT 1 FROM user_account u WHERE u.user_id = i.user_id) AS user_ok
+        FROM unnest(p_user_ids, p_listing_ids, p_amounts) WITH ORDINALITY AS i(user_id, listing_id, amount, ord)
+        ORDER BY i.listing_id, i.ord
+    LOOP
+        IF r.listing_id IS NOT NULL AND r.listing_id IS DISTINCT FROM cur_listing THEN
+            cur_listing := r.listing_id;
+            SELECT l.start_price, l.status, l.end_date, COALESCE(l.high_bid, 0)
+            INTO l_start, l_status, l_end, high
+            FROM listing l WHERE l.listing_id = r.listing_id;
+            l_found := FOUND;
+        END IF;
+        min_ok := GREATEST(l_start, high + 1);
+        why := CASE
+            WHEN r.user_id IS NULL THEN 'Missing user_id'
+            WHEN r.listing_id IS NULL THEN 'Missing listing_id'
+            WHEN r.amount IS NULL THEN 'Missing bid amount'
+            -- NaN compares above every number, so it fails the upper bound
+            WHEN NOT (r.amount > 0 AND r.amount < 1e10) THEN 'Bid amount must be positive and below 10000000000'
+            WHEN NOT l_found THEN format('Listing %s does not exist', r.listing_id)
+            WHEN NOT r.user_ok THEN format('User %s does not exist', r.user_id)
+            WHEN l_status <> 'active' OR NOW() > l_end THEN 'Listing not active or already ended'
+            WHEN r.amount < min_ok THEN format('Bid too low. Minimum acceptable: %s', min_ok)
+        END;
+        new_id := NULL;
+        IF why IS NULL THEN
+            new_id := nextval(seq);
+            high := r.amount;
+            ok_bid := ok_bid || new_id;
+            ok_listing := ok_listing || r.listing_id;
+            ok_user := ok_user || r.user_id;
+            ok_amount := ok_amount || r.amount;
+            ok_proxy := ok_proxy || r.is_proxy;
+        END IF;
+        res_ord := res_ord || r.ord;
+        res_listing := res_listing || r.listing_id;
+        res_bid := res_bid || new_id;
+        res_reason := res_reason || why;
+    END LOOP;
+
+    INSERT INTO bid (bid_id, listing_id, user_id, bid_amount, is_proxy)
+    OVERRIDING SYSTEM VALUE
+    SELECT a.bid_id, a.listing_id, a.user_id, a.amount, a.is_proxy
+    FROM unnest(ok_bid, ok_listing, ok_user, ok_amount, ok_proxy) AS a(bid_id, listing_id, user_id, amount, is_proxy)
+    ORDER BY a.bid_id;
+
+    RETURN QUERY
+    SELECT x.ord, x.listing_id, x.bid_id, x.reason
+    FROM unnest(res_ord, res_listing, res_bid, res_reason) AS x(ord, listing_id, bid_id, reason)
+    ORDER BY x.ord;
+END$$;
+
+-- Bid deletes are applied by the row triggers tg_reset_high_bid and tg_summary_on_bid again,
+-- instead of the statement-level tg_bid_delete_stmt
+DROP TRIGGER IF EXISTS tg_bid_delete_stmt ON bid;
+DROP FUNCTION IF EXISTS fn_bid_delete_stmt();
+
+DROP TRIGGER IF EXISTS tg_reset_high_bid ON bid;
+CREATE TRIGGER tg_reset_high_bid
+AFTER DELETE OR UPDATE OF listing_id, bid_amount ON bid
+FOR EACH ROW EXECUTE FUNCTION fn_reset_high_bid();
+
+DROP TRIGGER IF EXISTS tg_summary_on_bid ON bid;
+CREATE TRIGGER tg_summary_on_bid
+AFTER INSERT OR DELETE OR UPDATE OF listing_id ON bid
+FOR EACH ROW EXECUTE FUNCTION fn_summary_on_bid();
+
+--  Archived months stay attached under archive.bid / archive.transaction
+
+CREATE SCHEMA IF NOT EXISTS archive;
+CREATE TABLE IF NOT EXISTS archive.bid (LIKE bid) PARTITION BY RANGE (bid_time);
+CREATE TABLE IF NOT EXISTS archive.transaction (LIKE transaction) PARTITION BY RANGE (transaction_date);
+CREATE INDEX IF NOT EXISTS idx_archive_bid_listing_amount ON archive.bid (listing_id, bid_amount DESC);
+CREATE INDEX IF NOT EXISTS idx_archive_transaction_listing ON archive.transaction (listing_id);
+
+-- Months archived before this migration are plain tables in the archive schema; attach them,
+-- taking the range from the name (bid_yYYYYmMM / transaction_yYYYYmMM)
+DO $$
+DECLARE
+    r RECORD;
+BEGIN
+    FOR r IN
+        SELECT c.relname, m[1] AS parent, make_timestamptz(m[2]::INT, m[3]::INT, 1, 0, 0, 0, 'UTC') AS range_from
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace AND n.nspname = 'archive'
+        CROSS JOIN LATERAL regexp_match(c.relname, '^(bid|transaction)_y(\d{4})m(\d{2})$') AS m
+        WHERE m IS NOT NULL AND c.relkind = 'r' AND NOT c.relispartition
+    LOOP
+        EXECUTE format('ALTER TABLE archive.%I ATTACH PARTITION archive.%I FOR VALUES FROM (%L) TO (%L)',
+                       r.parent, r.relname, r.range_from, date_add(r.range_from, INTERVAL '1 month', 'UTC'));
+    END LOOP;
+END$$;
+
+-- View: v_bid_history / v_transaction_history
+-- Purpose: Every bid / transaction, live and archived: what the trigger-maintained summaries
+-- (high_bid, listing_price_summary, revenue_fact, the bid sketches) count, and what their
+-- refresh_*() functions rebuild from
+CREATE OR REPLACE VIEW v_bid_history AS
+SELECT * FROM bid UNION ALL SELECT * FROM archive.bid;
+
+CREATE OR REPLACE VIEW v_transaction_history AS
+SELECT * FROM transaction UNION ALL SELECT * FROM archive.transaction;
+
+-- View: v_time_partitions
+-- Purpose: The monthly partitions of bid and transaction with their time range and size
+-- (archived months are partitions of archive.bid / archive.transaction and are not listed)
+-- Query Pattern: SELECT * FROM v_time_partitions ORDER BY parent_table, range_from
+CREATE OR REPLACE VIEW v_time_partitions AS
+SELECT p.relname AS parent_table, c.relname AS partition_name,
+       b[1]::TIMESTAMPTZ AS range_from, b[2]::TIMESTAMPTZ AS range_to,
+       GREATEST(c.reltuples, 0)::BIGINT AS estimated_rows,
+       pg_total_relation_size(c.oid) AS total_bytes
+FROM pg_inherits i
+JOIN pg_class p ON p.oid = i.inhparent
+JOIN pg_class c ON c.oid = i.inhrelid
+CROSS JOIN LATERAL regexp_match(pg_get_expr(c.relpartbound, c.oid), 'FROM \(''(.+)''\) TO \(''(.+)''\)') AS b
+WHERE i.inhparent IN ('bid'::REGCLASS, 'transaction'::REGCLASS);
+
+-- Function: fn_reset_high_bid()
+-- Purpose: Keeps listing.high_bid correct when bids are deleted or changed
+-- Business Rules:
+--   1. Only acts when the affected bid was the listing's high bid
+--   2. The replacement is the top entry of idx_bid_listing_amount (earliest bid wins ties)
+-- Usage: Automatically called by trigger tg_reset_high_bid on bid DELETE/UPDATE
+CREATE OR REPLACE FUNCTION fn_reset_high_bid()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE listing l
+       SET high_bid = top.bid_amount, high_bidder_id = top.user_id
+      FROM (SELECT OLD.listing_id AS listing_id) k
+      LEFT JOIN LATERAL (
+            SELECT b.bid_amount, b.user_id FROM v_bid_history b
+            WHERE b.listing_id = k.listing_id
+            ORDER BY b.bid_amount DESC, b.bid_time ASC
+            LIMIT 1) top ON TRUE
+     WHERE l.listing_id = k.listing_id
+       AND OLD.bid_amount >= l.high_bid;
+    IF TG_OP = 'UPDATE' THEN
+        UPDATE listing
+           SET high_bid = NEW.bid_amount, high_bidder_id = NEW.user_id
+         WHERE listing_id = NEW.listing_id
+           AND (high_bid IS NULL OR NEW.bid_amount > high_bid);
+    END IF;
+    RETURN NULL;
+END$$;
+
+-- Function: refresh_listing_high_bids()
+-- Purpose: Recomputes listing.high_bid / high_bidder_id from bid, archived months included
+-- Returns: Number of listings updated
+-- Usage: SELECT refresh_listing_high_bids();
+-- Example: Run after bulk loads done with triggers disabled
+CREATE OR REPLACE FUNCTION refresh_listing_high_bids()
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+    n INT;
+BEGIN
+    LOCK TABLE bid IN SHARE MODE;
+    UPDATE listing l
+       SET high_bid = top.bid_amount, high_bidder_id = top.user_id
+      FROM listing l2
+      LEFT JOIN LATERAL (
+            SELECT b.bid_amount, b.user_id FROM v_bid_history b
+            WHERE b.listing_id = l2.listing_id
+            ORDER BY b.bid_amount DESC, b.bid_time ASC
+            LIMIT 1) top ON TRUE
+     WHERE l.listing_id = l2.listing_id
+       AND (l.high_bid IS DISTINCT FROM top.bid_amount OR l.high_bidder_id IS DISTINCT FROM top.user_id);
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END$$;
+
+-- Function: refresh_listing_price_summary()
+-- Purpose: Rebuilds listing_price_summary from the base tables (bids of archived months included)
+-- Business Rules:
+--   1. Bids and watchers are aggregated separately, so there is no bids x watchers fan-out
+--   2. Writers to bid/user_listing_watch are blocked for the duration so no delta is lost
+-- Returns: Number of listings summarized
+-- Usage: SELECT refresh_listing_price_summary();
+-- Example: Run after bulk loads done with triggers disabled
+CREATE OR REPLACE FUNCTION refresh_listing_price_summary()
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+    n INT;
+BEGIN
+    LOCK TABLE bid, user_listing_watch IN SHARE MODE;
+    DELETE FROM listing_price_summary;
+    INSERT INTO listing_price_summary (listing_id, bid_count, watcher_count)
+    SELECT l.listing_id, COALESCE(b.bid_count, 0), COALESCE(w.watcher_count, 0)
+    FROM listing l
+    LEFT JOIN (SELECT listing_id, COUNT(*) AS bid_count
+               FROM v_bid_history GROUP BY listing_id) b ON b.listing_id = l.listing_id
+    LEFT JOIN (SELECT listing_id, COUNT(*) AS watcher_count
+               FROM user_listing_watch GROUP BY listing_id) w ON w.listing_id = l.listing_id;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END$$;
+
+-- Function: fn_revenue_fact_on_listing()
+-- Purpose: Moves a listing's transactions to its new category in revenue_fact
+-- Usage: Automatically called by trigger tg_revenue_fact_on_listing when listing.category_id changes
+CREATE OR REPLACE FUNCTION fn_revenue_fact_on_listing()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO revenue_fact AS f (category_id, payment_status, shipping_status, sale_date, txn_count, revenue)
+    SELECT v.category_id, t.payment_status, t.shipping_status, (t.transaction_date AT TIME ZONE 'UTC')::DATE,
+           SUM(v.sign), SUM(v.sign * t.final_price)
+    FROM v_transaction_history t
+    CROSS JOIN (VALUES (OLD.category_id, -1), (NEW.category_id, 1)) AS v(category_id, sign)
+    WHERE t.listing_id = NEW.listing_id
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (category_id, payment_status, shipping_status, sale_date) DO UPDATE
+       SET txn_count = f.txn_count + EXCLUDED.txn_count,
+           revenue = f.revenue + EXCLUDED.revenue;
+    DELETE FROM revenue_fact WHERE txn_count = 0;
+    RETURN NULL;
+END$$;
+
+-- Function: refresh_revenue_fact()
+-- Purpose: Rebuilds revenue_fact from transaction (archived months included) and listing
+-- Business Rules:
+--   1. Writers to transaction/listing are blocked for the duration so no delta is lost
+-- Returns: Number of fact rows
+-- Usage: SELECT refresh_revenue_fact();
+-- Example: Run after bulk loads done with triggers disabled
+CREATE OR REPLACE FUNCTION refresh_revenue_fact()
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+    n INT;
+BEGIN
+    LOCK TABLE transaction, listing IN SHARE MODE;
+    DELETE FROM revenue_fact;
+    INSERT INTO revenue_fact (category_id, payment_status, shipping_status, sale_date, txn_count, revenue)
+    SELECT l.category_id, t.payment_status, t.shipping_status, (t.transaction_date AT TIME ZONE 'UTC')::DATE,
+           COUNT(*), SUM(t.final_price)
+    FROM v_transaction_history t
+    JOIN listing l ON l.listing_id = t.listing_id
+    GROUP BY 1, 2, 3, 4;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END$$;
+
+-- Function: refresh_bid_sketches()
+-- Purpose: Rebuilds bid_sketch_listing, bid_sketch_category and bid_sketch_total from bid,
+-- archived months included
+-- Business Rules:
+--   1. Writers to bid/listing are blocked for the duration so no delta is lost
+-- Returns: Number of listing sketch rows
+-- Usage: SELECT refresh_bid_sketches();
+-- Example: Run after bulk loads done with triggers disabled
+CREATE OR REPLACE FUNCTION refresh_bid_sketches()
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+    v_rows INT;
+BEGIN
+    LOCK TABLE bid, listing IN SHARE MODE;
+    DELETE FROM bid_sketch_listing;
+    DELETE FROM bid_sketch_category;
+    DELETE FROM bid_sketch_total;
+    INSERT INTO bid_sketch_listing (listing_id, bucket, n)
+    SELECT listing_id, bid_sketch_bucket(bid_amount), COUNT(*)
+    FROM v_bid_history
+    GROUP BY 1, 2;
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    INSERT INTO bid_sketch_category (category_id, bucket, n)
+    SELECT l.category_id, s.bucket, SUM(s.n)
+    FROM bid_sketch_listing s
+    JOIN listing l ON l.listing_id = s.listing_id
+    GROUP BY 1, 2;
+    INSERT INTO bid_sketch_total (stripe, bucket, n)
+    SELECT listing_id % 16, bucket, SUM(n)
+    FROM bid_sketch_listing
+    GROUP BY 1, 2;
+    RETURN v_rows;
+END$$;
+
+COMMIT;
@@ -0,0 +1,147 @@
+-- Migration 009: unique tracking numbers
+-- Purpose: Restores the uniqueness of transaction.tracking_number that migration 005 dropped
+--          when it partitioned transaction, through the transaction_tracking_number side table
+--          defined in ebay_db.sql (fresh installs already have it)
+-- Source: review of the time partitioning change; a duplicate tracking number was accepted
+-- Notes:
+--   1. Everything runs in one transaction; the backfill holds a SHARE lock on transaction
+--      (reads go on, writes wait) while it copies every tracking number, archived months included
+--   2. The backfill fails on transaction_tracking_number_key if two transactions already share a
+--      tracking number; list them with
+--        SELECT tracking_number, array_agg(transaction_id) FROM v_transaction_history
+--        WHERE tracking_number IS NOT NULL GROUP BY 1 HAVING COUNT(*) > 1;
+--      and fix them before re-running
+--   3. fn_ref_transaction_bid moves here from migration 008 (same function plus rule 6); apply
+--      008 before this file
+--   4. Every statement is idempotent; re-running the file is safe
+-- Usage: psql -d ebay_db -f migrations/009_tracking_number_unique.sql
+
+BEGIN;
+
+-- One row per tracking number in transaction, archived months included: a UNIQUE constraint on
+-- the partitioned table would have to include transaction_date. Kept by the tg_ref_transaction_*
+-- triggers, so a duplicate fails on transaction_tracking_number_key, the name the UNIQUE
+-- constraint had; refresh_transaction_tracking_numbers() rebuilds it
+CREATE TABLE IF NOT EXISTS transaction_tracking_number (
+    tracking_number TEXT NOT NULL,
+    transaction_id  INT NOT NULL,
+    CONSTRAINT transaction_tracking_number_key PRIMARY KEY (tracking_number)
+);
+
+-- Function: fn_ref_transaction_bid()
+-- Purpose: Enforces transaction.bid_id -> bid(bid_id), one transaction per bid and unique
+-- tracking numbers
+-- Business Rules:
+--   1. Every inserted transaction, or one whose bid_id changed, must name an existing bid
+--   2. No bid may have more than one transaction
+--   3. The named bids are locked FOR KEY SHARE, as a declared foreign key would lock them, so a
+--      concurrent delete of the bid waits for this transaction and then fails its own check
+--   4. One transaction-scoped advisory lock per bid, taken in bid_id order, serializes writers
+--      naming the same bid, so the second one's duplicate check sees the first one's row;
+--      a statement takes one lock per distinct bid (close_expired_listings: one per listing
+--      closed), which has to fit the server's lock table (max_locks_per_transaction)
+--   5. The bid_id lookups cannot be pruned to one partition, so this function (like
+--      fn_ref_feedback_transaction) keeps generic plans: re-planning them against every
+--      partition on each call cost more than the check itself
+--   6. Tracking numbers the statement set are claimed in transaction_tracking_number and the
+--      ones it replaced are released; its primary key rejects a duplicate, and a concurrent
+--      writer of the same tracking number waits for this transaction, as with a UNIQUE constraint
+-- Usage: Automatically called by the tg_ref_transaction_bid_* triggers
+CREATE OR REPLACE FUNCTION fn_ref_transaction_bid()
+RETURNS TRIGGER LANGUAGE plpgsql
+SET plan_cache_mode = force_generic_plan AS $$
+DECLARE
+    v_bids INT[];
+    v_bid  INT;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO transaction_tracking_number (tracking_number, transaction_id)
+        SELECT tracking_number, transaction_id FROM new_rows WHERE tracking_number IS NOT NULL;
+    ELSE
+        DELETE FROM transaction_tracking_number k
+        USING (SELECT tracking_number, transaction_id FROM old_rows
+               EXCEPT SELECT tracking_number, transaction_id FROM new_rows) o
+        WHERE k.tracking_number = o.tracking_number AND k.transaction_id = o.transaction_id;
+        INSERT INTO transaction_tracking_number (tracking_number, transaction_id)
+        SELECT tracking_number, transaction_id FROM new_rows WHERE tracking_number IS NOT NULL
+        EXCEPT SELECT tracking_number, transaction_id FROM old_rows;
+    END IF;
+
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT bid_id ORDER BY bid_id) INTO v_bids FROM new_rows;
+    ELSE
+        SELECT array_agg(DISTINCT n.bid_id ORDER BY n.bid_id) INTO v_bids
+        FROM new_rows n
+        WHERE NOT EXISTS (SELECT 1 FROM old_rows o WHERE o.transaction_id = n.transaction_id AND o.bid_id = n.bid_id);
+    END IF;
+    IF v_bids IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    FOREACH v_bid IN ARRAY v_bids LOOP
+        PERFORM pg_advisory_xact_lock(hashtext('transaction.bid_id'), v_bid);
+    END LOOP;
+    WITH locked AS MATERIALIZED (
+        SELECT bid_id FROM bid WHERE bid_id = ANY(v_bids) ORDER BY bid_id FOR KEY SHARE
+    )
+    SELECT x INTO v_bid FROM unnest(v_bids) AS x
+    WHERE x NOT IN (SELECT bid_id FROM locked)
+    LIMIT 1;
+    IF FOUND THEN
+        RAISE EXCEPTION 'Bid % does not exist', v_bid USING ERRCODE = 'foreign_key_violation';
+    END IF;
+    SELECT t.bid_id INTO v_bid FROM transaction t
+    WHERE t.bid_id = ANY(v_bids)
+    GROUP BY t.bid_id HAVING COUNT(*) > 1
+    LIMIT 1;
+    IF FOUND THEN
+        RAISE EXCEPTION 'Bid % already has a transaction', v_bid USING ERRCODE = 'unique_violation';
+    END IF;
+    RETURN NULL;
+END$$;
+
+-- Function: fn_ref_transaction_delete()
+-- Purpose: The ON DELETE side of feedback.transaction_id: transactions with feedback cannot be deleted;
+-- also releases the tracking numbers of the deleted transactions
+-- Usage: Automatically called by trigger tg_ref_transaction_delete (purge_users deletes feedback first)
+CREATE OR REPLACE FUNCTION fn_ref_transaction_delete()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+DECLARE
+    v_txn INT;
+BEGIN
+    DELETE FROM transaction_tracking_number k
+    USING old_rows o
+    WHERE k.tracking_number = o.tracking_number AND k.transaction_id = o.transaction_id;
+    SELECT f.transaction_id INTO v_txn FROM feedback f
+    WHERE f.transaction_id IN (SELECT transaction_id FROM old_rows)
+    LIMIT 1;
+    IF FOUND THEN
+        RAISE EXCEPTION 'Transaction % is still referenced by feedback', v_txn USING ERRCODE = 'foreign_key_violation';
+    END IF;
+    RETURN NULL;
+END$$;
+
+-- Function: refresh_transaction_tracking_numbers()
+-- Purpose: Rebuilds transaction_tracking_number from transaction (archived months included)
+-- Business Rules:
+--   1. Writers to transaction are blocked for the duration so no tracking number is missed
+--   2. Fails on transaction_tracking_number_key if two transactions share a tracking number
+-- Returns: Number of tracking numbers
+-- Usage: SELECT refresh_transaction_tracking_numbers();
+-- Example: Run after bulk loads done with triggers disabled, or after dropping archived months
+CREATE OR REPLACE FUNCTION refresh_transaction_tracking_numbers()
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+    n INT;
+BEGIN
+    LOCK TABLE transaction IN SHARE MODE;
+    DELETE FROM transaction_tracking_number;
+    INSERT INTO transaction_tracking_number (tracking_number, transaction_id)
+    SELECT tracking_number, transaction_id FROM v_transaction_history WHERE tracking_number IS NOT NULL;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END$$;
+
+SELECT refresh_transaction_tracking_numbers();
+
+COMMIT;
@@ -0,0 +1,173 @@
+-- Migration 010: purging users with archived history
+-- Purpose: Lets purge_users() delete users whose bids or transactions were archived by
+--          partitions.py: it now removes their archived rows too, and archive.bid /
+--          archive.transaction get the DELETE triggers of bid and transaction so the summaries
+--          stay correct (fresh installs already have all of this)
+-- Source: review of the time partitioning change; purging a user with archived bids failed on
+--         listing_high_bidder_id_fkey, because deleting their live bids made an archived bid of
+--         theirs the listing's high bid again
+-- Notes:
+--   1. Everything runs in one transaction; the new archive indexes adopt the indexes archived
+--      months brought with them, so nothing is rebuilt for months archived by partitions.py
+--   2. The archive triggers call fn_ref_transaction_delete as migration 009 left it; apply 009
+--      before this file
+--   3. Every statement is idempotent; re-running the file is safe
+-- Usage: psql -d ebay_db -f migrations/010_purge_archived_rows.sql
+
+BEGIN;
+
+-- Lookups of purge_users() and the tg_ref_* checks on archived rows; same definitions as the
+-- indexes of bid / transaction, so an archived month's own indexes are adopted
+CREATE INDEX IF NOT EXISTS idx_archive_bid_user ON archive.bid (user_id);
+CREATE INDEX IF NOT EXISTS idx_archive_transaction_buyer ON archive.transaction (buyer_id);
+CREATE INDEX IF NOT EXISTS idx_archive_transaction_seller ON archive.transaction (seller_id);
+CREATE INDEX IF NOT EXISTS idx_archive_transaction_bid ON archive.transaction (bid_id);
+
+-- Function: purge_users()
+-- Purpose: Deletes users together with everything that depends on them, in one round trip
+-- Business Rules:
+--   1. Removes the users' listings, and every bid, watch and transaction that involves
+--      the users or those listings, archived months included (an archived bid left behind
+--      could become a listing's high bid again and keep its bidder referenced)
+--   2. Removes feedback written by or about the users, or tied to a removed transaction
+--   3. Every step is a set-based DELETE on an indexed column, in FK order
+--   4. Runs in the caller's transaction, so a failure leaves nothing half-deleted
+--   5. Keeps generic plans: its lookups by id cannot be pruned to one partition of bid or
+--      transaction, and re-planning them against every partition on each call cost more
+--      than running them
+-- Returns: One row per table with the number of rows deleted
+-- Usage: SELECT * FROM purge_users(ARRAY[12, 13, 14]);
+-- Example: Remove test or spam accounts in bulk
+CREATE OR REPLACE FUNCTION purge_users(p_user_ids INT[])
+RETURNS TABLE (table_name TEXT, deleted BIGINT)
+LANGUAGE plpgsql
+SET plan_cache_mode = force_generic_plan AS $$
+DECLARE
+    v_listings INT[];
+    v_txns     INT[];
+    n          BIGINT;
+BEGIN
+    SELECT COALESCE(array_agg(l.listing_id), '{}') INTO v_listings
+    FROM listing l WHERE l.seller_id = ANY(p_user_ids);
+
+    SELECT COALESCE(array_agg(DISTINCT x.transaction_id), '{}') INTO v_txns
+    FROM (
+        SELECT t.transaction_id FROM v_transaction_history t WHERE t.buyer_id = ANY(p_user_ids)
+        UNION ALL
+        SELECT t.transaction_id FROM v_transaction_history t WHERE t.seller_id = ANY(p_user_ids)
+        UNION ALL
+        SELECT t.transaction_id FROM v_transaction_history t WHERE t.listing_id = ANY(v_listings)
+        UNION ALL
+        SELECT t.transaction_id FROM v_bid_history b JOIN v_transaction_history t ON t.bid_id = b.bid_id
+        WHERE b.user_id = ANY(p_user_ids)
+    ) x;
+
+    table_name := 'feedback';
+    DELETE FROM feedback f
+    WHERE f.author_user_id = ANY(p_user_ids)
+       OR f.target_user_id = ANY(p_user_ids)
+       OR f.transaction_id = ANY(v_txns);
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+    RETURN NEXT;
+
+    table_name := 'transaction';
+    DELETE FROM transaction t WHERE t.transaction_id = ANY(v_txns);
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+    DELETE FROM archive.transaction t WHERE t.transaction_id = ANY(v_txns);
+    GET DIAGNOSTICS n = ROW_COUNT;
+    deleted := deleted + n;
+    RETURN NEXT;
+
+    table_name := 'bid';
+    DELETE FROM bid b WHERE b.listing_id = ANY(v_listings);
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+    DELETE FROM archive.bid b WHERE b.listing_id = ANY(v_listings);
+    GET DIAGNOSTICS n = ROW_COUNT;
+    deleted := deleted + n;
+    DELETE FROM bid b WHERE b.user_id = ANY(p_user_ids);
+    GET DIAGNOSTICS n = ROW_COUNT;
+    deleted := deleted + n;
+    DELETE FROM archive.bid b WHERE b.user_id = ANY(p_user_ids);
+    GET DIAGNOSTICS n = ROW_COUNT;
+    deleted := deleted + n;
+    RETURN NEXT;
+
+    table_name := 'user_listing_watch';
+    DELETE FROM user_listing_watch w WHERE w.listing_id = ANY(v_listings);
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+    DELETE FROM user_listing_watch w WHERE w.user_id = ANY(p_user_ids);
+    GET DIAGNOSTICS n = ROW_COUNT;
+    deleted := deleted + n;
+    RETURN NEXT;
+
+    table_name := 'listing';
+    DELETE FROM listing l WHERE l.listing_id = ANY(v_listings);
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+    RETURN NEXT;
+
+    table_name := 'user_account';
+    DELETE FROM user_account u WHERE u.user_id = ANY(p_user_ids);
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+    RETURN NEXT;
+END$$;
+
+-- Function: fn_ref_bid_delete()
+-- Purpose: The ON DELETE side of transaction.bid_id: bids that have a transaction cannot be deleted
+-- (live or archived bids, live or archived transactions)
+-- Usage: Automatically called by trigger tg_ref_bid_delete (purge_users deletes transactions first)
+CREATE OR REPLACE FUNCTION fn_ref_bid_delete()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+DECLARE
+    v_bid INT;
+BEGIN
+    SELECT t.bid_id INTO v_bid FROM v_transaction_history t
+    WHERE t.bid_id IN (SELECT bid_id FROM old_rows)
+    LIMIT 1;
+    IF FOUND THEN
+        RAISE EXCEPTION 'Bid % is still referenced by a transaction', v_bid USING ERRCODE = 'foreign_key_violation';
+    END IF;
+    RETURN NULL;
+END$$;
+
+-- Triggers on archive.bid / archive.transaction
+-- Purpose: purge_users() deletes archived rows too; these are the DELETE triggers of bid and
+-- transaction, so the high bid, listing_price_summary, the bid sketches, revenue_fact and
+-- transaction_tracking_number lose them as they would lose live rows, and the tg_ref_* checks
+-- still apply. Archived rows are never inserted or updated, so there are no other triggers
+-- Usage: Attached months get the row triggers automatically; the statement triggers fire on the
+-- parent
+DROP TRIGGER IF EXISTS tg_reset_high_bid ON archive.bid;
+CREATE TRIGGER tg_reset_high_bid
+AFTER DELETE ON archive.bid
+FOR EACH ROW EXECUTE FUNCTION fn_reset_high_bid();
+
+DROP TRIGGER IF EXISTS tg_summary_on_bid ON archive.bid;
+CREATE TRIGGER tg_summary_on_bid
+AFTER DELETE ON archive.bid
+FOR EACH ROW EXECUTE FUNCTION fn_summary_on_bid();
+
+DROP TRIGGER IF EXISTS tg_bid_sketch_delete ON archive.bid;
+CREATE TRIGGER tg_bid_sketch_delete
+AFTER DELETE ON archive.bid
+REFERENCING OLD TABLE AS old_bids
+FOR EACH STATEMENT EXECUTE FUNCTION fn_bid_sketch_stmt();
+
+DROP TRIGGER IF EXISTS tg_ref_bid_delete ON archive.bid;
+CREATE TRIGGER tg_ref_bid_delete
+AFTER DELETE ON archive.bid
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION fn_ref_bid_delete();
+
+DROP TRIGGER IF EXISTS tg_revenue_fact_delete ON archive.transaction;
+CREATE TRIGGER tg_revenue_fact_delete
+AFTER DELETE ON archive.transaction
+REFERENCING OLD TABLE AS old_txns
+FOR EACH STATEMENT EXECUTE FUNCTION fn_revenue_fact_stmt();
+
+DROP TRIGGER IF EXISTS tg_ref_transaction_delete ON archive.transaction;
+CREATE TRIGGER tg_ref_transaction_delete
+AFTER DELETE ON archive.transaction
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION fn_ref_transaction_delete();
+
+COMMIT;
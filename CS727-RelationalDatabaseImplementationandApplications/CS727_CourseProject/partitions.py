@@ -0,0 +1,205 @@
+"""
+Partition maintenance for the time-partitioned `bid` and `transaction`
+tables of the `ebay_db` database (no Tkinter required).
+
+Both tables are range-partitioned by month (bid_time / transaction_date, in
+UTC); see the "Time partitioning" section of ebay_db.sql.
+
+- list: every partition with its range, estimated rows and size.
+- ensure: create any missing partitions from this month to --months-ahead
+  months ahead (ensure_time_partitions(); auction_closer.py and the app
+  also run it at startup and every hour, ebay_service.py and ebay_async.py
+  before they write bids or transactions).
+- archive: detach the partitions that end on or before a cutoff with
+  DETACH PARTITION ... CONCURRENTLY, which does not block reads or writes on
+  the parent, move them to the `archive` schema and attach them to
+  archive.bid / archive.transaction. Their foreign keys are dropped;
+  purge_users() deletes a purged user's archived rows itself, and the
+  delete triggers of archive.bid / archive.transaction keep the high bid
+  and the summaries in step. A detach that was interrupted, or a detached partition whose
+  move failed, is archived first. The cutoff may not be later than the start of the
+  current month (UTC): live months are never archived.
+
+Archived bids and transactions drop out of every query on the parent
+tables. v_bid_history / v_transaction_history cover both, and the
+transaction -> bid and feedback -> transaction checks of
+`datagen.py --verify` and the refresh_*() functions use them, so a
+transaction of an archived bid is not a dangling reference.
+listing_price_summary, revenue_fact and the bid sketches are maintained by
+triggers and keep their history.
+
+Usage:
+  python partitions.py list
+  python partitions.py ensure --months-ahead 6
+  python partitions.py archive --keep-months 12 --dry-run
+  python partitions.py archive --before 2025-01-01
+
+Connection settings come from the same PG* env vars as the app (see db.py).
+"""
+
+import argparse
+import json
+import sys
+
+from db import get_conn
+from queries import PARTITION_MONTHS_AHEAD
+from ebay_service import ensure_partitions, json_default
+
+ARCHIVE_SCHEMA = "archive"
+
+LIST_SQL = """
+    SELECT parent_table, partition_name, range_from, range_to, estimated_rows,
+           pg_size_pretty(total_bytes) AS size
+    FROM v_time_partitions
+    ORDER BY parent_table, range_from
+"""
+
+# finished by archive(): a DETACH ... CONCURRENTLY that was cancelled or lost its connection
+PENDING_SQL = """
+    SELECT i.inhparent::REGCLASS::TEXT AS parent_table, c.relname AS partition_name,
+           b[1]::TIMESTAMPTZ AS range_from, b[2]::TIMESTAMPTZ AS range_to, c.reltuples::BIGINT AS estimated_rows
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    CROSS JOIN LATERAL regexp_match(pg_get_expr(c.relpartbound, c.oid), 'FROM \\(''(.+)''\\) TO \\(''(.+)''\\)') AS b
+    WHERE i.inhdetachpending AND i.inhparent IN ('bid'::REGCLASS, 'transaction'::REGCLASS)
+"""
+
+# detached but never moved: the archive transaction failed after its DETACH committed
+STRANDED_SQL = """
+    SELECT m[1] AS parent_table, c.relname AS partition_name, f.range_from,
+           date_add(f.range_from, INTERVAL '1 month', 'UTC') AS range_to, c.reltuples::BIGINT AS estimated_rows
+    FROM pg_class c
+    CROSS JOIN LATERAL regexp_match(c.relname, '^(bid|transaction)_y(\\d{4})m(\\d{2})$') AS m
+    CROSS JOIN LATERAL make_timestamptz(m[2]::INT, m[3]::INT, 1, 0, 0, 0, 'UTC') AS f(range_from)
+    WHERE m IS NOT NULL AND c.relnamespace = 'public'::REGNAMESPACE AND c.relkind = 'r' AND NOT c.relispartition
+"""
+
+FOREIGN_KEYS_SQL = "SELECT conname FROM pg_constraint WHERE conrelid = %s::REGCLASS AND contype = 'f'"
+
+# the current month (UTC) and later are live: bids and sales still arrive there
+CUTOFF_CHECK_SQL = "SELECT %s::TIMESTAMPTZ <= date_trunc('month', NOW(), 'UTC'), date_trunc('month', NOW(), 'UTC')"
+
+ARCHIVABLE_SQL = """
+    SELECT parent_table, partition_name, range_from, range_to, estimated_rows
+    FROM v_time_partitions
+    WHERE range_to <= %s
+    ORDER BY range_from, parent_table
+"""
+
+
+def list_partitions(conn):
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(LIST_SQL)
+            cols = [d[0] for d in cur.description]
+            return [dict(zip(cols, row)) for row in cur.fetchall()]
+
+
+def archive_cutoff(conn, keep_months):
+    """Start of the month `keep_months` months before the current one (UTC)."""
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT date_subtract(date_trunc('month', NOW(), 'UTC'), make_interval(months => %s), 'UTC')",
+                (keep_months,),
+            )
+            return cur.fetchone()[0]
+
+
+def _move_to_archive(conn, part):
+    """Move a detached partition to the archive schema and attach it to archive.<parent>."""
+    table = f'{ARCHIVE_SCHEMA}."{part["partition_name"]}"'
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(f'ALTER TABLE "{part["partition_name"]}" SET SCHEMA {ARCHIVE_SCHEMA}')
+            cur.execute(FOREIGN_KEYS_SQL, (table,))
+            for (name,) in cur.fetchall():
+                cur.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"')
+            # the CHECK constraint DETACH ... CONCURRENTLY leaves behind spares the validation scan
+            cur.execute(
+                f'ALTER TABLE {ARCHIVE_SCHEMA}.{part["parent_table"]} ATTACH PARTITION {table} FOR VALUES FROM (%s) TO (%s)',
+                (part["range_from"], part["range_to"]),
+            )
+
+
+def archive_partitions(conn, before, dry_run=False):
+    """
+    Detach every partition of bid and transaction whose range ends on or
+    before `before` and attach it to archive.bid / archive.transaction.
+    DETACH ... CONCURRENTLY cannot run inside a transaction block, so it runs
+    in autocommit; moving the detached partition to the archive schema,
+    dropping its foreign keys and attaching it is one transaction per
+    partition, and a failure leaves the ones already archived in place.
+    Raises ValueError if `before` is after the start of the current month.
+    Returns [{parent_table, partition_name, range_from, range_to, estimated_rows}].
+    """
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(CUTOFF_CHECK_SQL, (before,))
+            allowed, month_start = cur.fetchone()
+            if not allowed:
+                raise ValueError(f"cutoff {before} is after the start of the current month ({month_start})")
+            cur.execute(ARCHIVABLE_SQL, (before,))
+            cols = [d[0] for d in cur.description]
+            parts = [dict(zip(cols, row)) for row in cur.fetchall()]
+            cur.execute(PENDING_SQL)
+            cols = [d[0] for d in cur.description]
+            pending = [dict(zip(cols, row)) for row in cur.fetchall()]
+            cur.execute(STRANDED_SQL)
+            cols = [d[0] for d in cur.description]
+            stranded = [dict(zip(cols, row)) for row in cur.fetchall()]
+    if dry_run:
+        return stranded + pending + parts
+
+    for part in stranded:
+        _move_to_archive(conn, part)
+
+    steps = [(part, "FINALIZE") for part in pending] + [(part, "CONCURRENTLY") for part in parts]
+    for part, mode in steps:
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f'ALTER TABLE {part["parent_table"]} DETACH PARTITION "{part["partition_name"]}" {mode}')
+        finally:
+            conn.autocommit = False
+        _move_to_archive(conn, part)
+    return stranded + pending + parts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="show the partitions of bid and transaction")
+    p = sub.add_parser("ensure", help="create missing partitions up to --months-ahead")
+    p.add_argument("--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD)
+    p = sub.add_parser("archive", help="detach old partitions into the archive schema")
+    when = p.add_mutually_exclusive_group(required=True)
+    when.add_argument("--before", help="archive partitions that end on or before this date")
+    when.add_argument("--keep-months", type=int, help="keep this many months before the current one")
+    p.add_argument("--dry-run", action="store_true", help="only list what would be archived")
+
+    args = parser.parse_args(argv)
+    conn = get_conn()
+    try:
+        if args.command == "list":
+            result = list_partitions(conn)
+        elif args.command == "ensure":
+            result = {"created": ensure_partitions(conn, args.months_ahead)}
+        else:
+            if args.keep_months is not None and args.keep_months < 0:
+                parser.error("--keep-months must be 0 or more")
+            before = args.before if args.before is not None else archive_cutoff(conn, args.keep_months)
+            try:
+                parts = archive_partitions(conn, before, args.dry_run)
+            except ValueError as exc:
+                print(json.dumps({"error": str(exc)}))
+                return 1
+            result = {"before": before, "dry_run": args.dry_run, "archived": parts}
+    finally:
+        conn.close()
+    print(json.dumps(result, indent=2, default=json_default))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
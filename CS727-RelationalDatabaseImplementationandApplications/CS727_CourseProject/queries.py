@@ -0,0 +1,298 @@
+"""
+SQL run by the desktop app, kept free of Tkinter so that headless tools
+(bench.py, index_advisor.py) drive exactly the same statements.
+
+- USER_* / PURGE_USERS_SQL: the CRUD statements behind CrudApp.
+- PURGE_USERS_TARGETS_SQL / PURGE_USERS_STEPS: the statements inside
+  purge_users(), for the index advisor.
+- PLACE_BID_SQL / FINALIZE_LISTING_SQL: the auction stored routines.
+- BID_PERCENTILES_SQL / BID_PERCENTILES_APPROX_SQL: exact and sketch-based
+  bid amount percentiles.
+- CATEGORY_CHILDREN_SQL: one level of the category tree with subtree
+  totals, read through the category_closure table.
+- SEARCH_LISTINGS_SQL: one keyset page of ranked listing search results.
+- PREBUILT_QUERIES: the one-click analytics queries, demonstrating set
+  operations (UNION/EXCEPT), set membership (IN), set comparison (ALL),
+  CTEs, advanced aggregates (percentile_cont), OLAP (ROLLUP/CUBE), a
+  time-bounded scan pruned to a few partitions of bid/transaction and
+  subtree totals over the category closure table. Each
+  entry also carries the result-cache TTL in seconds and the tables it
+  reads, which decide when a cached result is invalidated. Entries with an
+  "approx_sql" also have an approximate form read from the bid sketches;
+  query_sql(key, approx) picks one.
+"""
+
+import os
+
+# Keyset page size of the user list
+USER_PAGE_SIZE = 100
+USER_COLUMNS = "user_id, username, email, user_type, account_status, rating"
+
+USER_PAGE_AFTER_SQL = f"SELECT {USER_COLUMNS} FROM user_account WHERE user_id > %s ORDER BY user_id LIMIT %s"
+USER_PAGE_BEFORE_SQL = f"SELECT {USER_COLUMNS} FROM user_account WHERE user_id < %s ORDER BY user_id DESC LIMIT %s"
+USER_SELECT_SQL = f"SELECT {USER_COLUMNS} FROM user_account WHERE user_id = %s"
+USER_SELECT_MANY_SQL = f"SELECT {USER_COLUMNS} FROM user_account WHERE user_id = ANY(%s) ORDER BY user_id"
+USER_INSERT_SQL = """
+    INSERT INTO user_account (username, email, user_type, account_status, rating)
+    VALUES (%s, %s, %s, %s, %s)
+    RETURNING user_id
+"""
+# execute_values() form: VALUES %s takes a page of rows
+USER_INSERT_MANY_SQL = """
+    INSERT INTO user_account (username, email, user_type, account_status, rating)
+    VALUES %s
+    RETURNING user_id
+"""
+USER_UPDATE_SQL = """
+    UPDATE user_account
+       SET username = %s,
+           email = %s,
+           user_type = %s,
+           account_status = %s,
+           rating = %s
+     WHERE user_id = %s
+"""
+PURGE_USERS_SQL = "SELECT table_name, deleted FROM purge_users(%s)"
+
+# What purge_users() runs, written out for index_advisor.py (EXPLAIN cannot see
+# inside a plpgsql function); keep in step with purge_users() in ebay_db.sql.
+# %(users)s are the user ids, %(listings)s / %(txns)s the listing and
+# transaction ids that PURGE_USERS_TARGETS_SQL collects for them.
+PURGE_USERS_TARGETS_SQL = """
+    SELECT v.listings, (
+        SELECT COALESCE(array_agg(DISTINCT x.transaction_id), '{}')
+        FROM (
+            SELECT t.transaction_id FROM v_transaction_history t WHERE t.buyer_id = ANY(%(users)s)
+            UNION ALL
+            SELECT t.transaction_id FROM v_transaction_history t WHERE t.seller_id = ANY(%(users)s)
+            UNION ALL
+            SELECT t.transaction_id FROM v_transaction_history t WHERE t.listing_id = ANY(v.listings)
+            UNION ALL
+            SELECT t.transaction_id FROM v_bid_history b JOIN v_transaction_history t ON t.bid_id = b.bid_id
+            WHERE b.user_id = ANY(%(users)s)
+        ) x
+    )
+    FROM (SELECT COALESCE(array_agg(l.listing_id), '{}') AS listings
+          FROM listing l WHERE l.seller_id = ANY(%(users)s)) v
+"""
+PURGE_USERS_STEPS = [
+    ("delete feedback", """
+        DELETE FROM feedback f
+        WHERE f.author_user_id = ANY(%(users)s) OR f.target_user_id = ANY(%(users)s)
+           OR f.transaction_id = ANY(%(txns)s)
+    """),
+    ("delete transactions", "DELETE FROM transaction t WHERE t.transaction_id = ANY(%(txns)s)"),
+    ("delete archived transactions", "DELETE FROM archive.transaction t WHERE t.transaction_id = ANY(%(txns)s)"),
+    ("delete bids on listings", "DELETE FROM bid b WHERE b.listing_id = ANY(%(listings)s)"),
+    ("delete archived bids on listings", "DELETE FROM archive.bid b WHERE b.listing_id = ANY(%(listings)s)"),
+    ("delete bids by users", "DELETE FROM bid b WHERE b.user_id = ANY(%(users)s)"),
+    ("delete archived bids by users", "DELETE FROM archive.bid b WHERE b.user_id = ANY(%(users)s)"),
+    ("delete watches on listings", "DELETE FROM user_listing_watch w WHERE w.listing_id = ANY(%(listings)s)"),
+    ("delete watches by users", "DELETE FROM user_listing_watch w WHERE w.user_id = ANY(%(users)s)"),
+    ("delete listings", "DELETE FROM listing l WHERE l.listing_id = ANY(%(listings)s)"),
+    ("delete users", "DELETE FROM user_account u WHERE u.user_id = ANY(%(users)s)"),
+]
+LISTING_COLUMNS = "listing_id, seller_id, category_id, title, status, start_price, high_bid, high_bidder_id, end_date"
+LISTING_SELECT_SQL = f"SELECT {LISTING_COLUMNS} FROM listing WHERE listing_id = %s"
+PLACE_BID_SQL = "CALL place_bid(%s, %s, %s, %s)"
+PLACE_BIDS_SQL = "SELECT ord, bid_id, reason FROM place_bids(%s, %s, %s::NUMERIC[], %s)"
+FINALIZE_LISTING_SQL = "SELECT finalize_listing(%s)"
+# bid and transaction have no default partition: a month needs its partition
+# before its first bid or sale (see ensure_time_partitions in ebay_db.sql)
+ENSURE_PARTITIONS_SQL = "SELECT ensure_time_partitions(%s)"
+PARTITION_MONTHS_AHEAD = 3
+
+# Bid amount percentiles over all bids, one category or one listing; the
+# approximate form merges the bid sketches. Both also return the relative
+# error bound of their values (0 for the exact form).
+BID_PERCENTILES_SQL = """
+    SELECT percentile_cont(%s::FLOAT8[]) WITHIN GROUP (ORDER BY b.bid_amount)::NUMERIC[], 0
+    FROM bid b
+    JOIN listing l ON l.listing_id = b.listing_id
+    WHERE (%s::INT IS NULL OR l.category_id = %s) AND (%s::INT IS NULL OR b.listing_id = %s)
+"""
+BID_PERCENTILES_APPROX_SQL = "SELECT bid_amount_percentiles_approx(%s::FLOAT8[], %s, %s), bid_sketch_accuracy()"
+
+# Direct subcategories of a category (top level for NULL) with the listing
+# counts and paid revenue of each one's whole subtree (see category_children())
+CATEGORY_CHILDREN_SQL = """
+    SELECT category_id, name, parent_id, child_count, subcategories, listings, active_listings, revenue
+    FROM category_children(%s)
+"""
+
+# Ranked listing search (see search_listings()): text, category subtree,
+# status, min/max current price, the (rank, listing_id) of the previous
+# page's last row (NULLs for the first page) and the page size
+SEARCH_PAGE_SIZE = 50
+SEARCH_LISTINGS_SQL = """
+    SELECT listing_id, title, category, status, current_price, end_date, rank
+    FROM search_listings(%s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+# Prebuilt query results are read from a server-side cursor QUERY_CHUNK_ROWS
+# at a time, up to QUERY_ROW_CAP rows per read.
+QUERY_CHUNK_ROWS = 500
+QUERY_ROW_CAP = int(os.getenv("APP_QUERY_ROW_CAP", "5000"))
+
+PREBUILT_QUERIES = {
+    "union_buyers_sellers": {
+        "label": "Set: buyers UNION sellers",
+        "sql": """
+            SELECT username, 'buyer'  AS role FROM user_account WHERE user_type IN ('buyer','both')
+            UNION
+            SELECT username, 'seller' AS role FROM user_account WHERE user_type IN ('seller','both')
+            ORDER BY username, role;
+        """,
+        "desc": "UNION of buyers and sellers (set operation)",
+        "ttl": 300,
+        "tables": ("user_account",),
+    },
+    "except_never_bidded": {
+        "label": "Set: users NEVER bid (EXCEPT)",
+        "sql": """
+            SELECT username FROM user_account
+            EXCEPT
+            SELECT DISTINCT u.username
+            FROM user_account u JOIN bid b ON b.user_id = u.user_id
+            ORDER BY username;
+        """,
+        "desc": "Users who have never placed a bid (EXCEPT)",
+        "ttl": 60,
+        "tables": ("user_account", "bid"),
+    },
+    "membership_watch_phones": {
+        "label": "Membership: watchers of Phones/Laptops",
+        "sql": """
+            SELECT DISTINCT u.username, l.title, c.name AS category
+            FROM user_listing_watch w
+            JOIN listing l ON l.listing_id = w.listing_id
+            JOIN category c ON c.category_id = l.category_id
+            JOIN user_account u ON u.user_id = w.user_id
+            WHERE c.name IN ('Phones','Laptops')
+            ORDER BY username, title;
+        """,
+        "desc": "IN membership on categories Phones/Laptops",
+        "ttl": 120,
+        "tables": ("user_listing_watch", "listing", "category", "user_account"),
+    },
+    "set_comparison_all": {
+        "label": "Set comparison: start_price > ALL bids",
+        "sql": """
+            SELECT l.listing_id, l.title, l.start_price
+            FROM listing l
+            WHERE l.start_price > ALL (
+                SELECT b.bid_amount FROM bid b WHERE b.listing_id = l.listing_id
+            )
+            ORDER BY l.listing_id;
+        """,
+        "desc": "Listings whose start price exceeds all existing bids (ALL)",
+        "ttl": 60,
+        "tables": ("listing", "bid"),
+    },
+    "cte_top_watchers": {
+        "label": "CTE: top watchers per listing",
+        "sql": """
+            WITH watch_counts AS (
+                SELECT l.listing_id, l.title, COUNT(w.user_id) AS watchers
+                FROM listing l
+                LEFT JOIN user_listing_watch w ON w.listing_id = l.listing_id
+                GROUP BY l.listing_id, l.title
+            )
+            SELECT * FROM watch_counts
+            ORDER BY watchers DESC, listing_id
+            LIMIT 10;
+        """,
+        "desc": "CTE to compute watcher counts",
+        "ttl": 60,
+        "tables": ("listing", "user_listing_watch"),
+    },
+    "agg_percentiles": {
+        "label": "Aggregate: bid amount percentiles",
+        "sql": """
+            SELECT percentile_cont(ARRAY[0.25,0.5,0.75]) WITHIN GROUP (ORDER BY bid_amount) AS bid_amount_percentiles
+            FROM bid;
+        """,
+        "desc": "Advanced aggregate: percentile_cont",
+        "approx_sql": """
+            SELECT bid_amount_percentiles_approx(ARRAY[0.25,0.5,0.75]) AS bid_amount_percentiles,
+                   bid_sketch_accuracy() AS relative_error;
+        """,
+        "approx_desc": "Approximate: merged bid sketches, each value within ±1% of percentile_cont",
+        "ttl": 30,
+        "tables": ("bid",),  # the bid sketches follow bid
+    },
+    "olap_rollup_revenue_category": {
+        "label": "OLAP: revenue by category (ROLLUP)",
+        "sql": """
+            SELECT COALESCE(c.name, '**TOTAL**') AS category, 
+                   COALESCE(SUM(f.revenue),0) AS revenue
+            FROM category c
+            LEFT JOIN revenue_fact f ON f.category_id = c.category_id AND f.payment_status = 'paid'
+            GROUP BY ROLLUP(c.name)
+            ORDER BY CASE WHEN c.name IS NULL THEN 1 ELSE 0 END, revenue DESC;
+        """,
+        "desc": "ROLLUP over the revenue_fact aggregate table (NULL = grand total)",
+        "ttl": 120,
+        "tables": ("category", "listing", "transaction"),  # revenue_fact follows listing/transaction
+    },
+    "olap_cube_payment_shipping": {
+        "label": "OLAP: revenue cube pay/ship",
+        "sql": """
+            SELECT COALESCE(payment_status::text, '**ALL**') AS payment_status,
+                   COALESCE(shipping_status::text, '**ALL**') AS shipping_status,
+                   SUM(revenue) AS revenue
+            FROM revenue_fact
+            GROUP BY CUBE(payment_status, shipping_status)
+            ORDER BY CASE WHEN payment_status IS NULL THEN 1 ELSE 0 END,
+                     CASE WHEN shipping_status IS NULL THEN 1 ELSE 0 END,
+                     payment_status, shipping_status;
+        """,
+        "desc": "CUBE over the revenue_fact aggregate table (NULL = subtotal/total)",
+        "ttl": 120,
+        "tables": ("transaction",),  # revenue_fact follows transaction
+    },
+    "range_recent_activity": {
+        "label": "Time range: bids and sales, last 30 days",
+        "sql": """
+            SELECT d.day::DATE AS day, COALESCE(b.bids, 0) AS bids,
+                   COALESCE(t.sales, 0) AS sales, COALESCE(t.revenue, 0) AS revenue
+            FROM generate_series(date_trunc('day', NOW()) - INTERVAL '29 day', date_trunc('day', NOW()),
+                                 INTERVAL '1 day') AS d(day)
+            LEFT JOIN (
+                SELECT date_trunc('day', bid_time) AS day, COUNT(*) AS bids
+                FROM bid
+                WHERE bid_time >= date_trunc('day', NOW()) - INTERVAL '29 day'
+                  AND bid_time < date_trunc('day', NOW()) + INTERVAL '1 day'
+                GROUP BY 1
+            ) b USING (day)
+            LEFT JOIN (
+                SELECT date_trunc('day', transaction_date) AS day, COUNT(*) AS sales, SUM(final_price) AS revenue
+                FROM transaction
+                WHERE transaction_date >= date_trunc('day', NOW()) - INTERVAL '29 day'
+                  AND transaction_date < date_trunc('day', NOW()) + INTERVAL '1 day'
+                GROUP BY 1
+            ) t USING (day)
+            ORDER BY day DESC;
+        """,
+        "desc": "Daily bids and sales; the time bounds prune bid/transaction to the partitions of the last 30 days",
+        "ttl": 60,
+        "tables": ("bid", "transaction"),
+    },
+    "tree_subtree_totals": {
+        "label": "Tree: listings and revenue per top-level category",
+        "sql": """
+            SELECT name AS category, subcategories, listings, active_listings, revenue
+            FROM category_children()
+            ORDER BY revenue DESC, category;
+        """,
+        "desc": "Closure table: each top-level category's whole subtree through one join, whatever its depth",
+        "ttl": 120,
+        "tables": ("category", "listing", "transaction"),  # closure follows category, revenue_fact transaction
+    },
+}
+
+
+def query_sql(key, approx=False):
+    """SQL for PREBUILT_QUERIES[key]; the approximate form when asked for and available."""
+    query = PREBUILT_QUERIES[key]
+    return query.get("approx_sql", query["sql"]) if approx else query["sql"]
@@ -0,0 +1,94 @@
+"""
+In-memory result cache for the prebuilt analytics queries.
+
+Entries are keyed by (query key, params), expire after a per-entry TTL, and are
+evicted least-recently-used once the cache holds `max_entries`. Each entry
+records the tables its query reads so that writes to any of them (local
+CRUD, or a LISTEN/NOTIFY message from another client) drop it right away.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_MAX_ENTRIES = int(os.getenv("APP_CACHE_MAX_ENTRIES", "64"))
+
+
+class QueryCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (key, params) -> (value, stored_at, expires_at, tables)
+        self._versions = {}            # table -> invalidation counter
+        self._epoch = 0                # bumped by clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, params=()):
+        """Return (value, age_seconds) for a live entry, or None on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((key, params))
+            if entry is None or entry[2] <= now:
+                if entry is not None:
+                    del self._entries[(key, params)]
+                self.misses += 1
+                return None
+            self._entries.move_to_end((key, params))
+            self.hits += 1
+            return entry[0], now - entry[1]
+
+    def token(self, tables):
+        """
+        Snapshot the invalidation counters of `tables` before running a query.
+        Passing it to put() keeps a result computed before a concurrent write
+        out of the cache.
+        """
+        with self._lock:
+            return self._epoch, {t: self._versions.get(t, 0) for t in tables}
+
+    def put(self, key, params, value, ttl, tables, token=None):
+        """Store value; returns False if a table was invalidated since `token`."""
+        now = time.monotonic()
+        with self._lock:
+            if token is not None:
+                epoch, versions = token
+                if epoch != self._epoch or any(self._versions.get(t, 0) != v for t, v in versions.items()):
+                    return False
+            self._entries[(key, params)] = (value, now, now + ttl, frozenset(tables))
+            self._entries.move_to_end((key, params))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def invalidate_tables(self, tables):
+        """Drop every entry that reads any of `tables`; returns how many."""
+        tables = set(tables)
+        with self._lock:
+            for t in tables:
+                self._versions[t] = self._versions.get(t, 0) + 1
+            stale = [k for k, entry in self._entries.items() if entry[3] & tables]
+            for k in stale:
+                del self._entries[k]
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
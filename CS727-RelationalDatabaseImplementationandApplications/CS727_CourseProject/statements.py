@@ -0,0 +1,103 @@
+"""
+Prepared-statement registry for the `ebay_db` hot paths (no Tkinter required).
+
+A StatementRegistry maps names to SQL with psycopg2-style %s placeholders.
+execute(cur, name, params) PREPAREs the statement the first time it is used
+on a connection and runs it with EXECUTE from then on, so the server parses
+and plans it once per connection instead of on every call. Connections are
+tracked weakly: a connection the pool replaces (after a server restart, say)
+is a new object and gets the statement prepared again.
+
+Per statement the registry counts calls, PREPAREs and errors and keeps the
+cumulative and maximum execution time; stats() returns them for display.
+"""
+
+import re
+import threading
+import time
+import weakref
+
+import psycopg2
+import psycopg2.errors
+
+_NAME = re.compile(r"[a-z_][a-z0-9_]*")
+
+
+def numbered_placeholders(sql):
+    """Turn %s placeholders into $1, $2, ... for PREPARE."""
+    pieces = sql.split("%s")
+    return "".join(p + (f"${i}" if i < len(pieces) else "") for i, p in enumerate(pieces, start=1))
+
+
+class StatementRegistry:
+    """Named statements, prepared lazily per connection, with usage stats. Thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._statements = {}                       # name -> (PREPARE sql, parameter count)
+        self._prepared = weakref.WeakKeyDictionary()  # connection -> names prepared on it
+        self._stats = {}
+
+    def register(self, name, sql):
+        """Add a statement; `sql` may only use %s placeholders (no %% or %(name)s)."""
+        if not _NAME.fullmatch(name):
+            raise ValueError(f"invalid statement name: {name!r}")
+        with self._lock:
+            if name in self._statements:
+                raise ValueError(f"statement {name!r} is already registered")
+            self._statements[name] = (f"PREPARE {name} AS {numbered_placeholders(sql)}", sql.count("%s"))
+            self._stats[name] = {"calls": 0, "prepares": 0, "errors": 0, "total_s": 0.0, "max_s": 0.0}
+        return name
+
+    def execute(self, cur, name, params=()):
+        """Run statement `name` on `cur`, preparing it on cur's connection first if needed."""
+        prepare_sql, nparams = self._statements[name]
+        if len(params) != nparams:
+            raise TypeError(f"statement {name!r} takes {nparams} parameters, got {len(params)}")
+        conn = cur.connection
+        with self._lock:
+            names = self._prepared.setdefault(conn, set())
+            prepared = name in names
+        started = time.monotonic()
+        try:
+            if not prepared:
+                cur.execute(prepare_sql)
+                with self._lock:
+                    names.add(name)
+                    self._stats[name]["prepares"] += 1
+            cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * nparams)})" if nparams else f"EXECUTE {name}", params)
+        except psycopg2.Error as exc:
+            with self._lock:
+                self._stats[name]["errors"] += 1
+                if isinstance(exc, psycopg2.errors.InvalidSqlStatementName):
+                    # deallocated behind our back (DISCARD ALL / DEALLOCATE): prepare again next time
+                    self._prepared.pop(conn, None)
+            raise
+        elapsed = time.monotonic() - started
+        with self._lock:
+            st = self._stats[name]
+            st["calls"] += 1
+            st["total_s"] += elapsed
+            st["max_s"] = max(st["max_s"], elapsed)
+
+    def stats(self):
+        """[{name, calls, prepares, errors, total_ms, avg_ms, max_ms}], most total time first."""
+        with self._lock:
+            rows = [(name, dict(st)) for name, st in self._stats.items()]
+        out = []
+        for name, st in rows:
+            out.append({
+                "name": name,
+                "calls": st["calls"],
+                "prepares": st["prepares"],
+                "errors": st["errors"],
+                "total_ms": round(st["total_s"] * 1000, 3),
+                "avg_ms": round(st["total_s"] * 1000 / st["calls"], 3) if st["calls"] else None,
+                "max_ms": round(st["max_s"] * 1000, 3),
+            })
+        return sorted(out, key=lambda r: r["total_ms"], reverse=True)
+
+    def reset_stats(self):
+        with self._lock:
+            for st in self._stats.values():
+                st.update(calls=0, prepares=0, errors=0, total_s=0.0, max_s=0.0)
@@ -0,0 +1,60 @@
+"""
+Shared fixtures for the unit tests (no database required).
+
+The modules live flat in the project directory, so it goes on sys.path.
+FakeConn stands in for a psycopg2 connection: it records what is executed
+and hands back queued result sets, which is enough for the helpers that
+only page through rows.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.connection = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.connection.executed.append((sql, params))
+
+    def fetchall(self):
+        return self.connection.results.pop(0)
+
+    def fetchone(self):
+        rows = self.connection.results.pop(0)
+        return rows[0] if rows else None
+
+
+class FakeConn:
+    def __init__(self, *results):
+        self.results = list(results)
+        self.executed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def params(self):
+        """Parameters of the EXECUTE statements run so far (PREPAREs skipped)."""
+        return [p for sql, p in self.executed if sql.startswith("EXECUTE")]
+
+
+@pytest.fixture
+def fake_conn():
+    return FakeConn
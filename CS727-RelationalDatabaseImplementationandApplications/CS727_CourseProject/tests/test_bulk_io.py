@@ -0,0 +1,63 @@
+import pytest
+
+from bulk_io import USER_FIELDS, _copy_text, detect_format, read_rows
+
+
+@pytest.mark.parametrize("path, fmt", [
+    ("users.csv", "csv"), ("users.ndjson", "ndjson"), ("users.JSONL", "ndjson"), ("users.json", "ndjson"),
+    ("users.txt", "csv"),
+])
+def test_detect_format(path, fmt):
+    assert detect_format(path) == fmt
+
+
+def test_read_rows_csv(tmp_path):
+    path = tmp_path / "users.csv"
+    path.write_text(
+        "email,username,extra\n"
+        "a@example.com,alice,x\n"
+        "b@example.com,bob,y,z\n"
+        ",carol,\n"
+    )
+    assert list(read_rows(str(path), USER_FIELDS)) == [
+        (1, ("alice", "a@example.com", None, None, None)),
+        (2, "Row has 4 values, the header has 3."),
+        (3, ("carol", "", None, None, None)),
+    ]
+
+
+def test_read_rows_csv_keeps_quoted_newlines(tmp_path):
+    path = tmp_path / "users.csv"
+    path.write_text('username,email\n"multi\nline",m@example.com\n')
+    assert list(read_rows(str(path), ("username", "email"))) == [(1, ("multi\nline", "m@example.com"))]
+
+
+def test_read_rows_ndjson(tmp_path):
+    path = tmp_path / "users.ndjson"
+    path.write_text(
+        '{"username": "alice", "email": "a@example.com", "rating": 4.5}\n'
+        "\n"
+        "not json\n"
+        "[1, 2]\n"
+        '{"username": "bob", "email": null, "unknown": 1}\n'
+    )
+    rows = list(read_rows(str(path), USER_FIELDS))
+    assert rows[0] == (1, ("alice", "a@example.com", None, None, "4.5"))
+    # blank lines are skipped and do not count as rows
+    assert rows[1][0] == 2 and rows[1][1].startswith("Invalid JSON:")
+    assert rows[2] == (3, "Each line must be a JSON object.")
+    assert rows[3] == (4, ("bob", None, None, None, None))
+
+
+def test_read_rows_format_override(tmp_path):
+    path = tmp_path / "users.txt"
+    path.write_text('{"username": "alice"}\n')
+    assert list(read_rows(str(path), ("username",), fmt="ndjson")) == [(1, ("alice",))]
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, None), ("", None), ("   ", None), (" alice ", "alice"),
+    ("a\tb", "a\\tb"), ("a\nb\rc", "a\\nb\\rc"), ("back\\slash", "back\\\\slash"),
+])
+def test_copy_text(value, expected):
+    assert _copy_text(value) == expected
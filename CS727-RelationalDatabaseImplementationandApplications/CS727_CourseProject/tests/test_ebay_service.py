@@ -0,0 +1,123 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+from ebay_service import User, ValidationError, _price, list_users, read_bid_csv, search_listings, validate_user
+
+
+def test_validate_user_applies_defaults_and_strips():
+    user = validate_user("  alice ", " alice@example.com ", user_id=7)
+    assert user == User(7, "alice", "alice@example.com", "buyer", "active", Decimal("0.0"))
+
+
+def test_validate_user_keeps_given_values():
+    user = validate_user("bob", "bob@example.com", "both", "suspended", "4.5")
+    assert (user.user_type, user.account_status, user.rating) == ("both", "suspended", Decimal("4.5"))
+
+
+@pytest.mark.parametrize("args, message", [
+    (("", "a@example.com"), "Username and email are required."),
+    (("alice", "  "), "Username and email are required."),
+    (("alice", "a@example.com", "admin"), "User type must be buyer, seller, or both."),
+    (("alice", "a@example.com", "", "deleted"), "Status must be active, suspended, or closed."),
+    (("alice", "a@example.com", "", "", "high"), "Rating must be numeric."),
+    (("alice", "a@example.com", "", "", "5.1"), "Rating must be between 0 and 5."),
+    (("alice", "a@example.com", "", "", "-1"), "Rating must be between 0 and 5."),
+])
+def test_validate_user_rejects(args, message):
+    with pytest.raises(ValidationError, match=message):
+        validate_user(*args)
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, None), ("", None), ("   ", None), ("12.50", Decimal("12.50")), (" 0 ", Decimal("0")), (3, Decimal("3")),
+])
+def test_price_parses(value, expected):
+    assert _price(value, "Minimum price") == expected
+
+
+@pytest.mark.parametrize("value, message", [
+    ("abc", "Maximum price must be numeric."),
+    ("NaN", "Maximum price must be numeric."),
+    ("Infinity", "Maximum price must be numeric."),
+    ("-0.01", "Maximum price cannot be negative."),
+])
+def test_price_rejects(value, message):
+    with pytest.raises(ValidationError, match=message):
+        _price(value, "Maximum price")
+
+
+def test_read_bid_csv(tmp_path):
+    path = tmp_path / "bids.csv"
+    path.write_text(
+        "user_id,listing_id,bid_amount,is_proxy\n"
+        "1,10,25.50,true\n"
+        "2,10, 26 ,\n"
+        "x,10,27,\n"
+        "3,10,NaN,\n"
+        "4,10,lots,\n"
+    )
+    rows = list(read_bid_csv(path))
+    assert rows[0] == (1, 10, Decimal("25.50"), True)
+    assert rows[1] == (2, 10, Decimal("26"), False)
+    assert rows[2].startswith("Unparseable row: invalid literal for int()")
+    assert rows[3] == "Unparseable row: bid_amount 'NaN' is not a number"
+    assert rows[4] == "Unparseable row: bid_amount 'lots' is not a number"
+
+
+def test_read_bid_csv_missing_column(tmp_path):
+    path = tmp_path / "bids.csv"
+    path.write_text("user_id,listing_id\n1,10\n")
+    assert list(read_bid_csv(path)) == ["Unparseable row: 'bid_amount'"]
+
+
+def _user(user_id):
+    return (user_id, f"user{user_id}", f"user{user_id}@example.com", "buyer", "active", Decimal(0))
+
+
+def test_list_users_pages_forward(fake_conn):
+    conn = fake_conn([_user(11), _user(12)])
+    assert [u.user_id for u in list_users(conn, anchor_id=10, limit=2)] == [11, 12]
+    assert conn.params() == [(10, 2)]
+
+
+def test_list_users_pages_backward_in_ascending_order(fake_conn):
+    # user_page_before reads user_id DESC; the page comes back ascending
+    conn = fake_conn([_user(9), _user(8)])
+    assert [u.user_id for u in list_users(conn, anchor_id=10, forward=False, limit=2)] == [8, 9]
+
+
+def _hit(listing_id, rank):
+    return (listing_id, f"Listing {listing_id}", "Books", "active", Decimal("10.00"),
+            datetime(2026, 1, 1, tzinfo=timezone.utc), rank)
+
+
+def test_search_listings_returns_cursor_of_last_hit(fake_conn):
+    conn = fake_conn([_hit(1, 0.9), _hit(2, 0.8), _hit(3, 0.7)])
+    hits, cursor = search_listings(conn, "lamp", limit=2)
+    assert [h.listing_id for h in hits] == [1, 2]
+    assert cursor == (0.8, 2)
+    # one row more than the page is fetched to tell whether there is a next page
+    assert conn.params() == [("lamp", None, None, None, None, None, None, 3)]
+
+
+def test_search_listings_last_page_has_no_cursor(fake_conn):
+    conn = fake_conn([_hit(4, 0.5)])
+    hits, cursor = search_listings(conn, "lamp", category_id=5, status="active", min_price="1",
+                                   max_price="", after=(0.7, 3), limit=2)
+    assert [h.listing_id for h in hits] == [4]
+    assert cursor is None
+    assert conn.params() == [("lamp", 5, "active", Decimal("1"), None, 0.7, 3, 3)]
+
+
+@pytest.mark.parametrize("kwargs, message", [
+    ({"limit": 0}, "Page size must be at least 1."),
+    ({"status": "open"}, "Status must be active, ended, cancelled, or sold."),
+    ({"min_price": "5", "max_price": "4"}, "Minimum price is above the maximum price."),
+])
+def test_search_listings_rejects_before_querying(fake_conn, kwargs, message):
+    conn = fake_conn()
+    with pytest.raises(ValidationError, match=message):
+        search_listings(conn, "lamp", **kwargs)
+    assert conn.executed == []
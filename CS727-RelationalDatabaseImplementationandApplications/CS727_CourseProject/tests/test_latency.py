@@ -0,0 +1,15 @@
+from latency import latency_summary, percentile
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile(values, 0) == 1
+    assert percentile([], 50) is None
+
+
+def test_latency_summary_in_milliseconds():
+    assert latency_summary([0.003, 0.001, 0.002]) == {"p50": 2.0, "p95": 3.0, "p99": 3.0, "max": 3.0}
+    assert latency_summary([]) == {"p50": None, "p95": None, "p99": None, "max": None}
@@ -0,0 +1,72 @@
+import pytest
+
+import query_cache
+from query_cache import QueryCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(query_cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_get_returns_value_and_age(clock):
+    cache = QueryCache()
+    assert cache.get("q", (1,)) is None
+    cache.put("q", (1,), "rows", ttl=60, tables=["bid"])
+    clock[0] += 5
+    assert cache.get("q", (1,)) == ("rows", 5.0)
+    assert cache.get("q", (2,)) is None
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 2, "evictions": 0, "invalidations": 0}
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = QueryCache()
+    cache.put("q", (), "rows", ttl=10, tables=["bid"])
+    clock[0] += 10
+    assert cache.get("q") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_is_evicted(clock):
+    cache = QueryCache(max_entries=2)
+    cache.put("a", (), 1, ttl=60, tables=[])
+    cache.put("b", (), 2, ttl=60, tables=[])
+    cache.get("a")
+    cache.put("c", (), 3, ttl=60, tables=[])
+    assert cache.get("b") is None
+    assert cache.get("a")[0] == 1 and cache.get("c")[0] == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_invalidate_tables_drops_readers_only(clock):
+    cache = QueryCache()
+    cache.put("bids", (), 1, ttl=60, tables=["bid", "listing"])
+    cache.put("users", (), 2, ttl=60, tables=["user_account"])
+    assert cache.invalidate_tables(["listing"]) == 1
+    assert cache.get("bids") is None
+    assert cache.get("users")[0] == 2
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_put_refuses_result_older_than_a_write(clock):
+    cache = QueryCache()
+    token = cache.token(["bid"])
+    cache.invalidate_tables(["bid"])
+    assert cache.put("q", (), "stale", ttl=60, tables=["bid"], token=token) is False
+    assert cache.get("q") is None
+    # a write to an unrelated table does not matter
+    token = cache.token(["bid"])
+    cache.invalidate_tables(["feedback"])
+    assert cache.put("q", (), "fresh", ttl=60, tables=["bid"], token=token) is True
+
+
+def test_clear_empties_and_invalidates_tokens(clock):
+    cache = QueryCache()
+    cache.put("q", (), 1, ttl=60, tables=["bid"])
+    token = cache.token(["bid"])
+    cache.clear()
+    assert cache.get("q") is None
+    assert cache.put("q", (), 2, ttl=60, tables=["bid"], token=token) is False
+    assert cache.stats()["invalidations"] == 1
@@ -0,0 +1,57 @@
+from decimal import Decimal
+
+import pytest
+
+from ebay_service import list_users
+from statements import StatementRegistry, numbered_placeholders
+
+
+def test_numbered_placeholders():
+    assert numbered_placeholders("SELECT * FROM t WHERE a = %s AND b < %s LIMIT %s") == (
+        "SELECT * FROM t WHERE a = $1 AND b < $2 LIMIT $3"
+    )
+    assert numbered_placeholders("SELECT 1") == "SELECT 1"
+
+
+def test_register_rejects_bad_and_duplicate_names():
+    registry = StatementRegistry()
+    registry.register("user_page", "SELECT %s")
+    with pytest.raises(ValueError, match="already registered"):
+        registry.register("user_page", "SELECT %s")
+    with pytest.raises(ValueError, match="invalid statement name"):
+        registry.register("User-Page", "SELECT 1")
+
+
+def test_execute_prepares_once_per_connection(fake_conn):
+    registry = StatementRegistry()
+    registry.register("pick", "SELECT * FROM t WHERE id = %s AND n < %s")
+    first, second = fake_conn(), fake_conn()
+    for conn in (first, first, second):
+        registry.execute(conn.cursor(), "pick", (1, 2))
+    assert first.executed == [
+        ("PREPARE pick AS SELECT * FROM t WHERE id = $1 AND n < $2", None),
+        ("EXECUTE pick (%s, %s)", (1, 2)),
+        ("EXECUTE pick (%s, %s)", (1, 2)),
+    ]
+    assert [sql for sql, _ in second.executed][0].startswith("PREPARE pick")
+    (stats,) = registry.stats()
+    assert (stats["calls"], stats["prepares"], stats["errors"]) == (3, 2, 0)
+
+
+def test_execute_checks_parameter_count(fake_conn):
+    registry = StatementRegistry()
+    registry.register("pick", "SELECT %s")
+    with pytest.raises(TypeError, match="takes 1 parameters, got 2"):
+        registry.execute(fake_conn().cursor(), "pick", (1, 2))
+
+
+def _user(user_id):
+    return (user_id, f"user{user_id}", f"user{user_id}@example.com", "buyer", "active", Decimal(0))
+
+
+def test_service_statements_prepared_once_per_connection(fake_conn):
+    conn = fake_conn([_user(1)], [_user(2)])
+    list_users(conn, anchor_id=0, limit=1)
+    list_users(conn, anchor_id=1, limit=1)
+    prepares = [sql for sql, _ in conn.executed if sql.startswith("PREPARE user_page_after")]
+    assert len(prepares) == 1